@@ -0,0 +1,90 @@
+"""
+Compare ways of parsing fitbit responses into our pydantic models.
+
+The test fixtures are scaled up to multi-day payloads, similar to what
+fitbit returns for a date range, with the per-30s sleep level data.
+
+Usage:
+    python -m benchmarks.bench_fitbit_parse [--days 30] [--repeat 5]
+"""
+
+import argparse
+import copy
+import json
+import timeit
+from pathlib import Path
+from typing import Any, Callable
+
+from pydantic import BaseModel
+
+from slackhealthbot.remoteservices.api.fitbit.activityapi import FitbitActivities
+from slackhealthbot.remoteservices.api.fitbit.sleepapi import FitbitSleep
+from tests.testsupport.testdata.fitbit_scenarios import activity_scenarios
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TESTDATA_PATH = Path(__file__).parent.parent / "tests" / "testsupport" / "testdata"
+
+
+def _sleep_payload(days: int) -> bytes:
+    fixture = json.loads(
+        (TESTDATA_PATH / "fitbit_sleep_response_2_items.json").read_text()
+    )
+    sleep_items = []
+    for _ in range(days):
+        for fixture_item in fixture["sleep"]:
+            item = copy.deepcopy(fixture_item)
+            # A night of sleep has around 1000 30-second level entries.
+            levels_data = item["levels"].get("data", [])
+            if levels_data:
+                item["levels"]["data"] = (levels_data * (1000 // len(levels_data) + 1))[
+                    :1000
+                ]
+            sleep_items.append(item)
+    return json.dumps({"sleep": sleep_items}).encode()
+
+
+def _activities_payload(days: int) -> bytes:
+    activities = [
+        activity
+        for scenario in activity_scenarios.values()
+        for activity in scenario.input_mock_fitbit_response.get("activities", [])
+    ]
+    return json.dumps({"activities": activities * days}).encode()
+
+
+def _parsers(model: type[BaseModel]) -> dict[str, Callable[[bytes], Any]]:
+    parsers = {
+        "json.loads + model": lambda text: model(**json.loads(text)),
+        "model_validate_json": model.model_validate_json,
+    }
+    if orjson:
+        parsers["orjson.loads + model_validate"] = lambda text: model.model_validate(
+            orjson.loads(text)
+        )
+    return parsers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for model, payload in (
+        (FitbitSleep, _sleep_payload(args.days)),
+        (FitbitActivities, _activities_payload(args.days)),
+    ):
+        print(f"{model.__name__}: {len(payload) / 1024:.0f} KiB")
+        for name, parse in _parsers(model).items():
+            best = min(
+                timeit.repeat(lambda: parse(payload), number=10, repeat=args.repeat)
+            )
+            print(f"  {name:<32} {best / 10 * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
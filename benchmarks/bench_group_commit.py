@@ -0,0 +1,152 @@
+"""
+Compare applying concurrent writes each in their own transaction,
+and through the group-commit writer.
+
+Each notification updates a user's sleep and saves an activity,
+like the fitbit webhook does.
+
+Reports the total duration, the mean latency of the notifications,
+and how many failed, for example when the database stayed locked
+for longer than the driver's timeout.
+
+Usage:
+    python -m benchmarks.bench_group_commit [--users 50] [--notifications 200]
+"""
+
+import argparse
+import asyncio
+import datetime
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from slackhealthbot.data.database import models
+from slackhealthbot.data.database.writer import (
+    GroupCommitWriter,
+    create_writer_session_maker,
+)
+from slackhealthbot.data.repositories.sqlalchemyfitbitrepository import (
+    SQLAlchemyFitbitRepository,
+)
+from slackhealthbot.domain.models.activity import ActivityData
+from slackhealthbot.domain.models.sleep import SleepData
+
+
+async def _create_users(session_maker: async_sessionmaker, users: int):
+    async with session_maker() as db:
+        for i in range(users):
+            db.add(
+                models.User(
+                    slack_alias=f"user{i}",
+                    fitbit=models.FitbitUser(
+                        oauth_access_token="access",
+                        oauth_refresh_token="refresh",
+                        oauth_userid=f"fitbit{i}",
+                        oauth_expiration_date=datetime.datetime.now(),
+                    ),
+                )
+            )
+        await db.commit()
+
+
+async def _measure(
+    session_maker: async_sessionmaker,
+    writer: GroupCommitWriter | None,
+    users: int,
+    notifications: int,
+    first_log_id: int,
+) -> tuple[float, float, int]:
+    """
+    :return: the total duration in ms, the mean latency in ms,
+        and the number of failed notifications.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    latencies: list[float] = []
+    failures = 0
+
+    async def notify(i: int):
+        nonlocal failures
+        start = time.perf_counter()
+        # Like the webhook requests, each notification has its own session.
+        async with session_maker() as db:
+            repo = SQLAlchemyFitbitRepository(db=db, writer=writer)
+            fitbit_userid = f"fitbit{i % users}"
+            try:
+                await repo.update_sleep_for_user(
+                    fitbit_userid=fitbit_userid,
+                    sleep=SleepData(
+                        start_time=now,
+                        end_time=now,
+                        sleep_minutes=420,
+                        wake_minutes=30,
+                    ),
+                )
+                await repo.create_activity_for_user(
+                    fitbit_userid=fitbit_userid,
+                    activity=ActivityData(
+                        log_id=first_log_id + i,
+                        type_id=55001,
+                        calories=300,
+                        distance_km=None,
+                        total_minutes=45,
+                        zone_minutes=[],
+                    ),
+                )
+            except Exception:
+                failures += 1
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(notify(i) for i in range(notifications)))
+    duration = time.perf_counter() - start
+    return duration * 1000, sum(latencies) / len(latencies) * 1000, failures
+
+
+async def main(users: int, notifications: int):
+    with tempfile.TemporaryDirectory() as workdir:
+        connection_url = f"sqlite+aiosqlite:///{Path(workdir) / 'bench.db'}"
+        engine = create_async_engine(connection_url)
+        async with engine.begin() as connection:
+            await connection.run_sync(
+                models.Base.metadata.create_all,
+                tables=[
+                    x
+                    for x in models.Base.metadata.sorted_tables
+                    if not x.info.get("is_view")
+                ],
+            )
+        session_maker = async_sessionmaker(bind=engine)
+        await _create_users(session_maker, users)
+
+        writer_session_maker = create_writer_session_maker(connection_url)
+        writer = GroupCommitWriter(
+            session_maker=writer_session_maker, max_batch_size=100
+        )
+        writer.start()
+        for i, (name, measured_writer) in enumerate(
+            (("direct", None), ("group commit", writer))
+        ):
+            duration_ms, latency_ms, failures = await _measure(
+                session_maker,
+                measured_writer,
+                users=users,
+                notifications=notifications,
+                first_log_id=i * notifications,
+            )
+            print(
+                f"{name:<16} {duration_ms:8.1f} ms total "
+                f"{latency_ms:8.1f} ms/notification {failures:4d} failed"
+            )
+        await writer.stop()
+        await writer_session_maker.kw["bind"].dispose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--notifications", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(users=args.users, notifications=args.notifications))
@@ -0,0 +1,177 @@
+"""
+Compare the webhook throughput of the runtime profiles and worker counts.
+
+Each configuration starts the app the way production does, with
+python -m slackhealthbot.main, and receives the same notification storm.
+The remote services are replaced by the load test's stubs, which run
+in this process with the load generator. The writes go through the
+group-commit writer, which the workers need to share the database.
+
+Reports the throughput, the latencies, the status codes,
+and how long the app took to shut down after a SIGTERM.
+
+Usage:
+    python -m benchmarks.bench_runtime_profiles [--workers 1 2] [--notifications 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import suppress
+from pathlib import Path
+
+import httpx
+
+from benchmarks.loadtest.harness import (
+    ACTIVITY_TYPE_ID,
+    LoadTestConfig,
+    configure_environment,
+    create_database,
+    send_storm,
+)
+from benchmarks.loadtest.stubs import (
+    StubBehavior,
+    fitbit_stub,
+    slack_stub,
+    withings_stub,
+)
+from slackhealthbot.settings import RuntimeProfile
+
+
+def _get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_until_ready(app_url: str, process: asyncio.subprocess.Process):
+    async with httpx.AsyncClient(base_url=app_url) as client:
+        while process.returncode is None:
+            with suppress(httpx.ConnectError):
+                if (await client.head("/")).status_code == httpx.codes.OK:
+                    return
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"The app exited with {process.returncode}")
+
+
+async def run_profile(
+    profile: RuntimeProfile,
+    workers: int,
+    config: LoadTestConfig,
+    log_path: Path,
+) -> str:
+    port = _get_free_port()
+    app_url = f"http://127.0.0.1:{port}"
+    with open(log_path, "w") as log_file:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "slackhealthbot.main",
+            env={
+                **os.environ,
+                "SERVER__HOST": "127.0.0.1",
+                "SERVER__PORT": str(port),
+                "SERVER__PROFILE": profile,
+                "SERVER__WORKERS": str(workers),
+                "DATABASE_WRITER__GROUP_COMMIT": "true",
+                "LOGGING__SQL_LOG_LEVEL": "WARNING",
+            },
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+        )
+    try:
+        await _wait_until_ready(app_url, process)
+        start = time.perf_counter()
+        latencies, status_codes = await send_storm(app_url, config)
+        duration = time.perf_counter() - start
+    finally:
+        stop_start = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        await process.wait()
+        stop_duration = time.perf_counter() - stop_start
+
+    latencies_ms = sorted(x * 1000 for x in latencies)
+    return (
+        f"{profile:<11} {workers:>7}"
+        f" {len(latencies) / duration:>9.1f}"
+        f" {latencies_ms[len(latencies_ms) // 2]:>8.1f}"
+        f" {latencies_ms[int(len(latencies_ms) * 0.99)]:>8.1f}"
+        f" {stop_duration:>7.2f}s"
+        f"  {dict(sorted(status_codes.items()))}"
+    )
+
+
+async def run(
+    workers: list[int],
+    config: LoadTestConfig,
+    stubs: list,
+    workdir: Path,
+) -> list[str]:
+    for stub in stubs:
+        await stub.start()
+    try:
+        return [
+            await run_profile(
+                profile=profile,
+                workers=worker_count,
+                config=config,
+                log_path=workdir / f"app-{profile}-{worker_count}.log",
+            )
+            for worker_count in workers
+            for profile in RuntimeProfile
+        ]
+    finally:
+        for stub in stubs:
+            await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--notifications", type=int, default=2000)
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="Max requests in flight."
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=20, help="Latency of the remote stubs."
+    )
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        users=args.users,
+        notifications=args.notifications,
+        concurrency=args.concurrency,
+    )
+    behavior = StubBehavior(latency_s=args.latency_ms / 1000)
+    fitbit = fitbit_stub(behavior, activity_type_id=ACTIVITY_TYPE_ID)
+    withings = withings_stub(behavior)
+    slack = slack_stub(behavior)
+    with tempfile.TemporaryDirectory() as workdir:
+        database_path = Path(workdir) / "bench.db"
+        configure_environment(
+            database_path, fitbit=fitbit, withings=withings, slack=slack
+        )
+        create_database(database_path, users=args.users)
+        rows = asyncio.run(
+            run(
+                workers=args.workers,
+                config=config,
+                stubs=[fitbit, withings, slack],
+                workdir=Path(workdir),
+            )
+        )
+    print("profile     workers     req/s  p50(ms)  p99(ms)  stop     status")
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Report where the startup time goes, and how long the app takes
+to serve its first request.
+
+- The modules whose import takes the longest, from python -X importtime.
+- The time to the first served request: the app is started with the
+  given command, on a new database for the first start, then on the
+  migrated database. Each start is timed until HEAD / succeeds.
+- The startup phases logged by the app.
+
+Usage:
+    python -m benchmarks.bench_startup [--starts 5] [--command "python -m slackhealthbot.main"]
+"""
+
+import argparse
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def get_slowest_imports(count: int) -> tuple[float, list[tuple[float, str]]]:
+    """
+    :return: the import time of the app in seconds, and its slowest
+        third-party imports, with their cumulative time.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import slackhealthbot.main"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = [
+        (int(m[2]) / 1_000_000, len(m[3]), m[4])
+        for m in map(_IMPORTTIME_LINE.match, result.stderr.splitlines())
+        if m
+    ]
+    # A module is listed after its own imports, one level less indented.
+    imports: list[tuple[float, str]] = []
+    total_s = 0.0
+    for index, (cumulative_s, indent, name) in enumerate(rows):
+        if name == "slackhealthbot.main":
+            total_s = cumulative_s
+        if name.startswith("slackhealthbot"):
+            continue
+        importer = next(
+            (x[2] for x in rows[index + 1 :] if x[1] < indent),
+            None,
+        )
+        if importer and importer.startswith("slackhealthbot"):
+            imports.append((cumulative_s, f"{name} <- {importer}"))
+    return total_s, sorted(imports, reverse=True)[:count]
+
+
+def _get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_first_request(command: str, env: dict[str, str]) -> tuple[float, str]:
+    """
+    :return: the time until the app started with the command served
+        a request, and the startup phases it logged.
+    """
+    port = _get_free_port()
+    with tempfile.TemporaryFile(mode="w+") as log_file:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            env={**env, "SERVER__HOST": "127.0.0.1", "SERVER__PORT": str(port)},
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+                while True:
+                    if process.poll() is not None:
+                        raise RuntimeError(f"The app exited with {process.returncode}")
+                    try:
+                        client.head("/").raise_for_status()
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.005)
+            duration = time.perf_counter() - start
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+        log_file.seek(0)
+        phases = re.search(r"Startup phases: (.*)", log_file.read())
+    return duration, phases[1] if phases else "not logged"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--starts", type=int, default=5)
+    parser.add_argument("--command", default=f"{sys.executable} -m slackhealthbot.main")
+    parser.add_argument("--imports", type=int, default=10)
+    args = parser.parse_args()
+
+    import_s, slowest_imports = get_slowest_imports(args.imports)
+    print(f"import slackhealthbot.main: {import_s * 1000:.0f}ms")
+    for cumulative_s, name in slowest_imports:
+        print(f"  {cumulative_s * 1000:6.0f}ms {name}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "DATABASE_PATH": str(Path(workdir) / "startup.db"),
+            "FITBIT__POLL__ENABLED": "false",
+            "WITHINGS_CLIENT_ID": "startup",
+            "WITHINGS_CLIENT_SECRET": "startup",
+            "FITBIT_CLIENT_ID": "startup",
+            "FITBIT_CLIENT_SECRET": "startup",
+            "FITBIT_CLIENT_SUBSCRIBER_VERIFICATION_CODE": "startup",
+            "SLACK_WEBHOOK_URL": "http://127.0.0.1:9/",
+        }
+        first_s, first_phases = time_first_request(args.command, env)
+        print(f"first request, new database: {first_s:.2f}s ({first_phases})")
+        durations = []
+        for _ in range(args.starts):
+            duration, phases = time_first_request(args.command, env)
+            durations.append(duration)
+        print(
+            f"first request, migrated database: median {statistics.median(durations):.2f}s"
+            f" min {min(durations):.2f}s ({phases})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Compare reading a user through ORM entities, with their joined relationships,
+and through the column-projected queries of the repository.
+
+Reports the latency and the peak memory allocated per read.
+
+Usage:
+    python -m benchmarks.bench_user_reads [--users 1000] [--reads 2000]
+"""
+
+import argparse
+import asyncio
+import datetime
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.data.database import models
+from slackhealthbot.data.repositories.sqlalchemyfitbitrepository import (
+    SQLAlchemyFitbitRepository,
+)
+from slackhealthbot.domain.localrepository.localfitbitrepository import UserIdentity
+
+
+async def _orm_get_user_identity(
+    db: AsyncSession, fitbit_userid: str
+) -> UserIdentity | None:
+    user = (
+        await db.scalars(
+            statement=select(models.User)
+            .join(models.User.fitbit)
+            .where(models.FitbitUser.oauth_userid == fitbit_userid)
+        )
+    ).one_or_none()
+    return UserIdentity(
+        fitbit_userid=user.fitbit.oauth_userid,
+        slack_alias=user.slack_alias,
+    )
+
+
+async def _orm_get_oauth_data(db: AsyncSession, fitbit_userid: str) -> OAuthFields:
+    fitbit_user = (
+        await db.scalars(
+            statement=select(models.FitbitUser).where(
+                models.FitbitUser.oauth_userid == fitbit_userid
+            )
+        )
+    ).one()
+    return OAuthFields(
+        oauth_userid=fitbit_user.oauth_userid,
+        oauth_access_token=fitbit_user.oauth_access_token,
+        oauth_refresh_token=fitbit_user.oauth_refresh_token,
+        oauth_expiration_date=fitbit_user.oauth_expiration_date.replace(
+            tzinfo=datetime.timezone.utc
+        ),
+    )
+
+
+async def _create_users(session_maker: async_sessionmaker, users: int):
+    async with session_maker() as db:
+        for i in range(users):
+            db.add(
+                models.User(
+                    slack_alias=f"user{i}",
+                    fitbit=models.FitbitUser(
+                        oauth_access_token="access",
+                        oauth_refresh_token="refresh",
+                        oauth_userid=f"fitbit{i}",
+                        oauth_expiration_date=datetime.datetime.now(),
+                    ),
+                    withings=models.WithingsUser(
+                        oauth_access_token="access",
+                        oauth_refresh_token="refresh",
+                        oauth_userid=f"withings{i}",
+                        oauth_expiration_date=datetime.datetime.now(),
+                    ),
+                )
+            )
+        await db.commit()
+
+
+async def _measure(
+    session_maker: async_sessionmaker,
+    read: Callable[[AsyncSession, str], Awaitable],
+    users: int,
+    reads: int,
+) -> tuple[float, float]:
+    """
+    :return: the mean latency in ms, and the mean peak of memory
+        allocated during a read in KiB.
+    """
+    async with session_maker() as db:
+        # Warm up the statement caches.
+        await read(db, "fitbit0")
+        start = time.perf_counter()
+        for i in range(reads):
+            await read(db, f"fitbit{i % users}")
+        duration = time.perf_counter() - start
+
+        # Measure the memory separately, as tracing slows down the reads.
+        tracemalloc.start()
+        peaks = 0
+        for i in range(reads):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await read(db, f"fitbit{i % users}")
+            _, peak = tracemalloc.get_traced_memory()
+            peaks += peak - before
+        tracemalloc.stop()
+    return duration / reads * 1000, peaks / reads / 1024
+
+
+async def main(users: int, reads: int):
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{Path(workdir) / 'bench.db'}"
+        )
+        async with engine.begin() as connection:
+            await connection.run_sync(
+                models.Base.metadata.create_all,
+                tables=[
+                    x
+                    for x in models.Base.metadata.sorted_tables
+                    if not x.info.get("is_view")
+                ],
+            )
+        session_maker = async_sessionmaker(bind=engine)
+        await _create_users(session_maker, users)
+
+        def projected(method_name: str):
+            async def read(db: AsyncSession, fitbit_userid: str):
+                repo = SQLAlchemyFitbitRepository(db)
+                return await getattr(repo, method_name)(fitbit_userid=fitbit_userid)
+
+            return read
+
+        for name, read in (
+            ("identity: orm", _orm_get_user_identity),
+            ("identity: projected", projected("get_user_identity_by_fitbit_userid")),
+            ("oauth data: orm", _orm_get_oauth_data),
+            ("oauth data: projected", projected("get_oauth_data_by_fitbit_userid")),
+        ):
+            latency_ms, allocated_kib = await _measure(
+                session_maker, read, users=users, reads=reads
+            )
+            print(f"{name:<24} {latency_ms:6.3f} ms/read {allocated_kib:8.1f} KiB/read")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(users=args.users, reads=args.reads))
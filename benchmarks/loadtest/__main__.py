@@ -0,0 +1,74 @@
+"""
+Load test the webhooks against local stubs of the remote services.
+
+Usage:
+    python -m benchmarks.loadtest [--users 50] [--notifications 1000] ...
+
+The test runs offline: the app, the stubs and the load generator
+all run in this process, and the database is created in a temp directory.
+"""
+
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+
+from benchmarks.loadtest.harness import LoadTestConfig, main
+from benchmarks.loadtest.stubs import StubBehavior
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--notifications", type=int, default=1000)
+    parser.add_argument(
+        "--concurrency", type=int, default=20, help="Max requests in flight."
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=20, help="Latency of the remote stubs."
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of remote calls which fail with a 500.",
+    )
+    parser.add_argument(
+        "--fitbit-debounce-s",
+        type=int,
+        default=None,
+        help="Override the fitbit webhook debounce delay. 0 to process every notification.",
+    )
+    parser.add_argument(
+        "--withings-window-s",
+        type=float,
+        default=None,
+        help="Override the withings notification window. 0 to process every notification.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=args.log_level)
+    with tempfile.TemporaryDirectory() as workdir:
+        report = main(
+            LoadTestConfig(
+                users=args.users,
+                notifications=args.notifications,
+                concurrency=args.concurrency,
+                remote_behavior=StubBehavior(
+                    latency_s=args.latency_ms / 1000,
+                    error_rate=args.error_rate,
+                ),
+                fitbit_debounce_s=args.fitbit_debounce_s,
+                withings_window_s=args.withings_window_s,
+                seed=args.seed,
+            ),
+            workdir=Path(workdir),
+        )
+    print(report.format())
@@ -0,0 +1,271 @@
+"""
+Replay notification storms through the app's webhooks,
+with the remote services replaced by local stubs.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import os
+import random
+import socket
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import uvicorn
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from benchmarks.loadtest.stubs import (
+    StubBehavior,
+    StubServer,
+    fitbit_stub,
+    slack_stub,
+    withings_stub,
+)
+
+# An activity type with a realtime report in the default config.
+ACTIVITY_TYPE_ID = 55001
+
+
+@dataclasses.dataclass
+class LoadTestConfig:
+    users: int = 50
+    notifications: int = 1000
+    concurrency: int = 20
+    remote_behavior: StubBehavior = dataclasses.field(default_factory=StubBehavior)
+    fitbit_debounce_s: int | None = None
+    withings_window_s: float | None = None
+    seed: int = 0
+
+
+@dataclasses.dataclass
+class LoadTestReport:
+    duration_s: float
+    latencies_s: list[float]
+    status_codes: Counter[int]
+    db_queries: int
+    remote_calls: dict[str, Counter[str]]
+    remote_errors: dict[str, int]
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies_s) / self.duration_s
+
+    def percentile_ms(self, percentile: int) -> float:
+        if len(self.latencies_s) == 1:
+            return self.latencies_s[0] * 1000
+        return (
+            statistics.quantiles(self.latencies_s, n=100, method="inclusive")[
+                percentile - 1
+            ]
+            * 1000
+        )
+
+    def format(self) -> str:
+        lines = [
+            f"requests:    {len(self.latencies_s)} in {self.duration_s:.2f}s",
+            f"throughput:  {self.throughput:.1f} req/s",
+            f"latency:     p50={self.percentile_ms(50):.1f}ms"
+            f" p99={self.percentile_ms(99):.1f}ms",
+            f"status:      {dict(sorted(self.status_codes.items()))}",
+            f"db queries:  {self.db_queries}"
+            f" ({self.db_queries / max(len(self.latencies_s), 1):.1f}/req)",
+        ]
+        for name, calls in self.remote_calls.items():
+            lines.append(
+                f"{name + ':':<12} {sum(calls.values())} calls,"
+                f" {self.remote_errors[name]} simulated errors"
+            )
+            lines.extend(
+                f"    {path}: {count}" for path, count in sorted(calls.items())
+            )
+        return "\n".join(lines)
+
+
+def configure_environment(
+    database_path: Path,
+    fitbit: StubServer,
+    withings: StubServer,
+    slack: StubServer,
+):
+    """
+    Point the app's settings to the stubs.
+    This must be called before the settings are first used.
+    """
+    os.environ.update(
+        {
+            "DATABASE_PATH": str(database_path),
+            "FITBIT__BASE_URL": fitbit.url,
+            "FITBIT__POLL__ENABLED": "false",
+            "WITHINGS__BASE_URL": withings.url,
+            "SLACK_WEBHOOK_URL": slack.url,
+            "WITHINGS_CLIENT_ID": "loadtest",
+            "WITHINGS_CLIENT_SECRET": "loadtest",
+            "FITBIT_CLIENT_ID": "loadtest",
+            "FITBIT_CLIENT_SECRET": "loadtest",
+            "FITBIT_CLIENT_SUBSCRIBER_VERIFICATION_CODE": "loadtest",
+        }
+    )
+
+
+def create_database(database_path: Path, users: int):
+    # Imported here, so that the settings are read after the environment is set.
+    from alembic import command
+    from alembic.config import Config
+    from slackhealthbot.data.database import models
+
+    command.upgrade(Config("alembic.ini"), "head")
+    expiration_date = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        days=1
+    )
+    engine = create_engine(f"sqlite:///{database_path}")
+    with Session(engine) as session:
+        for i in range(users):
+            session.add(
+                models.User(
+                    slack_alias=f"user{i}",
+                    fitbit=models.FitbitUser(
+                        oauth_access_token="access",
+                        oauth_refresh_token="refresh",
+                        oauth_userid=f"fitbit{i}",
+                        oauth_expiration_date=expiration_date,
+                    ),
+                    withings=models.WithingsUser(
+                        oauth_access_token="access",
+                        oauth_refresh_token="refresh",
+                        oauth_userid=f"withings{i}",
+                        oauth_expiration_date=expiration_date,
+                    ),
+                )
+            )
+        session.commit()
+    engine.dispose()
+
+
+def _notification_requests(config: LoadTestConfig) -> list[dict]:
+    rng = random.Random(config.seed)
+    requests = []
+    for i in range(config.notifications):
+        user = rng.randrange(config.users)
+        kind = rng.choice(["activities", "sleep", "withings"])
+        if kind == "withings":
+            requests.append(
+                {
+                    "url": "/withings-notification-webhook/",
+                    "data": {
+                        "userid": f"withings{user}",
+                        "startdate": 1700000000 + i,
+                        "enddate": 1700000001 + i,
+                    },
+                }
+            )
+        else:
+            requests.append(
+                {
+                    "url": "/fitbit-notification-webhook/",
+                    "json": [
+                        {
+                            "ownerId": f"fitbit{user}",
+                            "date": "2023-05-14",
+                            "collectionType": kind,
+                        }
+                    ],
+                }
+            )
+    return requests
+
+
+async def send_storm(
+    app_url: str,
+    config: LoadTestConfig,
+) -> tuple[list[float], Counter[int]]:
+    latencies = []
+    status_codes = Counter()
+    semaphore = asyncio.Semaphore(config.concurrency)
+
+    async def send(client: httpx.AsyncClient, request: dict):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(**request)
+            latencies.append(time.perf_counter() - start)
+            status_codes[response.status_code] += 1
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=60) as client:
+        await asyncio.gather(
+            *(send(client, request) for request in _notification_requests(config))
+        )
+    return latencies, status_codes
+
+
+async def run(
+    config: LoadTestConfig,
+    fitbit: StubServer,
+    withings: StubServer,
+    slack: StubServer,
+) -> LoadTestReport:
+    from slackhealthbot.main import app
+    from slackhealthbot.routers import fitbit as fitbit_router
+
+    if config.fitbit_debounce_s is not None:
+        fitbit_router.DEBOUNCE_NOTIFICATION_DELAY_S = config.fitbit_debounce_s
+
+    stubs = {"fitbit": fitbit, "withings": withings, "slack": slack}
+    for stub in stubs.values():
+        await stub.start()
+
+    app_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    app_socket.bind(("127.0.0.1", 0))
+    host, port = app_socket.getsockname()
+    app_server = uvicorn.Server(
+        uvicorn.Config(app, log_level="warning", access_log=False)
+    )
+    app_task = asyncio.create_task(app_server.serve(sockets=[app_socket]))
+    while not app_server.started:
+        await asyncio.sleep(0.01)
+
+    db_queries = 0
+
+    def count_query(*_args):
+        nonlocal db_queries
+        db_queries += 1
+
+    event.listen(Engine, "before_cursor_execute", count_query)
+    try:
+        start = time.perf_counter()
+        latencies, status_codes = await send_storm(f"http://{host}:{port}", config)
+        duration = time.perf_counter() - start
+    finally:
+        event.remove(Engine, "before_cursor_execute", count_query)
+        app_server.should_exit = True
+        await app_task
+        for stub in stubs.values():
+            await stub.stop()
+
+    return LoadTestReport(
+        duration_s=duration,
+        latencies_s=latencies,
+        status_codes=status_codes,
+        db_queries=db_queries,
+        remote_calls={name: stub.calls for name, stub in stubs.items()},
+        remote_errors={name: stub.errors for name, stub in stubs.items()},
+    )
+
+
+def main(config: LoadTestConfig, workdir: Path) -> LoadTestReport:
+    remote_behavior = config.remote_behavior
+    fitbit = fitbit_stub(remote_behavior, activity_type_id=ACTIVITY_TYPE_ID)
+    withings = withings_stub(remote_behavior)
+    slack = slack_stub(remote_behavior)
+    database_path = workdir / "loadtest.db"
+    configure_environment(database_path, fitbit=fitbit, withings=withings, slack=slack)
+    if config.withings_window_s is not None:
+        os.environ["WITHINGS__NOTIFICATION_WINDOW_SECONDS"] = str(
+            config.withings_window_s
+        )
+    create_database(database_path, users=config.users)
+    return asyncio.run(run(config, fitbit=fitbit, withings=withings, slack=slack))
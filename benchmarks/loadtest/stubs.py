@@ -0,0 +1,152 @@
+"""
+Local stand-ins for the Fitbit, Withings and Slack APIs.
+"""
+
+import asyncio
+import dataclasses
+import itertools
+import json
+import random
+import socket
+from collections import Counter
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+TESTDATA_PATH = (
+    Path(__file__).parent.parent.parent / "tests" / "testsupport" / "testdata"
+)
+
+
+@dataclasses.dataclass
+class StubBehavior:
+    latency_s: float = 0.0
+    error_rate: float = 0.0
+
+
+class StubServer:
+    """
+    An HTTP server running in the current event loop,
+    which counts the calls it receives per route.
+    """
+
+    def __init__(self, app: FastAPI, behavior: StubBehavior):
+        self.app = app
+        self.calls: Counter[str] = Counter()
+        self.errors = 0
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._server = uvicorn.Server(
+            uvicorn.Config(app, log_level="warning", lifespan="off")
+        )
+        self._task: asyncio.Task | None = None
+
+        @app.middleware("http")
+        async def simulate(request: Request, call_next):
+            self.calls[f"{request.method} {request.url.path}"] += 1
+            if behavior.latency_s:
+                await asyncio.sleep(behavior.latency_s)
+            if random.random() < behavior.error_rate:
+                self.errors += 1
+                return Response(status_code=500)
+            return await call_next(request)
+
+    @property
+    def url(self) -> str:
+        host, port = self._socket.getsockname()
+        return f"http://{host}:{port}/"
+
+    async def start(self):
+        self._task = asyncio.create_task(self._server.serve(sockets=[self._socket]))
+        while not self._server.started:
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        self._server.should_exit = True
+        await self._task
+
+
+def fitbit_stub(behavior: StubBehavior, activity_type_id: int) -> StubServer:
+    app = FastAPI()
+    log_ids = itertools.count(1)
+    sleep_response = json.loads(
+        (TESTDATA_PATH / "fitbit_sleep_response_1_item.json").read_text()
+    )
+
+    @app.get("/1/user/-/activities/list.json")
+    def get_activities():
+        # Every call returns a new activity, so that each processed
+        # notification goes through the whole flow, up to slack.
+        return {
+            "activities": [
+                {
+                    "logId": next(log_ids),
+                    "activityName": "Spinning",
+                    "activityTypeId": activity_type_id,
+                    "calories": random.randint(50, 500),
+                    "duration": random.randint(10, 90) * 60000,
+                    "activeZoneMinutes": {
+                        "minutesInHeartRateZones": [
+                            {"type": "FAT_BURN", "minutes": random.randint(0, 30)},
+                            {"type": "CARDIO", "minutes": random.randint(0, 30)},
+                        ]
+                    },
+                }
+            ]
+        }
+
+    @app.get("/1.2/user/-/sleep/date/{date}.json")
+    def get_sleep(date: str):
+        return sleep_response
+
+    @app.post("/oauth2/token")
+    def refresh_token():
+        return {
+            "access_token": "access",
+            "refresh_token": "refresh",
+            "expires_in": 3600,
+            "token_type": "Bearer",
+        }
+
+    return StubServer(app, behavior)
+
+
+def withings_stub(behavior: StubBehavior) -> StubServer:
+    app = FastAPI()
+
+    @app.post("/measure")
+    def get_measure():
+        return {
+            "status": 0,
+            "body": {
+                "measuregrps": [
+                    {"measures": [{"value": random.randint(50000, 90000), "unit": -3}]}
+                ]
+            },
+        }
+
+    @app.post("/v2/oauth2")
+    def refresh_token():
+        return {
+            "status": 0,
+            "body": {
+                "access_token": "access",
+                "refresh_token": "refresh",
+                "expires_in": 3600,
+                "token_type": "Bearer",
+            },
+        }
+
+    return StubServer(app, behavior)
+
+
+def slack_stub(behavior: StubBehavior) -> StubServer:
+    app = FastAPI()
+
+    @app.post("/")
+    def post_message():
+        return Response(content="ok")
+
+    return StubServer(app, behavior)
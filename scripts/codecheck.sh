@@ -1,5 +1,5 @@
 error=0
-for project in slackhealthbot alembic tests
+for project in slackhealthbot alembic tests benchmarks
 do
   black $project --check || error=$?
   ruff check $project --output-format=github || error=$?
@@ -1,5 +1,8 @@
 from dependency_injector import containers, providers
 
+from slackhealthbot.core.keyedlocks import KeyedLocks
+from slackhealthbot.domain.models.activity import ActivityTypeCatalogue
+from slackhealthbot.remoteservices.resilience import ResiliencePolicies
 from slackhealthbot.settings import AppSettings, SecretSettings, Settings
 
 
@@ -8,12 +11,25 @@ class Container(containers.DeclarativeContainer):
 
     wiring_config = containers.WiringConfiguration(
         modules=[
+            "slackhealthbot.domain.usecases.failedevents.usecase_record_failed_event",
+            "slackhealthbot.domain.usecases.failedevents.usecase_record_failed_replay",
+            "slackhealthbot.domain.usecases.fitbit.usecase_compact_activities",
+            "slackhealthbot.domain.usecases.fitbit.usecase_get_poll_shard",
+            "slackhealthbot.domain.usecases.fitbit.usecase_get_poll_skips",
             "slackhealthbot.domain.usecases.fitbit.usecase_process_daily_activity",
             "slackhealthbot.domain.usecases.fitbit.usecase_process_new_activity",
+            "slackhealthbot.domain.usecases.fitbit.usecase_process_new_sleep",
+            "slackhealthbot.domain.usecases.fitbit.usecase_reconcile_subscriptions",
+            "slackhealthbot.domain.usecases.fitbit.usecase_record_notification",
+            "slackhealthbot.domain.usecases.fitbit.usecase_refresh_activity_types",
+            "slackhealthbot.domain.usecases.slack.usecase_dispatch_notifications",
             "slackhealthbot.domain.usecases.slack.usecase_post_user_logged_out",
             "slackhealthbot.domain.usecases.slack.usecase_post_activity",
             "slackhealthbot.domain.usecases.slack.usecase_post_daily_activity",
+            "slackhealthbot.domain.usecases.withings.usecase_poll_new_weight",
+            "slackhealthbot.domain.usecases.withings.usecase_process_new_weight",
             "slackhealthbot.oauth.fitbitconfig",
+            "slackhealthbot.oauth.requests",
             "slackhealthbot.oauth.withingsconfig",
             "slackhealthbot.remoteservices.api.fitbit.activityapi",
             "slackhealthbot.remoteservices.api.fitbit.sleepapi",
@@ -21,9 +37,15 @@ class Container(containers.DeclarativeContainer):
             "slackhealthbot.remoteservices.api.slack.messageapi",
             "slackhealthbot.remoteservices.api.withings.subscribeapi",
             "slackhealthbot.remoteservices.api.withings.weightapi",
+            "slackhealthbot.routers.dependencies",
             "slackhealthbot.routers.fitbit",
             "slackhealthbot.routers.withings",
+            "slackhealthbot.tasks.failedeventsreplay",
+            "slackhealthbot.tasks.fitbitactivitiesretention",
             "slackhealthbot.tasks.fitbitpoll",
+            "slackhealthbot.tasks.fitbitsubscriptions",
+            "slackhealthbot.tasks.slackoutbox",
+            "slackhealthbot.tasks.withingspoll",
             "slackhealthbot.data.database.connection",
         ],
     )
@@ -35,3 +57,17 @@ class Container(containers.DeclarativeContainer):
         app_settings,
         secret_settings,
     )
+    activity_type_catalogue: ActivityTypeCatalogue = providers.Singleton(
+        ActivityTypeCatalogue
+    )
+    resilience_policies: ResiliencePolicies = providers.Singleton(
+        ResiliencePolicies,
+        settings,
+    )
+    # Serializes the work for the same user, across the webhooks and polls
+    # of this worker only. Across workers, the outbox's idempotency keys
+    # keep a notification processed twice from being posted twice.
+    user_locks: KeyedLocks = providers.Singleton(KeyedLocks)
+    # Overridden with the group-commit writer while the app is running,
+    # if it's enabled.
+    group_commit_writer = providers.Object(None)
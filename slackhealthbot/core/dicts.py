@@ -0,0 +1,16 @@
+from typing import Any
+
+
+def deep_update(mapping: dict[str, Any], *updates: dict[str, Any]) -> dict[str, Any]:
+    """
+    :return: a copy of the mapping, with the values of the updates
+        merged recursively into its nested dicts.
+    """
+    updated = mapping.copy()
+    for update in updates:
+        for key, value in update.items():
+            if isinstance(value, dict) and isinstance(updated.get(key), dict):
+                updated[key] = deep_update(updated[key], value)
+            else:
+                updated[key] = value
+    return updated
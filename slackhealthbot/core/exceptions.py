@@ -8,3 +8,21 @@ class UnknownUserException(Exception):
     """
     Raised when we fail to find a user.
     """
+
+
+class CircuitOpenException(Exception):
+    """
+    Raised when we don't send a request to a remote service,
+    because its recent requests failed.
+    """
+
+
+class RetryableRemoteServiceException(Exception):
+    """
+    Raised when a remote service still replies with a server error
+    or a 429 after the retries, so the request can be sent again later.
+    """
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Remote service replied with {status_code}")
+        self.status_code = status_code
@@ -0,0 +1,64 @@
+import asyncio
+import dataclasses
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable
+
+
+@dataclasses.dataclass
+class KeyedLockStats:
+    acquisitions: int = 0
+    # The acquisitions which had to wait for another task to release the lock.
+    contentions: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    # The keys whose lock is held or waited for.
+    active_keys: int = 0
+
+
+class KeyedLocks:
+    """
+    A lock per key, so that the tasks working on the same key run one at a time,
+    while the tasks working on different keys run concurrently.
+
+    A key's lock is created when it's first needed, and forgotten as soon as
+    no task holds it or waits for it, so the memory stays bounded by
+    the number of tasks.
+
+    The locks are per process: with several server workers, two workers
+    can work on the same key at once.
+    """
+
+    def __init__(self):
+        # Each task holding or waiting for a lock keeps a reference to it.
+        self._locks: weakref.WeakValueDictionary[Hashable, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._stats = KeyedLockStats()
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        self._stats.acquisitions += 1
+        if lock.locked():
+            self._stats.contentions += 1
+            start = time.perf_counter()
+            await lock.acquire()
+            wait_seconds = time.perf_counter() - start
+            self._stats.total_wait_seconds += wait_seconds
+            self._stats.max_wait_seconds = max(
+                self._stats.max_wait_seconds, wait_seconds
+            )
+        else:
+            await lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def get_stats(self) -> KeyedLockStats:
+        return dataclasses.replace(self._stats, active_keys=len(self._locks))
@@ -0,0 +1,22 @@
+import fcntl
+from pathlib import Path
+from typing import IO
+
+
+def try_acquire(path: Path) -> IO | None:
+    """
+    Try to take the exclusive lock on the given file, without waiting.
+
+    The lock is held until the returned file is closed, or the process exits:
+    if the process holding it dies, another process can take it over.
+
+    :return: the open lock file, or None if another process holds the lock.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
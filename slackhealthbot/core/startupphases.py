@@ -0,0 +1,27 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class StartupPhases:
+    """
+    How long each phase of the startup took, to find what delays
+    the first request.
+    """
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[phase] = time.perf_counter() - start
+
+    def format(self) -> str:
+        return ", ".join(
+            f"{phase} {duration * 1000:.0f}ms"
+            for phase, duration in self.durations.items()
+        )
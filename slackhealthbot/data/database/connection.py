@@ -1,15 +1,55 @@
+import dataclasses
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import cache
 from pathlib import Path
+from typing import Iterator
 
 from dependency_injector.wiring import Provide, inject
 from fastapi import Depends
-from sqlalchemy import event
+from sqlalchemy import Engine, event
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from slackhealthbot.containers import Container
 from slackhealthbot.settings import Settings
 
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class QueryCounter:
+    statements: list[str] = dataclasses.field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+_query_counters: ContextVar[tuple[QueryCounter, ...]] = ContextVar(
+    "query_counters", default=()
+)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """
+    Count the SQL statements executed within this context,
+    including in tasks started from it.
+    """
+    counter = QueryCounter()
+    token = _query_counters.set(_query_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _query_counters.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(_conn, _cursor, statement, *args):
+    for counter in _query_counters.get():
+        counter.statements.append(statement)
+
 
 @inject
 def get_connection_url(
@@ -35,7 +75,7 @@ def create_async_session_maker(
     if settings.app_settings.logging.sql_log_level.upper() == "DEBUG":
 
         def before_cursor_execute(_conn, _cursor, statement, parameters, *args):
-            logging.debug(f"{statement}; args={parameters}")
+            logger.debug(f"{statement}; args={parameters}")
 
         event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
     return async_sessionmaker(
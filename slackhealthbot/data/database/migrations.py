@@ -0,0 +1,84 @@
+import ast
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+ALEMBIC_CONFIG_PATH = "alembic.ini"
+MIGRATIONS_PATH = Path("alembic/versions")
+
+
+def get_database_revisions(database_path: Path) -> set[str]:
+    """
+    :return: the migrations applied to the database, read without
+        loading alembic's environment.
+    """
+    if not database_path.exists():
+        return set()
+    with closing(sqlite3.connect(database_path)) as connection:
+        try:
+            rows = connection.execute(
+                "SELECT version_num FROM alembic_version"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # The database was never migrated.
+            return set()
+    return {row[0] for row in rows}
+
+
+def _read_revisions(path: Path) -> tuple[str, set[str]]:
+    values = {}
+    for node in ast.parse(path.read_text(encoding="utf-8")).body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = node.targets[0]
+        elif isinstance(node, ast.AnnAssign):
+            target = node.target
+        else:
+            continue
+        if isinstance(target, ast.Name) and target.id in (
+            "revision",
+            "down_revision",
+        ):
+            values[target.id] = ast.literal_eval(node.value)
+    down_revision = values.get("down_revision")
+    if down_revision is None:
+        down_revisions = set()
+    elif isinstance(down_revision, str):
+        down_revisions = {down_revision}
+    else:
+        # A merge of several branches.
+        down_revisions = set(down_revision)
+    return values["revision"], down_revisions
+
+
+def get_head_revisions(migrations_path: Path = MIGRATIONS_PATH) -> set[str] | None:
+    """
+    :return: the latest migrations, read from the migration scripts
+        without importing alembic, or None if a script can't be read that way.
+    """
+    revisions: set[str] = set()
+    down_revisions: set[str] = set()
+    for path in migrations_path.glob("*.py"):
+        try:
+            revision, parents = _read_revisions(path)
+        except (KeyError, ValueError, SyntaxError):
+            return None
+        revisions.add(revision)
+        down_revisions |= parents
+    return revisions - down_revisions
+
+
+def upgrade_database(database_path: Path) -> bool:
+    """
+    Apply the migrations which the database is missing,
+    like alembic upgrade head.
+
+    :return: whether alembic was run.
+    """
+    if get_database_revisions(database_path) == get_head_revisions():
+        return False
+    # Imported here: alembic is only needed when there are migrations to apply.
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(ALEMBIC_CONFIG_PATH), "head")
+    return True
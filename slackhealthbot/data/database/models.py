@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import Float, ForeignKey, String, func
+from sqlalchemy import JSON, Float, ForeignKey, String, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship
 
 Base = declarative_base()
@@ -39,6 +39,9 @@ class WithingsUser(TimestampMixin, Base):
     oauth_userid: Mapped[str] = mapped_column(String(40))
     oauth_expiration_date: Mapped[Optional[datetime]] = mapped_column()
     last_weight: Mapped[Optional[float]] = mapped_column(Float())
+    # When last_weight was measured, as a unix timestamp.
+    last_weight_date: Mapped[Optional[int]] = mapped_column()
+    measures_cursor_lastupdate: Mapped[Optional[int]] = mapped_column()
 
 
 class FitbitUser(TimestampMixin, Base):
@@ -56,6 +59,8 @@ class FitbitUser(TimestampMixin, Base):
     last_sleep_end_time: Mapped[Optional[datetime]] = mapped_column()
     last_sleep_sleep_minutes: Mapped[Optional[int]] = mapped_column()
     last_sleep_wake_minutes: Mapped[Optional[int]] = mapped_column()
+    activity_cursor_start_time: Mapped[Optional[datetime]] = mapped_column()
+    activity_cursor_log_id: Mapped[Optional[int]] = mapped_column()
 
 
 class FitbitActivity(TimestampMixin, Base):
@@ -93,3 +98,112 @@ class FitbitDailyActivity(Base):
     sum_cardio_minutes: Mapped[Optional[int]] = mapped_column()
     sum_peak_minutes: Mapped[Optional[int]] = mapped_column()
     sum_out_of_zone_minutes: Mapped[Optional[int]] = mapped_column()
+
+
+# The daily sums of the activities which were compacted by the retention task.
+# The fitbit_daily_activities view combines them with the sums of the
+# activities which are still stored individually.
+class FitbitDailyActivityAggregate(TimestampMixin, Base):
+    __tablename__ = "fitbit_daily_activity_aggregates"
+    __table_args__ = (UniqueConstraint("fitbit_user_id", "type_id", "date"),)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    fitbit_user_id: Mapped[int] = mapped_column(
+        ForeignKey("fitbit_users.id", ondelete="CASCADE")
+    )
+    type_id: Mapped[int] = mapped_column()
+    activity_date: Mapped[date] = mapped_column("date")
+    count_activities: Mapped[int] = mapped_column()
+    sum_calories: Mapped[int] = mapped_column()
+    sum_distance_km: Mapped[Optional[float]] = mapped_column()
+    sum_total_minutes: Mapped[int] = mapped_column()
+    sum_fat_burn_minutes: Mapped[Optional[int]] = mapped_column()
+    sum_cardio_minutes: Mapped[Optional[int]] = mapped_column()
+    sum_peak_minutes: Mapped[Optional[int]] = mapped_column()
+    sum_out_of_zone_minutes: Mapped[Optional[int]] = mapped_column()
+
+
+class FitbitPollReplica(Base):
+    __tablename__ = "fitbit_poll_replicas"
+    replica_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    last_seen_at: Mapped[datetime] = mapped_column(index=True)
+
+
+class FitbitPollState(TimestampMixin, Base):
+    __tablename__ = "fitbit_poll_states"
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    fitbit_user_id: Mapped[int] = mapped_column(
+        ForeignKey("fitbit_users.id", ondelete="CASCADE"), unique=True
+    )
+    fitbit_user: Mapped["FitbitUser"] = relationship(lazy="joined", join_depth=2)
+    last_sleep_success_date: Mapped[Optional[date]] = mapped_column()
+    last_fail_alert_date: Mapped[Optional[date]] = mapped_column()
+    last_new_data_at: Mapped[Optional[datetime]] = mapped_column()
+
+
+class FitbitSubscription(TimestampMixin, Base):
+    __tablename__ = "fitbit_subscriptions"
+    __table_args__ = (UniqueConstraint("fitbit_user_id", "collection_type"),)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    fitbit_user_id: Mapped[int] = mapped_column(
+        ForeignKey("fitbit_users.id", ondelete="CASCADE")
+    )
+    fitbit_user: Mapped["FitbitUser"] = relationship(lazy="joined", join_depth=2)
+    collection_type: Mapped[str] = mapped_column(String(40))
+    verified_at: Mapped[datetime] = mapped_column()
+
+
+class FitbitWebhookNotification(TimestampMixin, Base):
+    __tablename__ = "fitbit_webhook_notifications"
+    __table_args__ = (UniqueConstraint("fitbit_user_id", "collection_type"),)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    fitbit_user_id: Mapped[int] = mapped_column(
+        ForeignKey("fitbit_users.id", ondelete="CASCADE")
+    )
+    fitbit_user: Mapped["FitbitUser"] = relationship(lazy="joined", join_depth=2)
+    collection_type: Mapped[str] = mapped_column(String(40))
+    last_notified_at: Mapped[datetime] = mapped_column()
+
+
+class FitbitActivityType(TimestampMixin, Base):
+    __tablename__ = "fitbit_activity_types"
+    # The fitbit activity type id.
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column()
+
+
+class FitbitActivityRecords(TimestampMixin, Base):
+    __tablename__ = "fitbit_activity_records"
+    __table_args__ = (UniqueConstraint("fitbit_user_id", "type_id"),)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    fitbit_user_id: Mapped[int] = mapped_column(
+        ForeignKey("fitbit_users.id", ondelete="CASCADE")
+    )
+    type_id: Mapped[int] = mapped_column()
+    # The all-time top value of each field.
+    all_time: Mapped[dict] = mapped_column(JSON)
+    # For each field, the [iso time, value] pairs which can still be
+    # the top value of a recent window.
+    recent: Mapped[dict] = mapped_column(JSON)
+
+
+class FailedEvent(TimestampMixin, Base):
+    __tablename__ = "failed_events"
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    source: Mapped[str] = mapped_column(String(40))
+    payload: Mapped[dict] = mapped_column(JSON)
+    error: Mapped[str] = mapped_column()
+    attempts: Mapped[int] = mapped_column()
+    # Null once we gave up replaying the event automatically.
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(index=True)
+
+
+class SlackOutbox(TimestampMixin, Base):
+    __tablename__ = "slack_outbox"
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    idempotency_key: Mapped[str] = mapped_column(String(200), unique=True)
+    message: Mapped[str] = mapped_column()
+    attempts: Mapped[int] = mapped_column(default=0)
+    error: Mapped[Optional[str]] = mapped_column()
+    # Null once the message is sent, or we gave up sending it.
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(index=True)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(index=True)
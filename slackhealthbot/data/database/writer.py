@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+WriteOperation = Callable[[AsyncSession], Awaitable[T]]
+
+
+class GroupCommitWriter:
+    """
+    Apply the write operations of all the concurrent requests and tasks
+    from a single task, committing them in batches.
+
+    With sqlite, writers take turns holding the database's write lock,
+    and each commit is synced to disk: committing many operations
+    at once saves most of the lock contention and syncs.
+
+    There's one writer per process: the workers of a multi-worker
+    server still take turns holding the write lock.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, max_batch_size: int):
+        self.session_maker = session_maker
+        self.max_batch_size = max_batch_size
+        self._queue: asyncio.Queue[tuple[WriteOperation, asyncio.Future]] = (
+            asyncio.Queue()
+        )
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Apply the pending operations, and stop.
+        """
+        if not self._task:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def write(self, operation: WriteOperation[T]) -> T:
+        """
+        Apply the operation in the next batch.
+
+        :param operation: the operation to apply. It mustn't commit.
+        :return: the result of the operation, once its batch is committed.
+        :raises: the exception raised by the operation, or by the commit.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        return await future
+
+    def _get_batch(
+        self, batch: list[tuple[WriteOperation, asyncio.Future]]
+    ) -> list[tuple[WriteOperation, asyncio.Future]]:
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = self._get_batch([await self._queue.get()])
+            try:
+                await self._apply(batch)
+            except Exception:
+                logger.error("Error applying database writes", exc_info=True)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _apply(self, batch: list[tuple[WriteOperation, asyncio.Future]]):
+        results: list[tuple[asyncio.Future, Any, BaseException | None]] = []
+        async with self.session_maker() as db:
+            try:
+                for operation, future in batch:
+                    try:
+                        # A failed operation is rolled back to its savepoint,
+                        # without affecting the rest of the batch.
+                        async with db.begin_nested():
+                            result = await operation(db)
+                        results.append((future, result, None))
+                    except Exception as e:
+                        results.append((future, None, e))
+                await db.commit()
+            except Exception as e:
+                results = [(future, None, e) for _, future in batch]
+        for future, result, error in results:
+            if future.done():
+                # The caller was cancelled.
+                continue
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def create_writer_session_maker(connection_url: str) -> async_sessionmaker:
+    """
+    Create sessions whose transactions take the database's write lock
+    from the start, and support savepoints.
+    """
+    engine = create_async_engine(
+        connection_url,
+        connect_args={"check_same_thread": False},
+    )
+
+    # https://docs.sqlalchemy.org/en/20/dialects/sqlite.html#serializable-isolation-savepoints-transactional-ddl
+    @event.listens_for(engine.sync_engine, "connect")
+    def do_connect(dbapi_connection, _connection_record):
+        # Disable the driver's own BEGIN, which breaks savepoints.
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def do_begin(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return async_sessionmaker(
+        autocommit=False, autoflush=False, bind=engine, future=True
+    )
+
+
+async def run_write(
+    db: AsyncSession,
+    writer: GroupCommitWriter | None,
+    operation: WriteOperation[T],
+) -> T:
+    """
+    Apply the operation with the group-commit writer if there's one,
+    or else in the given session, and commit it.
+    """
+    if writer:
+        return await writer.write(operation)
+    result = await operation(db)
+    await db.commit()
+    return result
@@ -0,0 +1,169 @@
+import datetime
+from typing import Any, AsyncIterator
+
+from sqlalchemy import Row, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from slackhealthbot.data.database import models
+from slackhealthbot.data.database.writer import GroupCommitWriter, run_write
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
+from slackhealthbot.domain.models.failedevent import FailedEvent, FailedEventSource
+
+# The number of rows read per query by the iter_* methods.
+_PAGE_SIZE = 500
+
+
+def _to_aware_utc(value: datetime.datetime | None) -> datetime.datetime | None:
+    return value.replace(tzinfo=datetime.timezone.utc) if value else None
+
+
+_COLUMNS = (
+    models.FailedEvent.id,
+    models.FailedEvent.source,
+    models.FailedEvent.payload,
+    models.FailedEvent.error,
+    models.FailedEvent.attempts,
+    models.FailedEvent.created_at,
+    models.FailedEvent.next_attempt_at,
+)
+
+
+def _row_to_failed_event(row: Row) -> FailedEvent:
+    return FailedEvent(
+        id=row.id,
+        source=FailedEventSource(row.source),
+        payload=row.payload,
+        error=row.error,
+        attempts=row.attempts,
+        created_at=_to_aware_utc(row.created_at),
+        next_attempt_at=_to_aware_utc(row.next_attempt_at),
+    )
+
+
+class SQLAlchemyFailedEventRepository(LocalFailedEventRepository):
+
+    def __init__(self, db: AsyncSession, writer: GroupCommitWriter | None = None):
+        self.db = db
+        self.writer = writer
+
+    async def create_failed_event(
+        self,
+        source: FailedEventSource,
+        payload: dict[str, Any],
+        error: str,
+        next_attempt_at: datetime.datetime | None,
+    ) -> int:
+        # The failed processing may have left changes in the session,
+        # or its transaction unusable.
+        await self.db.rollback()
+
+        async def write(db: AsyncSession) -> int:
+            return (
+                await db.execute(
+                    statement=insert(models.FailedEvent)
+                    .values(
+                        source=source,
+                        payload=payload,
+                        error=error,
+                        attempts=1,
+                        next_attempt_at=next_attempt_at,
+                    )
+                    .returning(models.FailedEvent.id)
+                )
+            ).scalar_one()
+
+        return await run_write(self.db, self.writer, write)
+
+    async def get_due_failed_events(
+        self,
+        now: datetime.datetime,
+        limit: int,
+    ) -> list[FailedEvent]:
+        rows = await self.db.execute(
+            statement=select(*_COLUMNS)
+            .where(models.FailedEvent.next_attempt_at <= now)
+            .order_by(models.FailedEvent.next_attempt_at)
+            .limit(limit)
+        )
+        return [_row_to_failed_event(x) for x in rows]
+
+    async def iter_failed_events(
+        self,
+        since: datetime.datetime,
+        until: datetime.datetime,
+        page_size: int = _PAGE_SIZE,
+    ) -> AsyncIterator[FailedEvent]:
+        # Replaying an event records its outcome from another session:
+        # a cursor left open would keep it waiting on the database lock.
+        last_id = None
+        while True:
+            statement = (
+                select(*_COLUMNS)
+                .where(
+                    models.FailedEvent.created_at >= since,
+                    models.FailedEvent.created_at < until,
+                )
+                .order_by(models.FailedEvent.id)
+                .limit(page_size)
+            )
+            if last_id is not None:
+                statement = statement.where(models.FailedEvent.id > last_id)
+            rows = (await self.db.execute(statement=statement)).all()
+            for row in rows:
+                yield _row_to_failed_event(row)
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1].id
+
+    async def claim_failed_event(
+        self,
+        id: int,
+        next_attempt_at: datetime.datetime | None,
+        lease_until: datetime.datetime,
+    ) -> bool:
+        async def write(db: AsyncSession) -> bool:
+            result = await db.execute(
+                statement=update(models.FailedEvent)
+                .where(
+                    models.FailedEvent.id == id,
+                    (
+                        models.FailedEvent.next_attempt_at.is_(None)
+                        if next_attempt_at is None
+                        else models.FailedEvent.next_attempt_at == next_attempt_at
+                    ),
+                )
+                .values(next_attempt_at=lease_until)
+            )
+            return result.rowcount == 1
+
+        return await run_write(self.db, self.writer, write)
+
+    async def update_failed_event(
+        self,
+        id: int,
+        error: str,
+        attempts: int,
+        next_attempt_at: datetime.datetime | None,
+    ):
+        async def write(db: AsyncSession):
+            await db.execute(
+                statement=update(models.FailedEvent)
+                .where(models.FailedEvent.id == id)
+                .values(
+                    error=error,
+                    attempts=attempts,
+                    next_attempt_at=next_attempt_at,
+                )
+            )
+
+        await run_write(self.db, self.writer, write)
+
+    async def delete_failed_event(self, id: int):
+        async def write(db: AsyncSession):
+            await db.execute(
+                statement=delete(models.FailedEvent).where(models.FailedEvent.id == id)
+            )
+
+        await run_write(self.db, self.writer, write)
@@ -1,31 +1,95 @@
 import datetime
+import logging
+from typing import AsyncIterator, Callable
 
-from sqlalchemy import and_, desc, func, select, update
+from sqlalchemy import (
+    Row,
+    and_,
+    case,
+    delete,
+    desc,
+    func,
+    literal,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from slackhealthbot.core.exceptions import UnknownUserException
 from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.data.database import models
+from slackhealthbot.data.database.writer import GroupCommitWriter, run_write
+from slackhealthbot.data.repositories.sqlalchemyslackoutboxrepository import (
+    queue_slack_notification,
+)
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
     User,
     UserIdentity,
 )
 from slackhealthbot.domain.models.activity import (
+    ActivityCursor,
     ActivityData,
+    ActivityRecords,
+    ActivityTypeCatalogue,
     ActivityZone,
     ActivityZoneMinutes,
     DailyActivityStats,
     TopActivityStats,
     TopDailyActivityStats,
 )
+from slackhealthbot.domain.models.poll import PollState
+from slackhealthbot.domain.models.slacknotification import SlackNotification
 from slackhealthbot.domain.models.sleep import SleepData
+from slackhealthbot.domain.models.subscription import CollectionType
+
+logger = logging.getLogger(__name__)
+
+_UPSERT_BATCH_SIZE = 250
+
+# The number of rows read per query by the iter_* methods.
+_PAGE_SIZE = 500
+# https://www.sqlite.org/pragma.html#pragma_auto_vacuum
+_AUTO_VACUUM_INCREMENTAL = 2
+
+# The columns of the activities which are summed in the daily aggregates.
+_SUMMED_ACTIVITY_COLUMNS = (
+    "calories",
+    "distance_km",
+    "total_minutes",
+    "fat_burn_minutes",
+    "cardio_minutes",
+    "peak_minutes",
+    "out_of_zone_minutes",
+)
+
+_OAUTH_COLUMNS = (
+    models.FitbitUser.oauth_userid,
+    models.FitbitUser.oauth_access_token,
+    models.FitbitUser.oauth_refresh_token,
+    models.FitbitUser.oauth_expiration_date,
+)
+
+
+def _row_to_oauth_fields(row: Row) -> OAuthFields:
+    return OAuthFields(
+        oauth_userid=row.oauth_userid,
+        oauth_access_token=row.oauth_access_token,
+        oauth_refresh_token=row.oauth_refresh_token,
+        oauth_expiration_date=row.oauth_expiration_date.replace(
+            tzinfo=datetime.timezone.utc
+        ),
+    )
 
 
 class SQLAlchemyFitbitRepository(LocalFitbitRepository):
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, writer: GroupCommitWriter | None = None):
         self.db = db
+        self.writer = writer
 
     async def create_user(
         self,
@@ -72,82 +136,108 @@ class SQLAlchemyFitbitRepository(LocalFitbitRepository):
             ),
         )
 
+    # The poll and the notifications read a user's identity and oauth data far
+    # more often than the rest: select just those columns, rather than loading
+    # the FitbitUser entity, which joins the user and their withings user.
+
     async def get_user_identity_by_fitbit_userid(
         self,
         fitbit_userid: str,
     ) -> UserIdentity | None:
-        user: models.User = (
-            await self.db.scalars(
-                statement=select(models.User)
-                .join(models.User.fitbit)
+        row = (
+            await self.db.execute(
+                statement=select(
+                    models.FitbitUser.oauth_userid,
+                    models.User.slack_alias,
+                )
+                .join(models.FitbitUser.user)
                 .where(models.FitbitUser.oauth_userid == fitbit_userid)
             )
         ).one_or_none()
         return (
-            UserIdentity(
-                fitbit_userid=user.fitbit.oauth_userid,
-                slack_alias=user.slack_alias,
-            )
-            if user
+            UserIdentity(fitbit_userid=row.oauth_userid, slack_alias=row.slack_alias)
+            if row
             else None
         )
 
     async def get_all_user_identities(
         self,
     ) -> list[UserIdentity]:
-        users = await self.db.scalars(
-            statement=select(models.User).join(models.User.fitbit)
-        )
-        return [
-            UserIdentity(fitbit_userid=x.fitbit.oauth_userid, slack_alias=x.slack_alias)
-            for x in users
-        ]
+        return [x async for x in self.iter_user_identities()]
+
+    async def iter_user_identities(
+        self,
+        page_size: int = _PAGE_SIZE,
+    ) -> AsyncIterator[UserIdentity]:
+        # The fitbit poll saves each user's results in this session
+        # while it iterates, so no cursor is left open between pages.
+        last_id = None
+        while True:
+            statement = (
+                select(
+                    models.FitbitUser.id,
+                    models.FitbitUser.oauth_userid,
+                    models.User.slack_alias,
+                )
+                .join(models.FitbitUser.user)
+                .order_by(models.FitbitUser.id)
+                .limit(page_size)
+            )
+            if last_id is not None:
+                statement = statement.where(models.FitbitUser.id > last_id)
+            rows = (await self.db.execute(statement=statement)).all()
+            for row in rows:
+                yield UserIdentity(
+                    fitbit_userid=row.oauth_userid, slack_alias=row.slack_alias
+                )
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1].id
 
     async def get_oauth_data_by_fitbit_userid(
         self,
         fitbit_userid: str,
     ) -> OAuthFields:
-        fitbit_user: models.FitbitUser = (
-            await self.db.scalars(
-                statement=select(models.FitbitUser).where(
+        row = (
+            await self.db.execute(
+                statement=select(*_OAUTH_COLUMNS).where(
                     models.FitbitUser.oauth_userid == fitbit_userid
                 )
             )
         ).one()
-        return OAuthFields(
-            oauth_userid=fitbit_user.oauth_userid,
-            oauth_access_token=fitbit_user.oauth_access_token,
-            oauth_refresh_token=fitbit_user.oauth_refresh_token,
-            oauth_expiration_date=fitbit_user.oauth_expiration_date.replace(
-                tzinfo=datetime.timezone.utc
-            ),
-        )
+        return _row_to_oauth_fields(row)
 
     async def get_user_by_fitbit_userid(
         self,
         fitbit_userid: str,
     ) -> User:
-        user: models.User = (
-            await self.db.scalars(
-                statement=select(models.User)
-                .join(models.User.fitbit)
+        row = (
+            await self.db.execute(
+                statement=select(
+                    *_OAUTH_COLUMNS,
+                    models.User.slack_alias,
+                    models.FitbitUser.activity_cursor_start_time,
+                    models.FitbitUser.activity_cursor_log_id,
+                )
+                .join(models.FitbitUser.user)
                 .where(models.FitbitUser.oauth_userid == fitbit_userid)
             )
         ).one_or_none()
-        if not user:
+        if not row:
             raise UnknownUserException
         return User(
             identity=UserIdentity(
-                fitbit_userid=user.fitbit.oauth_userid,
-                slack_alias=user.slack_alias,
+                fitbit_userid=row.oauth_userid,
+                slack_alias=row.slack_alias,
             ),
-            oauth_data=OAuthFields(
-                oauth_userid=fitbit_userid,
-                oauth_access_token=user.fitbit.oauth_access_token,
-                oauth_refresh_token=user.fitbit.oauth_refresh_token,
-                oauth_expiration_date=user.fitbit.oauth_expiration_date.replace(
-                    tzinfo=datetime.timezone.utc
-                ),
+            oauth_data=_row_to_oauth_fields(row),
+            activity_cursor=(
+                ActivityCursor(
+                    start_time=row.activity_cursor_start_time,
+                    log_id=row.activity_cursor_log_id,
+                )
+                if row.activity_cursor_start_time
+                else None
             ),
         )
 
@@ -196,14 +286,81 @@ class SQLAlchemyFitbitRepository(LocalFitbitRepository):
         self,
         fitbit_userid: str,
         activity: ActivityData,
-    ):
-        user: models.FitbitUser = (
-            await self.db.scalars(
-                statement=select(models.FitbitUser).where(
-                    models.FitbitUser.oauth_userid == fitbit_userid
+        records_since: datetime.datetime | None = None,
+        create_notification: (
+            Callable[[ActivityRecords], SlackNotification | None] | None
+        ) = None,
+    ) -> ActivityRecords:
+        async def write(db: AsyncSession) -> ActivityRecords:
+            records = await SQLAlchemyFitbitRepository(db=db)._create_activity_for_user(
+                fitbit_userid=fitbit_userid,
+                activity=activity,
+                records_since=records_since,
+            )
+            if create_notification and (notification := create_notification(records)):
+                await queue_slack_notification(db, notification)
+            return records
+
+        return await run_write(self.db, self.writer, write)
+
+    async def _create_activity_for_user(
+        self,
+        fitbit_userid: str,
+        activity: ActivityData,
+        records_since: datetime.datetime | None,
+    ) -> ActivityRecords:
+        row = (
+            await self.db.execute(
+                statement=select(
+                    models.FitbitUser.id,
+                    models.FitbitActivityRecords.all_time,
+                    models.FitbitActivityRecords.recent,
+                )
+                .outerjoin(
+                    models.FitbitActivityRecords,
+                    and_(
+                        models.FitbitActivityRecords.fitbit_user_id
+                        == models.FitbitUser.id,
+                        models.FitbitActivityRecords.type_id == activity.type_id,
+                    ),
                 )
+                .where(models.FitbitUser.oauth_userid == fitbit_userid)
             )
-        ).one_or_none()
+        ).one()
+        fitbit_user_id = row.id
+        if row.all_time is not None:
+            records = _db_records_to_domain_records(row)
+        else:
+            # Compute the records before adding the activity,
+            # so that it's not counted twice.
+            records = await self._compute_activity_records(
+                fitbit_user_id=fitbit_user_id,
+                type_id=activity.type_id,
+                since=records_since,
+            )
+        records.add(
+            activity,
+            when=datetime.datetime.now(datetime.timezone.utc),
+            since=records_since,
+        )
+        statement = insert(models.FitbitActivityRecords).values(
+            fitbit_user_id=fitbit_user_id,
+            type_id=activity.type_id,
+            **_domain_records_to_db_values(records),
+        )
+        await self.db.execute(
+            statement=statement.on_conflict_do_update(
+                index_elements=[
+                    models.FitbitActivityRecords.fitbit_user_id,
+                    models.FitbitActivityRecords.type_id,
+                ],
+                set_={
+                    "all_time": statement.excluded.all_time,
+                    "recent": statement.excluded.recent,
+                    "updated_at": func.now(),
+                },
+            )
+        )
         fitbit_activity = models.FitbitActivity(
             log_id=activity.log_id,
             type_id=activity.type_id,
@@ -211,26 +368,78 @@ class SQLAlchemyFitbitRepository(LocalFitbitRepository):
             calories=activity.calories,
             distance_km=activity.distance_km,
             **{f"{x.zone}_minutes": x.minutes for x in activity.zone_minutes},
-            fitbit_user_id=user.id,
+            fitbit_user_id=fitbit_user_id,
         )
         self.db.add(fitbit_activity)
-        await self.db.commit()
+        await self.db.flush()
+        return records
 
-    async def update_sleep_for_user(
+    async def _compute_activity_records(
+        self,
+        fitbit_user_id: int,
+        type_id: int,
+        since: datetime.datetime | None = None,
+    ) -> ActivityRecords:
+        """
+        Compute the records from the saved activities.
+        This is only needed once per user and activity type, for the activities
+        saved before we kept track of the records.
+        """
+        records = ActivityRecords()
+        db_activities = await self.db.scalars(
+            statement=select(models.FitbitActivity)
+            .where(
+                and_(
+                    models.FitbitActivity.fitbit_user_id == fitbit_user_id,
+                    models.FitbitActivity.type_id == type_id,
+                )
+            )
+            .order_by(models.FitbitActivity.updated_at)
+        )
+        for db_activity in db_activities:
+            records.add(
+                _db_activity_to_domain_activity(db_activity),
+                when=db_activity.updated_at.replace(tzinfo=datetime.timezone.utc),
+                since=since,
+            )
+        return records
+
+    async def update_activity_cursor(
         self,
         fitbit_userid: str,
-        sleep: SleepData,
+        activity_cursor: ActivityCursor,
     ):
         await self.db.execute(
             statement=update(models.FitbitUser)
             .where(models.FitbitUser.oauth_userid == fitbit_userid)
             .values(
-                last_sleep_start_time=sleep.start_time,
-                last_sleep_end_time=sleep.end_time,
-                last_sleep_sleep_minutes=sleep.sleep_minutes,
-                last_sleep_wake_minutes=sleep.wake_minutes,
+                activity_cursor_start_time=activity_cursor.start_time,
+                activity_cursor_log_id=activity_cursor.log_id,
             )
         )
+        await self.db.commit()
+
+    async def update_sleep_for_user(
+        self,
+        fitbit_userid: str,
+        sleep: SleepData,
+        notification: SlackNotification | None = None,
+    ):
+        async def write(db: AsyncSession):
+            await db.execute(
+                statement=update(models.FitbitUser)
+                .where(models.FitbitUser.oauth_userid == fitbit_userid)
+                .values(
+                    last_sleep_start_time=sleep.start_time,
+                    last_sleep_end_time=sleep.end_time,
+                    last_sleep_sleep_minutes=sleep.sleep_minutes,
+                    last_sleep_wake_minutes=sleep.wake_minutes,
+                )
+            )
+            if notification:
+                await queue_slack_notification(db, notification)
+
+        await run_write(self.db, self.writer, write)
 
     async def get_sleep_by_fitbit_userid(
         self,
@@ -259,63 +468,18 @@ class SQLAlchemyFitbitRepository(LocalFitbitRepository):
         fitbit_userid: str,
         oauth_data: OAuthFields,
     ):
-        await self.db.execute(
-            statement=update(models.FitbitUser)
-            .where(models.FitbitUser.oauth_userid == fitbit_userid)
-            .values(
-                oauth_access_token=oauth_data.oauth_access_token,
-                oauth_refresh_token=oauth_data.oauth_refresh_token,
-                oauth_expiration_date=oauth_data.oauth_expiration_date,
+        async def write(db: AsyncSession):
+            await db.execute(
+                statement=update(models.FitbitUser)
+                .where(models.FitbitUser.oauth_userid == fitbit_userid)
+                .values(
+                    oauth_access_token=oauth_data.oauth_access_token,
+                    oauth_refresh_token=oauth_data.oauth_refresh_token,
+                    oauth_expiration_date=oauth_data.oauth_expiration_date,
+                )
             )
-        )
-        await self.db.commit()
-
-    async def get_top_activity_stats_by_user_and_activity_type(
-        self,
-        fitbit_userid: str,
-        type_id: int,
-        since: datetime.datetime | None = None,
-    ) -> TopActivityStats:
-
-        columns = [
-            models.FitbitActivity.calories,
-            models.FitbitActivity.distance_km,
-            models.FitbitActivity.total_minutes,
-            models.FitbitActivity.fat_burn_minutes,
-            models.FitbitActivity.cardio_minutes,
-            models.FitbitActivity.peak_minutes,
-        ]
-        conditions = [
-            models.FitbitUser.oauth_userid == fitbit_userid,
-            models.FitbitActivity.type_id == type_id,
-        ]
-        if since:
-            conditions.append(models.FitbitActivity.updated_at >= since)
 
-        subqueries = [
-            select(func.max(column))
-            .join(models.FitbitUser)
-            .where(and_(*conditions))
-            .label(f"top_{column.name}")
-            for column in columns
-        ]
-        results = await self.db.execute(statement=select(*subqueries))
-        # noinspection PyProtectedMember
-        row = results.one()._asdict()
-
-        return TopActivityStats(
-            top_calories=row["top_calories"],
-            top_distance_km=row["top_distance_km"],
-            top_total_minutes=row["top_total_minutes"],
-            top_zone_minutes=[
-                ActivityZoneMinutes(
-                    zone=ActivityZone[x.upper()],
-                    minutes=row.get(f"top_{x}_minutes"),
-                )
-                for x in ActivityZone
-                if row.get(f"top_{x}_minutes")
-            ],
-        )
+        await run_write(self.db, self.writer, write)
 
     async def get_latest_daily_activity_by_user_and_activity_type(
         self,
@@ -360,35 +524,72 @@ class SQLAlchemyFitbitRepository(LocalFitbitRepository):
         type_ids: set[int],
         when: datetime.date | None = None,
     ) -> list[DailyActivityStats]:
-        activity_date = when if when else datetime.date.today()
-        daily_activities: list[models.FitbitDailyActivity] = await self.db.scalars(
-            statement=select(models.FitbitDailyActivity)
-            .join(models.FitbitUser)
-            .join(models.User)
-            .where(
-                and_(
-                    models.FitbitDailyActivity.date == activity_date,
-                    models.FitbitDailyActivity.type_id.in_(type_ids),
-                )
-            )
-        )
         return [
-            DailyActivityStats(
-                fitbit_userid=daily_activity.fitbit_user.oauth_userid,
-                slack_alias=daily_activity.fitbit_user.user.slack_alias,
-                type_id=daily_activity.type_id,
-                count_activities=daily_activity.count_activities,
-                sum_calories=daily_activity.sum_calories,
-                sum_distance_km=daily_activity.sum_distance_km,
-                sum_total_minutes=daily_activity.sum_total_minutes,
-                sum_fat_burn_minutes=daily_activity.sum_fat_burn_minutes,
-                sum_cardio_minutes=daily_activity.sum_cardio_minutes,
-                sum_peak_minutes=daily_activity.sum_peak_minutes,
-                sum_out_of_zone_minutes=daily_activity.sum_out_of_zone_minutes,
-            )
-            for daily_activity in daily_activities
+            x
+            async for x in self.iter_daily_activities_by_type(
+                type_ids=type_ids, when=when
+            )
         ]
 
+    async def iter_daily_activities_by_type(
+        self,
+        type_ids: set[int],
+        when: datetime.date | None = None,
+        page_size: int = _PAGE_SIZE,
+    ) -> AsyncIterator[DailyActivityStats]:
+        activity_date = when if when else datetime.date.today()
+        daily_activity = models.FitbitDailyActivity
+        key = tuple_(daily_activity.fitbit_user_id, daily_activity.type_id)
+        last_key = None
+        while True:
+            conditions = [
+                daily_activity.date == activity_date,
+                daily_activity.type_id.in_(type_ids),
+            ]
+            if last_key is not None:
+                conditions.append(key > tuple_(*last_key))
+            rows = (
+                await self.db.execute(
+                    statement=select(
+                        daily_activity.fitbit_user_id,
+                        models.FitbitUser.oauth_userid,
+                        models.User.slack_alias,
+                        daily_activity.type_id,
+                        daily_activity.count_activities,
+                        daily_activity.sum_calories,
+                        daily_activity.sum_distance_km,
+                        daily_activity.sum_total_minutes,
+                        daily_activity.sum_fat_burn_minutes,
+                        daily_activity.sum_cardio_minutes,
+                        daily_activity.sum_peak_minutes,
+                        daily_activity.sum_out_of_zone_minutes,
+                    )
+                    .select_from(daily_activity)
+                    .join(models.FitbitUser)
+                    .join(models.User)
+                    .where(and_(*conditions))
+                    .order_by(daily_activity.fitbit_user_id, daily_activity.type_id)
+                    .limit(page_size)
+                )
+            ).all()
+            for row in rows:
+                yield DailyActivityStats(
+                    fitbit_userid=row.oauth_userid,
+                    slack_alias=row.slack_alias,
+                    type_id=row.type_id,
+                    count_activities=row.count_activities,
+                    sum_calories=row.sum_calories,
+                    sum_distance_km=row.sum_distance_km,
+                    sum_total_minutes=row.sum_total_minutes,
+                    sum_fat_burn_minutes=row.sum_fat_burn_minutes,
+                    sum_cardio_minutes=row.sum_cardio_minutes,
+                    sum_peak_minutes=row.sum_peak_minutes,
+                    sum_out_of_zone_minutes=row.sum_out_of_zone_minutes,
+                )
+            if len(rows) < page_size:
+                return
+            last_key = (rows[-1].fitbit_user_id, rows[-1].type_id)
+
     async def get_top_daily_activity_stats_by_user_and_activity_type(
         self,
         fitbit_userid: str,
@@ -426,6 +627,484 @@ class SQLAlchemyFitbitRepository(LocalFitbitRepository):
         row = results.one()._asdict()
         return TopDailyActivityStats(**row)
 
+    async def upsert_poll_replica(
+        self,
+        replica_id: str,
+        when: datetime.datetime,
+    ):
+        statement = insert(models.FitbitPollReplica).values(
+            replica_id=replica_id,
+            last_seen_at=when,
+        )
+        await self.db.execute(
+            statement=statement.on_conflict_do_update(
+                index_elements=[models.FitbitPollReplica.replica_id],
+                set_={"last_seen_at": statement.excluded.last_seen_at},
+            )
+        )
+        await self.db.commit()
+
+    async def get_poll_replica_ids(
+        self,
+        since: datetime.datetime,
+    ) -> list[str]:
+        replica_ids = await self.db.scalars(
+            statement=select(models.FitbitPollReplica.replica_id)
+            .where(models.FitbitPollReplica.last_seen_at >= since)
+            .order_by(models.FitbitPollReplica.replica_id)
+        )
+        return list(replica_ids)
+
+    async def delete_poll_replica(
+        self,
+        replica_id: str,
+    ):
+        await self.db.execute(
+            statement=delete(models.FitbitPollReplica).where(
+                models.FitbitPollReplica.replica_id == replica_id
+            )
+        )
+        await self.db.commit()
+
+    async def get_poll_states(self) -> list[PollState]:
+        db_poll_states = await self.db.scalars(statement=select(models.FitbitPollState))
+        return [
+            PollState(
+                fitbit_userid=x.fitbit_user.oauth_userid,
+                last_sleep_success_date=x.last_sleep_success_date,
+                last_fail_alert_date=x.last_fail_alert_date,
+                last_new_data_at=(
+                    x.last_new_data_at.replace(tzinfo=datetime.timezone.utc)
+                    if x.last_new_data_at
+                    else None
+                ),
+            )
+            for x in db_poll_states
+        ]
+
+    async def upsert_poll_states(
+        self,
+        poll_states: list[PollState],
+    ):
+        if not poll_states:
+            return
+
+        async def write(db: AsyncSession):
+            await SQLAlchemyFitbitRepository(db=db)._upsert_poll_states(poll_states)
+
+        await run_write(self.db, self.writer, write)
+
+    async def _upsert_poll_states(
+        self,
+        poll_states: list[PollState],
+    ):
+        fitbit_user_ids: dict[str, int] = dict(
+            (
+                await self.db.execute(
+                    statement=select(
+                        models.FitbitUser.oauth_userid, models.FitbitUser.id
+                    ).where(
+                        models.FitbitUser.oauth_userid.in_(
+                            [x.fitbit_userid for x in poll_states]
+                        )
+                    )
+                )
+            ).all()
+        )
+        values = [
+            {
+                "fitbit_user_id": fitbit_user_ids[x.fitbit_userid],
+                "last_sleep_success_date": x.last_sleep_success_date,
+                "last_fail_alert_date": x.last_fail_alert_date,
+                "last_new_data_at": x.last_new_data_at,
+            }
+            for x in poll_states
+            if x.fitbit_userid in fitbit_user_ids
+        ]
+        if not values:
+            return
+        statement = insert(models.FitbitPollState)
+        excluded = statement.excluded
+
+        def latest(column):
+            # The scalar max() of sqlite is null if either value is.
+            return func.coalesce(
+                func.max(column, excluded[column.key]),
+                column,
+                excluded[column.key],
+            )
+
+        await self.db.execute(
+            statement=statement.on_conflict_do_update(
+                index_elements=[models.FitbitPollState.fitbit_user_id],
+                set_={
+                    "last_sleep_success_date": latest(
+                        models.FitbitPollState.last_sleep_success_date
+                    ),
+                    # A logged out alert is forgotten by a later successful poll.
+                    "last_fail_alert_date": case(
+                        (
+                            and_(
+                                excluded.last_fail_alert_date.is_(None),
+                                excluded.last_sleep_success_date
+                                >= models.FitbitPollState.last_fail_alert_date,
+                            ),
+                            None,
+                        ),
+                        else_=latest(models.FitbitPollState.last_fail_alert_date),
+                    ),
+                    "last_new_data_at": latest(models.FitbitPollState.last_new_data_at),
+                    "updated_at": func.now(),
+                },
+            ),
+            params=values,
+        )
+
+    async def update_subscriptions(
+        self,
+        fitbit_userid: str,
+        collection_types: set[CollectionType],
+        verified_at: datetime.datetime,
+    ):
+        fitbit_user_id = (
+            select(models.FitbitUser.id)
+            .where(models.FitbitUser.oauth_userid == fitbit_userid)
+            .scalar_subquery()
+        )
+        await self.db.execute(
+            statement=delete(models.FitbitSubscription).where(
+                and_(
+                    models.FitbitSubscription.fitbit_user_id == fitbit_user_id,
+                    models.FitbitSubscription.collection_type.not_in(collection_types),
+                )
+            )
+        )
+        if collection_types:
+            statement = insert(models.FitbitSubscription).values(
+                [
+                    {
+                        "fitbit_user_id": fitbit_user_id,
+                        "collection_type": x,
+                        "verified_at": verified_at,
+                    }
+                    for x in collection_types
+                ]
+            )
+            await self.db.execute(
+                statement=statement.on_conflict_do_update(
+                    index_elements=[
+                        models.FitbitSubscription.fitbit_user_id,
+                        models.FitbitSubscription.collection_type,
+                    ],
+                    set_={
+                        "verified_at": statement.excluded.verified_at,
+                        "updated_at": func.now(),
+                    },
+                )
+            )
+        await self.db.commit()
+
+    async def get_subscribed_fitbit_userids(
+        self,
+        since: datetime.datetime,
+    ) -> set[str]:
+        rows = await self.db.scalars(
+            statement=select(models.FitbitUser.oauth_userid)
+            .join(
+                models.FitbitSubscription,
+                models.FitbitSubscription.fitbit_user_id == models.FitbitUser.id,
+            )
+            .where(
+                and_(
+                    models.FitbitSubscription.collection_type.in_(list(CollectionType)),
+                    models.FitbitSubscription.verified_at >= since,
+                )
+            )
+            .group_by(models.FitbitUser.oauth_userid)
+            .having(func.count() == len(CollectionType))
+        )
+        return set(rows)
+
+    async def record_notification(
+        self,
+        fitbit_userid: str,
+        collection_type: CollectionType,
+        notified_at: datetime.datetime,
+    ):
+        # Insert from a select, so that nothing is inserted for unknown users.
+        statement = insert(models.FitbitWebhookNotification).from_select(
+            [
+                models.FitbitWebhookNotification.fitbit_user_id,
+                models.FitbitWebhookNotification.collection_type,
+                models.FitbitWebhookNotification.last_notified_at,
+            ],
+            select(
+                models.FitbitUser.id,
+                literal(collection_type),
+                literal(notified_at),
+            ).where(models.FitbitUser.oauth_userid == fitbit_userid),
+        )
+        await self.db.execute(
+            statement=statement.on_conflict_do_update(
+                index_elements=[
+                    models.FitbitWebhookNotification.fitbit_user_id,
+                    models.FitbitWebhookNotification.collection_type,
+                ],
+                set_={
+                    "last_notified_at": statement.excluded.last_notified_at,
+                    "updated_at": func.now(),
+                },
+            )
+        )
+        await self.db.commit()
+
+    async def get_notified_fitbit_userids(
+        self,
+        collection_type: CollectionType,
+        since: datetime.datetime,
+    ) -> set[str]:
+        rows = await self.db.scalars(
+            statement=select(models.FitbitUser.oauth_userid)
+            .join(
+                models.FitbitWebhookNotification,
+                models.FitbitWebhookNotification.fitbit_user_id == models.FitbitUser.id,
+            )
+            .where(
+                and_(
+                    models.FitbitWebhookNotification.collection_type == collection_type,
+                    models.FitbitWebhookNotification.last_notified_at >= since,
+                )
+            )
+        )
+        return set(rows)
+
+    async def get_activity_type_catalogue(self) -> ActivityTypeCatalogue:
+        rows = (
+            await self.db.execute(
+                statement=select(
+                    models.FitbitActivityType.id,
+                    models.FitbitActivityType.name,
+                    models.FitbitActivityType.updated_at,
+                )
+            )
+        ).all()
+        if not rows:
+            return ActivityTypeCatalogue()
+        return ActivityTypeCatalogue(
+            names={row.id: row.name for row in rows},
+            refreshed_at=max(row.updated_at for row in rows).replace(
+                tzinfo=datetime.timezone.utc
+            ),
+        )
+
+    async def upsert_activity_types(
+        self,
+        names: dict[int, str],
+        refreshed_at: datetime.datetime,
+    ):
+        values = [
+            {"id": type_id, "name": name, "updated_at": refreshed_at}
+            for type_id, name in names.items()
+        ]
+        # Stay below sqlite's limit of variables per statement.
+        for start in range(0, len(values), _UPSERT_BATCH_SIZE):
+            statement = insert(models.FitbitActivityType).values(
+                values[start : start + _UPSERT_BATCH_SIZE]
+            )
+            await self.db.execute(
+                statement=statement.on_conflict_do_update(
+                    index_elements=[models.FitbitActivityType.id],
+                    set_={
+                        "name": statement.excluded.name,
+                        "updated_at": statement.excluded.updated_at,
+                    },
+                )
+            )
+        await self.db.commit()
+
+    async def compact_activities(
+        self,
+        before: datetime.date,
+        records_since: datetime.datetime | None = None,
+    ) -> int:
+        async def write(db: AsyncSession) -> int:
+            return await SQLAlchemyFitbitRepository(db=db)._compact_activities(
+                before=before,
+                records_since=records_since,
+            )
+
+        return await run_write(self.db, self.writer, write)
+
+    async def _compact_activities(
+        self,
+        before: datetime.date,
+        records_since: datetime.datetime | None,
+    ) -> int:
+        ranked_activities = select(
+            models.FitbitActivity.id,
+            func.row_number()
+            .over(
+                partition_by=(
+                    models.FitbitActivity.fitbit_user_id,
+                    models.FitbitActivity.type_id,
+                ),
+                order_by=(
+                    desc(models.FitbitActivity.updated_at),
+                    desc(models.FitbitActivity.id),
+                ),
+            )
+            .label("rank"),
+        ).subquery()
+        is_old_activity = and_(
+            models.FitbitActivity.updated_at
+            < datetime.datetime.combine(before, datetime.time.min),
+            # The next activity of each user and type is compared
+            # with the latest one: keep it.
+            models.FitbitActivity.id.not_in(
+                select(ranked_activities.c.id).where(ranked_activities.c.rank == 1)
+            ),
+            # Without a cursor, the latest activity is fetched from fitbit, and
+            # only its log id tells if it's new: keep the activities of users
+            # who don't have one yet.
+            models.FitbitActivity.fitbit_user_id.in_(
+                select(models.FitbitUser.id).where(
+                    models.FitbitUser.activity_cursor_log_id.is_not(None)
+                )
+            ),
+        )
+
+        # Records are computed from the saved activities the first time
+        # they're needed: compute them now, while the activities still exist.
+        rows = (
+            await self.db.execute(
+                statement=select(
+                    models.FitbitActivity.fitbit_user_id,
+                    models.FitbitActivity.type_id,
+                )
+                .distinct()
+                .outerjoin(
+                    models.FitbitActivityRecords,
+                    and_(
+                        models.FitbitActivityRecords.fitbit_user_id
+                        == models.FitbitActivity.fitbit_user_id,
+                        models.FitbitActivityRecords.type_id
+                        == models.FitbitActivity.type_id,
+                    ),
+                )
+                .where(and_(is_old_activity, models.FitbitActivityRecords.id.is_(None)))
+            )
+        ).all()
+        for row in rows:
+            records = await self._compute_activity_records(
+                fitbit_user_id=row.fitbit_user_id,
+                type_id=row.type_id,
+                since=records_since,
+            )
+            await self.db.execute(
+                statement=insert(models.FitbitActivityRecords)
+                .values(
+                    fitbit_user_id=row.fitbit_user_id,
+                    type_id=row.type_id,
+                    **_domain_records_to_db_values(records),
+                )
+                .on_conflict_do_nothing()
+            )
+
+        activity_date = func.date(models.FitbitActivity.updated_at)
+        activity_columns = models.FitbitActivity.__table__.c
+        aggregate_columns = models.FitbitDailyActivityAggregate.__table__.c
+        statement = insert(models.FitbitDailyActivityAggregate).from_select(
+            [
+                "fitbit_user_id",
+                "type_id",
+                "date",
+                "count_activities",
+                *(f"sum_{x}" for x in _SUMMED_ACTIVITY_COLUMNS),
+            ],
+            select(
+                models.FitbitActivity.fitbit_user_id,
+                models.FitbitActivity.type_id,
+                activity_date,
+                func.count(),
+                *(func.sum(activity_columns[x]) for x in _SUMMED_ACTIVITY_COLUMNS),
+            )
+            .where(is_old_activity)
+            .group_by(
+                models.FitbitActivity.fitbit_user_id,
+                models.FitbitActivity.type_id,
+                activity_date,
+            ),
+        )
+        # A day is normally compacted only once, but add to an existing
+        # aggregate rather than lose activities.
+        await self.db.execute(
+            statement=statement.on_conflict_do_update(
+                index_elements=["fitbit_user_id", "type_id", "date"],
+                set_={
+                    "count_activities": aggregate_columns.count_activities
+                    + statement.excluded.count_activities,
+                    **{
+                        f"sum_{x}": func.coalesce(
+                            aggregate_columns[f"sum_{x}"]
+                            + statement.excluded[f"sum_{x}"],
+                            aggregate_columns[f"sum_{x}"],
+                            statement.excluded[f"sum_{x}"],
+                        )
+                        for x in _SUMMED_ACTIVITY_COLUMNS
+                    },
+                    "updated_at": func.now(),
+                },
+            )
+        )
+        result = await self.db.execute(
+            statement=delete(models.FitbitActivity).where(is_old_activity)
+        )
+        return result.rowcount
+
+    async def reclaim_space(self):
+        # Not through the group-commit writer: VACUUM can't run in a transaction,
+        # and the writer applies its batches in one.
+        if (
+            await self.db.scalar(statement=text("PRAGMA auto_vacuum"))
+            != _AUTO_VACUUM_INCREMENTAL
+        ):
+            # Only the first time: changing the auto_vacuum mode of an existing
+            # database takes a full VACUUM, which rewrites the database file,
+            # and holds the database's write lock meanwhile.
+            logger.info("Switching the database to incremental vacuum")
+            script = "PRAGMA auto_vacuum = INCREMENTAL; VACUUM"
+        else:
+            script = "PRAGMA incremental_vacuum"
+        # The incremental_vacuum pragma frees one page per step, and executing it
+        # as a statement only steps once: executescript steps through it until
+        # it's done. VACUUM can't run in a transaction: executescript commits first.
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.executescript(script)
+        await self.db.commit()
+
+
+def _db_records_to_domain_records(row: Row) -> ActivityRecords:
+    return ActivityRecords(
+        all_time=row.all_time,
+        recent={
+            field: [
+                (datetime.datetime.fromisoformat(when), value) for when, value in values
+            ]
+            for field, values in row.recent.items()
+        },
+    )
+
+
+def _domain_records_to_db_values(records: ActivityRecords) -> dict:
+    return {
+        "all_time": records.all_time,
+        "recent": {
+            field: [[when.isoformat(), value] for when, value in values]
+            for field, values in records.recent.items()
+        },
+    }
+
 
 def _db_activity_to_domain_activity(
     db_activity: models.FitbitActivity,
@@ -0,0 +1,175 @@
+import datetime
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from slackhealthbot.data.database import models
+from slackhealthbot.data.database.writer import GroupCommitWriter, run_write
+from slackhealthbot.domain.localrepository.localslackoutboxrepository import (
+    LocalSlackOutboxRepository,
+)
+from slackhealthbot.domain.models.slacknotification import (
+    QueuedSlackNotification,
+    SlackNotification,
+)
+
+
+async def queue_slack_notification(db: AsyncSession, notification: SlackNotification):
+    """
+    Queue the notification in the outbox, in the caller's transaction.
+    It's ignored if a notification with the same idempotency key
+    was already queued.
+    """
+    await db.execute(
+        statement=insert(models.SlackOutbox)
+        .values(
+            idempotency_key=notification.idempotency_key,
+            message=notification.message,
+            next_attempt_at=datetime.datetime.now(datetime.timezone.utc),
+        )
+        .on_conflict_do_nothing(
+            index_elements=[models.SlackOutbox.idempotency_key],
+        )
+    )
+
+
+class SQLAlchemySlackOutboxRepository(LocalSlackOutboxRepository):
+
+    def __init__(self, db: AsyncSession, writer: GroupCommitWriter | None = None):
+        self.db = db
+        self.writer = writer
+
+    async def claim_due_notifications(
+        self,
+        now: datetime.datetime,
+        lease_until: datetime.datetime,
+        limit: int,
+    ) -> list[QueuedSlackNotification]:
+        async def write(db: AsyncSession) -> list[QueuedSlackNotification]:
+            # A single statement, so that two replicas can't claim
+            # the same notifications.
+            rows = await db.execute(
+                statement=update(models.SlackOutbox)
+                .where(
+                    models.SlackOutbox.id.in_(
+                        select(models.SlackOutbox.id)
+                        .where(models.SlackOutbox.next_attempt_at <= now)
+                        .order_by(models.SlackOutbox.id)
+                        .limit(limit)
+                    )
+                )
+                .values(next_attempt_at=lease_until)
+                .returning(
+                    models.SlackOutbox.id,
+                    models.SlackOutbox.idempotency_key,
+                    models.SlackOutbox.message,
+                    models.SlackOutbox.attempts,
+                )
+            )
+            return sorted(
+                (
+                    QueuedSlackNotification(
+                        id=row.id,
+                        idempotency_key=row.idempotency_key,
+                        message=row.message,
+                        attempts=row.attempts,
+                    )
+                    for row in rows
+                ),
+                key=lambda x: x.id,
+            )
+
+        return await run_write(self.db, self.writer, write)
+
+    async def renew_notification_claim(
+        self,
+        id: int,
+        claimed_until: datetime.datetime,
+        lease_until: datetime.datetime,
+    ) -> bool:
+        async def write(db: AsyncSession) -> bool:
+            result = await db.execute(
+                statement=update(models.SlackOutbox)
+                .where(
+                    models.SlackOutbox.id == id,
+                    models.SlackOutbox.next_attempt_at == claimed_until,
+                )
+                .values(next_attempt_at=lease_until)
+            )
+            return result.rowcount == 1
+
+        return await run_write(self.db, self.writer, write)
+
+    async def mark_notification_sent(
+        self,
+        id: int,
+        claimed_until: datetime.datetime,
+        sent_at: datetime.datetime,
+    ) -> bool:
+        async def write(db: AsyncSession) -> bool:
+            result = await db.execute(
+                statement=update(models.SlackOutbox)
+                .where(
+                    models.SlackOutbox.id == id,
+                    models.SlackOutbox.next_attempt_at == claimed_until,
+                )
+                .values(sent_at=sent_at, next_attempt_at=None)
+            )
+            return result.rowcount == 1
+
+        return await run_write(self.db, self.writer, write)
+
+    async def postpone_notifications(
+        self,
+        ids: list[int],
+        claimed_until: datetime.datetime,
+        next_attempt_at: datetime.datetime,
+    ):
+        async def write(db: AsyncSession):
+            await db.execute(
+                statement=update(models.SlackOutbox)
+                .where(
+                    models.SlackOutbox.id.in_(ids),
+                    models.SlackOutbox.next_attempt_at == claimed_until,
+                )
+                .values(next_attempt_at=next_attempt_at)
+            )
+
+        await run_write(self.db, self.writer, write)
+
+    async def update_notification(  # noqa: PLR0913
+        self,
+        id: int,
+        claimed_until: datetime.datetime,
+        error: str,
+        attempts: int,
+        next_attempt_at: datetime.datetime | None,
+    ) -> bool:
+        async def write(db: AsyncSession) -> bool:
+            result = await db.execute(
+                statement=update(models.SlackOutbox)
+                .where(
+                    models.SlackOutbox.id == id,
+                    models.SlackOutbox.next_attempt_at == claimed_until,
+                )
+                .values(
+                    error=error,
+                    attempts=attempts,
+                    next_attempt_at=next_attempt_at,
+                )
+            )
+            return result.rowcount == 1
+
+        return await run_write(self.db, self.writer, write)
+
+    async def delete_sent_notifications(self, before: datetime.datetime) -> int:
+        async def write(db: AsyncSession) -> int:
+            result = await db.execute(
+                statement=delete(models.SlackOutbox).where(
+                    models.SlackOutbox.sent_at < before
+                )
+            )
+            return result.rowcount
+
+        return await run_write(self.db, self.writer, write)
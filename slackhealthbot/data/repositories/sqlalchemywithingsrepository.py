@@ -1,23 +1,59 @@
 import datetime
+from typing import AsyncIterator
 
-from sqlalchemy import select, update
+from sqlalchemy import Row, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from slackhealthbot.core.exceptions import UnknownUserException
 from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.data.database import models
+from slackhealthbot.data.database.writer import GroupCommitWriter, run_write
+from slackhealthbot.data.repositories.sqlalchemyslackoutboxrepository import (
+    queue_slack_notification,
+)
 from slackhealthbot.domain.localrepository.localwithingsrepository import (
     FitnessData,
     LocalWithingsRepository,
     User,
     UserIdentity,
 )
+from slackhealthbot.domain.models.slacknotification import SlackNotification
+
+# The number of rows read per query by the iter_* methods.
+_PAGE_SIZE = 500
+
+_OAUTH_COLUMNS = (
+    models.WithingsUser.oauth_userid,
+    models.WithingsUser.oauth_access_token,
+    models.WithingsUser.oauth_refresh_token,
+    models.WithingsUser.oauth_expiration_date,
+)
+
+
+def _row_to_oauth_fields(row: Row) -> OAuthFields:
+    return OAuthFields(
+        oauth_userid=row.oauth_userid,
+        oauth_access_token=row.oauth_access_token,
+        oauth_refresh_token=row.oauth_refresh_token,
+        oauth_expiration_date=row.oauth_expiration_date.replace(
+            tzinfo=datetime.timezone.utc
+        ),
+    )
+
+
+def _forward_measures_cursor(measures_cursor: int):
+    # sqlite's max() with several arguments returns the largest one.
+    return func.max(
+        func.coalesce(models.WithingsUser.measures_cursor_lastupdate, measures_cursor),
+        measures_cursor,
+    )
 
 
 class SQLAlchemyWithingsRepository(LocalWithingsRepository):
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, writer: GroupCommitWriter | None = None):
         self.db = db
+        self.writer = writer
 
     async def create_user(
         self, slack_alias: str, withings_userid: str, oauth_data: OAuthFields
@@ -62,116 +98,177 @@ class SQLAlchemyWithingsRepository(LocalWithingsRepository):
             fitness_data=FitnessData(),
         )
 
+    # Every weight notification reads the user's identity and oauth data:
+    # select just their columns, without the fitbit user which the entities join.
+
     async def get_user_identity_by_withings_userid(
         self,
         withings_userid: str,
     ) -> UserIdentity | None:
-        user: models.User = (
-            await self.db.scalars(
-                statement=select(models.User)
-                .join(models.User.withings)
+        row = (
+            await self.db.execute(
+                statement=select(
+                    models.WithingsUser.oauth_userid,
+                    models.User.slack_alias,
+                )
+                .join(models.WithingsUser.user)
                 .where(models.WithingsUser.oauth_userid == withings_userid)
             )
         ).one_or_none()
         return (
-            UserIdentity(
-                withings_userid=user.withings.oauth_userid,
-                slack_alias=user.slack_alias,
-            )
-            if user
+            UserIdentity(withings_userid=row.oauth_userid, slack_alias=row.slack_alias)
+            if row
             else None
         )
 
+    async def iter_user_identities(
+        self,
+        page_size: int = _PAGE_SIZE,
+    ) -> AsyncIterator[UserIdentity]:
+        # The withings poll saves the weights from other sessions meanwhile:
+        # a cursor left open would keep them waiting on the database lock.
+        last_id = None
+        while True:
+            statement = (
+                select(
+                    models.WithingsUser.id,
+                    models.WithingsUser.oauth_userid,
+                    models.User.slack_alias,
+                )
+                .join(models.WithingsUser.user)
+                .order_by(models.WithingsUser.id)
+                .limit(page_size)
+            )
+            if last_id is not None:
+                statement = statement.where(models.WithingsUser.id > last_id)
+            rows = (await self.db.execute(statement=statement)).all()
+            for row in rows:
+                yield UserIdentity(
+                    withings_userid=row.oauth_userid, slack_alias=row.slack_alias
+                )
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1].id
+
     async def get_oauth_data_by_withings_userid(
         self,
         withings_userid: str,
     ) -> OAuthFields:
-        withings_user: models.WithingsUser = (
-            await self.db.scalars(
-                statement=select(models.WithingsUser).where(
+        row = (
+            await self.db.execute(
+                statement=select(*_OAUTH_COLUMNS).where(
                     models.WithingsUser.oauth_userid == withings_userid
                 )
             )
         ).one()
-        return OAuthFields(
-            oauth_userid=withings_userid,
-            oauth_access_token=withings_user.oauth_access_token,
-            oauth_refresh_token=withings_user.oauth_refresh_token,
-            oauth_expiration_date=withings_user.oauth_expiration_date.replace(
-                tzinfo=datetime.timezone.utc
-            ),
-        )
+        return _row_to_oauth_fields(row)
 
     async def get_fitness_data_by_withings_userid(
         self,
         withings_userid: str,
     ) -> FitnessData:
-        withings_user: models.WithingsUser = (
-            await self.db.scalars(
-                statement=select(models.WithingsUser).where(
-                    models.WithingsUser.oauth_userid == withings_userid
-                )
+        row = (
+            await self.db.execute(
+                statement=select(
+                    models.WithingsUser.last_weight,
+                    models.WithingsUser.last_weight_date,
+                ).where(models.WithingsUser.oauth_userid == withings_userid)
             )
         ).one()
         return FitnessData(
-            last_weight_kg=withings_user.last_weight,
+            last_weight_kg=row.last_weight,
+            last_weight_date=row.last_weight_date,
         )
 
     async def get_user_by_withings_userid(
         self,
         withings_userid: str,
     ) -> User:
-        user: models.User = (
-            await self.db.scalars(
-                statement=select(models.User)
-                .join(models.User.withings)
+        row = (
+            await self.db.execute(
+                statement=select(
+                    *_OAUTH_COLUMNS,
+                    models.User.slack_alias,
+                    models.WithingsUser.last_weight,
+                    models.WithingsUser.last_weight_date,
+                    models.WithingsUser.measures_cursor_lastupdate,
+                )
+                .join(models.WithingsUser.user)
                 .where(models.WithingsUser.oauth_userid == withings_userid)
             )
         ).one_or_none()
-        if not user:
+        if not row:
             raise UnknownUserException
         return User(
             identity=UserIdentity(
-                withings_userid=user.withings.oauth_userid,
-                slack_alias=user.slack_alias,
-            ),
-            oauth_data=OAuthFields(
-                oauth_userid=withings_userid,
-                oauth_access_token=user.withings.oauth_access_token,
-                oauth_refresh_token=user.withings.oauth_refresh_token,
-                oauth_expiration_date=user.withings.oauth_expiration_date.replace(
-                    tzinfo=datetime.timezone.utc
-                ),
+                withings_userid=row.oauth_userid,
+                slack_alias=row.slack_alias,
             ),
+            oauth_data=_row_to_oauth_fields(row),
             fitness_data=FitnessData(
-                last_weight_kg=user.withings.last_weight,
+                last_weight_kg=row.last_weight,
+                last_weight_date=row.last_weight_date,
             ),
+            measures_cursor=row.measures_cursor_lastupdate,
         )
 
     async def update_user_weight(
         self,
         withings_userid: str,
         last_weight_kg: float,
+        last_weight_date: int | None = None,
+        measures_cursor: int | None = None,
+        notification: SlackNotification | None = None,
     ):
-        await self.db.execute(
-            statement=update(models.WithingsUser)
-            .where(models.WithingsUser.oauth_userid == withings_userid)
-            .values(last_weight=last_weight_kg)
-        )
-        await self.db.commit()
+        values = {"last_weight": last_weight_kg}
+        if last_weight_date is not None:
+            values["last_weight_date"] = last_weight_date
+        if measures_cursor is not None:
+            values["measures_cursor_lastupdate"] = _forward_measures_cursor(
+                measures_cursor
+            )
+
+        async def write(db: AsyncSession):
+            await db.execute(
+                statement=update(models.WithingsUser)
+                .where(models.WithingsUser.oauth_userid == withings_userid)
+                .values(**values)
+            )
+            if notification:
+                await queue_slack_notification(db, notification)
+
+        await run_write(self.db, self.writer, write)
+
+    async def update_measures_cursor(
+        self,
+        withings_userid: str,
+        measures_cursor: int,
+    ):
+        async def write(db: AsyncSession):
+            await db.execute(
+                statement=update(models.WithingsUser)
+                .where(models.WithingsUser.oauth_userid == withings_userid)
+                .values(
+                    measures_cursor_lastupdate=_forward_measures_cursor(measures_cursor)
+                )
+            )
+
+        await run_write(self.db, self.writer, write)
 
     async def update_oauth_data(
         self,
         withings_userid: str,
         oauth_data: OAuthFields,
     ):
-        await self.db.execute(
-            statement=update(models.WithingsUser)
-            .where(models.WithingsUser.oauth_userid == withings_userid)
-            .values(
-                oauth_access_token=oauth_data.oauth_access_token,
-                oauth_refresh_token=oauth_data.oauth_refresh_token,
-                oauth_expiration_date=oauth_data.oauth_expiration_date,
+        async def write(db: AsyncSession):
+            await db.execute(
+                statement=update(models.WithingsUser)
+                .where(models.WithingsUser.oauth_userid == withings_userid)
+                .values(
+                    oauth_access_token=oauth_data.oauth_access_token,
+                    oauth_refresh_token=oauth_data.oauth_refresh_token,
+                    oauth_expiration_date=oauth_data.oauth_expiration_date,
+                )
             )
-        )
-        await self.db.commit()
+
+        await run_write(self.db, self.writer, write)
@@ -0,0 +1,74 @@
+import datetime
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator
+
+from slackhealthbot.domain.models.failedevent import FailedEvent, FailedEventSource
+
+
+class LocalFailedEventRepository(ABC):
+    @abstractmethod
+    async def create_failed_event(
+        self,
+        source: FailedEventSource,
+        payload: dict[str, Any],
+        error: str,
+        next_attempt_at: datetime.datetime | None,
+    ) -> int:
+        """
+        :return: the id of the new event.
+        """
+        pass
+
+    @abstractmethod
+    async def get_due_failed_events(
+        self,
+        now: datetime.datetime,
+        limit: int,
+    ) -> list[FailedEvent]:
+        """
+        :return: the events whose next attempt is due, the earliest first.
+        """
+        pass
+
+    @abstractmethod
+    def iter_failed_events(
+        self,
+        since: datetime.datetime,
+        until: datetime.datetime,
+    ) -> AsyncIterator[FailedEvent]:
+        """
+        Iterate over the events created in the given time range,
+        including the ones we gave up replaying, reading them
+        from the database a page at a time.
+        """
+        pass
+
+    @abstractmethod
+    async def claim_failed_event(
+        self,
+        id: int,
+        next_attempt_at: datetime.datetime | None,
+        lease_until: datetime.datetime,
+    ) -> bool:
+        """
+        Postpone the event's next attempt while we replay it,
+        so that other replicas don't replay it at the same time.
+
+        :param next_attempt_at: the next attempt time we read for the event.
+        :return: False if the event was claimed, replayed or deleted since.
+        """
+        pass
+
+    @abstractmethod
+    async def update_failed_event(
+        self,
+        id: int,
+        error: str,
+        attempts: int,
+        next_attempt_at: datetime.datetime | None,
+    ):
+        pass
+
+    @abstractmethod
+    async def delete_failed_event(self, id: int):
+        pass
@@ -1,14 +1,21 @@
 import dataclasses
 import datetime
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable
 
 from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.domain.models.activity import (
+    ActivityCursor,
     ActivityData,
+    ActivityRecords,
+    ActivityTypeCatalogue,
     DailyActivityStats,
     TopActivityStats,
 )
+from slackhealthbot.domain.models.poll import PollState
+from slackhealthbot.domain.models.slacknotification import SlackNotification
 from slackhealthbot.domain.models.sleep import SleepData
+from slackhealthbot.domain.models.subscription import CollectionType
 
 
 @dataclasses.dataclass
@@ -21,6 +28,7 @@ class UserIdentity:
 class User:
     identity: UserIdentity
     oauth_data: OAuthFields
+    activity_cursor: ActivityCursor | None = None
 
 
 class LocalFitbitRepository(ABC):
@@ -44,6 +52,14 @@ class LocalFitbitRepository(ABC):
     async def get_all_user_identities(self) -> list[UserIdentity]:
         pass
 
+    @abstractmethod
+    def iter_user_identities(self) -> AsyncIterator[UserIdentity]:
+        """
+        Iterate over the identities of all the users, reading them
+        from the database a page at a time.
+        """
+        pass
+
     @abstractmethod
     async def get_oauth_data_by_fitbit_userid(
         self,
@@ -79,6 +95,28 @@ class LocalFitbitRepository(ABC):
         self,
         fitbit_userid: str,
         activity: ActivityData,
+        records_since: datetime.datetime | None = None,
+        create_notification: (
+            Callable[[ActivityRecords], SlackNotification | None] | None
+        ) = None,
+    ) -> ActivityRecords:
+        """
+        Save the activity, and update the user's records for its activity type.
+
+        :param records_since: the start of the window of the recent records.
+            Values older than this may be forgotten.
+        :param create_notification: called with the user's updated records.
+            The notification it returns is queued in the same transaction
+            as the activity.
+        :return: the user's records for the activity type, including this activity.
+        """
+        pass
+
+    @abstractmethod
+    async def update_activity_cursor(
+        self,
+        fitbit_userid: str,
+        activity_cursor: ActivityCursor,
     ):
         pass
 
@@ -87,7 +125,11 @@ class LocalFitbitRepository(ABC):
         self,
         fitbit_userid: str,
         sleep: SleepData,
+        notification: SlackNotification | None = None,
     ):
+        """
+        :param notification: queued in the same transaction as the sleep.
+        """
         pass
 
     @abstractmethod
@@ -105,15 +147,6 @@ class LocalFitbitRepository(ABC):
     ):
         pass
 
-    @abstractmethod
-    async def get_top_activity_stats_by_user_and_activity_type(
-        self,
-        fitbit_userid: str,
-        type_id: int,
-        since: datetime.datetime | None = None,
-    ) -> TopActivityStats:
-        pass
-
     @abstractmethod
     async def get_latest_daily_activity_by_user_and_activity_type(
         self,
@@ -132,13 +165,26 @@ class LocalFitbitRepository(ABC):
         self,
         type_ids: set[int],
         when: datetime.date | None = None,
-    ) -> DailyActivityStats | None:
+    ) -> list[DailyActivityStats]:
         """
         Get the stats for the given date and activity types.
         If no date is provided, returns the stats for today.
         """
         pass
 
+    @abstractmethod
+    def iter_daily_activities_by_type(
+        self,
+        type_ids: set[int],
+        when: datetime.date | None = None,
+    ) -> AsyncIterator[DailyActivityStats]:
+        """
+        Iterate over the stats for the given date and activity types,
+        reading them from the database a page at a time.
+        If no date is provided, iterates over the stats for today.
+        """
+        pass
+
     @abstractmethod
     async def get_top_daily_activity_stats_by_user_and_activity_type(
         self,
@@ -150,3 +196,147 @@ class LocalFitbitRepository(ABC):
         Get the top daily activity stats for the given user and activity type.
         """
         pass
+
+    @abstractmethod
+    async def upsert_poll_replica(
+        self,
+        replica_id: str,
+        when: datetime.datetime,
+    ):
+        """
+        Register the given poll replica as alive at the given time.
+        """
+        pass
+
+    @abstractmethod
+    async def get_poll_replica_ids(
+        self,
+        since: datetime.datetime,
+    ) -> list[str]:
+        """
+        Get the ids, sorted, of the poll replicas which have been alive since the given time.
+        """
+        pass
+
+    @abstractmethod
+    async def delete_poll_replica(
+        self,
+        replica_id: str,
+    ):
+        """
+        Unregister the given poll replica, so that the other replicas take over its users.
+        """
+        pass
+
+    @abstractmethod
+    async def get_poll_states(self) -> list[PollState]:
+        """
+        Get the saved poll states of all the users.
+        """
+        pass
+
+    @abstractmethod
+    async def upsert_poll_states(
+        self,
+        poll_states: list[PollState],
+    ):
+        """
+        Save the given poll states, in one transaction.
+
+        A saved state never goes back in time: if another replica saved
+        more recent dates or activity, they're kept.
+        """
+        pass
+
+    @abstractmethod
+    async def update_subscriptions(
+        self,
+        fitbit_userid: str,
+        collection_types: set[CollectionType],
+        verified_at: datetime.datetime,
+    ):
+        """
+        Record that the given user's subscriptions to the given collection types
+        exist on fitbit, and that the other subscriptions don't.
+        """
+        pass
+
+    @abstractmethod
+    async def get_subscribed_fitbit_userids(
+        self,
+        since: datetime.datetime,
+    ) -> set[str]:
+        """
+        Get the users whose subscriptions to all the collection types
+        were verified since the given time.
+        """
+        pass
+
+    @abstractmethod
+    async def record_notification(
+        self,
+        fitbit_userid: str,
+        collection_type: CollectionType,
+        notified_at: datetime.datetime,
+    ):
+        """
+        Record that fitbit notified us of new data of the given collection type
+        for the given user. Unknown users are ignored.
+        """
+        pass
+
+    @abstractmethod
+    async def get_notified_fitbit_userids(
+        self,
+        collection_type: CollectionType,
+        since: datetime.datetime,
+    ) -> set[str]:
+        """
+        Get the users for whom fitbit notified us of new data of the given
+        collection type since the given time.
+        """
+        pass
+
+    @abstractmethod
+    async def get_activity_type_catalogue(self) -> ActivityTypeCatalogue:
+        pass
+
+    @abstractmethod
+    async def upsert_activity_types(
+        self,
+        names: dict[int, str],
+        refreshed_at: datetime.datetime,
+    ):
+        pass
+
+    @abstractmethod
+    async def compact_activities(
+        self,
+        before: datetime.date,
+        records_since: datetime.datetime | None = None,
+    ) -> int:
+        """
+        Roll the activities saved before the given date into daily aggregates,
+        and delete them.
+
+        The records of each user and activity type are saved first,
+        so that they're not lost with the activities.
+        The activities of users without an activity cursor are kept: they're
+        needed to recognize the activities which were already processed.
+        The latest activity of each user and activity type is kept too:
+        the next one is compared with it.
+
+        :param records_since: the start of the window of the recent records.
+        :return: the number of deleted activities.
+        """
+        pass
+
+    @abstractmethod
+    async def reclaim_space(self):
+        """
+        Give the space freed by deleted rows back to the file system.
+
+        The first time, this switches the database to incremental vacuum,
+        with a full VACUUM.
+        """
+        pass
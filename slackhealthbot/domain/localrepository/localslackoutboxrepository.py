@@ -0,0 +1,96 @@
+import datetime
+from abc import ABC, abstractmethod
+
+from slackhealthbot.domain.models.slacknotification import QueuedSlackNotification
+
+
+class LocalSlackOutboxRepository(ABC):
+    """
+    The slack notifications waiting to be posted.
+    They're queued by the repositories saving the data they're about.
+    """
+
+    @abstractmethod
+    async def claim_due_notifications(
+        self,
+        now: datetime.datetime,
+        lease_until: datetime.datetime,
+        limit: int,
+    ) -> list[QueuedSlackNotification]:
+        """
+        Postpone the next attempt of the notifications which are due,
+        so that other replicas don't post them at the same time.
+
+        :return: the claimed notifications, the oldest first.
+        """
+        pass
+
+    @abstractmethod
+    async def renew_notification_claim(
+        self,
+        id: int,
+        claimed_until: datetime.datetime,
+        lease_until: datetime.datetime,
+    ) -> bool:
+        """
+        Extend our claim of the notification before posting it.
+
+        :param claimed_until: the end of our current lease.
+        :return: False if the lease expired and another replica claimed
+            the notification since.
+        """
+        pass
+
+    @abstractmethod
+    async def mark_notification_sent(
+        self,
+        id: int,
+        claimed_until: datetime.datetime,
+        sent_at: datetime.datetime,
+    ) -> bool:
+        """
+        :param claimed_until: the end of our current lease.
+        :return: False if another replica claimed the notification since.
+        """
+        pass
+
+    @abstractmethod
+    async def postpone_notifications(
+        self,
+        ids: list[int],
+        claimed_until: datetime.datetime,
+        next_attempt_at: datetime.datetime,
+    ):
+        """
+        Release notifications which were claimed, but not attempted.
+        The ones claimed by another replica since are left alone.
+
+        :param claimed_until: the end of our current lease.
+        """
+        pass
+
+    @abstractmethod
+    async def update_notification(  # noqa: PLR0913
+        self,
+        id: int,
+        claimed_until: datetime.datetime,
+        error: str,
+        attempts: int,
+        next_attempt_at: datetime.datetime | None,
+    ) -> bool:
+        """
+        :param claimed_until: the end of our current lease.
+        :param next_attempt_at: None to give up posting the notification.
+        :return: False if another replica claimed the notification since.
+        """
+        pass
+
+    @abstractmethod
+    async def delete_sent_notifications(self, before: datetime.datetime) -> int:
+        """
+        Forget the notifications sent before the given time.
+        Until then, they're kept so that they're not queued again.
+
+        :return: the number of deleted notifications.
+        """
+        pass
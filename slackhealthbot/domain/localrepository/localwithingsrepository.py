@@ -1,7 +1,9 @@
 import dataclasses
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
 
 from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.domain.models.slacknotification import SlackNotification
 
 
 @dataclasses.dataclass
@@ -13,6 +15,8 @@ class UserIdentity:
 @dataclasses.dataclass
 class FitnessData:
     last_weight_kg: float | None = None
+    # When the last weight was measured, as a unix timestamp.
+    last_weight_date: int | None = None
 
 
 @dataclasses.dataclass
@@ -20,6 +24,9 @@ class User:
     identity: UserIdentity
     oauth_data: OAuthFields
     fitness_data: FitnessData
+    # The time up to which the user's measures have been processed,
+    # as a unix timestamp.
+    measures_cursor: int | None = None
 
 
 class LocalWithingsRepository(ABC):
@@ -39,6 +46,14 @@ class LocalWithingsRepository(ABC):
     ) -> UserIdentity | None:
         pass
 
+    @abstractmethod
+    def iter_user_identities(self) -> AsyncIterator[UserIdentity]:
+        """
+        Iterate over the identities of all the users, reading them
+        from the database a page at a time.
+        """
+        pass
+
     @abstractmethod
     async def get_oauth_data_by_withings_userid(
         self,
@@ -65,7 +80,28 @@ class LocalWithingsRepository(ABC):
         self,
         withings_userid: str,
         last_weight_kg: float,
+        last_weight_date: int | None = None,
+        measures_cursor: int | None = None,
+        notification: SlackNotification | None = None,
+    ):
+        """
+        :param last_weight_date: when the weight was measured.
+        :param measures_cursor: if provided, the user's measures cursor is
+            moved forward to this time. It's never moved back.
+        :param notification: queued in the same transaction as the weight.
+        """
+        pass
+
+    @abstractmethod
+    async def update_measures_cursor(
+        self,
+        withings_userid: str,
+        measures_cursor: int,
     ):
+        """
+        Move the user's measures cursor forward to the given time.
+        It's never moved back.
+        """
         pass
 
     async def update_oauth_data(
@@ -1,4 +1,5 @@
 import dataclasses
+import datetime
 from enum import StrEnum, auto
 
 
@@ -23,6 +24,30 @@ class ActivityData:
     calories: int
     distance_km: float | None
     zone_minutes: list[ActivityZoneMinutes]
+    start_time: datetime.datetime | None = None
+
+
+@dataclasses.dataclass
+class ActivityCursor:
+    """
+    The most recent activity we fetched for a user.
+    """
+
+    start_time: datetime.datetime
+    log_id: int
+
+
+@dataclasses.dataclass
+class ActivityTypeCatalogue:
+    """
+    The names of fitbit's activity types, by activity type id.
+    """
+
+    names: dict[int, str] = dataclasses.field(default_factory=dict)
+    refreshed_at: datetime.datetime | None = None
+
+    def is_stale(self, now: datetime.datetime, ttl: datetime.timedelta) -> bool:
+        return not self.refreshed_at or now - self.refreshed_at > ttl
 
 
 @dataclasses.dataclass
@@ -33,6 +58,83 @@ class TopActivityStats:
     top_zone_minutes: list[ActivityZoneMinutes]
 
 
+# The activity fields for which we track records.
+RECORD_FIELDS = (
+    "calories",
+    "distance_km",
+    "total_minutes",
+    *(f"{x}_minutes" for x in ActivityZone if x != ActivityZone.OUT_OF_ZONE),
+)
+
+
+def _get_record_field_value(activity: ActivityData, field: str) -> float | None:
+    if field.endswith("_minutes") and field != "total_minutes":
+        zone = ActivityZone(field.removesuffix("_minutes"))
+        return next((x.minutes for x in activity.zone_minutes if x.zone == zone), None)
+    return getattr(activity, field)
+
+
+@dataclasses.dataclass
+class ActivityRecords:
+    """
+    The top values of a user's activities of a given type.
+
+    For each field, recent holds the values which can still be the top value
+    of a window ending now, with the time they were recorded: each value is
+    larger than all the values recorded after it. The top value since a given
+    time is then the first one recorded after that time.
+    """
+
+    all_time: dict[str, float] = dataclasses.field(default_factory=dict)
+    recent: dict[str, list[tuple[datetime.datetime, float]]] = dataclasses.field(
+        default_factory=dict
+    )
+
+    def add(
+        self,
+        activity: ActivityData,
+        when: datetime.datetime,
+        since: datetime.datetime | None = None,
+    ):
+        """
+        :param since: the start of the largest window we need recent records for.
+            Older values are dropped.
+        """
+        for field in RECORD_FIELDS:
+            value = _get_record_field_value(activity, field)
+            recent_values = [
+                x
+                for x in self.recent.get(field, [])
+                if (since is None or x[0] >= since) and (value is None or x[1] > value)
+            ]
+            if value is not None:
+                self.all_time[field] = max(self.all_time.get(field, value), value)
+                recent_values.append((when, value))
+            if recent_values:
+                self.recent[field] = recent_values
+            else:
+                self.recent.pop(field, None)
+
+    def get_top_stats(self, since: datetime.datetime | None = None) -> TopActivityStats:
+        if since is None:
+            top_values = self.all_time
+        else:
+            top_values = {
+                field: next((x[1] for x in values if x[0] >= since), None)
+                for field, values in self.recent.items()
+            }
+        return TopActivityStats(
+            top_calories=top_values.get("calories"),
+            top_distance_km=top_values.get("distance_km"),
+            top_total_minutes=top_values.get("total_minutes"),
+            top_zone_minutes=[
+                ActivityZoneMinutes(zone=x, minutes=top_values[f"{x}_minutes"])
+                for x in ActivityZone
+                if top_values.get(f"{x}_minutes")
+            ],
+        )
+
+
 @dataclasses.dataclass
 class ActivityHistory:
     latest_activity_data: ActivityData | None
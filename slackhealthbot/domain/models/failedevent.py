@@ -0,0 +1,29 @@
+import dataclasses
+import datetime
+import enum
+from typing import Any
+
+
+class FailedEventSource(enum.StrEnum):
+    FITBIT = "fitbit"
+    WITHINGS = "withings"
+
+
+@dataclasses.dataclass
+class FailedEvent:
+    """
+    A notification whose processing failed, kept to be replayed.
+    """
+
+    id: int
+    source: FailedEventSource
+    # For fitbit: the webhook notification, with at least
+    # its collectionType, ownerId and date.
+    # For withings: the withings_userid, startdate and enddate of the notification.
+    payload: dict[str, Any]
+    # The exception of the last attempt.
+    error: str
+    attempts: int
+    created_at: datetime.datetime
+    # None once we gave up replaying the event automatically.
+    next_attempt_at: datetime.datetime | None
@@ -0,0 +1,29 @@
+import dataclasses
+import datetime
+import zlib
+
+
+@dataclasses.dataclass(frozen=True)
+class PollShard:
+    index: int
+    count: int
+
+    def contains(self, fitbit_userid: str) -> bool:
+        # Use a stable hash: python's hash() of a str is randomized per process,
+        # and all replicas must agree on which shard a user belongs to.
+        return zlib.crc32(fitbit_userid.encode()) % self.count == self.index
+
+
+ALL_USERS_SHARD = PollShard(index=0, count=1)
+
+
+@dataclasses.dataclass
+class PollState:
+    """
+    What the poll task remembers about a user between polls.
+    """
+
+    fitbit_userid: str
+    last_sleep_success_date: datetime.date | None = None
+    last_fail_alert_date: datetime.date | None = None
+    last_new_data_at: datetime.datetime | None = None
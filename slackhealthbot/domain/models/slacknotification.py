@@ -0,0 +1,21 @@
+import dataclasses
+
+
+@dataclasses.dataclass
+class SlackNotification:
+    """
+    A message to post to slack, queued in the outbox in the same transaction
+    as the data it's about, and posted in the background.
+    """
+
+    # Identifies the event the message is about, so that it's queued once
+    # even if the event is processed again.
+    idempotency_key: str
+    message: str
+
+
+@dataclasses.dataclass
+class QueuedSlackNotification(SlackNotification):
+    id: int
+    # The failed attempts to post the message.
+    attempts: int
@@ -0,0 +1,10 @@
+import enum
+
+
+class CollectionType(enum.StrEnum):
+    """
+    The fitbit collections we subscribe to, for webhook notifications.
+    """
+
+    SLEEP = "sleep"
+    ACTIVITIES = "activities"
@@ -6,3 +6,22 @@ class WeightData:
     weight_kg: float
     slack_alias: str
     last_weight_kg: float | None
+
+
+@dataclasses.dataclass
+class WeightMeasure:
+    weight_kg: float
+    # When the weight was measured, as a unix timestamp.
+    date: int
+
+
+@dataclasses.dataclass
+class WeightUpdates:
+    """
+    The weights measured or modified since a given time.
+    """
+
+    # The most recently measured of the weights.
+    last_weight: WeightMeasure | None
+    # The time of the response, from which to request the next updates.
+    updatetime: int
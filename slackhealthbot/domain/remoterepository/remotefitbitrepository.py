@@ -2,8 +2,9 @@ import datetime
 from abc import ABC, abstractmethod
 
 from slackhealthbot.core.models import OAuthFields
-from slackhealthbot.domain.models.activity import ActivityData
+from slackhealthbot.domain.models.activity import ActivityCursor, ActivityData
 from slackhealthbot.domain.models.sleep import SleepData
+from slackhealthbot.domain.models.subscription import CollectionType
 
 
 class RemoteFitbitRepository(ABC):
@@ -11,13 +12,56 @@ class RemoteFitbitRepository(ABC):
     async def subscribe(
         self,
         oauth_fields: OAuthFields,
-    ):
+        collection_types: set[CollectionType] | None = None,
+    ) -> set[CollectionType]:
+        """
+        Subscribe to webhook notifications for the given collection types,
+        or for all of them, if not provided.
+
+        :return: the collection types we're now subscribed to.
+        """
+        pass
+
+    @abstractmethod
+    async def get_subscriptions(
+        self,
+        oauth_fields: OAuthFields,
+    ) -> set[CollectionType]:
+        """
+        :return: the collection types the user is subscribed to.
+        """
         pass
 
     @abstractmethod
     async def get_activity(
-        self, oauth_fields: OAuthFields, when: datetime.datetime
+        self,
+        oauth_fields: OAuthFields,
+        when: datetime.datetime,
     ) -> tuple[str, ActivityData] | None:
+        """
+        Get the latest activity before the given time.
+        """
+        pass
+
+    @abstractmethod
+    async def get_activities_after(
+        self,
+        oauth_fields: OAuthFields,
+        after: ActivityCursor,
+    ) -> list[tuple[str, ActivityData]]:
+        """
+        Get all the activities after the given one, oldest first.
+        """
+        pass
+
+    @abstractmethod
+    async def get_activity_types(
+        self,
+        oauth_fields: OAuthFields,
+    ) -> dict[int, str]:
+        """
+        :return: the names of all the activity types, by activity type id.
+        """
         pass
 
     @abstractmethod
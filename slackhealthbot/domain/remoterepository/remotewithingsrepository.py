@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 
 from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.domain.models.weight import WeightMeasure, WeightUpdates
 
 
 class RemoteWithingsRepository(ABC):
@@ -13,12 +14,26 @@ class RemoteWithingsRepository(ABC):
         pass
 
     @abstractmethod
-    async def get_last_weight_kg(
+    async def get_last_weight(
         self,
         oauth_fields: OAuthFields,
         startdate: int,
         enddate: int,
-    ) -> float | None:
+    ) -> WeightMeasure | None:
+        """
+        Get the most recent weight measured in the given range of unix timestamps.
+        """
+        pass
+
+    @abstractmethod
+    async def get_weight_updates(
+        self,
+        oauth_fields: OAuthFields,
+        lastupdate: int,
+    ) -> WeightUpdates:
+        """
+        Get the weights measured or modified since the given unix timestamp.
+        """
         pass
 
     @abstractmethod
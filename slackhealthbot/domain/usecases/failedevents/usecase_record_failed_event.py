@@ -0,0 +1,58 @@
+import datetime
+import traceback
+from typing import Any
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
+from slackhealthbot.domain.models.failedevent import FailedEventSource
+from slackhealthbot.settings import FailedEvents, Settings
+
+
+def format_error(error: Exception) -> str:
+    return "".join(traceback.format_exception_only(error)).strip()
+
+
+def get_next_attempt_at(
+    attempts: int,
+    failed_events_settings: FailedEvents,
+) -> datetime.datetime | None:
+    """
+    :return: when to replay an event which failed the given number of times,
+        or None to give up.
+    """
+    if attempts >= failed_events_settings.max_attempts:
+        return None
+    delay_s = min(
+        failed_events_settings.backoff_max_seconds,
+        failed_events_settings.backoff_base_seconds * 2 ** (attempts - 1),
+    )
+    return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=delay_s
+    )
+
+
+@inject
+async def do(
+    local_failed_event_repo: LocalFailedEventRepository,
+    source: FailedEventSource,
+    payload: dict[str, Any],
+    error: Exception,
+    settings: Settings = Depends(Provide[Container.settings]),
+):
+    """
+    Keep a notification whose processing failed, to replay it later.
+    """
+    await local_failed_event_repo.create_failed_event(
+        source=source,
+        payload=payload,
+        error=format_error(error),
+        next_attempt_at=get_next_attempt_at(
+            attempts=1,
+            failed_events_settings=settings.app_settings.failed_events,
+        ),
+    )
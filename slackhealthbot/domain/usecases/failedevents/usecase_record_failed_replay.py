@@ -0,0 +1,42 @@
+import logging
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
+from slackhealthbot.domain.models.failedevent import FailedEvent
+from slackhealthbot.domain.usecases.failedevents.usecase_record_failed_event import (
+    format_error,
+    get_next_attempt_at,
+)
+from slackhealthbot.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+@inject
+async def do(
+    local_failed_event_repo: LocalFailedEventRepository,
+    event: FailedEvent,
+    error: Exception,
+    settings: Settings = Depends(Provide[Container.settings]),
+):
+    """
+    Postpone the next replay of the event, or give up after too many attempts.
+    """
+    attempts = event.attempts + 1
+    next_attempt_at = get_next_attempt_at(
+        attempts=attempts,
+        failed_events_settings=settings.app_settings.failed_events,
+    )
+    if next_attempt_at is None:
+        logger.error(f"Giving up replaying failed event {event.id}")
+    await local_failed_event_repo.update_failed_event(
+        id=event.id,
+        error=format_error(error),
+        attempts=attempts,
+        next_attempt_at=next_attempt_at,
+    )
@@ -0,0 +1,38 @@
+import datetime
+import logging
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+@inject
+async def do(
+    local_fitbit_repo: LocalFitbitRepository,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> int:
+    """
+    Compact the activities older than the retention period into daily aggregates,
+    and reclaim the space they used.
+
+    :return: the number of compacted activities.
+    """
+    activities_settings = settings.app_settings.fitbit.activities
+    now = datetime.datetime.now(datetime.timezone.utc)
+    compacted_count = await local_fitbit_repo.compact_activities(
+        before=(
+            now - datetime.timedelta(days=activities_settings.retention.detail_days)
+        ).date(),
+        records_since=now - datetime.timedelta(days=activities_settings.history_days),
+    )
+    if compacted_count:
+        await local_fitbit_repo.reclaim_space()
+    logger.info(f"Compacted {compacted_count} fitbit activities")
+    return compacted_count
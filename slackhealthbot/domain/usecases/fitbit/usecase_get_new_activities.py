@@ -15,11 +15,23 @@ async def do(
     remote_repo: RemoteFitbitRepository,
     fitbit_userid: str,
     when: datetime.datetime,
-) -> tuple[str, ActivityData] | None:
+) -> list[tuple[str, ActivityData]]:
+    """
+    Get the activities following the last one we fetched for this user,
+    oldest first, or the latest activity if we never fetched one.
+
+    :return: an empty list if there's no new activity.
+    """
     user: User = await local_repo.get_user_by_fitbit_userid(
         fitbit_userid=fitbit_userid,
     )
-    return await remote_repo.get_activity(
+    if not user.activity_cursor:
+        latest_activity = await remote_repo.get_activity(
+            oauth_fields=user.oauth_data,
+            when=when,
+        )
+        return [latest_activity] if latest_activity else []
+    return await remote_repo.get_activities_after(
         oauth_fields=user.oauth_data,
-        when=when,
+        after=user.activity_cursor,
     )
@@ -0,0 +1,39 @@
+import datetime
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.models.poll import PollShard
+from slackhealthbot.settings import Settings
+
+
+@inject
+async def do(
+    local_fitbit_repo: LocalFitbitRepository,
+    replica_id: str,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> PollShard:
+    """
+    Determine which subset of users this replica should poll.
+
+    If the shard is configured statically, return it.
+    Otherwise, register this replica as alive, and derive the shard from
+    the list of live replicas: as replicas join or leave, the users are
+    rebalanced between the remaining ones.
+    """
+    poll_settings = settings.app_settings.fitbit.poll
+    if poll_settings.shard_count is not None:
+        return PollShard(
+            index=poll_settings.shard_index, count=poll_settings.shard_count
+        )
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    await local_fitbit_repo.upsert_poll_replica(replica_id=replica_id, when=now)
+    replica_ids: list[str] = await local_fitbit_repo.get_poll_replica_ids(
+        since=now - datetime.timedelta(seconds=poll_settings.replica_timeout_seconds),
+    )
+    return PollShard(index=replica_ids.index(replica_id), count=len(replica_ids))
@@ -0,0 +1,52 @@
+import datetime
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.models.subscription import CollectionType
+from slackhealthbot.settings import Settings
+
+
+@inject
+async def do(
+    local_fitbit_repo: LocalFitbitRepository,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> dict[CollectionType, set[str]]:
+    """
+    Determine which users don't need to be polled, because we can rely
+    on the webhook for them.
+
+    :return: the fitbit userids to skip, per collection type.
+    """
+    poll_settings = settings.app_settings.fitbit.poll
+    now = datetime.datetime.now(datetime.timezone.utc)
+    skip_fitbit_userids = {x: set() for x in CollectionType}
+    if poll_settings.skip_subscribed_users:
+        # Allow the reconciliation to be a bit late.
+        max_verified_age = datetime.timedelta(
+            seconds=settings.app_settings.fitbit.subscriptions.reconcile_interval_seconds
+            * 2
+        )
+        subscribed_fitbit_userids = (
+            await local_fitbit_repo.get_subscribed_fitbit_userids(
+                since=now - max_verified_age,
+            )
+        )
+        for fitbit_userids in skip_fitbit_userids.values():
+            fitbit_userids.update(subscribed_fitbit_userids)
+    if poll_settings.webhook_silence_threshold_seconds is not None:
+        since = now - datetime.timedelta(
+            seconds=poll_settings.webhook_silence_threshold_seconds
+        )
+        for collection_type, fitbit_userids in skip_fitbit_userids.items():
+            fitbit_userids.update(
+                await local_fitbit_repo.get_notified_fitbit_userids(
+                    collection_type=collection_type,
+                    since=since,
+                )
+            )
+    return skip_fitbit_userids
@@ -1,3 +1,4 @@
+import datetime
 from typing import Any
 
 from slackhealthbot.core.models import OAuthFields
@@ -18,7 +19,12 @@ async def do(
     token: dict[str, Any],
 ):
     user: User = await _upsert_user(local_repo, remote_repo, slack_alias, token)
-    await remote_repo.subscribe(oauth_fields=user.oauth_data)
+    collection_types = await remote_repo.subscribe(oauth_fields=user.oauth_data)
+    await local_repo.update_subscriptions(
+        fitbit_userid=user.identity.fitbit_userid,
+        collection_types=collection_types,
+        verified_at=datetime.datetime.now(datetime.timezone.utc),
+    )
 
 
 async def _upsert_user(
@@ -1,6 +1,5 @@
 import datetime as dt
 
-from slackhealthbot.data.database.models import FitbitDailyActivity
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
 )
@@ -15,13 +14,10 @@ async def do(
     type_ids: set[int],
     slack_repo: RemoteSlackRepository,
 ):
-    list_daily_activities: list[FitbitDailyActivity] = (
-        await local_fitbit_repo.get_daily_activities_by_type(
-            type_ids=type_ids,
-            when=dt.datetime.now(dt.timezone.utc).date(),
-        )
-    )
-    for daily_activity in list_daily_activities:
+    async for daily_activity in local_fitbit_repo.iter_daily_activities_by_type(
+        type_ids=type_ids,
+        when=dt.datetime.now(dt.timezone.utc).date(),
+    ):
         await usecase_process_daily_activity.do(
             local_fitbit_repo=local_fitbit_repo,
             slack_repo=slack_repo,
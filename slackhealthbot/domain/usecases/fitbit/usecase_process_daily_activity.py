@@ -9,6 +9,7 @@ from slackhealthbot.domain.localrepository.localfitbitrepository import (
     UserIdentity,
 )
 from slackhealthbot.domain.models.activity import (
+    ActivityTypeCatalogue,
     DailyActivityHistory,
     DailyActivityStats,
     TopActivityStats,
@@ -19,12 +20,22 @@ from slackhealthbot.domain.remoterepository.remoteslackrepository import (
 from slackhealthbot.domain.usecases.slack import usecase_post_daily_activity
 from slackhealthbot.settings import Settings
 
-activity_names = {
-    55001: "Spinning",
-    90013: "Walking",
-    90019: "Treadmill",
-    90001: "Bike",
-}
+
+@inject
+def get_activity_name(
+    type_id: int,
+    catalogue: ActivityTypeCatalogue = Depends(
+        Provide[Container.activity_type_catalogue]
+    ),
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> str:
+    name = catalogue.names.get(type_id)
+    if name:
+        return name
+    activity_type = settings.app_settings.fitbit.activities.get_activity_type(
+        id=type_id
+    )
+    return activity_type.name if activity_type else "Unknown"
 
 
 @inject
@@ -73,7 +84,7 @@ async def do(
     await usecase_post_daily_activity.do(
         repo=slack_repo,
         slack_alias=user_identity.slack_alias,
-        activity_name=activity_names.get(daily_activity.type_id, "Unknown"),
+        activity_name=get_activity_name(daily_activity.type_id),
         history=history,
         record_history_days=settings.app_settings.fitbit.activities.history_days,
     )
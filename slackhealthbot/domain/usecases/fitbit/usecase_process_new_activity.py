@@ -4,22 +4,23 @@ from dependency_injector.wiring import Provide, inject
 from fastapi import Depends
 
 from slackhealthbot.containers import Container
+from slackhealthbot.core.keyedlocks import KeyedLocks
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
     UserIdentity,
 )
 from slackhealthbot.domain.models.activity import (
+    ActivityCursor,
     ActivityData,
     ActivityHistory,
+    ActivityRecords,
     TopActivityStats,
 )
+from slackhealthbot.domain.models.slacknotification import SlackNotification
 from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
     RemoteFitbitRepository,
 )
-from slackhealthbot.domain.remoterepository.remoteslackrepository import (
-    RemoteSlackRepository,
-)
-from slackhealthbot.domain.usecases.fitbit import usecase_get_last_activity
+from slackhealthbot.domain.usecases.fitbit import usecase_get_new_activities
 from slackhealthbot.domain.usecases.slack import usecase_post_activity
 from slackhealthbot.settings import Settings
 
@@ -28,27 +29,47 @@ from slackhealthbot.settings import Settings
 async def do(  # noqa: PLR0913 deal with this later
     local_fitbit_repo: LocalFitbitRepository,
     remote_fitbit_repo: RemoteFitbitRepository,
-    slack_repo: RemoteSlackRepository,
     fitbit_userid: str,
     when: datetime.datetime,
     settings: Settings = Depends(Provide[Container.settings]),
+    user_locks: KeyedLocks = Depends(Provide[Container.user_locks]),
 ) -> ActivityData | None:
-    user_identity: UserIdentity = (
-        await local_fitbit_repo.get_user_identity_by_fitbit_userid(
+    """
+    Process each of the user's new activities, oldest first.
+
+    :return: the latest of the new activities posted to slack, if any.
+    """
+    # Serialize the work for the same user, across the webhooks and polls.
+    async with user_locks.hold(("fitbit", fitbit_userid)):
+        new_activities = await usecase_get_new_activities.do(
+            local_repo=local_fitbit_repo,
+            remote_repo=remote_fitbit_repo,
             fitbit_userid=fitbit_userid,
+            when=when,
         )
-    )
-    new_activity = await usecase_get_last_activity.do(
-        local_repo=local_fitbit_repo,
-        remote_repo=remote_fitbit_repo,
-        fitbit_userid=fitbit_userid,
-        when=when,
-    )
-    if not new_activity:
-        return None
+        posted_activity_data: ActivityData | None = None
+        for activity_name, new_activity_data in new_activities:
+            if await _process_activity(
+                local_fitbit_repo,
+                fitbit_userid=fitbit_userid,
+                activity_name=activity_name,
+                new_activity_data=new_activity_data,
+                settings=settings,
+            ):
+                posted_activity_data = new_activity_data
+        return posted_activity_data
 
-    activity_name, new_activity_data = new_activity
 
+async def _process_activity(
+    local_fitbit_repo: LocalFitbitRepository,
+    fitbit_userid: str,
+    activity_name: str,
+    new_activity_data: ActivityData,
+    settings: Settings,
+) -> bool:
+    """
+    :return: whether the activity is posted to slack.
+    """
     if not await _is_new_valid_activity(
         local_fitbit_repo,
         fitbit_userid=fitbit_userid,
@@ -56,8 +77,20 @@ async def do(  # noqa: PLR0913 deal with this later
         log_id=new_activity_data.log_id,
         settings=settings,
     ):
-        return None
+        # Move past this activity, even if we ignore it,
+        # so that we don't fetch it again.
+        await _update_activity_cursor(
+            local_fitbit_repo,
+            fitbit_userid=fitbit_userid,
+            activity=new_activity_data,
+        )
+        return False
 
+    user_identity: UserIdentity = (
+        await local_fitbit_repo.get_user_identity_by_fitbit_userid(
+            fitbit_userid=fitbit_userid,
+        )
+    )
     last_activity_data: ActivityData = (
         # Look up the previous activity for this user and type
         # before saving the new activity.
@@ -69,49 +102,64 @@ async def do(  # noqa: PLR0913 deal with this later
         )
     )
 
-    await local_fitbit_repo.create_activity_for_user(
-        fitbit_userid=fitbit_userid,
-        activity=new_activity_data,
+    recent_since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        days=settings.app_settings.fitbit.activities.history_days
     )
-
     report = settings.app_settings.fitbit.activities.get_report(
         activity_type_id=new_activity_data.type_id
     )
-    if report is None or not report.realtime:
-        # This activity isn't to be posted in realtime to slack.
-        # We're done for now.
-        return
 
-    all_time_top_activity_stats: TopActivityStats = (
-        await local_fitbit_repo.get_top_activity_stats_by_user_and_activity_type(
-            fitbit_userid=fitbit_userid,
-            type_id=new_activity_data.type_id,
+    def create_notification(records: ActivityRecords) -> SlackNotification:
+        all_time_top_activity_stats: TopActivityStats = records.get_top_stats()
+        recent_top_activity_stats: TopActivityStats = records.get_top_stats(
+            since=recent_since
         )
-    )
-    recent_top_activity_stats: TopActivityStats = (
-        await local_fitbit_repo.get_top_activity_stats_by_user_and_activity_type(
-            fitbit_userid=fitbit_userid,
-            type_id=new_activity_data.type_id,
-            since=datetime.datetime.now(datetime.timezone.utc)
-            - datetime.timedelta(
-                days=settings.app_settings.fitbit.activities.history_days
+        return usecase_post_activity.create_notification(
+            idempotency_key=f"fitbit-activity-{new_activity_data.log_id}",
+            slack_alias=user_identity.slack_alias,
+            activity_name=activity_name,
+            activity_history=ActivityHistory(
+                latest_activity_data=last_activity_data,
+                new_activity_data=new_activity_data,
+                all_time_top_activity_data=all_time_top_activity_stats,
+                recent_top_activity_data=recent_top_activity_stats,
             ),
+            record_history_days=settings.app_settings.fitbit.activities.history_days,
         )
+
+    is_realtime = report is not None and report.realtime
+    await local_fitbit_repo.create_activity_for_user(
+        fitbit_userid=fitbit_userid,
+        activity=new_activity_data,
+        records_since=recent_since,
+        # The message needs the records including the new activity,
+        # so it's created while the activity is saved.
+        create_notification=create_notification if is_realtime else None,
     )
-    await usecase_post_activity.do(
-        repo=slack_repo,
-        slack_alias=user_identity.slack_alias,
-        activity_name=activity_name,
-        activity_history=ActivityHistory(
-            latest_activity_data=last_activity_data,
-            new_activity_data=new_activity_data,
-            all_time_top_activity_data=all_time_top_activity_stats,
-            recent_top_activity_data=recent_top_activity_stats,
-        ),
-        record_history_days=settings.app_settings.fitbit.activities.history_days,
+    await _update_activity_cursor(
+        local_fitbit_repo,
+        fitbit_userid=fitbit_userid,
+        activity=new_activity_data,
     )
+    # If this activity isn't to be posted in realtime to slack,
+    # we're done for now.
+    return is_realtime
 
-    return new_activity_data
+
+async def _update_activity_cursor(
+    repo: LocalFitbitRepository,
+    fitbit_userid: str,
+    activity: ActivityData,
+):
+    if activity.start_time is None:
+        return
+    await repo.update_activity_cursor(
+        fitbit_userid=fitbit_userid,
+        activity_cursor=ActivityCursor(
+            start_time=activity.start_time,
+            log_id=activity.log_id,
+        ),
+    )
 
 
 async def _is_new_valid_activity(
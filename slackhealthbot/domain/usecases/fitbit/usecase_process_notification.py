@@ -0,0 +1,44 @@
+import datetime
+
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.models.subscription import CollectionType
+from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
+    RemoteFitbitRepository,
+)
+from slackhealthbot.domain.usecases.fitbit import (
+    usecase_process_new_activity,
+    usecase_process_new_sleep,
+)
+
+
+async def do(
+    local_fitbit_repo: LocalFitbitRepository,
+    remote_fitbit_repo: RemoteFitbitRepository,
+    fitbit_userid: str,
+    collection_type: str | None,
+    when: datetime.date | None,
+) -> bool:
+    """
+    Process the new data of a webhook notification.
+
+    :return: whether new data was found.
+    """
+    if collection_type == CollectionType.SLEEP:
+        new_sleep_data = await usecase_process_new_sleep.do(
+            local_fitbit_repo=local_fitbit_repo,
+            remote_fitbit_repo=remote_fitbit_repo,
+            fitbit_userid=fitbit_userid,
+            when=when,
+        )
+        return bool(new_sleep_data)
+    if collection_type == CollectionType.ACTIVITIES:
+        activity_history = await usecase_process_new_activity.do(
+            local_fitbit_repo=local_fitbit_repo,
+            remote_fitbit_repo=remote_fitbit_repo,
+            fitbit_userid=fitbit_userid,
+            when=datetime.datetime.now(),
+        )
+        return bool(activity_history)
+    return False
@@ -0,0 +1,58 @@
+import datetime
+import logging
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.core.keyedlocks import KeyedLocks
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+    User,
+)
+from slackhealthbot.domain.models.subscription import CollectionType
+from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
+    RemoteFitbitRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@inject
+async def do(
+    local_repo: LocalFitbitRepository,
+    remote_repo: RemoteFitbitRepository,
+    fitbit_userid: str,
+    user_locks: KeyedLocks = Depends(Provide[Container.user_locks]),
+) -> set[CollectionType]:
+    """
+    Check that the user's subscriptions still exist on fitbit,
+    recreate the missing ones, and record which ones exist.
+
+    :return: the collection types which the user is subscribed to.
+    :raises:
+        UserLoggedOutException if the refresh token request fails
+    """
+    # Serialize the work for the same user, across the webhooks and polls.
+    async with user_locks.hold(("fitbit", fitbit_userid)):
+        user: User = await local_repo.get_user_by_fitbit_userid(
+            fitbit_userid=fitbit_userid,
+        )
+        collection_types = await remote_repo.get_subscriptions(
+            oauth_fields=user.oauth_data,
+        )
+        missing_collection_types = set(CollectionType) - collection_types
+        if missing_collection_types:
+            logger.info(
+                f"Recreating fitbit subscriptions {missing_collection_types} for user"
+            )
+            collection_types |= await remote_repo.subscribe(
+                oauth_fields=user.oauth_data,
+                collection_types=missing_collection_types,
+            )
+        await local_repo.update_subscriptions(
+            fitbit_userid=fitbit_userid,
+            collection_types=collection_types,
+            verified_at=datetime.datetime.now(datetime.timezone.utc),
+        )
+        return collection_types
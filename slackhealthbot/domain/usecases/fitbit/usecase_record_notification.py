@@ -0,0 +1,34 @@
+import datetime
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.models.subscription import CollectionType
+from slackhealthbot.settings import Settings
+
+
+@inject
+async def do(
+    local_fitbit_repo: LocalFitbitRepository,
+    fitbit_userid: str,
+    collection_type: str,
+    settings: Settings = Depends(Provide[Container.settings]),
+):
+    """
+    Record that the webhook of the given collection type works for the user,
+    if the poll needs to know it.
+    """
+    if (
+        settings.app_settings.fitbit.poll.webhook_silence_threshold_seconds is None
+        or collection_type not in list(CollectionType)
+    ):
+        return
+    await local_fitbit_repo.record_notification(
+        fitbit_userid=fitbit_userid,
+        collection_type=CollectionType(collection_type),
+        notified_at=datetime.datetime.now(datetime.timezone.utc),
+    )
@@ -0,0 +1,68 @@
+import datetime
+import logging
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.core.exceptions import UserLoggedOutException
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.models.activity import ActivityTypeCatalogue
+from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
+    RemoteFitbitRepository,
+)
+from slackhealthbot.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+@inject
+async def do(
+    local_fitbit_repo: LocalFitbitRepository,
+    remote_fitbit_repo: RemoteFitbitRepository,
+    catalogue: ActivityTypeCatalogue = Depends(
+        Provide[Container.activity_type_catalogue]
+    ),
+    settings: Settings = Depends(Provide[Container.settings]),
+):
+    """
+    Make sure the in-memory catalogue of activity types is fresh.
+
+    The catalogue is loaded from the database, and only fetched from fitbit
+    if the stored copy is older than the ttl.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    ttl = datetime.timedelta(
+        seconds=settings.app_settings.fitbit.activities.activity_type_catalogue_ttl_seconds
+    )
+    if not catalogue.is_stale(now=now, ttl=ttl):
+        return
+
+    # Another replica may have refreshed the stored copy.
+    stored_catalogue = await local_fitbit_repo.get_activity_type_catalogue()
+    if not stored_catalogue.is_stale(now=now, ttl=ttl):
+        catalogue.names = stored_catalogue.names
+        catalogue.refreshed_at = stored_catalogue.refreshed_at
+        return
+    # Keep serving the stale names if we can't refresh them.
+    catalogue.names = stored_catalogue.names
+
+    # The activity types are the same for everyone: any user's token will do.
+    async for user_identity in local_fitbit_repo.iter_user_identities():
+        oauth_data = await local_fitbit_repo.get_oauth_data_by_fitbit_userid(
+            fitbit_userid=user_identity.fitbit_userid,
+        )
+        try:
+            names = await remote_fitbit_repo.get_activity_types(
+                oauth_fields=oauth_data,
+            )
+        except UserLoggedOutException:
+            continue
+        await local_fitbit_repo.upsert_activity_types(names=names, refreshed_at=now)
+        logger.info(f"Refreshed {len(names)} fitbit activity types")
+        catalogue.names = {**stored_catalogue.names, **names}
+        catalogue.refreshed_at = now
+        return
+    logger.info("No logged-in fitbit user to refresh the activity types with")
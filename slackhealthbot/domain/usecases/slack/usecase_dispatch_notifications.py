@@ -0,0 +1,162 @@
+import datetime
+import logging
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.core.exceptions import CircuitOpenException
+from slackhealthbot.domain.localrepository.localslackoutboxrepository import (
+    LocalSlackOutboxRepository,
+)
+from slackhealthbot.domain.models.slacknotification import QueuedSlackNotification
+from slackhealthbot.domain.remoterepository.remoteslackrepository import (
+    RemoteSlackRepository,
+)
+from slackhealthbot.domain.usecases.failedevents.usecase_record_failed_event import (
+    format_error,
+)
+from slackhealthbot.settings import Settings, SlackOutbox
+
+logger = logging.getLogger(__name__)
+
+# How long a replica has to post a notification it claimed,
+# before the other replicas can post it. The claim is renewed before
+# each post, so this only needs to cover a single post: slack posts
+# aren't retried, and time out well within it.
+_CLAIM_LEASE = datetime.timedelta(minutes=1)
+
+
+def get_next_attempt_at(
+    attempts: int,
+    outbox_settings: SlackOutbox,
+) -> datetime.datetime | None:
+    """
+    :return: when to post again a notification which failed the given
+        number of times, or None to give up.
+    """
+    if attempts >= outbox_settings.max_attempts:
+        return None
+    delay_s = min(
+        outbox_settings.backoff_max_seconds,
+        outbox_settings.backoff_base_seconds * 2 ** (attempts - 1),
+    )
+    return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=delay_s
+    )
+
+
+async def _record_failed_post(
+    local_slack_outbox_repo: LocalSlackOutboxRepository,
+    notification: QueuedSlackNotification,
+    claimed_until: datetime.datetime,
+    error: Exception,
+    outbox_settings: SlackOutbox,
+):
+    attempts = notification.attempts + 1
+    next_attempt_at = get_next_attempt_at(
+        attempts=attempts,
+        outbox_settings=outbox_settings,
+    )
+    if next_attempt_at is None:
+        logger.error(f"Giving up posting slack notification {notification.id}")
+    if not await local_slack_outbox_repo.update_notification(
+        id=notification.id,
+        claimed_until=claimed_until,
+        error=format_error(error),
+        attempts=attempts,
+        next_attempt_at=next_attempt_at,
+    ):
+        logger.warning(
+            f"Slack notification {notification.id} was claimed by another replica"
+        )
+
+
+@inject
+async def do(
+    local_slack_outbox_repo: LocalSlackOutboxRepository,
+    slack_repo: RemoteSlackRepository,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> tuple[int, int]:
+    """
+    Post the due notifications of the outbox, the oldest first,
+    reading them a batch at a time.
+
+    A notification can be posted twice, if we stop after posting it
+    and before marking it as sent, or if posting it takes longer than
+    our claim's lease.
+
+    :return: the number of notifications sent, and of failed posts.
+    """
+    outbox_settings = settings.app_settings.slack.outbox
+    sent = failed = 0
+    while True:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        lease_until = now + _CLAIM_LEASE
+        notifications = await local_slack_outbox_repo.claim_due_notifications(
+            now=now,
+            lease_until=lease_until,
+            limit=outbox_settings.batch_size,
+        )
+        unattempted_ids: list[int] = []
+        for index, notification in enumerate(notifications):
+            # Renew the claim before each post, so that it doesn't expire
+            # while we post the rest of the batch.
+            claimed_until = datetime.datetime.now(datetime.timezone.utc) + _CLAIM_LEASE
+            if not await local_slack_outbox_repo.renew_notification_claim(
+                id=notification.id,
+                claimed_until=lease_until,
+                lease_until=claimed_until,
+            ):
+                logger.warning(
+                    f"Slack notification {notification.id} "
+                    "was claimed by another replica"
+                )
+                continue
+            try:
+                await slack_repo.post_message(notification.message)
+            except CircuitOpenException:
+                # Slack is unavailable: try again in the next cycle.
+                await local_slack_outbox_repo.postpone_notifications(
+                    ids=[notification.id],
+                    claimed_until=claimed_until,
+                    next_attempt_at=now,
+                )
+                unattempted_ids = [x.id for x in notifications[index + 1 :]]
+                break
+            except Exception as e:
+                logger.warning(
+                    f"Error posting slack notification {notification.id}",
+                    exc_info=True,
+                )
+                failed += 1
+                await _record_failed_post(
+                    local_slack_outbox_repo,
+                    notification=notification,
+                    claimed_until=claimed_until,
+                    error=e,
+                    outbox_settings=outbox_settings,
+                )
+                # Slack is likely failing: leave the rest of the batch
+                # to the next cycle.
+                unattempted_ids = [x.id for x in notifications[index + 1 :]]
+                break
+            sent += 1
+            if not await local_slack_outbox_repo.mark_notification_sent(
+                id=notification.id,
+                claimed_until=claimed_until,
+                sent_at=datetime.datetime.now(datetime.timezone.utc),
+            ):
+                logger.warning(
+                    f"Slack notification {notification.id} was claimed "
+                    "by another replica while we posted it"
+                )
+        if unattempted_ids:
+            await local_slack_outbox_repo.postpone_notifications(
+                ids=unattempted_ids,
+                claimed_until=lease_until,
+                next_attempt_at=now,
+            )
+            return sent, failed
+        if len(notifications) < outbox_settings.batch_size:
+            return sent, failed
@@ -3,9 +3,7 @@ from fastapi import Depends
 
 from slackhealthbot.containers import Container
 from slackhealthbot.domain.models.activity import ActivityHistory
-from slackhealthbot.domain.remoterepository.remoteslackrepository import (
-    RemoteSlackRepository,
-)
+from slackhealthbot.domain.models.slacknotification import SlackNotification
 from slackhealthbot.domain.usecases.slack.usecase_activity_message_formatter import (
     format_activity_zone,
     get_activity_calories_change_icon,
@@ -16,17 +14,20 @@ from slackhealthbot.domain.usecases.slack.usecase_activity_message_formatter imp
 from slackhealthbot.settings import ReportField, Settings
 
 
-async def do(
-    repo: RemoteSlackRepository,
+def create_notification(
+    idempotency_key: str,
     slack_alias: str,
     activity_name: str,
     activity_history: ActivityHistory,
     record_history_days: int,
-):
+) -> SlackNotification:
     message = create_message(
         slack_alias, activity_name, activity_history, record_history_days
     )
-    await repo.post_message(message.strip())
+    return SlackNotification(
+        idempotency_key=idempotency_key,
+        message=message.strip(),
+    )
 
 
 @inject
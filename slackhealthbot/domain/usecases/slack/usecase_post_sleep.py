@@ -1,23 +1,23 @@
 import datetime
 
+from slackhealthbot.domain.models.slacknotification import SlackNotification
 from slackhealthbot.domain.models.sleep import SleepData
-from slackhealthbot.domain.remoterepository.remoteslackrepository import (
-    RemoteSlackRepository,
-)
 
 
-async def do(
-    repo: RemoteSlackRepository,
+def create_notification(
+    idempotency_key: str,
     slack_alias: str,
     new_sleep_data: SleepData,
     last_sleep_data: SleepData,
-):
-    message = create_message(
-        slack_alias=slack_alias,
-        new_sleep_data=new_sleep_data,
-        last_sleep_data=last_sleep_data,
+) -> SlackNotification:
+    return SlackNotification(
+        idempotency_key=idempotency_key,
+        message=create_message(
+            slack_alias=slack_alias,
+            new_sleep_data=new_sleep_data,
+            last_sleep_data=last_sleep_data,
+        ),
     )
-    await repo.post_message(message)
 
 
 def create_message(
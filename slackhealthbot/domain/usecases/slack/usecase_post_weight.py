@@ -1,19 +1,17 @@
+from slackhealthbot.domain.models.slacknotification import SlackNotification
 from slackhealthbot.domain.models.weight import WeightData
-from slackhealthbot.domain.remoterepository.remoteslackrepository import (
-    RemoteSlackRepository,
-)
 
 
-async def do(
-    repo: RemoteSlackRepository,
+def create_notification(
+    idempotency_key: str,
     weight_data: WeightData,
-):
+) -> SlackNotification:
     icon = _get_weight_change_icon(weight_data)
     message = (
         f"New weight from <@{weight_data.slack_alias}>: "
         + f"{weight_data.weight_kg:.2f} kg. {icon}"
     )
-    await repo.post_message(message)
+    return SlackNotification(idempotency_key=idempotency_key, message=message)
 
 
 WEIGHT_CHANGE_KG_SMALL = 0.1
@@ -2,6 +2,7 @@ from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.domain.localrepository.localwithingsrepository import (
     LocalWithingsRepository,
 )
+from slackhealthbot.domain.models.weight import WeightMeasure
 from slackhealthbot.domain.remoterepository.remotewithingsrepository import (
     RemoteWithingsRepository,
 )
@@ -13,11 +14,11 @@ async def do(
     withings_userid: str,
     startdate: int,
     enddate: int,
-) -> float:
+) -> WeightMeasure | None:
     oauth_fields: OAuthFields = await local_repo.get_oauth_data_by_withings_userid(
         withings_userid=withings_userid,
     )
-    return await remote_repo.get_last_weight_kg(
+    return await remote_repo.get_last_weight(
         oauth_fields=oauth_fields,
         startdate=startdate,
         enddate=enddate,
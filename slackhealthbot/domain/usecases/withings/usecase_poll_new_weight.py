@@ -0,0 +1,65 @@
+import datetime
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.core.keyedlocks import KeyedLocks
+from slackhealthbot.domain.localrepository.localwithingsrepository import (
+    LocalWithingsRepository,
+    User,
+)
+from slackhealthbot.domain.models.weight import WeightUpdates
+from slackhealthbot.domain.remoterepository.remotewithingsrepository import (
+    RemoteWithingsRepository,
+)
+from slackhealthbot.domain.usecases.withings import usecase_save_new_weight
+
+
+@inject
+async def do(
+    local_withings_repo: LocalWithingsRepository,
+    remote_withings_repo: RemoteWithingsRepository,
+    withings_userid: str,
+    user_locks: KeyedLocks = Depends(Provide[Container.user_locks]),
+) -> float | None:
+    """
+    Fetch the weights measured or modified since the user's measures cursor,
+    and post the latest one, if it was measured after the user's last weight.
+
+    :return: the new weight, if any.
+    :raises:
+        UserLoggedOutException if the refresh token request fails
+    """
+    # Serialize the work for the same user, across the webhooks and polls.
+    async with user_locks.hold(("withings", withings_userid)):
+        user: User = await local_withings_repo.get_user_by_withings_userid(
+            withings_userid=withings_userid,
+        )
+        if user.measures_cursor is None:
+            # Don't post the weights from before the first poll.
+            await local_withings_repo.update_measures_cursor(
+                withings_userid=withings_userid,
+                measures_cursor=int(
+                    datetime.datetime.now(datetime.timezone.utc).timestamp()
+                ),
+            )
+            return None
+
+        weight_updates: WeightUpdates = await remote_withings_repo.get_weight_updates(
+            oauth_fields=user.oauth_data,
+            lastupdate=user.measures_cursor,
+        )
+        if weight_updates.last_weight is not None and await usecase_save_new_weight.do(
+            local_withings_repo=local_withings_repo,
+            user=user,
+            weight_measure=weight_updates.last_weight,
+            measures_cursor=weight_updates.updatetime,
+        ):
+            return weight_updates.last_weight.weight_kg
+        # Don't fetch the same updates again.
+        await local_withings_repo.update_measures_cursor(
+            withings_userid=withings_userid,
+            measures_cursor=weight_updates.updatetime,
+        )
+        return None
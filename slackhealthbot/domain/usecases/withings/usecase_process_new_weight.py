@@ -1,18 +1,22 @@
 import dataclasses
 
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.core.keyedlocks import KeyedLocks
 from slackhealthbot.domain.localrepository.localwithingsrepository import (
     LocalWithingsRepository,
     User,
 )
-from slackhealthbot.domain.models.weight import WeightData
-from slackhealthbot.domain.remoterepository.remoteslackrepository import (
-    RemoteSlackRepository,
-)
+from slackhealthbot.domain.models.weight import WeightMeasure
 from slackhealthbot.domain.remoterepository.remotewithingsrepository import (
     RemoteWithingsRepository,
 )
-from slackhealthbot.domain.usecases.slack import usecase_post_weight
-from slackhealthbot.domain.usecases.withings import usecase_get_last_weight
+from slackhealthbot.domain.usecases.withings import (
+    usecase_get_last_weight,
+    usecase_save_new_weight,
+)
 
 
 @dataclasses.dataclass
@@ -22,33 +26,31 @@ class NewWeightParameters:
     enddate: int
 
 
+@inject
 async def do(
     local_withings_repo: LocalWithingsRepository,
     remote_withings_repo: RemoteWithingsRepository,
-    slack_repo: RemoteSlackRepository,
     new_weight_parameters: NewWeightParameters,
+    user_locks: KeyedLocks = Depends(Provide[Container.user_locks]),
 ):
-    user: User = await local_withings_repo.get_user_by_withings_userid(
-        withings_userid=new_weight_parameters.withings_userid,
-    )
-    previous_weight_kg: float = user.fitness_data.last_weight_kg
-
-    new_weight_kg: float = await usecase_get_last_weight.do(
-        local_repo=local_withings_repo,
-        remote_repo=remote_withings_repo,
-        withings_userid=new_weight_parameters.withings_userid,
-        startdate=new_weight_parameters.startdate,
-        enddate=new_weight_parameters.enddate,
-    )
-    await local_withings_repo.update_user_weight(
-        withings_userid=new_weight_parameters.withings_userid,
-        last_weight_kg=new_weight_kg,
-    )
-    await usecase_post_weight.do(
-        repo=slack_repo,
-        weight_data=WeightData(
-            weight_kg=new_weight_kg,
-            slack_alias=user.identity.slack_alias,
-            last_weight_kg=previous_weight_kg,
-        ),
-    )
+    # Serialize the work for the same user, across the webhooks and polls.
+    async with user_locks.hold(("withings", new_weight_parameters.withings_userid)):
+        user: User = await local_withings_repo.get_user_by_withings_userid(
+            withings_userid=new_weight_parameters.withings_userid,
+        )
+        weight_measure: WeightMeasure | None = await usecase_get_last_weight.do(
+            local_repo=local_withings_repo,
+            remote_repo=remote_withings_repo,
+            withings_userid=new_weight_parameters.withings_userid,
+            startdate=new_weight_parameters.startdate,
+            enddate=new_weight_parameters.enddate,
+        )
+        if weight_measure is None:
+            return
+        # The measures cursor is left to the poll: it's the time of withings'
+        # last update, which the notification doesn't tell.
+        await usecase_save_new_weight.do(
+            local_withings_repo=local_withings_repo,
+            user=user,
+            weight_measure=weight_measure,
+        )
@@ -0,0 +1,43 @@
+from slackhealthbot.domain.localrepository.localwithingsrepository import (
+    LocalWithingsRepository,
+    User,
+)
+from slackhealthbot.domain.models.weight import WeightData, WeightMeasure
+from slackhealthbot.domain.usecases.slack import usecase_post_weight
+
+
+async def do(
+    local_withings_repo: LocalWithingsRepository,
+    user: User,
+    weight_measure: WeightMeasure,
+    measures_cursor: int | None = None,
+) -> bool:
+    """
+    Save the weight and post it to slack, unless it wasn't measured after
+    the user's last weight: then it's an old measure which was edited,
+    or a measure which the webhook and the poll both fetched.
+
+    :param measures_cursor: if provided, the user's measures cursor is
+        moved forward to this time along with the weight.
+    :return: whether the weight was new.
+    """
+    last_weight_date = user.fitness_data.last_weight_date
+    if last_weight_date is not None and weight_measure.date <= last_weight_date:
+        return False
+    await local_withings_repo.update_user_weight(
+        withings_userid=user.identity.withings_userid,
+        last_weight_kg=weight_measure.weight_kg,
+        last_weight_date=weight_measure.date,
+        measures_cursor=measures_cursor,
+        notification=usecase_post_weight.create_notification(
+            # The same for the webhook and the poll, which may both fetch it.
+            idempotency_key=f"withings-weight-{user.identity.withings_userid}-"
+            f"{weight_measure.date}",
+            weight_data=WeightData(
+                weight_kg=weight_measure.weight_kg,
+                slack_alias=user.identity.slack_alias,
+                last_weight_kg=user.fitness_data.last_weight_kg,
+            ),
+        ),
+    )
+    return True
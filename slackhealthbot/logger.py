@@ -3,20 +3,83 @@ Middleware which adds a correlation id to the response headers and logs.
 https://github.com/snok/asgi-correlation-id/blob/main/README.md#integration-with-uvicorn
 """
 
+import json
 import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
 
 from asgi_correlation_id import CorrelationIdFilter
-from pydantic.v1.utils import deep_update
 from uvicorn.config import LOGGING_CONFIG
 
+from slackhealthbot.core.dicts import deep_update
+from slackhealthbot.settings import LogFormat, Logging
+
 logging_format_prefix = "%(asctime)s [%(name)-14s]"
 
+# Payloads are only logged if enabled in the settings:
+# they're large, and logged on the hot paths.
+payload_logger = logging.getLogger("slackhealthbot.payloads")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records below WARNING, per logger.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._logger_rates: dict[str, float] = {}
+
+    def _get_rate(self, logger_name: str) -> float:
+        rate = self._logger_rates.get(logger_name)
+        if rate is None:
+            # Use the rate of the closest configured ancestor.
+            name = logger_name
+            while name and name not in self.rates:
+                name = name.rpartition(".")[0]
+            rate = self.rates.get(name, 1.0)
+            self._logger_rates[logger_name] = rate
+        return rate
 
-def get_uvicorn_log_config() -> dict:
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self._get_rate(record.name)
+
+
+def get_uvicorn_log_config(log_format: LogFormat = LogFormat.text) -> dict:
     """
     Return a logging config for uvicorn with timestamps added,
     and the correlation-id added to access logs.
     """
+    if log_format == LogFormat.json:
+        formatters = {
+            "access": {"()": JsonFormatter},
+            "default": {"()": JsonFormatter},
+        }
+        return {
+            **deep_update(
+                LOGGING_CONFIG,
+                {"handlers": {"access": {"filters": [CorrelationIdFilter()]}}},
+            ),
+            "formatters": formatters,
+        }
     return deep_update(
         LOGGING_CONFIG,
         {
@@ -35,15 +98,46 @@ def get_uvicorn_log_config() -> dict:
     )
 
 
-def configure_logging(sql_log_level: str):
-    # This setup impacts the logs sent from our own code as well as logs from httpx.
+def configure_logging(logging_settings: Logging) -> QueueListener:
+    """
+    This setup impacts the logs sent from our own code as well as logs from httpx.
+
+    The records are written to the console by a listener thread, so that logging
+    doesn't block the event loop.
+
+    :return: the started listener, to stop when the app shuts down.
+    """
     console_handler = logging.StreamHandler()
-    console_handler.addFilter(CorrelationIdFilter())
-    logging.getLogger("sqlalchemy.engine").setLevel(getattr(logging, sql_log_level))
-
-    logging.basicConfig(
-        handlers=[console_handler],
-        format=logging_format_prefix
-        + " %(levelname)-9s [%(correlation_id)s] %(message)s",
-        level=logging.INFO,
+    if logging_settings.format == LogFormat.json:
+        console_handler.setFormatter(JsonFormatter())
+    else:
+        console_handler.setFormatter(
+            logging.Formatter(
+                logging_format_prefix
+                + " %(levelname)-9s [%(correlation_id)s] %(message)s"
+            )
+        )
+    listener = QueueListener(queue.SimpleQueue(), console_handler)
+
+    queue_handler = QueueHandler(listener.queue)
+    # The filters run in the logging thread, where the correlation id is known,
+    # and before the records are queued.
+    queue_handler.addFilter(CorrelationIdFilter())
+    if logging_settings.sampling_rates:
+        queue_handler.addFilter(SamplingFilter(logging_settings.sampling_rates))
+
+    root_logger = logging.getLogger()
+    # Replace the handler of a previous configuration.
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, QueueHandler):
+            root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(logging.INFO)
+    logging.getLogger("sqlalchemy.engine").setLevel(
+        getattr(logging, logging_settings.sql_log_level)
+    )
+    payload_logger.setLevel(
+        logging.DEBUG if logging_settings.log_payloads else logging.NOTSET
     )
+    listener.start()
+    return listener
@@ -1,16 +1,29 @@
-import random
-import string
+import asyncio
+import importlib.util
+import logging
+import os
+import secrets
 from asyncio import Task
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
+from typing import IO
 
 import uvicorn
 from asgi_correlation_id import CorrelationIdMiddleware
-from fastapi import FastAPI, Response
+from fastapi import FastAPI, Request, Response
 from starlette.middleware import Middleware
 from starlette.middleware.sessions import SessionMiddleware
 
 from slackhealthbot import logger
 from slackhealthbot.containers import Container
+from slackhealthbot.core import leaderlock
+from slackhealthbot.core.startupphases import StartupPhases
+from slackhealthbot.data.database import migrations
+from slackhealthbot.data.database.connection import count_queries, get_connection_url
+from slackhealthbot.data.database.writer import (
+    GroupCommitWriter,
+    create_writer_session_maker,
+)
 from slackhealthbot.domain.usecases.fitbit.usecase_update_user_oauth import (
     UpdateTokenUseCase as FitbitUpdateTokenUseCase,
 )
@@ -19,80 +32,235 @@ from slackhealthbot.domain.usecases.withings.usecase_update_user_oauth import (
 )
 from slackhealthbot.oauth import fitbitconfig as oauth_fitbit
 from slackhealthbot.oauth import withingsconfig as oauth_withings
+from slackhealthbot.oauth.config import SharedTransport
 from slackhealthbot.routers.dependencies import (
+    failed_event_repository_factory,
     fitbit_repository_factory,
     get_remote_fitbit_repository,
     get_remote_withings_repository,
     get_slack_repository,
     request_context_fitbit_repository,
     request_context_withings_repository,
+    slack_outbox_repository_factory,
+    withings_repository_factory,
 )
 from slackhealthbot.routers.fitbit import router as fitbit_router
+from slackhealthbot.routers.withings import process_pending_withings_notifications
 from slackhealthbot.routers.withings import router as withings_router
-from slackhealthbot.settings import Settings
-from slackhealthbot.tasks import fitbitpoll
+from slackhealthbot.settings import RuntimeProfile, Server, Settings
+from slackhealthbot.tasks import (
+    failedeventsreplay,
+    fitbitactivitiesretention,
+    fitbitactivitytypes,
+    fitbitpoll,
+    fitbitsubscriptions,
+    slackoutbox,
+    withingspoll,
+)
+from slackhealthbot.tasks.failedeventsreplay import ReplayRepositories
 from slackhealthbot.tasks.post_daily_activities_task import post_daily_activities
 
 
-@asynccontextmanager
-async def lifespan(_app: FastAPI):
-    settings: Settings = _app.container.settings.provided()
-    logger.configure_logging(settings.app_settings.logging.sql_log_level)
-    oauth_withings.configure(
+def configure_oauth_clients() -> tuple[SharedTransport, SharedTransport]:
+    """
+    :return: the connection pools of withings and fitbit, to close on shutdown.
+    """
+    withings_transport = oauth_withings.configure(
         WithingsUpdateTokenUseCase(
             request_context_withings_repository,
             remote_repo=get_remote_withings_repository(),
         )
     )
-    oauth_fitbit.configure(
+    fitbit_transport = oauth_fitbit.configure(
         FitbitUpdateTokenUseCase(
             request_context_fitbit_repository,
             remote_repo=get_remote_fitbit_repository(),
         )
     )
-    schedule_task = None
-    if settings.app_settings.fitbit.poll.enabled:
-        schedule_task = await fitbitpoll.schedule_fitbit_poll(
-            local_fitbit_repo_factory=fitbit_repository_factory(),
-            remote_fitbit_repo=get_remote_fitbit_repository(),
-            slack_repo=get_slack_repository(),
-            initial_delay_s=10,
+    return withings_transport, fitbit_transport
+
+
+def get_replay_repositories() -> ReplayRepositories:
+    return ReplayRepositories(
+        local_failed_event_repo_factory=failed_event_repository_factory(),
+        local_fitbit_repo_factory=fitbit_repository_factory(),
+        remote_fitbit_repo=get_remote_fitbit_repository(),
+        local_withings_repo_factory=withings_repository_factory(),
+        remote_withings_repo=get_remote_withings_repository(),
+    )
+
+
+def get_leader_lock_path(database_path: Path) -> Path:
+    """
+    :return: the lock file held by the worker which runs the single-worker tasks.
+    """
+    return database_path.with_name(f"{database_path.name}.leader.lock")
+
+
+async def schedule_leader_tasks(settings: Settings) -> list[Task]:
+    """
+    Schedule the periodic tasks which must run in a single worker:
+    they don't coordinate with the other workers.
+    """
+    tasks: list[Task] = []
+    if settings.app_settings.withings.poll.enabled:
+        tasks.append(
+            await withingspoll.schedule_withings_poll(
+                local_withings_repo_factory=withings_repository_factory(),
+                remote_withings_repo=get_remote_withings_repository(),
+                slack_repo=get_slack_repository(),
+                initial_delay_s=30,
+            )
+        )
+    if settings.app_settings.fitbit.subscriptions.reconcile:
+        tasks.append(
+            await fitbitsubscriptions.schedule_fitbit_subscriptions_reconciliation(
+                local_fitbit_repo_factory=fitbit_repository_factory(),
+                remote_fitbit_repo=get_remote_fitbit_repository(),
+                initial_delay_s=60,
+            )
+        )
+    if settings.app_settings.fitbit.activities.retention.enabled:
+        tasks.append(
+            await fitbitactivitiesretention.schedule_activities_retention(
+                local_fitbit_repo_factory=fitbit_repository_factory(),
+                initial_delay_s=300,
+            )
         )
-    daily_activity_task: Task | None = None
     daily_activity_type_ids = (
         settings.app_settings.fitbit.activities.daily_activity_type_ids
     )
     if daily_activity_type_ids:
-        daily_activity_task = await post_daily_activities(
-            local_fitbit_repo_factory=fitbit_repository_factory(),
-            activity_type_ids=set(daily_activity_type_ids),
+        tasks.append(
+            await fitbitactivitytypes.schedule_activity_types_refresh(
+                local_fitbit_repo_factory=fitbit_repository_factory(),
+                remote_fitbit_repo=get_remote_fitbit_repository(),
+                initial_delay_s=10,
+            )
+        )
+        tasks.append(
+            await post_daily_activities(
+                local_fitbit_repo_factory=fitbit_repository_factory(),
+                activity_type_ids=set(daily_activity_type_ids),
+                slack_repo=get_slack_repository(),
+                post_time=settings.app_settings.fitbit.activities.daily_report_time,
+            )
+        )
+    return tasks
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    with startup_phases.measure("lifespan"):
+        settings: Settings = _app.container.settings.provided()
+        log_listener = logger.configure_logging(settings.app_settings.logging)
+        writer: GroupCommitWriter | None = None
+        if settings.app_settings.database_writer.group_commit:
+            writer = GroupCommitWriter(
+                session_maker=create_writer_session_maker(get_connection_url()),
+                max_batch_size=settings.app_settings.database_writer.max_batch_size,
+            )
+            writer.start()
+            _app.container.group_commit_writer.override(writer)
+        withings_transport, fitbit_transport = configure_oauth_clients()
+        outbox_stopping = asyncio.Event()
+        outbox_task = await slackoutbox.schedule_slack_outbox_dispatch(
+            local_slack_outbox_repo_factory=slack_outbox_repository_factory(),
             slack_repo=get_slack_repository(),
-            post_time=settings.app_settings.fitbit.activities.daily_report_time,
+            stopping=outbox_stopping,
         )
+        schedule_task = None
+        if settings.app_settings.fitbit.poll.enabled:
+            schedule_task = await fitbitpoll.schedule_fitbit_poll(
+                local_fitbit_repo_factory=fitbit_repository_factory(),
+                remote_fitbit_repo=get_remote_fitbit_repository(),
+                slack_repo=get_slack_repository(),
+                initial_delay_s=10,
+                local_failed_event_repo_factory=failed_event_repository_factory(),
+            )
+        # The other periodic tasks, cancelled on shutdown.
+        tasks: list[Task] = []
+        if settings.app_settings.failed_events.replay:
+            tasks.append(
+                await failedeventsreplay.schedule_failed_events_replay(
+                    repos=get_replay_repositories(),
+                    initial_delay_s=20,
+                )
+            )
+        # With several workers, the first one to take the lock runs
+        # the tasks which must run once.
+        leader_lock: IO | None = None
+        if settings.app_settings.server.workers > 1:
+            leader_lock = leaderlock.try_acquire(
+                get_leader_lock_path(Path(settings.app_settings.database_path))
+            )
+        if settings.app_settings.server.workers == 1 or leader_lock:
+            tasks.extend(await schedule_leader_tasks(settings))
+        else:
+            logging.info("Another worker runs the single-worker tasks")
+    logging.info(f"Startup phases: {startup_phases.format()}")
     yield
     if schedule_task:
         schedule_task.cancel()
-    if daily_activity_task:
-        daily_activity_task.cancel()
-
-
-app = FastAPI(
-    middleware=[
-        Middleware(CorrelationIdMiddleware),
-        Middleware(
-            SessionMiddleware,
-            secret_key="".join(
-                random.choice(string.ascii_lowercase) for i in range(32)
-            ),
-        ),
-    ],
-    lifespan=lifespan,
-)
+        # Let the poll task clean up, before the event loop is closed.
+        with suppress(asyncio.CancelledError):
+            await schedule_task
+    for task in tasks:
+        task.cancel()
+    if leader_lock:
+        leader_lock.close()
+    await process_pending_withings_notifications()
+    # Post the notifications queued by the requests and tasks.
+    outbox_stopping.set()
+    await outbox_task
+    if writer:
+        # Apply the writes queued by the requests and tasks.
+        await writer.stop()
+        _app.container.group_commit_writer.reset_override()
+    await withings_transport.close_pool()
+    await fitbit_transport.close_pool()
+    # Flush the queued logs.
+    log_listener.stop()
 
-container = Container()
-app.container = container
-app.include_router(withings_router)
-app.include_router(fitbit_router)
+
+startup_phases = StartupPhases()
+with startup_phases.measure("container"):
+    # Wiring the container imports and inspects the wired modules: about 0.1s.
+    # It's eager: the Provide defaults of the use cases and tasks are only
+    # resolved in wired modules, so it can't be limited to the routers.
+    container = Container()
+
+
+def get_session_secret_key() -> str:
+    """
+    The key signing the session cookies, which keep the oauth state between
+    the login redirect and the oauth callback.
+
+    The workers must use the same key, as the callback can land on
+    another worker than the login.
+    """
+    return container.secret_settings().session_secret_key or secrets.token_urlsafe(32)
+
+
+with startup_phases.measure("app"):
+    app = FastAPI(
+        middleware=[
+            Middleware(CorrelationIdMiddleware),
+            Middleware(SessionMiddleware, secret_key=get_session_secret_key()),
+        ],
+        lifespan=lifespan,
+    )
+    app.container = container
+    app.include_router(withings_router)
+    app.include_router(fitbit_router)
+
+
+@app.middleware("http")
+async def log_query_count(request: Request, call_next):
+    with count_queries() as query_counter:
+        response = await call_next(request)
+    logging.debug(f"{request.method} {request.url.path}: {query_counter.count} queries")
+    return response
 
 
 @app.head("/")
@@ -100,10 +268,78 @@ def validate_root():
     return Response()
 
 
-if __name__ == "__main__":
+@app.get("/v1/remote-services")
+def get_remote_services():
+    """
+    The state of the circuit breaker of each remote service, and its counters.
+    """
+    return container.resilience_policies().get_stats()
+
+
+@app.get("/v1/user-locks")
+def get_user_locks():
+    """
+    How often the work for a user had to wait for other work for the same user.
+
+    The locks and their counters are per worker: with several workers,
+    each request reports on the worker which served it.
+    """
+    return container.user_locks().get_stats()
+
+
+def get_uvicorn_options(server: Server) -> dict:
+    """
+    :return: the uvicorn options to serve the app with the given settings.
+    """
+    loop, http = "asyncio", "h11"
+    if server.profile == RuntimeProfile.production:
+        if importlib.util.find_spec("uvloop"):
+            loop = "uvloop"
+        else:
+            logging.warning("uvloop isn't installed, using the asyncio event loop")
+        if importlib.util.find_spec("httptools"):
+            http = "httptools"
+        else:
+            logging.warning("httptools isn't installed, using the h11 http parser")
+    return {
+        "host": server.host,
+        "port": server.port,
+        "loop": loop,
+        "http": http,
+        "workers": server.workers,
+        "timeout_graceful_shutdown": server.graceful_shutdown_timeout_seconds,
+    }
+
+
+def run():
+    with startup_phases.measure("settings"):
+        settings: Settings = container.settings.provided()
+    with startup_phases.measure("migrations"):
+        # Once, before the workers start.
+        migrations.upgrade_database(settings.app_settings.database_path)
+    options = get_uvicorn_options(settings.app_settings.server)
+    if (
+        options["workers"] > 1
+        and not settings.app_settings.database_writer.group_commit
+    ):
+        # Each worker has its own writer: the group commit doesn't serialize
+        # the writes of the workers, but its transactions take the write lock
+        # up front, so that they wait for it rather than fail.
+        logging.warning(
+            "Several workers without database_writer.group_commit:"
+            " a transaction which reads before it writes can fail with"
+            " 'database is locked' when another worker writes at the same time"
+        )
+    if options["workers"] > 1 and not settings.secret_settings.session_secret_key:
+        # The workers inherit the environment: they read the same key.
+        os.environ["SESSION_SECRET_KEY"] = secrets.token_urlsafe(32)
     uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000,
-        log_config=logger.get_uvicorn_log_config(),
+        # The workers import the app themselves.
+        "slackhealthbot.main:app" if options["workers"] > 1 else app,
+        log_config=logger.get_uvicorn_log_config(settings.app_settings.logging.format),
+        **options,
     )
+
+
+if __name__ == "__main__":
+    run()
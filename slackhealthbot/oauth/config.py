@@ -1,5 +1,62 @@
+import httpx
 from authlib.integrations.starlette_client import OAuth
+from authlib.integrations.starlette_client.apps import StarletteOAuth2App
 from starlette.config import Config
 
+from slackhealthbot.settings import HttpClient
+
 config = Config(".env")
 oauth = OAuth(Config(".env"))
+
+
+class SharedTransport(httpx.AsyncHTTPTransport):
+    """
+    A connection pool shared by the short-lived http clients which authlib
+    creates for each request.
+
+    Closing one of these clients leaves the pool open:
+    the pool is only closed by close_pool().
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def aclose(self):
+        pass
+
+    async def close_pool(self):
+        await super().aclose()
+
+
+def register(
+    http_client_settings: HttpClient,
+    client_kwargs: dict,
+    **kwargs,
+) -> SharedTransport:
+    """
+    Register an oauth client, whose requests share one connection pool.
+
+    :return: the connection pool, to close when the app shuts down.
+    """
+    transport = SharedTransport(
+        limits=httpx.Limits(
+            max_connections=http_client_settings.max_connections,
+            max_keepalive_connections=http_client_settings.max_keepalive_connections,
+            keepalive_expiry=http_client_settings.keepalive_expiry_seconds,
+        ),
+    )
+    client: StarletteOAuth2App = oauth.register(
+        client_kwargs={
+            **client_kwargs,
+            "transport": transport,
+            "timeout": http_client_settings.timeout_seconds,
+        },
+        **kwargs,
+    )
+    # The oauth client is only created by the first registration:
+    # make sure it uses the new connection pool if we're registered again.
+    client.client_kwargs["transport"] = transport
+    return transport
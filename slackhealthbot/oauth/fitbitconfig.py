@@ -7,15 +7,18 @@ from fastapi import Depends, status
 
 from slackhealthbot.containers import Container
 from slackhealthbot.core.exceptions import UserLoggedOutException
-from slackhealthbot.oauth.config import oauth
+from slackhealthbot.oauth import config as oauth_config
 from slackhealthbot.settings import Settings
 
+logger = logging.getLogger(__name__)
+
 
 def fitbit_compliance_fix(session: AsyncOAuth2Client):
     def _fix_access_token_response(resp):
-        logging.info(f"Token response {resp}")
+        logger.info(f"Token response {resp}")
         if is_auth_failure(resp):
             raise UserLoggedOutException
+        resp.raise_for_status()
         data = resp.json()
         data["userid"] = data["user_id"]
         resp.json = lambda: data
@@ -30,15 +33,31 @@ def fitbit_compliance_fix(session: AsyncOAuth2Client):
 
 
 def is_auth_failure(response) -> bool:
-    return response.status_code != status.HTTP_200_OK
+    """
+    :return: whether the user needs to log in again: their access token was
+        refused, or their refresh token was revoked. Other failures, like
+        fitbit being down or rate limiting the user, are not auth failures.
+    """
+    # https://dev.fitbit.com/build/reference/web-api/troubleshooting-guide/error-messages/
+    if response.status_code == status.HTTP_401_UNAUTHORIZED:
+        return True
+    if response.status_code != status.HTTP_400_BAD_REQUEST:
+        return False
+    try:
+        errors = response.json().get("errors") or []
+        error_types = {x.get("errorType") for x in errors}
+    except (ValueError, AttributeError):
+        return False
+    return bool(error_types & {"invalid_grant", "invalid_token"})
 
 
 @inject
 def configure(
     update_token_callback: Callable[[dict[str, Any]], Coroutine],
     settings: Settings = Depends(Provide[Container.settings]),
-):
-    oauth.register(
+) -> oauth_config.SharedTransport:
+    return oauth_config.register(
+        http_client_settings=settings.app_settings.fitbit.http_client,
         name=settings.fitbit_oauth_settings.name,
         api_base_url=settings.fitbit_oauth_settings.base_url,
         authorize_url="https://www.fitbit.com/oauth2/authorize",
@@ -2,10 +2,14 @@ from typing import Any
 
 import httpx
 from authlib.integrations.starlette_client.apps import StarletteOAuth2App
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
 
+from slackhealthbot.containers import Container
 from slackhealthbot.core.exceptions import UserLoggedOutException
 from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.oauth.config import oauth
+from slackhealthbot.remoteservices.resilience import ResiliencePolicies
 
 
 def asdict(token: OAuthFields) -> dict[str, str]:
@@ -16,43 +20,62 @@ def asdict(token: OAuthFields) -> dict[str, str]:
     }
 
 
+@inject
 async def get(
     provider: str,
     token: OAuthFields,
     url: str,
     params: dict[str, Any] = None,
+    policies: ResiliencePolicies = Depends(Provide[Container.resilience_policies]),
 ) -> httpx.Response:
     """
     :raises:
         UserLoggedOutException if the refresh token request fails
+        CircuitOpenException if the provider's recent requests failed
+        RetryableRemoteServiceException if the provider replies with
+            a server error or a 429
     """
     client: StarletteOAuth2App = oauth.create_client(provider)
-    response = await client.get(
-        url,
-        params=params,
-        token=asdict(token),
+    response = await policies.get(provider).call(
+        lambda: client.get(
+            url,
+            params=params,
+            token=asdict(token),
+        ),
+        idempotent=True,
     )
     if client.client_kwargs["is_auth_failure"](response):
         raise UserLoggedOutException
     return response
 
 
-async def post(
+@inject
+async def post(  # noqa: PLR0913
     provider: str,
     token: OAuthFields,
     url: str,
     data: dict[str, str] = None,
+    idempotent: bool = False,
+    policies: ResiliencePolicies = Depends(Provide[Container.resilience_policies]),
 ) -> httpx.Response:
     """
     Execute a request, and retry with a refreshed access token if we get a 401.
+    :param idempotent: if True, retry the request if it fails with
+        a connection error or a server error.
     :raises:
         UserLoggedOutException if the refresh token request fails
+        CircuitOpenException if the provider's recent requests failed
+        RetryableRemoteServiceException if the provider replies with
+            a server error or a 429
     """
     client: StarletteOAuth2App = oauth.create_client(provider)
-    response = await client.post(
-        url,
-        data=data,
-        token=asdict(token),
+    response = await policies.get(provider).call(
+        lambda: client.post(
+            url,
+            data=data,
+            token=asdict(token),
+        ),
+        idempotent=idempotent,
     )
     if client.client_kwargs["is_auth_failure"](response):
         raise UserLoggedOutException
@@ -8,9 +8,11 @@ from fastapi import Depends
 
 from slackhealthbot.containers import Container
 from slackhealthbot.core.exceptions import UserLoggedOutException
-from slackhealthbot.oauth.config import oauth
+from slackhealthbot.oauth import config as oauth_config
 from slackhealthbot.settings import Settings
 
+logger = logging.getLogger(__name__)
+
 ACCESS_TOKEN_EXTRA_PARAMS = {
     "action": "requesttoken",
 }
@@ -22,7 +24,7 @@ def withings_compliance_fix(session: AsyncOAuth2Client):
         return url, headers, body
 
     def _fix_access_token_response(resp):
-        logging.info(f"Token response {resp}")
+        logger.info(f"Token response {resp}")
         # https://developer.withings.com/api-reference/#section/Response-status
         if is_auth_failure(resp):
             resp.status_code = 400
@@ -46,7 +48,7 @@ def is_auth_failure(response) -> bool:
     status = response.json()["status"]
     # https://developer.withings.com/api-reference/#tag/response_status
     if status != 0:
-        logging.warning(f"Auth failure {response.json()}")
+        logger.warning(f"Auth failure {response.json()}")
         return True
     return False
 
@@ -55,8 +57,9 @@ def is_auth_failure(response) -> bool:
 def configure(
     update_token_callback: Callable[[dict[str, Any]], Coroutine],
     settings: Settings = Depends(Provide[Container.settings]),
-):
-    oauth.register(
+) -> oauth_config.SharedTransport:
+    return oauth_config.register(
+        http_client_settings=settings.app_settings.withings.http_client,
         name=settings.withings_oauth_settings.name,
         api_base_url=settings.withings_oauth_settings.base_url,
         authorize_url="https://account.withings.com/oauth2_user/authorize2",
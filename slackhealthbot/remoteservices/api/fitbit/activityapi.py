@@ -1,5 +1,4 @@
 import datetime
-import json
 import logging
 from typing import Self
 
@@ -12,6 +11,8 @@ from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.oauth import requests
 from slackhealthbot.settings import Settings
 
+logger = logging.getLogger(__name__)
+
 
 class FitbitMinutesInHeartRateZone(BaseModel):
     minutes: int
@@ -33,14 +34,47 @@ class FitbitActivity(BaseModel):
     duration: int
     distance: float | None = None
     distanceUnit: str | None = None
+    startTime: datetime.datetime | None = None
+
+
+class FitbitPagination(BaseModel):
+    # The url of the next page, empty on the last page.
+    next: str = ""
 
 
 class FitbitActivities(BaseModel):
     activities: list[FitbitActivity]
+    pagination: FitbitPagination = FitbitPagination()
 
     @classmethod
     def parse(cls, text: bytes) -> Self:
-        return cls(**json.loads(text))
+        return cls.model_validate_json(text)
+
+
+class FitbitActivityLevel(BaseModel):
+    id: int
+    name: str
+
+
+class FitbitActivityType(BaseModel):
+    id: int
+    name: str
+    activityLevels: list[FitbitActivityLevel] = []
+
+
+class FitbitActivityCategory(BaseModel):
+    id: int
+    name: str
+    activities: list[FitbitActivityType] = []
+    subCategories: list["FitbitActivityCategory"] = []
+
+
+class FitbitActivityTypes(BaseModel):
+    categories: list[FitbitActivityCategory]
+
+
+# The max number of activities per page allowed by fitbit.
+_PAGE_SIZE = 100
 
 
 @inject
@@ -50,26 +84,94 @@ async def get_activity(
     settings: Settings = Depends(Provide[Container.settings]),
 ) -> FitbitActivities | None:
     """
+    Get the latest activity before the given time.
+
     :raises:
         UserLoggedOutException if the refresh token request fails
+        httpx.HTTPStatusError if fitbit replies with another error
     """
-    logging.info("get_activity for user")
-    when_str = when.strftime("%Y-%m-%dT%H:%M:%S")
+    logger.info("get_activity for user")
+    # https://dev.fitbit.com/build/reference/web-api/activity/get-activity-log-list/
     response = await requests.get(
         provider=settings.fitbit_oauth_settings.name,
         token=oauth_token,
         url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json",
         params={
-            "beforeDate": when_str,
+            "beforeDate": when.strftime("%Y-%m-%dT%H:%M:%S"),
             "sort": "desc",
             "offset": 0,
             "limit": 1,
         },
     )
+    response.raise_for_status()
     try:
         return FitbitActivities.parse(response.content)
     except Exception as e:
-        logging.warning(
-            f"Error parsing activity: error {e}, input: {input}", exc_info=e
-        )
+        logger.warning(f"Error parsing activity: error {e}, input: {input}", exc_info=e)
         return None
+
+
+@inject
+async def get_activities_after(
+    oauth_token: OAuthFields,
+    after: datetime.datetime,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> FitbitActivities | None:
+    """
+    Get all the activities from the given time, oldest first,
+    following fitbit's pages.
+    fitbit returns an empty list if there's no new activity.
+
+    :raises:
+        UserLoggedOutException if the refresh token request fails
+        httpx.HTTPStatusError if fitbit replies with another error
+    """
+    logger.info("get_activities_after for user")
+    # https://dev.fitbit.com/build/reference/web-api/activity/get-activity-log-list/
+    url = f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json"
+    params = {
+        "afterDate": after.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sort": "asc",
+        "offset": 0,
+        "limit": _PAGE_SIZE,
+    }
+    activities: list[FitbitActivity] = []
+    while url:
+        response = await requests.get(
+            provider=settings.fitbit_oauth_settings.name,
+            token=oauth_token,
+            url=url,
+            params=params,
+        )
+        response.raise_for_status()
+        try:
+            page = FitbitActivities.parse(response.content)
+        except Exception as e:
+            logger.warning(
+                f"Error parsing activity: error {e}, input: {input}", exc_info=e
+            )
+            # The activities after the last parsed one are fetched next time.
+            break
+        activities.extend(page.activities)
+        # The next page's url has all the query parameters.
+        url, params = page.pagination.next, None
+    return FitbitActivities(activities=activities) if activities else None
+
+
+@inject
+async def get_activity_types(
+    oauth_token: OAuthFields,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> FitbitActivityTypes:
+    """
+    :raises:
+        UserLoggedOutException if the refresh token request fails
+    """
+    # https://dev.fitbit.com/build/reference/web-api/activity/get-all-activity-types/
+    response = await requests.get(
+        provider=settings.fitbit_oauth_settings.name,
+        token=oauth_token,
+        url=f"{settings.fitbit_oauth_settings.base_url}1/activities.json",
+    )
+    response.raise_for_status()
+    return FitbitActivityTypes.model_validate_json(response.content)
@@ -1,5 +1,4 @@
 import datetime
-import json
 import logging
 from typing import Annotated, Literal, Self, Union
 
@@ -9,9 +8,12 @@ from pydantic import BaseModel, Field
 
 from slackhealthbot.containers import Container
 from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.logger import payload_logger
 from slackhealthbot.oauth import requests
 from slackhealthbot.settings import Settings
 
+logger = logging.getLogger(__name__)
+
 
 class FitbitSleepItemSummaryItem(BaseModel):
     minutes: int
@@ -61,8 +63,11 @@ class FitbitSleep(BaseModel):
 
     @classmethod
     def parse(cls, text: bytes | str) -> Self:
-        logging.info(f"parse sleep input: {text}")
-        return cls(**json.loads(text))
+        payload_logger.debug("parse sleep input: %s", text)
+        # Validate the raw json directly: the fields we don't declare,
+        # like the large levels.data lists, are skipped without being
+        # materialized as python objects.
+        return cls.model_validate_json(text)
 
 
 @inject
@@ -74,16 +79,18 @@ async def get_sleep(
     """
     :raises:
         UserLoggedOutException if the refresh token request fails
+        httpx.HTTPStatusError if fitbit replies with another error
     """
-    logging.info("get_sleep for user")
+    logger.info("get_sleep for user")
     when_str = when.strftime("%Y-%m-%d")
     response = await requests.get(
         provider=settings.fitbit_oauth_settings.name,
         token=oauth_token,
         url=f"{settings.fitbit_oauth_settings.base_url}1.2/user/-/sleep/date/{when_str}.json",
     )
+    response.raise_for_status()
     try:
         return FitbitSleep.parse(response.content)
     except Exception as e:
-        logging.warning(f"Error parsing sleep: error {e}, input: {input}", exc_info=e)
+        logger.warning(f"Error parsing sleep: error {e}, input: {input}", exc_info=e)
         return None
@@ -1,25 +1,65 @@
 import logging
+from typing import Iterable
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import Depends
+from fastapi import Depends, status
+from pydantic import BaseModel
 
 from slackhealthbot.containers import Container
 from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.oauth import requests
 from slackhealthbot.settings import Settings
 
+logger = logging.getLogger(__name__)
+
+
+class FitbitSubscription(BaseModel):
+    collectionType: str
+    subscriptionId: str
+
+
+class FitbitSubscriptions(BaseModel):
+    apiSubscriptions: list[FitbitSubscription]
+
 
 @inject
 async def subscribe(
     oauth_token: OAuthFields,
+    collection_paths: Iterable[str],
     settings: Settings = Depends(Provide[Container.settings]),
-):
-    for collectionPath in ["sleep", "activities"]:
+) -> set[str]:
+    """
+    :return: the collection paths which we're now subscribed to.
+    """
+    # https://dev.fitbit.com/build/reference/web-api/subscription/create-subscription/
+    subscribed_collection_paths = set()
+    for collectionPath in collection_paths:
         response = await requests.post(
             provider=settings.fitbit_oauth_settings.name,
             token=oauth_token,
             url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/{collectionPath}/apiSubscriptions/{oauth_token.oauth_userid}-{collectionPath}.json",
         )
-        logging.info(
-            f"Fitbit {collectionPath} subscription response: {response.json()}"
-        )
+        logger.info(f"Fitbit {collectionPath} subscription response: {response.json()}")
+        # 200 means the subscription already existed.
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_201_CREATED):
+            subscribed_collection_paths.add(collectionPath)
+    return subscribed_collection_paths
+
+
+@inject
+async def get_subscriptions(
+    oauth_token: OAuthFields,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> FitbitSubscriptions:
+    """
+    :raises:
+        UserLoggedOutException if the refresh token request fails
+    """
+    # https://dev.fitbit.com/build/reference/web-api/subscription/get-subscription-list/
+    response = await requests.get(
+        provider=settings.fitbit_oauth_settings.name,
+        token=oauth_token,
+        url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/apiSubscriptions.json",
+    )
+    response.raise_for_status()
+    return FitbitSubscriptions.model_validate_json(response.content)
@@ -3,6 +3,7 @@ from dependency_injector.wiring import Provide, inject
 from fastapi import Depends
 
 from slackhealthbot.containers import Container
+from slackhealthbot.remoteservices.resilience import SLACK, ResiliencePolicies
 from slackhealthbot.settings import Settings
 
 
@@ -10,12 +11,25 @@ from slackhealthbot.settings import Settings
 async def post_message(
     message: str,
     settings: Settings = Depends(Provide[Container.settings]),
+    policies: ResiliencePolicies = Depends(Provide[Container.resilience_policies]),
 ):
+    """
+    :raises:
+        CircuitOpenException if slack's recent requests failed
+        RetryableRemoteServiceException if slack replies with
+            a server error or a 429
+        httpx.HTTPError if the message wasn't posted
+    """
     async with httpx.AsyncClient() as client:
-        await client.post(
-            url=str(settings.secret_settings.slack_webhook_url),
-            json={
-                "text": message,
-            },
-            timeout=30.0,
+        # Not retried: slack could post the message twice.
+        response = await policies.get(SLACK).call(
+            lambda: client.post(
+                url=str(settings.secret_settings.slack_webhook_url),
+                json={
+                    "text": message,
+                },
+                timeout=30.0,
+            ),
+            idempotent=False,
         )
+        response.raise_for_status()
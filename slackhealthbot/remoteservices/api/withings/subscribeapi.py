@@ -6,9 +6,12 @@ from fastapi import Depends
 from slackhealthbot.containers import Container
 from slackhealthbot.core.exceptions import UserLoggedOutException
 from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.logger import payload_logger
 from slackhealthbot.oauth import requests
 from slackhealthbot.settings import Settings
 
+logger = logging.getLogger(__name__)
+
 
 @inject
 async def subscribe(
@@ -30,8 +33,9 @@ async def subscribe(
                 "appli": 1,
             },
         )
-        logging.info(f"Withings subscription response: {response.json()}")
+        logger.info("Withings subscription response")
+        payload_logger.debug("Withings subscription response: %s", response.text)
     except UserLoggedOutException:
-        logging.warning(
+        logger.warning(
             "Error subscribing. This may be normal in a debug environment (http on localhost)"
         )
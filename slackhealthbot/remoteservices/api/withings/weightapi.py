@@ -5,17 +5,31 @@ from fastapi import Depends
 
 from slackhealthbot.containers import Container
 from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.domain.models.weight import WeightMeasure, WeightUpdates
 from slackhealthbot.oauth import requests
 from slackhealthbot.settings import Settings
 
 
+def _get_last_measure(measuregrps: list[dict]) -> Optional[WeightMeasure]:
+    if measuregrps:
+        last_measuregrp_item = max(measuregrps, key=lambda x: x["date"])
+        measures = last_measuregrp_item["measures"]
+        if measures:
+            last_measure = measures[0]
+            return WeightMeasure(
+                weight_kg=last_measure["value"] * pow(10, last_measure["unit"]),
+                date=last_measuregrp_item["date"],
+            )
+    return None
+
+
 @inject
-async def get_last_weight_kg(
+async def get_last_weight(
     oauth_token: OAuthFields,
     startdate: int,
     enddate: int,
     settings: Settings = Depends(Provide[Container.settings]),
-) -> Optional[float]:
+) -> Optional[WeightMeasure]:
     """
     :raises:
         UserLoggedOutException if the refresh token request fails
@@ -32,14 +46,38 @@ async def get_last_weight_kg(
             "startdate": startdate,
             "enddate": enddate,
         },
+        # getmeas only reads the measures.
+        idempotent=True,
+    )
+    return _get_last_measure(response.json()["body"]["measuregrps"])
+
+
+@inject
+async def get_weight_updates(
+    oauth_token: OAuthFields,
+    lastupdate: int,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> WeightUpdates:
+    """
+    :raises:
+        UserLoggedOutException if the refresh token request fails
+    """
+    # https://developer.withings.com/api-reference/#tag/measure/operation/measure-getmeas
+    response = await requests.post(
+        provider=settings.withings_oauth_settings.name,
+        token=oauth_token,
+        url=f"{settings.withings_oauth_settings.base_url}measure",
+        data={
+            "action": "getmeas",
+            "meastype": 1,  # weight
+            "category": 1,  # real measures, not objectives
+            "lastupdate": lastupdate,
+        },
+        # getmeas only reads the measures.
+        idempotent=True,
     )
     response_data = response.json()["body"]
-    measuregrps = response_data["measuregrps"]
-    if measuregrps:
-        last_measuregrp_item = measuregrps[0]
-        measures = last_measuregrp_item["measures"]
-        if measures:
-            last_measure = measures[0]
-            weight_kg = last_measure["value"] * pow(10, last_measure["unit"])
-            return weight_kg
-    return None
+    return WeightUpdates(
+        last_weight=_get_last_measure(response_data["measuregrps"]),
+        updatetime=response_data["updatetime"],
+    )
@@ -3,11 +3,13 @@ import logging
 
 from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.domain.models.activity import (
+    ActivityCursor,
     ActivityData,
     ActivityZone,
     ActivityZoneMinutes,
 )
 from slackhealthbot.domain.models.sleep import SleepData
+from slackhealthbot.domain.models.subscription import CollectionType
 from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
     RemoteFitbitRepository,
 )
@@ -15,13 +17,31 @@ from slackhealthbot.remoteservices.api.fitbit import activityapi, sleepapi, subs
 from slackhealthbot.remoteservices.api.fitbit.activityapi import FitbitActivities
 from slackhealthbot.remoteservices.api.fitbit.sleepapi import FitbitSleep
 
+logger = logging.getLogger(__name__)
+
 
 class WebApiFitbitRepository(RemoteFitbitRepository):
     async def subscribe(
         self,
         oauth_fields: OAuthFields,
-    ):
-        await subscribeapi.subscribe(oauth_fields)
+        collection_types: set[CollectionType] | None = None,
+    ) -> set[CollectionType]:
+        subscribed_collection_paths = await subscribeapi.subscribe(
+            oauth_fields,
+            collection_paths=collection_types or list(CollectionType),
+        )
+        return {CollectionType(x) for x in subscribed_collection_paths}
+
+    async def get_subscriptions(
+        self,
+        oauth_fields: OAuthFields,
+    ) -> set[CollectionType]:
+        subscriptions = await subscribeapi.get_subscriptions(oauth_fields)
+        return {
+            CollectionType(x.collectionType)
+            for x in subscriptions.apiSubscriptions
+            if x.collectionType in list(CollectionType)
+        }
 
     async def get_sleep(
         self,
@@ -34,7 +54,9 @@ class WebApiFitbitRepository(RemoteFitbitRepository):
         return remote_service_sleep_to_domain_sleep(sleep) if sleep else None
 
     async def get_activity(
-        self, oauth_fields: OAuthFields, when: datetime.datetime
+        self,
+        oauth_fields: OAuthFields,
+        when: datetime.datetime,
     ) -> tuple[str, ActivityData] | None:
         activities: FitbitActivities | None = await activityapi.get_activity(
             oauth_token=oauth_fields,
@@ -42,6 +64,33 @@ class WebApiFitbitRepository(RemoteFitbitRepository):
         )
         return remote_service_activity_to_domain_activity(activities)
 
+    async def get_activities_after(
+        self,
+        oauth_fields: OAuthFields,
+        after: ActivityCursor,
+    ) -> list[tuple[str, ActivityData]]:
+        activities: FitbitActivities | None = await activityapi.get_activities_after(
+            oauth_token=oauth_fields,
+            after=after.start_time,
+        )
+        if not activities:
+            return []
+        # afterDate includes the activity which starts at the cursor's time.
+        return [
+            remote_service_fitbit_activity_to_domain_activity(x)
+            for x in activities.activities
+            if x.logId != after.log_id
+        ]
+
+    async def get_activity_types(
+        self,
+        oauth_fields: OAuthFields,
+    ) -> dict[int, str]:
+        activity_types: activityapi.FitbitActivityTypes = (
+            await activityapi.get_activity_types(oauth_token=oauth_fields)
+        )
+        return remote_service_activity_types_to_domain_names(activity_types.categories)
+
     def parse_oauth_fields(
         self,
         response_data: dict[str, str],
@@ -63,7 +112,7 @@ def remote_service_sleep_to_domain_sleep(
         return None
     main_sleep_item = next((item for item in remote.sleep if item.isMainSleep), None)
     if not main_sleep_item:
-        logging.warning("No main sleep found")
+        logger.warning("No main sleep found")
         return None
 
     wake_minutes = (
@@ -91,7 +140,12 @@ def remote_service_activity_to_domain_activity(
 ) -> tuple[str, ActivityData] | None:
     if not remote or not remote.activities:
         return None
-    fitbit_activity = remote.activities[0]
+    return remote_service_fitbit_activity_to_domain_activity(remote.activities[0])
+
+
+def remote_service_fitbit_activity_to_domain_activity(
+    fitbit_activity: activityapi.FitbitActivity,
+) -> tuple[str, ActivityData]:
     return fitbit_activity.activityName, ActivityData(
         log_id=fitbit_activity.logId,
         type_id=fitbit_activity.activityTypeId,
@@ -107,7 +161,29 @@ def remote_service_activity_to_domain_activity(
             for x in fitbit_activity.activeZoneMinutes.minutesInHeartRateZones
             if x.type.upper() in ActivityZone.__members__ and x.minutes > 0
         ],
+        # Keep the user's local time, which is what fitbit expects in queries.
+        start_time=(
+            fitbit_activity.startTime.replace(tzinfo=None)
+            if fitbit_activity.startTime
+            else None
+        ),
     )
 
 
+def remote_service_activity_types_to_domain_names(
+    categories: list[activityapi.FitbitActivityCategory],
+) -> dict[int, str]:
+    names = {}
+    for category in categories:
+        for activity_type in category.activities:
+            names[activity_type.id] = activity_type.name
+            # Activities logged manually can use the id of an intensity level.
+            for level in activity_type.activityLevels:
+                names[level.id] = f"{activity_type.name} ({level.name})"
+        names.update(
+            remote_service_activity_types_to_domain_names(category.subCategories)
+        )
+    return names
+
+
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
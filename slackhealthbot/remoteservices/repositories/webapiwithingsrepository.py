@@ -1,6 +1,7 @@
 import datetime
 
 from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.domain.models.weight import WeightMeasure, WeightUpdates
 from slackhealthbot.domain.remoterepository.remotewithingsrepository import (
     RemoteWithingsRepository,
 )
@@ -14,18 +15,28 @@ class WebApiWithingsRepository(RemoteWithingsRepository):
     ):
         await subscribeapi.subscribe(oauth_fields)
 
-    async def get_last_weight_kg(
+    async def get_last_weight(
         self,
         oauth_fields: OAuthFields,
         startdate: int,
         enddate: int,
-    ) -> float | None:
-        return await weightapi.get_last_weight_kg(
+    ) -> WeightMeasure | None:
+        return await weightapi.get_last_weight(
             oauth_token=oauth_fields,
             startdate=startdate,
             enddate=enddate,
         )
 
+    async def get_weight_updates(
+        self,
+        oauth_fields: OAuthFields,
+        lastupdate: int,
+    ) -> WeightUpdates:
+        return await weightapi.get_weight_updates(
+            oauth_token=oauth_fields,
+            lastupdate=lastupdate,
+        )
+
     def parse_oauth_fields(
         self,
         response_data: dict[str, str],
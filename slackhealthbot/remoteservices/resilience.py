@@ -0,0 +1,227 @@
+import asyncio
+import dataclasses
+import datetime
+import enum
+import itertools
+import logging
+import random
+from typing import Awaitable, Callable
+
+import httpx
+
+from slackhealthbot.core.exceptions import (
+    CircuitOpenException,
+    RetryableRemoteServiceException,
+    UserLoggedOutException,
+)
+from slackhealthbot.settings import Resilience, Settings
+
+logger = logging.getLogger(__name__)
+
+SLACK = "slack"
+
+
+class CircuitState(enum.StrEnum):
+    closed = enum.auto()
+    open = enum.auto()
+    half_open = enum.auto()
+
+
+@dataclasses.dataclass
+class RemoteServiceStats:
+    state: CircuitState = CircuitState.closed
+    consecutive_failures: int = 0
+    calls: int = 0
+    failures: int = 0
+    retries: int = 0
+    # The calls which failed fast, because the circuit was open.
+    rejected: int = 0
+    opened_at: datetime.datetime | None = None
+
+
+class CircuitBreaker:
+    """
+    Stop sending requests to a remote service after too many consecutive
+    failures. Once the reset timeout has passed, let a single request through:
+    if it succeeds, the requests are sent again. If it fails, wait again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout_s: float,
+        stats: RemoteServiceStats,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.stats = stats
+        self._probing = False
+
+    def before_call(self):
+        """
+        :raises:
+            CircuitOpenException if the call mustn't be sent.
+        """
+        stats = self.stats
+        if stats.state == CircuitState.open:
+            elapsed = datetime.datetime.now(datetime.timezone.utc) - stats.opened_at
+            if elapsed.total_seconds() < self.reset_timeout_s:
+                stats.rejected += 1
+                raise CircuitOpenException
+            logger.info(f"Circuit for {self.name} is half-open")
+            stats.state = CircuitState.half_open
+        if stats.state == CircuitState.half_open:
+            if self._probing:
+                stats.rejected += 1
+                raise CircuitOpenException
+            self._probing = True
+        stats.calls += 1
+
+    def record_success(self):
+        self._probing = False
+        stats = self.stats
+        if stats.state != CircuitState.closed:
+            logger.info(f"Circuit for {self.name} is closed")
+        stats.state = CircuitState.closed
+        stats.consecutive_failures = 0
+        stats.opened_at = None
+
+    def record_failure(self):
+        self._probing = False
+        stats = self.stats
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        if (
+            stats.state == CircuitState.half_open
+            or stats.consecutive_failures >= self.failure_threshold
+        ):
+            if stats.state != CircuitState.open:
+                logger.warning(
+                    f"Circuit for {self.name} is open after "
+                    f"{stats.consecutive_failures} consecutive failures"
+                )
+            stats.state = CircuitState.open
+            stats.opened_at = datetime.datetime.now(datetime.timezone.utc)
+
+    def release(self):
+        """
+        Forget a call whose outcome is unknown, for example if it was cancelled.
+        """
+        self._probing = False
+
+
+class ResiliencePolicy:
+    """
+    Retry the idempotent requests to a remote service with exponential backoff,
+    and fail fast while the service is down.
+    """
+
+    def __init__(self, name: str, settings: Resilience):
+        self.name = name
+        self.settings = settings
+        self.stats = RemoteServiceStats()
+        self.breaker = CircuitBreaker(
+            name=name,
+            failure_threshold=settings.failure_threshold,
+            reset_timeout_s=settings.reset_timeout_seconds,
+            stats=self.stats,
+        )
+
+    def _get_backoff_s(self, attempt: int, response: httpx.Response | None) -> float:
+        if response is not None and "Retry-After" in response.headers:
+            try:
+                return float(response.headers["Retry-After"])
+            except ValueError:
+                pass
+        # Full jitter, so that the clients which failed together
+        # don't retry together.
+        return random.uniform(
+            0,
+            min(
+                self.settings.backoff_max_seconds,
+                self.settings.backoff_base_seconds * 2**attempt,
+            ),
+        )
+
+    async def call(
+        self,
+        request: Callable[[], Awaitable[httpx.Response]],
+        idempotent: bool,
+    ) -> httpx.Response:
+        """
+        Send the request, retrying it if it's idempotent and it failed
+        with a connection error, a 5xx or a 429.
+
+        :return: the response, which is neither a 5xx nor a 429.
+        :raises:
+            CircuitOpenException if the service's recent requests failed.
+            httpx.TransportError if the last attempt failed to connect.
+            RetryableRemoteServiceException if the last attempt failed
+                with a 5xx or a 429.
+        """
+        for attempt in itertools.count():
+            self.breaker.before_call()
+            response = None
+            try:
+                response = await request()
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.settings.max_retries:
+                    raise
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except UserLoggedOutException:
+                # The service replied, refusing the user's token.
+                self.breaker.record_success()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.is_server_error:
+                    self.breaker.record_failure()
+                else:
+                    # A 429 is about the user's quota, not the service's health.
+                    self.breaker.record_success()
+                    if response.status_code != httpx.codes.TOO_MANY_REQUESTS:
+                        return response
+                if not idempotent or attempt >= self.settings.max_retries:
+                    raise RetryableRemoteServiceException(response.status_code)
+            backoff_s = self._get_backoff_s(attempt, response)
+            if backoff_s > self.settings.backoff_max_seconds:
+                # Not worth waiting for: let the caller send it again later.
+                raise RetryableRemoteServiceException(response.status_code)
+            self.stats.retries += 1
+            logger.info(f"Retrying request to {self.name} in {backoff_s:.2f}s")
+            await asyncio.sleep(backoff_s)
+
+
+class ResiliencePolicies:
+    """
+    The resilience policy of each remote service, by name.
+    """
+
+    def __init__(self, settings: Settings):
+        self._policies = {
+            name: ResiliencePolicy(name=name, settings=resilience)
+            for name, resilience in (
+                (
+                    settings.fitbit_oauth_settings.name,
+                    settings.app_settings.fitbit.resilience,
+                ),
+                (
+                    settings.withings_oauth_settings.name,
+                    settings.app_settings.withings.resilience,
+                ),
+                (SLACK, settings.app_settings.slack.resilience),
+            )
+        }
+
+    def get(self, name: str) -> ResiliencePolicy:
+        return self._policies[name]
+
+    def get_stats(self) -> dict[str, RemoteServiceStats]:
+        return {name: policy.stats for name, policy in self._policies.items()}
@@ -0,0 +1,76 @@
+"""
+Replay the notifications which failed in a time range, including
+the ones the background replay gave up on.
+
+Usage:
+    python -m slackhealthbot.replayfailedevents --since 2024-03-01T08:00 \\
+        [--until 2024-03-01T12:00] [--concurrency 4]
+
+The times are in UTC, unless they include an offset.
+"""
+
+import argparse
+import asyncio
+import datetime
+
+from slackhealthbot import logger
+from slackhealthbot.main import (
+    configure_oauth_clients,
+    container,
+    get_replay_repositories,
+)
+from slackhealthbot.tasks.failedeventsreplay import replay_failed_events
+
+
+def _parse_time(value: str) -> datetime.datetime:
+    time = datetime.datetime.fromisoformat(value)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=datetime.timezone.utc)
+    return time.astimezone(datetime.timezone.utc)
+
+
+async def replay(
+    since: datetime.datetime,
+    until: datetime.datetime,
+    concurrency: int,
+) -> tuple[int, int]:
+    """
+    :return: the number of events replayed successfully, and of failed replays.
+    """
+    settings = container.settings.provided()
+    log_listener = logger.configure_logging(settings.app_settings.logging)
+    transports = configure_oauth_clients()
+    repos = get_replay_repositories()
+    try:
+        async with repos.local_failed_event_repo_factory() as local_failed_event_repo:
+            return await replay_failed_events(
+                events=local_failed_event_repo.iter_failed_events(
+                    since=since, until=until
+                ),
+                repos=repos,
+                concurrency=concurrency,
+            )
+    finally:
+        for transport in transports:
+            await transport.close_pool()
+        log_listener.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--since", type=_parse_time, required=True)
+    parser.add_argument(
+        "--until",
+        type=_parse_time,
+        default=datetime.datetime.now(datetime.timezone.utc),
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="Max events replayed at once."
+    )
+    args = parser.parse_args()
+    replayed, failed = asyncio.run(
+        replay(since=args.since, until=args.until, concurrency=args.concurrency)
+    )
+    print(f"Replayed {replayed} failed events, {failed} failed again")
@@ -1,21 +1,36 @@
 from contextlib import asynccontextmanager
 from contextvars import ContextVar
-from typing import AsyncContextManager, Callable
+from functools import cache
+from typing import TYPE_CHECKING, AsyncContextManager, Callable
 
+from dependency_injector.wiring import Provide, inject
 from fastapi import Depends
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from slackhealthbot.containers import Container
 from slackhealthbot.data.database.connection import create_async_session_maker
+from slackhealthbot.data.database.writer import GroupCommitWriter
+from slackhealthbot.data.repositories.sqlalchemyfailedeventrepository import (
+    SQLAlchemyFailedEventRepository,
+)
 from slackhealthbot.data.repositories.sqlalchemyfitbitrepository import (
     SQLAlchemyFitbitRepository,
 )
+from slackhealthbot.data.repositories.sqlalchemyslackoutboxrepository import (
+    SQLAlchemySlackOutboxRepository,
+)
 from slackhealthbot.data.repositories.sqlalchemywithingsrepository import (
     SQLAlchemyWithingsRepository,
 )
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
 )
+from slackhealthbot.domain.localrepository.localslackoutboxrepository import (
+    LocalSlackOutboxRepository,
+)
 from slackhealthbot.domain.localrepository.localwithingsrepository import (
     LocalWithingsRepository,
 )
@@ -38,11 +53,25 @@ from slackhealthbot.remoteservices.repositories.webhookslackrepository import (
     WebhookSlackRepository,
 )
 
+if TYPE_CHECKING:
+    from fastapi.templating import Jinja2Templates
+
 _ctx_db = ContextVar("ctx_db")
 _ctx_withings_repository = ContextVar("withings_repository")
 _ctx_fitbit_repository = ContextVar("fitbit_repository")
 
 
+@inject
+def get_group_commit_writer(
+    writer: GroupCommitWriter | None = Depends(Provide[Container.group_commit_writer]),
+) -> GroupCommitWriter | None:
+    # Outside the app, for example in the alembic migrations,
+    # the container isn't wired.
+    if not isinstance(writer, GroupCommitWriter):
+        return None
+    return writer
+
+
 async def get_db():
     db = create_async_session_maker()()
     try:
@@ -60,7 +89,7 @@ async def get_db():
 async def get_local_withings_repository(
     db: AsyncSession = Depends(get_db),
 ) -> LocalWithingsRepository:
-    repo = SQLAlchemyWithingsRepository(db=db)
+    repo = SQLAlchemyWithingsRepository(db=db, writer=get_group_commit_writer())
     _ctx_withings_repository.set(repo)
     yield repo
     _ctx_withings_repository.set(None)
@@ -77,7 +106,7 @@ def get_remote_withings_repository() -> RemoteWithingsRepository:
 async def get_local_fitbit_repository(
     db: AsyncSession = Depends(get_db),
 ) -> LocalFitbitRepository:
-    repo = SQLAlchemyFitbitRepository(db=db)
+    repo = SQLAlchemyFitbitRepository(db=db, writer=get_group_commit_writer())
     _ctx_fitbit_repository.set(repo)
     yield repo
     _ctx_fitbit_repository.set(None)
@@ -87,6 +116,12 @@ def get_remote_fitbit_repository() -> RemoteFitbitRepository:
     return WebApiFitbitRepository()
 
 
+def get_local_failed_event_repository(
+    db: AsyncSession = Depends(get_db),
+) -> LocalFailedEventRepository:
+    return SQLAlchemyFailedEventRepository(db=db, writer=get_group_commit_writer())
+
+
 def get_slack_repository() -> RemoteSlackRepository:
     return WebhookSlackRepository()
 
@@ -95,6 +130,55 @@ def request_context_fitbit_repository() -> LocalFitbitRepository:
     return _ctx_fitbit_repository.get()
 
 
+def withings_repository_factory() -> (
+    Callable[[], AsyncContextManager[LocalWithingsRepository]]
+):
+    @asynccontextmanager
+    async def ctx_mgr() -> LocalWithingsRepository:
+        db = create_async_session_maker()()
+        repo = SQLAlchemyWithingsRepository(db=db, writer=get_group_commit_writer())
+        _ctx_withings_repository.set(repo)
+        try:
+            yield repo
+        finally:
+            _ctx_withings_repository.set(None)
+            await db.close()
+
+    return ctx_mgr
+
+
+def failed_event_repository_factory() -> (
+    Callable[[], AsyncContextManager[LocalFailedEventRepository]]
+):
+    @asynccontextmanager
+    async def ctx_mgr() -> LocalFailedEventRepository:
+        db = create_async_session_maker()()
+        try:
+            yield SQLAlchemyFailedEventRepository(
+                db=db, writer=get_group_commit_writer()
+            )
+        finally:
+            await db.close()
+
+    return ctx_mgr
+
+
+def slack_outbox_repository_factory() -> (
+    Callable[[], AsyncContextManager[LocalSlackOutboxRepository]]
+):
+    @asynccontextmanager
+    async def ctx_mgr() -> LocalSlackOutboxRepository:
+        db = create_async_session_maker()()
+        try:
+            yield SQLAlchemySlackOutboxRepository(
+                db=db, writer=get_group_commit_writer()
+            )
+        finally:
+            await db.close()
+
+    return ctx_mgr
+
+
 # TODO move this
 def fitbit_repository_factory(
     db: AsyncSession | None = None,
@@ -106,14 +190,22 @@ def fitbit_repository_factory(
         if _db is None:
             _db = create_async_session_maker()()
             autoclose_db = True
-        repo = SQLAlchemyFitbitRepository(db=_db)
+        repo = SQLAlchemyFitbitRepository(db=_db, writer=get_group_commit_writer())
         _ctx_fitbit_repository.set(repo)
-        yield repo
-        _ctx_fitbit_repository.set(None)
-        if autoclose_db:
-            await _db.close()
+        try:
+            yield repo
+        finally:
+            _ctx_fitbit_repository.set(None)
+            if autoclose_db:
+                await _db.close()
 
     return ctx_mgr
 
 
-templates = Jinja2Templates(directory="templates")
+@cache
+def get_templates() -> "Jinja2Templates":
+    # Imported here: jinja2 is only needed by the login pages,
+    # and not to serve the first requests.
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory="templates")
@@ -7,31 +7,40 @@ from pydantic import BaseModel
 
 from slackhealthbot.containers import Container
 from slackhealthbot.core.exceptions import UnknownUserException, UserLoggedOutException
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
 )
+from slackhealthbot.domain.models.failedevent import FailedEventSource
 from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
     RemoteFitbitRepository,
 )
 from slackhealthbot.domain.remoterepository.remoteslackrepository import (
     RemoteSlackRepository,
 )
+from slackhealthbot.domain.usecases.failedevents import usecase_record_failed_event
 from slackhealthbot.domain.usecases.fitbit import (
     usecase_login_user,
     usecase_post_user_logged_out,
-    usecase_process_new_activity,
-    usecase_process_new_sleep,
+    usecase_process_notification,
+    usecase_record_notification,
 )
+from slackhealthbot.logger import payload_logger
 from slackhealthbot.oauth.config import oauth
 from slackhealthbot.routers.dependencies import (
+    get_local_failed_event_repository,
     get_local_fitbit_repository,
     get_remote_fitbit_repository,
     get_slack_repository,
-    templates,
+    get_templates,
 )
 from slackhealthbot.settings import Settings
 
 router = APIRouter()
+# A named logger, so that the webhook logs can be sampled.
+logger = logging.getLogger(__name__)
 
 
 @router.get("/v1/fitbit-authorization/{slack_alias}")
@@ -77,7 +86,7 @@ async def fitbit_oauth_webhook(
         token=token,
         slack_alias=request.session.pop("slack_alias"),
     )
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         request=request, name="login_complete.html", context={"provider": "fitbit"}
     )
 
@@ -116,39 +125,38 @@ def _mark_fitbit_notification_processed(notification: FitbitNotification):
 
 
 @router.post("/fitbit-notification-webhook/")
-async def fitbit_notification_webhook(
+async def fitbit_notification_webhook(  # noqa: PLR0913
     notifications: list[FitbitNotification],
     local_fitbit_repo: LocalFitbitRepository = Depends(get_local_fitbit_repository),
     remote_fitbit_repo: RemoteFitbitRepository = Depends(get_remote_fitbit_repository),
     slack_repo: RemoteSlackRepository = Depends(get_slack_repository),
+    local_failed_event_repo: LocalFailedEventRepository = Depends(
+        get_local_failed_event_repository
+    ),
 ):
-    logging.info(f"fitbit_notification_webhook: {notifications}")
+    logger.info("fitbit_notification_webhook: %d notifications", len(notifications))
+    payload_logger.debug("fitbit_notification_webhook: %s", notifications)
     for notification in notifications:
-        if _is_fitbit_notification_processed(notification):
-            logging.info("fitbit_notificaiton_webhook: skipping duplicate notification")
-            continue
-
         try:
-            if notification.collectionType == "sleep":
-                new_sleep_data = await usecase_process_new_sleep.do(
-                    local_fitbit_repo=local_fitbit_repo,
-                    remote_fitbit_repo=remote_fitbit_repo,
-                    slack_repo=slack_repo,
-                    fitbit_userid=notification.ownerId,
-                    when=notification.date,
-                )
-                if new_sleep_data:
-                    _mark_fitbit_notification_processed(notification)
-            elif notification.collectionType == "activities":
-                activity_history = await usecase_process_new_activity.do(
-                    local_fitbit_repo=local_fitbit_repo,
-                    remote_fitbit_repo=remote_fitbit_repo,
-                    slack_repo=slack_repo,
-                    fitbit_userid=notification.ownerId,
-                    when=datetime.datetime.now(),
+            await usecase_record_notification.do(
+                local_fitbit_repo=local_fitbit_repo,
+                fitbit_userid=notification.ownerId,
+                collection_type=notification.collectionType,
+            )
+            if _is_fitbit_notification_processed(notification):
+                logger.info(
+                    "fitbit_notificaiton_webhook: skipping duplicate notification"
                 )
-                if activity_history:
-                    _mark_fitbit_notification_processed(notification)
+                continue
+
+            if await usecase_process_notification.do(
+                local_fitbit_repo=local_fitbit_repo,
+                remote_fitbit_repo=remote_fitbit_repo,
+                fitbit_userid=notification.ownerId,
+                collection_type=notification.collectionType,
+                when=notification.date,
+            ):
+                _mark_fitbit_notification_processed(notification)
         except UserLoggedOutException:
             await usecase_post_user_logged_out.do(
                 fitbit_repo=local_fitbit_repo,
@@ -157,6 +165,14 @@ async def fitbit_notification_webhook(
             )
             break
         except UnknownUserException:
-            logging.info("fitbit_notification_webhook: unknown user")
+            logger.info("fitbit_notification_webhook: unknown user")
             return Response(status_code=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error("Error processing fitbit notification", exc_info=True)
+            await usecase_record_failed_event.do(
+                local_failed_event_repo=local_failed_event_repo,
+                source=FailedEventSource.FITBIT,
+                payload=notification.model_dump(mode="json"),
+                error=e,
+            )
     return Response(status_code=status.HTTP_204_NO_CONTENT)
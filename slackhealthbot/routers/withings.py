@@ -1,4 +1,7 @@
+import asyncio
+import dataclasses
 import logging
+from contextlib import suppress
 
 from dependency_injector.wiring import Provide, inject
 from fastapi import APIRouter, Depends, Request, Response, status
@@ -6,15 +9,20 @@ from pydantic import BaseModel
 
 from slackhealthbot.containers import Container
 from slackhealthbot.core.exceptions import UnknownUserException, UserLoggedOutException
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
 from slackhealthbot.domain.localrepository.localwithingsrepository import (
     LocalWithingsRepository,
 )
+from slackhealthbot.domain.models.failedevent import FailedEventSource
 from slackhealthbot.domain.remoterepository.remoteslackrepository import (
     RemoteSlackRepository,
 )
 from slackhealthbot.domain.remoterepository.remotewithingsrepository import (
     RemoteWithingsRepository,
 )
+from slackhealthbot.domain.usecases.failedevents import usecase_record_failed_event
 from slackhealthbot.domain.usecases.withings import (
     usecase_login_user,
     usecase_post_user_logged_out,
@@ -25,14 +33,19 @@ from slackhealthbot.domain.usecases.withings.usecase_process_new_weight import (
 )
 from slackhealthbot.oauth.config import oauth
 from slackhealthbot.routers.dependencies import (
+    failed_event_repository_factory,
+    get_local_failed_event_repository,
     get_local_withings_repository,
     get_remote_withings_repository,
     get_slack_repository,
-    templates,
+    get_templates,
+    withings_repository_factory,
 )
 from slackhealthbot.settings import Settings
 
 router = APIRouter()
+# A named logger, so that the webhook logs can be sampled.
+logger = logging.getLogger(__name__)
 
 
 @router.head("/withings-oauth-webhook/")
@@ -62,7 +75,7 @@ async def withings_oauth_webhook(
         token=token,
         slack_alias=request.session.pop("slack_alias"),
     )
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         request=request, name="login_complete.html", context={"provider": "withings"}
     )
 
@@ -83,6 +96,11 @@ async def get_withings_authorization(
 
 
 last_processed_withings_notification_per_user = {}
+# The merged notifications waiting for the end of their user's window.
+pending_withings_notification_per_user: dict[str, NewWeightParameters] = {}
+# Set to end the window of a user early.
+_pending_withings_notification_window_ends: dict[str, asyncio.Event] = {}
+_pending_withings_notification_tasks: set[asyncio.Task] = set()
 
 
 class WithingsNotification(BaseModel):
@@ -95,8 +113,121 @@ async def parse_notification(request: Request):
     return WithingsNotification(**(await request.form()))
 
 
+async def _process_notification(
+    withings_local_repo: LocalWithingsRepository,
+    withings_remote_repo: RemoteWithingsRepository,
+    slack_repo: RemoteSlackRepository,
+    local_failed_event_repo: LocalFailedEventRepository,
+    new_weight_parameters: NewWeightParameters,
+):
+    """
+    :raises:
+        UnknownUserException if the user isn't known.
+    """
+    withings_userid = new_weight_parameters.withings_userid
+    date_range = (new_weight_parameters.startdate, new_weight_parameters.enddate)
+    if last_processed_withings_notification_per_user.get(withings_userid) == date_range:
+        logger.info("Ignoring duplicate withings notification")
+        return
+    try:
+        await usecase_process_new_weight.do(
+            local_withings_repo=withings_local_repo,
+            remote_withings_repo=withings_remote_repo,
+            new_weight_parameters=new_weight_parameters,
+        )
+        last_processed_withings_notification_per_user[withings_userid] = date_range
+    except UserLoggedOutException:
+        await usecase_post_user_logged_out.do(
+            withings_repo=withings_local_repo,
+            slack_repo=slack_repo,
+            withings_userid=withings_userid,
+        )
+    except UnknownUserException:
+        raise
+    except Exception as e:
+        logger.error("Error processing withings notification", exc_info=True)
+        await usecase_record_failed_event.do(
+            local_failed_event_repo=local_failed_event_repo,
+            source=FailedEventSource.WITHINGS,
+            payload=dataclasses.asdict(new_weight_parameters),
+            error=e,
+        )
+
+
+async def _process_notification_after_window(
+    withings_userid: str,
+    window_seconds: float,
+    withings_remote_repo: RemoteWithingsRepository,
+    slack_repo: RemoteSlackRepository,
+):
+    window_end = _pending_withings_notification_window_ends[withings_userid]
+    with suppress(TimeoutError):
+        await asyncio.wait_for(window_end.wait(), timeout=window_seconds)
+    del _pending_withings_notification_window_ends[withings_userid]
+    new_weight_parameters = pending_withings_notification_per_user.pop(withings_userid)
+    # The session of the request which opened the window is closed by now.
+    async with (
+        withings_repository_factory()() as withings_local_repo,
+        failed_event_repository_factory()() as local_failed_event_repo,
+    ):
+        try:
+            await _process_notification(
+                withings_local_repo=withings_local_repo,
+                withings_remote_repo=withings_remote_repo,
+                slack_repo=slack_repo,
+                local_failed_event_repo=local_failed_event_repo,
+                new_weight_parameters=new_weight_parameters,
+            )
+        except Exception:
+            logger.error("Error processing withings notification", exc_info=True)
+
+
+def _coalesce_notification(
+    notification: WithingsNotification,
+    window_seconds: float,
+    withings_remote_repo: RemoteWithingsRepository,
+    slack_repo: RemoteSlackRepository,
+):
+    pending = pending_withings_notification_per_user.get(notification.userid)
+    if pending:
+        logger.info("Merging withings notification into the pending one")
+        pending.startdate = min(pending.startdate, notification.startdate)
+        pending.enddate = max(pending.enddate, notification.enddate)
+        return
+    pending_withings_notification_per_user[notification.userid] = NewWeightParameters(
+        withings_userid=notification.userid,
+        startdate=notification.startdate,
+        enddate=notification.enddate,
+    )
+    _pending_withings_notification_window_ends[notification.userid] = asyncio.Event()
+    task = asyncio.create_task(
+        _process_notification_after_window(
+            withings_userid=notification.userid,
+            window_seconds=window_seconds,
+            withings_remote_repo=withings_remote_repo,
+            slack_repo=slack_repo,
+        )
+    )
+    # Keep a reference to the task, so it isn't garbage collected.
+    _pending_withings_notification_tasks.add(task)
+    task.add_done_callback(_pending_withings_notification_tasks.discard)
+
+
+async def process_pending_withings_notifications():
+    """
+    End the windows early, and wait for their notifications to be processed.
+
+    The windows are only held in memory: if the process is killed
+    before this runs, the withings poll catches up on the weights.
+    """
+    for window_end in _pending_withings_notification_window_ends.values():
+        window_end.set()
+    await asyncio.gather(*_pending_withings_notification_tasks)
+
+
 @router.post("/withings-notification-webhook/")
-async def withings_notification_webhook(
+@inject
+async def withings_notification_webhook(  # noqa: PLR0913
     notification: WithingsNotification = Depends(parse_notification),
     withings_local_repo: LocalWithingsRepository = Depends(
         get_local_withings_repository
@@ -105,39 +236,48 @@ async def withings_notification_webhook(
         get_remote_withings_repository
     ),
     slack_repo: RemoteSlackRepository = Depends(get_slack_repository),
+    local_failed_event_repo: LocalFailedEventRepository = Depends(
+        get_local_failed_event_repository
+    ),
+    settings: Settings = Depends(Provide[Container.settings]),
 ):
-    logging.info(
-        "withings_notification_webhook: "
-        + f"userid={notification.userid}, startdate={notification.startdate}, enddate={notification.enddate}"
-    )
-    if last_processed_withings_notification_per_user.get(notification.userid, None) != (
+    logger.info(
+        "withings_notification_webhook: userid=%s, startdate=%s, enddate=%s",
+        notification.userid,
         notification.startdate,
         notification.enddate,
-    ):
+    )
+    window_seconds = settings.app_settings.withings.notification_window_seconds
+    if not window_seconds:
         try:
-            await usecase_process_new_weight.do(
-                local_withings_repo=withings_local_repo,
-                remote_withings_repo=withings_remote_repo,
+            await _process_notification(
+                withings_local_repo=withings_local_repo,
+                withings_remote_repo=withings_remote_repo,
                 slack_repo=slack_repo,
+                local_failed_event_repo=local_failed_event_repo,
                 new_weight_parameters=NewWeightParameters(
                     withings_userid=notification.userid,
                     startdate=notification.startdate,
                     enddate=notification.enddate,
                 ),
             )
-            last_processed_withings_notification_per_user[notification.userid] = (
-                notification.startdate,
-                notification.enddate,
-            )
-        except UserLoggedOutException:
-            await usecase_post_user_logged_out.do(
-                withings_repo=withings_local_repo,
-                slack_repo=slack_repo,
-                withings_userid=notification.userid,
-            )
         except UnknownUserException:
-            logging.info("withings_notification_webhook: unknown user")
+            logger.info("withings_notification_webhook: unknown user")
             return Response(status_code=status.HTTP_404_NOT_FOUND)
-    else:
-        logging.info("Ignoring duplicate withings notification")
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    if (
+        notification.userid not in pending_withings_notification_per_user
+        and not await withings_local_repo.get_user_identity_by_withings_userid(
+            withings_userid=notification.userid,
+        )
+    ):
+        logger.info("withings_notification_webhook: unknown user")
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    _coalesce_notification(
+        notification=notification,
+        window_seconds=window_seconds,
+        withings_remote_repo=withings_remote_repo,
+        slack_repo=slack_repo,
+    )
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -4,19 +4,19 @@ import enum
 import os
 from copy import deepcopy
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from typing import Optional
+from typing import Optional, Self
 
 import yaml
-from pydantic import AnyHttpUrl, BaseModel, HttpUrl
-from pydantic.v1.utils import deep_update
+from pydantic import AnyHttpUrl, BaseModel, Field, HttpUrl, model_validator
 from pydantic_settings import (
     BaseSettings,
+    InitSettingsSource,
     PydanticBaseSettingsSource,
     SettingsConfigDict,
-    YamlConfigSettingsSource,
 )
 
+from slackhealthbot.core.dicts import deep_update
+
 
 @dataclasses.dataclass
 class WithingsOAuthSettings:
@@ -35,9 +35,72 @@ class FitbitOAuthSettings:
     subscriber_verification_code: str
 
 
+class HttpClient(BaseModel):
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_seconds: float = 30.0
+    timeout_seconds: float = 5.0
+
+
+class Resilience(BaseModel):
+    # The max number of retries of idempotent requests which failed
+    # with a connection error, a 5xx or a 429.
+    max_retries: int = 2
+    backoff_base_seconds: float = 0.5
+    backoff_max_seconds: float = 10.0
+    # Fail fast after this many consecutive failed requests,
+    # until reset_timeout_seconds have passed.
+    failure_threshold: int = 5
+    reset_timeout_seconds: float = 30.0
+
+
+class AdaptivePoll(BaseModel):
+    # If enabled, the intervals replace Poll.interval_seconds.
+    enabled: bool = False
+    min_interval_seconds: int = Field(default=1800, ge=1)
+    max_interval_seconds: int = 86400
+
+    @model_validator(mode="after")
+    def check_intervals(self) -> Self:
+        if self.min_interval_seconds > self.max_interval_seconds:
+            raise ValueError(
+                f"min_interval_seconds {self.min_interval_seconds} must not be "
+                f"greater than max_interval_seconds {self.max_interval_seconds}"
+            )
+        return self
+
+
 class Poll(BaseModel):
     enabled: bool = True
     interval_seconds: int = 3600
+    adaptive: AdaptivePoll = AdaptivePoll()
+    # Static sharding: if shard_count is set, this replica only polls
+    # the users whose fitbit userid hashes into shard_index.
+    # If shard_count isn't set, the shard is derived from the replicas
+    # currently registered in the database.
+    shard_index: int = Field(default=0, ge=0)
+    shard_count: int | None = Field(default=None, ge=1)
+    replica_timeout_seconds: int = 7200
+    # Don't poll users whose webhook subscriptions were recently verified.
+    skip_subscribed_users: bool = False
+    # If set, only poll a user's collection type if its webhook
+    # notifications have been silent for this long.
+    webhook_silence_threshold_seconds: int | None = None
+
+    @model_validator(mode="after")
+    def check_shard(self) -> Self:
+        if self.shard_count is not None and self.shard_index >= self.shard_count:
+            raise ValueError(
+                f"shard_index {self.shard_index} must be lower than "
+                f"shard_count {self.shard_count}"
+            )
+        return self
+
+
+class Subscriptions(BaseModel):
+    reconcile: bool = True
+    reconcile_interval_seconds: int = 86400
+    reconcile_concurrency: int = 4
 
 
 class ReportField(enum.StrEnum):
@@ -63,9 +126,19 @@ class ActivityType(BaseModel):
     report: Report | None = None
 
 
+class ActivitiesRetention(BaseModel):
+    enabled: bool = False
+    # Activities older than this are compacted into daily aggregates.
+    detail_days: int = 365
+    interval_seconds: int = 86400
+
+
 class Activities(BaseModel):
     daily_report_time: dt.time = dt.time(hour=23, second=50)
     history_days: int = 180
+    # How often to refresh the names of fitbit's activity types.
+    activity_type_catalogue_ttl_seconds: int = 2592000
+    retention: ActivitiesRetention = ActivitiesRetention()
     activity_types: list[ActivityType]
     default_report: Report = Report(
         daily=False,
@@ -117,26 +190,115 @@ class Activities(BaseModel):
 class Fitbit(BaseModel):
     poll: Poll
     activities: Activities
+    subscriptions: Subscriptions = Subscriptions()
     base_url: str = "https://api.fitbit.com/"
     oauth_scopes: list[str] = ["sleep", "activity"]
+    http_client: HttpClient = HttpClient()
+    resilience: Resilience = Resilience()
+
+
+class WithingsPoll(BaseModel):
+    enabled: bool = True
+    interval_seconds: int = 3600
+    # The max number of users polled at the same time.
+    concurrency: int = 4
 
 
 class Withings(BaseModel):
     callback_url: AnyHttpUrl
     base_url: str = "https://wbsapi.withings.net/"
     oauth_scopes: list[str] = ["user.metrics", "user.activity"]
+    http_client: HttpClient = HttpClient()
+    resilience: Resilience = Resilience()
+    # Notifications for a user within this delay of their first one
+    # are processed together. Opt-in: the pending notifications are only
+    # held in memory. 0 to process each notification right away.
+    notification_window_seconds: float = 0.0
+    poll: WithingsPoll = WithingsPoll()
+
+
+class SlackOutbox(BaseModel):
+    # How often to look for notifications to post.
+    interval_seconds: float = 1.0
+    # The max number of notifications read at a time.
+    batch_size: int = 50
+    # The delay before retrying a failed post, doubled after each failed attempt.
+    backoff_base_seconds: int = 30
+    backoff_max_seconds: int = 3600
+    # Give up posting a notification after this many failed attempts.
+    max_attempts: int = 20
+    # How long to remember the sent notifications, so that they're not posted twice.
+    retention_days: int = 7
+
+
+class Slack(BaseModel):
+    resilience: Resilience = Resilience()
+    outbox: SlackOutbox = SlackOutbox()
+
+
+class LogFormat(enum.StrEnum):
+    text = enum.auto()
+    json = enum.auto()
 
 
 class Logging(BaseModel):
     sql_log_level: str = "WARNING"
+    format: LogFormat = LogFormat.text
+    # The fraction of the records below WARNING to keep, per logger name.
+    # A logger's rate also applies to its children.
+    sampling_rates: dict[str, float] = {}
+    # Log the payloads of webhook notifications and remote api responses.
+    log_payloads: bool = False
+
+
+class DatabaseWriter(BaseModel):
+    # Apply the writes from a single task, committing them in batches.
+    group_commit: bool = False
+    max_batch_size: int = 100
+
+
+class FailedEvents(BaseModel):
+    # Replay the failed notifications in the background.
+    replay: bool = True
+    interval_seconds: int = 60
+    # The delay before the first replay, doubled after each failed replay.
+    backoff_base_seconds: int = 60
+    backoff_max_seconds: int = 21600
+    # Give up replaying an event after this many failed attempts.
+    max_attempts: int = 10
+    # The max number of events replayed at the same time.
+    concurrency: int = 4
+
+
+class RuntimeProfile(enum.StrEnum):
+    # The asyncio event loop and the pure-python h11 http parser.
+    default = enum.auto()
+    # uvloop and the httptools http parser, when they're installed.
+    production = enum.auto()
+
+
+class Server(BaseModel):
+    host: str = "0.0.0.0"
+    port: int = 8000
+    profile: RuntimeProfile = RuntimeProfile.default
+    # The number of processes serving the requests.
+    # Only one of them runs the single-worker tasks.
+    workers: int = Field(default=1, ge=1)
+    # At shutdown, how long to wait for the requests in progress,
+    # before closing their connections.
+    graceful_shutdown_timeout_seconds: float = 8.0
 
 
 class AppSettings(BaseSettings):
     server_url: AnyHttpUrl
+    server: Server = Server()
     database_path: Path = "/tmp/data/slackhealthbot.db"
+    database_writer: DatabaseWriter = DatabaseWriter()
+    failed_events: FailedEvents = FailedEvents()
     logging: Logging
     withings: Withings
     fitbit: Fitbit
+    slack: Slack = Slack()
     model_config = SettingsConfigDict(
         env_nested_delimiter="__",
     )
@@ -172,14 +334,11 @@ class AppSettings(BaseSettings):
         env_settings: PydanticBaseSettingsSource,
         **kwargs,
     ) -> tuple[PydanticBaseSettingsSource, ...]:
-        merged_config = cls._load_merged_config()
-        with NamedTemporaryFile(mode="w") as file:
-            yaml.safe_dump(merged_config, file.file)
-            yaml_settings_source = YamlConfigSettingsSource(
-                settings_cls,
-                yaml_file=file.name,
-            )
-        return (env_settings, yaml_settings_source)
+        config_settings_source = InitSettingsSource(
+            settings_cls,
+            init_kwargs=cls._load_merged_config(),
+        )
+        return (env_settings, config_settings_source)
 
 
 class SecretSettings(BaseSettings):
@@ -189,6 +348,9 @@ class SecretSettings(BaseSettings):
     fitbit_client_secret: str
     fitbit_client_subscriber_verification_code: str
     slack_webhook_url: HttpUrl
+    # Signs the session cookies. If it's not set, a random key is used,
+    # shared by the workers of the process.
+    session_secret_key: str | None = None
     model_config = SettingsConfigDict(env_file=".env")
 
 
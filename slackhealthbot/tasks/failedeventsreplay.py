@@ -0,0 +1,170 @@
+import asyncio
+import dataclasses
+import datetime
+import logging
+from typing import AsyncContextManager, AsyncIterable, Callable
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.core.exceptions import UnknownUserException, UserLoggedOutException
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.localrepository.localwithingsrepository import (
+    LocalWithingsRepository,
+)
+from slackhealthbot.domain.models.failedevent import FailedEvent, FailedEventSource
+from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
+    RemoteFitbitRepository,
+)
+from slackhealthbot.domain.remoterepository.remotewithingsrepository import (
+    RemoteWithingsRepository,
+)
+from slackhealthbot.domain.usecases.failedevents import usecase_record_failed_replay
+from slackhealthbot.domain.usecases.fitbit import usecase_process_notification
+from slackhealthbot.domain.usecases.withings import usecase_process_new_weight
+from slackhealthbot.domain.usecases.withings.usecase_process_new_weight import (
+    NewWeightParameters,
+)
+from slackhealthbot.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# The max number of due events read at a time.
+_BATCH_SIZE = 100
+# How long a replica has to replay the events it claimed,
+# before the other replicas can replay them.
+_CLAIM_LEASE = datetime.timedelta(minutes=10)
+
+
+@dataclasses.dataclass
+class ReplayRepositories:
+    local_failed_event_repo_factory: Callable[
+        [], AsyncContextManager[LocalFailedEventRepository]
+    ]
+    local_fitbit_repo_factory: Callable[[], AsyncContextManager[LocalFitbitRepository]]
+    remote_fitbit_repo: RemoteFitbitRepository
+    local_withings_repo_factory: Callable[
+        [], AsyncContextManager[LocalWithingsRepository]
+    ]
+    remote_withings_repo: RemoteWithingsRepository
+
+
+async def _process_event(event: FailedEvent, repos: ReplayRepositories):
+    if event.source == FailedEventSource.FITBIT:
+        date = event.payload.get("date")
+        async with repos.local_fitbit_repo_factory() as local_fitbit_repo:
+            await usecase_process_notification.do(
+                local_fitbit_repo=local_fitbit_repo,
+                remote_fitbit_repo=repos.remote_fitbit_repo,
+                fitbit_userid=event.payload["ownerId"],
+                collection_type=event.payload.get("collectionType"),
+                when=datetime.date.fromisoformat(date) if date else None,
+            )
+    else:
+        async with repos.local_withings_repo_factory() as local_withings_repo:
+            await usecase_process_new_weight.do(
+                local_withings_repo=local_withings_repo,
+                remote_withings_repo=repos.remote_withings_repo,
+                new_weight_parameters=NewWeightParameters(**event.payload),
+            )
+
+
+async def replay_failed_event(event: FailedEvent, repos: ReplayRepositories) -> bool:
+    """
+    Process the event again. If it succeeds, forget it.
+    Otherwise, postpone its next replay.
+
+    :return: whether the event was replayed successfully.
+    """
+    try:
+        await _process_event(event, repos)
+    except (UserLoggedOutException, UnknownUserException):
+        # The user will get their data when they log in again.
+        logger.info(f"Dropping failed event {event.id}: unknown or logged out user")
+    except Exception as e:
+        logger.warning(f"Error replaying failed event {event.id}", exc_info=True)
+        async with repos.local_failed_event_repo_factory() as local_failed_event_repo:
+            await usecase_record_failed_replay.do(
+                local_failed_event_repo=local_failed_event_repo,
+                event=event,
+                error=e,
+            )
+        return False
+    async with repos.local_failed_event_repo_factory() as local_failed_event_repo:
+        await local_failed_event_repo.delete_failed_event(id=event.id)
+    return True
+
+
+async def replay_failed_events(
+    events: AsyncIterable[FailedEvent],
+    repos: ReplayRepositories,
+    concurrency: int,
+) -> tuple[int, int]:
+    """
+    Replay the events, with at most the given number of events
+    being replayed at the same time.
+
+    :return: the number of events replayed successfully, and of failed replays.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: list[bool] = []
+
+    async def replay(event: FailedEvent):
+        try:
+            results.append(await replay_failed_event(event, repos))
+        finally:
+            semaphore.release()
+
+    async with asyncio.TaskGroup() as task_group:
+        async for event in events:
+            await semaphore.acquire()
+            task_group.create_task(replay(event))
+    return results.count(True), results.count(False)
+
+
+async def _claim_due_events(repos: ReplayRepositories) -> AsyncIterable[FailedEvent]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    async with repos.local_failed_event_repo_factory() as local_failed_event_repo:
+        for event in await local_failed_event_repo.get_due_failed_events(
+            now=now, limit=_BATCH_SIZE
+        ):
+            if await local_failed_event_repo.claim_failed_event(
+                id=event.id,
+                next_attempt_at=event.next_attempt_at,
+                lease_until=now + _CLAIM_LEASE,
+            ):
+                yield event
+
+
+@inject
+async def schedule_failed_events_replay(
+    repos: ReplayRepositories,
+    initial_delay_s: int,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> asyncio.Task:
+    failed_events_settings = settings.app_settings.failed_events
+
+    async def run_with_delay():
+        await asyncio.sleep(initial_delay_s)
+        while True:
+            try:
+                replayed, failed = await replay_failed_events(
+                    events=_claim_due_events(repos),
+                    repos=repos,
+                    concurrency=failed_events_settings.concurrency,
+                )
+                if replayed or failed:
+                    logger.info(
+                        f"Replayed {replayed} failed events, {failed} failed again"
+                    )
+            except Exception:
+                logger.error("Error replaying failed events", exc_info=True)
+            await asyncio.sleep(failed_events_settings.interval_seconds)
+
+    return asyncio.create_task(run_with_delay())
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+from typing import AsyncContextManager, Callable
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.usecases.fitbit import usecase_compact_activities
+from slackhealthbot.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+@inject
+async def schedule_activities_retention(
+    local_fitbit_repo_factory: Callable[[], AsyncContextManager[LocalFitbitRepository]],
+    initial_delay_s: int,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> asyncio.Task:
+    retention_settings = settings.app_settings.fitbit.activities.retention
+
+    async def run_with_delay():
+        await asyncio.sleep(initial_delay_s)
+        while True:
+            try:
+                async with local_fitbit_repo_factory() as local_fitbit_repo:
+                    await usecase_compact_activities.do(
+                        local_fitbit_repo=local_fitbit_repo,
+                    )
+            except Exception:
+                logger.error("Error compacting fitbit activities", exc_info=True)
+            await asyncio.sleep(retention_settings.interval_seconds)
+
+    return asyncio.create_task(run_with_delay())
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+from typing import AsyncContextManager, Callable
+
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
+    RemoteFitbitRepository,
+)
+from slackhealthbot.domain.usecases.fitbit import usecase_refresh_activity_types
+
+logger = logging.getLogger(__name__)
+
+# Refreshing is a no-op while the catalogue is fresh, so we can check often.
+REFRESH_CHECK_INTERVAL_S = 3600
+
+
+async def schedule_activity_types_refresh(
+    local_fitbit_repo_factory: Callable[[], AsyncContextManager[LocalFitbitRepository]],
+    remote_fitbit_repo: RemoteFitbitRepository,
+    initial_delay_s: int,
+) -> asyncio.Task:
+    async def run():
+        await asyncio.sleep(initial_delay_s)
+        while True:
+            try:
+                async with local_fitbit_repo_factory() as local_fitbit_repo:
+                    await usecase_refresh_activity_types.do(
+                        local_fitbit_repo=local_fitbit_repo,
+                        remote_fitbit_repo=remote_fitbit_repo,
+                    )
+            except Exception:
+                logger.error("Error refreshing fitbit activity types", exc_info=True)
+            await asyncio.sleep(REFRESH_CHECK_INTERVAL_S)
+
+    return asyncio.create_task(run())
@@ -2,29 +2,44 @@ import asyncio
 import dataclasses
 import datetime
 import logging
-from typing import AsyncContextManager, Callable
+import os
+import socket
+from contextlib import nullcontext
+from typing import AsyncContextManager, Awaitable, Callable
 
 from dependency_injector.wiring import Provide, inject
 from fastapi import Depends
 
 from slackhealthbot.containers import Container
-from slackhealthbot.core.exceptions import UserLoggedOutException
+from slackhealthbot.core.exceptions import CircuitOpenException, UserLoggedOutException
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
     UserIdentity,
 )
+from slackhealthbot.domain.models.failedevent import FailedEventSource
+from slackhealthbot.domain.models.poll import ALL_USERS_SHARD, PollShard, PollState
+from slackhealthbot.domain.models.subscription import CollectionType
 from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
     RemoteFitbitRepository,
 )
 from slackhealthbot.domain.remoterepository.remoteslackrepository import (
     RemoteSlackRepository,
 )
+from slackhealthbot.domain.usecases.failedevents import usecase_record_failed_event
 from slackhealthbot.domain.usecases.fitbit import (
+    usecase_get_poll_shard,
+    usecase_get_poll_skips,
     usecase_process_new_activity,
     usecase_process_new_sleep,
 )
 from slackhealthbot.domain.usecases.slack import usecase_post_user_logged_out
-from slackhealthbot.settings import Settings
+from slackhealthbot.settings import Poll, Settings
+from slackhealthbot.tasks.pollschedule import PollSchedule
+
+logger = logging.getLogger(__name__)
 
 
 @dataclasses.dataclass
@@ -33,6 +48,42 @@ class Cache:
         default_factory=dict
     )
     cache_fail: dict[str, datetime.date] = dataclasses.field(default_factory=dict)
+    # Users whose poll state changed since it was last saved.
+    dirty_userids: set[str] = dataclasses.field(default_factory=set)
+    # The shard whose users' poll states were loaded from the database.
+    shard: PollShard | None = None
+
+    def set_poll_state(self, poll_state: PollState):
+        for cache, value in (
+            (self.cache_sleep_success, poll_state.last_sleep_success_date),
+            (self.cache_fail, poll_state.last_fail_alert_date),
+        ):
+            if value:
+                cache[poll_state.fitbit_userid] = value
+            else:
+                cache.pop(poll_state.fitbit_userid, None)
+
+    @property
+    def fitbit_userids(self) -> set[str]:
+        return self.cache_sleep_success.keys() | self.cache_fail.keys()
+
+    def pop_dirty_poll_states(
+        self,
+        schedule: PollSchedule | None = None,
+    ) -> list[PollState]:
+        poll_states = [
+            PollState(
+                fitbit_userid=fitbit_userid,
+                last_sleep_success_date=self.cache_sleep_success.get(fitbit_userid),
+                last_fail_alert_date=self.cache_fail.get(fitbit_userid),
+                last_new_data_at=(
+                    schedule.last_new_data_at.get(fitbit_userid) if schedule else None
+                ),
+            )
+            for fitbit_userid in self.dirty_userids
+        ]
+        self.dirty_userids.clear()
+        return poll_states
 
 
 async def handle_success_poll(
@@ -42,6 +93,7 @@ async def handle_success_poll(
 ):
     cache.cache_sleep_success[fitbit_userid] = when
     cache.cache_fail.pop(fitbit_userid, None)
+    cache.dirty_userids.add(fitbit_userid)
 
 
 async def handle_fail_poll(
@@ -59,59 +111,198 @@ async def handle_fail_poll(
             service="fitbit",
         )
         cache.cache_fail[fitbit_userid] = when
+        cache.dirty_userids.add(fitbit_userid)
 
 
-async def fitbit_poll(
+async def fitbit_poll(  # noqa: PLR0913
     cache: Cache,
     local_fitbit_repo: LocalFitbitRepository,
     remote_fitbit_repo: RemoteFitbitRepository,
     slack_repo: RemoteSlackRepository,
+    replica_id: str,
+    schedule: PollSchedule | None = None,
+    local_failed_event_repo: LocalFailedEventRepository | None = None,
 ):
-    logging.info("fitbit poll")
+    logger.info("fitbit poll")
     today = datetime.date.today()
     try:
+        shard: PollShard = await usecase_get_poll_shard.do(
+            local_fitbit_repo=local_fitbit_repo,
+            replica_id=replica_id,
+        )
+        logger.info(f"fitbit poll shard {shard.index + 1}/{shard.count}")
+        if shard != cache.shard:
+            await load_poll_states(
+                local_fitbit_repo=local_fitbit_repo,
+                cache=cache,
+                schedule=schedule,
+                shard=shard,
+            )
+        skip_fitbit_userids = await usecase_get_poll_skips.do(
+            local_fitbit_repo=local_fitbit_repo,
+        )
         await do_poll(
             local_fitbit_repo=local_fitbit_repo,
             remote_fitbit_repo=remote_fitbit_repo,
             slack_repo=slack_repo,
             cache=cache,
             when=today,
+            shard=shard,
+            schedule=schedule,
+            skip_fitbit_userids=skip_fitbit_userids,
+            local_failed_event_repo=local_failed_event_repo,
+        )
+    except CircuitOpenException:
+        # The remaining users are polled in the next cycle.
+        logger.warning("Stopped polling fitbit: fitbit is unavailable")
+    except Exception:
+        logger.error("Error polling fitbit", exc_info=True)
+    finally:
+        await save_poll_states(
+            local_fitbit_repo=local_fitbit_repo,
+            cache=cache,
+            schedule=schedule,
         )
+
+
+async def save_poll_states(
+    local_fitbit_repo: LocalFitbitRepository,
+    cache: Cache,
+    schedule: PollSchedule | None,
+):
+    poll_states = cache.pop_dirty_poll_states(schedule)
+    try:
+        await local_fitbit_repo.upsert_poll_states(poll_states)
     except Exception:
-        logging.error("Error polling fitbit", exc_info=True)
+        logger.error("Error saving fitbit poll states", exc_info=True)
+        # Try again next time.
+        cache.dirty_userids.update(x.fitbit_userid for x in poll_states)
 
 
-async def do_poll(
+async def load_poll_states(
+    local_fitbit_repo: LocalFitbitRepository,
+    cache: Cache,
+    schedule: PollSchedule | None,
+    shard: PollShard = ALL_USERS_SHARD,
+):
+    """
+    Load the saved poll states of the users which the shard has, and which
+    the cache's shard didn't have: all of them after a restart, and then the
+    users taken over from other replicas. What we remember about them is stale,
+    if another replica polled them since.
+    """
+
+    def is_taken_over(fitbit_userid: str) -> bool:
+        return (
+            shard.contains(fitbit_userid)
+            and not (cache.shard and cache.shard.contains(fitbit_userid))
+            # Not saved yet: more recent than the database.
+            and fitbit_userid not in cache.dirty_userids
+        )
+
+    poll_states: list[PollState] = [
+        x
+        for x in await local_fitbit_repo.get_poll_states()
+        if is_taken_over(x.fitbit_userid)
+    ]
+    for fitbit_userid in cache.fitbit_userids:
+        if is_taken_over(fitbit_userid):
+            cache.set_poll_state(PollState(fitbit_userid=fitbit_userid))
+    for poll_state in poll_states:
+        cache.set_poll_state(poll_state)
+        if schedule and poll_state.last_new_data_at:
+            schedule.last_new_data_at[poll_state.fitbit_userid] = (
+                poll_state.last_new_data_at
+            )
+    cache.shard = shard
+
+
+async def do_poll(  # noqa: PLR0913
     local_fitbit_repo: LocalFitbitRepository,
     remote_fitbit_repo: RemoteFitbitRepository,
     slack_repo: RemoteSlackRepository,
     cache: Cache,
     when: datetime.date,
+    shard: PollShard = ALL_USERS_SHARD,
+    schedule: PollSchedule | None = None,
+    skip_fitbit_userids: dict[CollectionType, set[str]] | None = None,
+    local_failed_event_repo: LocalFailedEventRepository | None = None,
 ):
-    user_identities: list[UserIdentity] = (
-        await local_fitbit_repo.get_all_user_identities()
+    """
+    :param skip_fitbit_userids: the users not to poll, per collection type.
+    :param local_failed_event_repo: if given, a user whose poll fails is recorded
+        as a failed event, to be replayed, and the poll goes on with the other users.
+    """
+    skip_fitbit_userids = skip_fitbit_userids or {}
+    sleep_skip_fitbit_userids = skip_fitbit_userids.get(CollectionType.SLEEP, set())
+    activity_skip_fitbit_userids = skip_fitbit_userids.get(
+        CollectionType.ACTIVITIES, set()
     )
-    for user_identity in user_identities:
-        await fitbit_poll_sleep(
-            local_fitbit_repo=local_fitbit_repo,
-            remote_fitbit_repo=remote_fitbit_repo,
-            slack_repo=slack_repo,
-            cache=cache,
-            poll_target=PollTarget(
-                when=when,
-                user_identity=user_identity,
-            ),
+
+    def is_polled(user_identity: UserIdentity) -> bool:
+        return shard.contains(user_identity.fitbit_userid) and not (
+            user_identity.fitbit_userid in sleep_skip_fitbit_userids
+            and user_identity.fitbit_userid in activity_skip_fitbit_userids
         )
-        await fitbit_poll_activity(
-            local_fitbit_repo=local_fitbit_repo,
-            remote_fitbit_repo=remote_fitbit_repo,
-            slack_repo=slack_repo,
-            cache=cache,
-            poll_target=PollTarget(
-                when=when,
-                user_identity=user_identity,
-            ),
+
+    # The users are streamed from the database, rather than loaded all at once.
+    due_userids: set[str] | None = None
+    if schedule:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        schedule.sync(
+            [
+                x.fitbit_userid
+                async for x in local_fitbit_repo.iter_user_identities()
+                if is_polled(x)
+            ],
+            now=now,
         )
+        due_userids = set(schedule.pop_due(now=now))
+        logger.info(f"fitbit poll: {len(due_userids)} users due")
+
+    async for user_identity in local_fitbit_repo.iter_user_identities():
+        if not is_polled(user_identity) or (
+            due_userids is not None and user_identity.fitbit_userid not in due_userids
+        ):
+            continue
+        poll_target = PollTarget(when=when, user_identity=user_identity)
+        has_new_sleep = False
+        if user_identity.fitbit_userid not in sleep_skip_fitbit_userids:
+            has_new_sleep = await _poll_or_record_failure(
+                fitbit_poll_sleep(
+                    local_fitbit_repo=local_fitbit_repo,
+                    remote_fitbit_repo=remote_fitbit_repo,
+                    slack_repo=slack_repo,
+                    cache=cache,
+                    poll_target=poll_target,
+                ),
+                local_failed_event_repo=local_failed_event_repo,
+                collection_type=CollectionType.SLEEP,
+                poll_target=poll_target,
+            )
+        has_new_activity = False
+        if user_identity.fitbit_userid not in activity_skip_fitbit_userids:
+            has_new_activity = await _poll_or_record_failure(
+                fitbit_poll_activity(
+                    local_fitbit_repo=local_fitbit_repo,
+                    remote_fitbit_repo=remote_fitbit_repo,
+                    slack_repo=slack_repo,
+                    cache=cache,
+                    poll_target=poll_target,
+                ),
+                local_failed_event_repo=local_failed_event_repo,
+                collection_type=CollectionType.ACTIVITIES,
+                poll_target=poll_target,
+            )
+        if schedule:
+            has_new_data = has_new_sleep or has_new_activity
+            schedule.record(
+                user_identity.fitbit_userid,
+                now=datetime.datetime.now(datetime.timezone.utc),
+                has_new_data=has_new_data,
+            )
+            if has_new_data:
+                cache.dirty_userids.add(user_identity.fitbit_userid)
 
 
 @dataclasses.dataclass
@@ -120,19 +311,50 @@ class PollTarget:
     user_identity: UserIdentity
 
 
+async def _poll_or_record_failure(
+    poll: Awaitable[bool],
+    local_failed_event_repo: LocalFailedEventRepository | None,
+    collection_type: CollectionType,
+    poll_target: PollTarget,
+) -> bool:
+    try:
+        return await poll
+    except CircuitOpenException:
+        raise
+    except Exception as e:
+        if local_failed_event_repo is None:
+            raise
+        logger.error(f"Error polling fitbit {collection_type}", exc_info=True)
+        await usecase_record_failed_event.do(
+            local_failed_event_repo=local_failed_event_repo,
+            source=FailedEventSource.FITBIT,
+            # Replayed like a webhook notification.
+            payload={
+                "collectionType": collection_type,
+                "ownerId": poll_target.user_identity.fitbit_userid,
+                "date": poll_target.when.isoformat(),
+            },
+            error=e,
+        )
+        return False
+
+
 async def fitbit_poll_activity(
     local_fitbit_repo: LocalFitbitRepository,
     remote_fitbit_repo: RemoteFitbitRepository,
     slack_repo: RemoteSlackRepository,
     cache: Cache,
     poll_target: PollTarget,
-):
+) -> bool:
+    """
+    :return: whether a new activity was found
+    """
+    fitbit_userid = poll_target.user_identity.fitbit_userid
     try:
-        await usecase_process_new_activity.do(
+        new_activity_data = await usecase_process_new_activity.do(
             local_fitbit_repo=local_fitbit_repo,
             remote_fitbit_repo=remote_fitbit_repo,
-            slack_repo=slack_repo,
-            fitbit_userid=poll_target.user_identity.fitbit_userid,
+            fitbit_userid=fitbit_userid,
             when=datetime.datetime.now(),
         )
     except UserLoggedOutException:
@@ -143,6 +365,8 @@ async def fitbit_poll_activity(
             when=poll_target.when,
             cache=cache,
         )
+        return False
+    return new_activity_data is not None
 
 
 async def fitbit_poll_sleep(
@@ -151,7 +375,10 @@ async def fitbit_poll_sleep(
     slack_repo: RemoteSlackRepository,
     cache: Cache,
     poll_target: PollTarget,
-):
+) -> bool:
+    """
+    :return: whether a new sleep was found
+    """
     latest_successful_poll = cache.cache_sleep_success.get(
         poll_target.user_identity.fitbit_userid
     )
@@ -160,7 +387,6 @@ async def fitbit_poll_sleep(
             sleep_data = await usecase_process_new_sleep.do(
                 local_fitbit_repo=local_fitbit_repo,
                 remote_fitbit_repo=remote_fitbit_repo,
-                slack_repo=slack_repo,
                 fitbit_userid=poll_target.user_identity.fitbit_userid,
                 when=poll_target.when,
             )
@@ -179,6 +405,12 @@ async def fitbit_poll_sleep(
                     when=poll_target.when,
                     cache=cache,
                 )
+                return True
+    return False
+
+
+def _default_replica_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
 
 
 @inject
@@ -188,24 +420,96 @@ async def schedule_fitbit_poll(  # noqa: PLR0913 deal with it later
     slack_repo: RemoteSlackRepository,
     initial_delay_s: int | None = None,
     cache: Cache = None,
+    replica_id: str | None = None,
+    local_failed_event_repo_factory: (
+        Callable[[], AsyncContextManager[LocalFailedEventRepository]] | None
+    ) = None,
     settings: Settings = Depends(Provide[Container.settings]),
 ):
-    if cache is None:
-        cache = Cache()
+    if replica_id is None:
+        replica_id = _default_replica_id()
 
+    poll_settings = settings.app_settings.fitbit.poll
     if initial_delay_s is None:
-        initial_delay_s = settings.app_settings.fitbit.poll.interval_seconds
+        initial_delay_s = poll_settings.interval_seconds
+
+    schedule: PollSchedule | None = None
+    if poll_settings.adaptive.enabled:
+        schedule = PollSchedule(
+            min_interval=datetime.timedelta(
+                seconds=poll_settings.adaptive.min_interval_seconds
+            ),
+            max_interval=datetime.timedelta(
+                seconds=poll_settings.adaptive.max_interval_seconds
+            ),
+        )
 
     async def run_with_delay():
-        await asyncio.sleep(initial_delay_s)
-        while True:
-            async with local_fitbit_repo_factory() as local_fitbit_repo:
-                await fitbit_poll(
-                    cache=cache,
-                    local_fitbit_repo=local_fitbit_repo,
-                    remote_fitbit_repo=remote_fitbit_repo,
-                    slack_repo=slack_repo,
-                )
-            await asyncio.sleep(settings.app_settings.fitbit.poll.interval_seconds)
+        nonlocal cache
+        joined_poll_replicas = False
+        try:
+            await asyncio.sleep(initial_delay_s)
+            if cache is None:
+                # Filled by each poll with the states saved before the last restart,
+                # or by other replicas, to avoid fetching data or posting alerts
+                # which were already done.
+                cache = Cache()
+            while True:
+                joined_poll_replicas = True
+                async with (
+                    local_fitbit_repo_factory() as local_fitbit_repo,
+                    (local_failed_event_repo_factory or nullcontext)() as (
+                        local_failed_event_repo
+                    ),
+                ):
+                    await fitbit_poll(
+                        cache=cache,
+                        local_fitbit_repo=local_fitbit_repo,
+                        remote_fitbit_repo=remote_fitbit_repo,
+                        slack_repo=slack_repo,
+                        replica_id=replica_id,
+                        schedule=schedule,
+                        local_failed_event_repo=local_failed_event_repo,
+                    )
+                await asyncio.sleep(_get_sleep_seconds(poll_settings, schedule))
+        finally:
+            if (
+                joined_poll_replicas
+                and not settings.app_settings.fitbit.poll.shard_count
+            ):
+                # Leave the membership, so the other replicas can take over our users
+                # right away, rather than after the replica timeout.
+                await _leave_poll_replicas(local_fitbit_repo_factory, replica_id)
 
     return asyncio.create_task(run_with_delay())
+
+
+def _get_sleep_seconds(
+    poll_settings: Poll,
+    schedule: PollSchedule | None,
+) -> float:
+    if not schedule:
+        return poll_settings.interval_seconds
+    # Wake up when the next user is due, but at least every min interval,
+    # to pick up new users.
+    sleep_seconds = poll_settings.adaptive.min_interval_seconds
+    next_poll_at = schedule.next_poll_at()
+    if next_poll_at:
+        sleep_seconds = min(
+            sleep_seconds,
+            (
+                next_poll_at - datetime.datetime.now(datetime.timezone.utc)
+            ).total_seconds(),
+        )
+    return max(sleep_seconds, 0)
+
+
+async def _leave_poll_replicas(
+    local_fitbit_repo_factory: Callable[[], AsyncContextManager[LocalFitbitRepository]],
+    replica_id: str,
+):
+    try:
+        async with local_fitbit_repo_factory() as local_fitbit_repo:
+            await local_fitbit_repo.delete_poll_replica(replica_id=replica_id)
+    except Exception:
+        logger.warning("Error unregistering fitbit poll replica", exc_info=True)
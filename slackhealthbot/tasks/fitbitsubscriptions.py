@@ -0,0 +1,90 @@
+import asyncio
+import datetime
+import logging
+from typing import AsyncContextManager, Callable
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.core.exceptions import UserLoggedOutException
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
+    RemoteFitbitRepository,
+)
+from slackhealthbot.domain.usecases.fitbit import usecase_reconcile_subscriptions
+from slackhealthbot.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_fitbit_subscriptions(
+    local_fitbit_repo_factory: Callable[[], AsyncContextManager[LocalFitbitRepository]],
+    remote_fitbit_repo: RemoteFitbitRepository,
+    concurrency: int,
+):
+    """
+    Check the subscriptions of all users, with at most the given number
+    of users being checked at the same time.
+    """
+    logger.info("fitbit subscriptions reconciliation")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def reconcile_user(fitbit_userid: str):
+        try:
+            # Each user gets their own session: sessions can't be shared
+            # between concurrent tasks.
+            async with local_fitbit_repo_factory() as local_fitbit_repo:
+                try:
+                    await usecase_reconcile_subscriptions.do(
+                        local_repo=local_fitbit_repo,
+                        remote_repo=remote_fitbit_repo,
+                        fitbit_userid=fitbit_userid,
+                    )
+                except UserLoggedOutException:
+                    # We can't receive notifications for this user anymore.
+                    # The poll will alert them that they're logged out.
+                    await local_fitbit_repo.update_subscriptions(
+                        fitbit_userid=fitbit_userid,
+                        collection_types=set(),
+                        verified_at=datetime.datetime.now(datetime.timezone.utc),
+                    )
+        except Exception:
+            logger.warning("Error reconciling fitbit subscriptions", exc_info=True)
+        finally:
+            semaphore.release()
+
+    async with local_fitbit_repo_factory() as local_fitbit_repo:
+        async with asyncio.TaskGroup() as task_group:
+            # The users are streamed from the database, and only
+            # the users being checked have a task.
+            async for user_identity in local_fitbit_repo.iter_user_identities():
+                await semaphore.acquire()
+                task_group.create_task(reconcile_user(user_identity.fitbit_userid))
+
+
+@inject
+async def schedule_fitbit_subscriptions_reconciliation(
+    local_fitbit_repo_factory: Callable[[], AsyncContextManager[LocalFitbitRepository]],
+    remote_fitbit_repo: RemoteFitbitRepository,
+    initial_delay_s: int,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> asyncio.Task:
+    subscriptions_settings = settings.app_settings.fitbit.subscriptions
+
+    async def run_with_delay():
+        await asyncio.sleep(initial_delay_s)
+        while True:
+            try:
+                await reconcile_fitbit_subscriptions(
+                    local_fitbit_repo_factory=local_fitbit_repo_factory,
+                    remote_fitbit_repo=remote_fitbit_repo,
+                    concurrency=subscriptions_settings.reconcile_concurrency,
+                )
+            except Exception:
+                logger.error("Error reconciling fitbit subscriptions", exc_info=True)
+            await asyncio.sleep(subscriptions_settings.reconcile_interval_seconds)
+
+    return asyncio.create_task(run_with_delay())
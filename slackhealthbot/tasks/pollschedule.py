@@ -0,0 +1,94 @@
+import dataclasses
+import datetime
+import heapq
+from typing import Iterable
+
+
+@dataclasses.dataclass
+class PollSchedule:
+    """
+    Adaptive poll schedule.
+
+    Users for whom we recently found new data are polled every min_interval.
+    Each poll which finds no new data doubles the user's poll interval,
+    up to max_interval.
+
+    The users are kept in a priority queue, ordered by their next poll time.
+    """
+
+    min_interval: datetime.timedelta
+    max_interval: datetime.timedelta
+    last_new_data_at: dict[str, datetime.datetime] = dataclasses.field(
+        default_factory=dict
+    )
+    _intervals: dict[str, datetime.timedelta] = dataclasses.field(default_factory=dict)
+    _next_poll_at: dict[str, datetime.datetime] = dataclasses.field(
+        default_factory=dict
+    )
+    _queue: list[tuple[datetime.datetime, str]] = dataclasses.field(
+        default_factory=list
+    )
+
+    def sync(self, userids: Iterable[str], now: datetime.datetime):
+        """
+        Update the schedule with the current list of users to poll:
+        new users are due right away, and users no longer in the list are dropped.
+        """
+        userids = set(userids)
+        for userid in userids - self._next_poll_at.keys():
+            self._intervals[userid] = self._initial_interval(userid, now)
+            self._push(userid, now)
+        for userid in self._next_poll_at.keys() - userids:
+            # The queue entry is skipped when it's popped.
+            del self._next_poll_at[userid]
+            self._intervals.pop(userid, None)
+
+    def pop_due(self, now: datetime.datetime) -> list[str]:
+        due_userids = []
+        while self._queue and self._queue[0][0] <= now:
+            when, userid = heapq.heappop(self._queue)
+            if self._next_poll_at.get(userid) == when:
+                del self._next_poll_at[userid]
+                due_userids.append(userid)
+        return due_userids
+
+    def record(
+        self,
+        userid: str,
+        now: datetime.datetime,
+        has_new_data: bool,
+    ):
+        """
+        Schedule the next poll for the given user, after having polled them.
+        """
+        if has_new_data:
+            self.last_new_data_at[userid] = now
+            interval = self.min_interval
+        else:
+            interval = min(
+                self._intervals.get(userid, self.min_interval) * 2,
+                self.max_interval,
+            )
+        self._intervals[userid] = interval
+        self._push(userid, now + interval)
+
+    def next_poll_at(self) -> datetime.datetime | None:
+        return min(self._next_poll_at.values(), default=None)
+
+    def _push(self, userid: str, when: datetime.datetime):
+        self._next_poll_at[userid] = when
+        heapq.heappush(self._queue, (when, userid))
+
+    def _initial_interval(
+        self,
+        userid: str,
+        now: datetime.datetime,
+    ) -> datetime.timedelta:
+        # If we know when we last found new data for this user, resume the
+        # backoff where it would be: the smallest interval covering that period.
+        last_new_data_at = self.last_new_data_at.get(userid)
+        interval = self.min_interval
+        if last_new_data_at:
+            while interval < now - last_new_data_at and interval < self.max_interval:
+                interval *= 2
+        return min(interval, self.max_interval)
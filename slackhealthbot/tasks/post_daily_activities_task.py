@@ -63,6 +63,6 @@ async def post_daily_activities(
                         slack_repo=slack_repo,
                     )
             except Exception:
-                logging.error("Error processing daily activities", exc_info=True)
+                logger.error("Error processing daily activities", exc_info=True)
 
     return asyncio.create_task(task())
@@ -0,0 +1,87 @@
+import asyncio
+import datetime
+import logging
+from contextlib import suppress
+from typing import AsyncContextManager, Callable
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.domain.localrepository.localslackoutboxrepository import (
+    LocalSlackOutboxRepository,
+)
+from slackhealthbot.domain.remoterepository.remoteslackrepository import (
+    RemoteSlackRepository,
+)
+from slackhealthbot.domain.usecases.slack import usecase_dispatch_notifications
+from slackhealthbot.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# How often to forget the old sent notifications.
+_PURGE_INTERVAL = datetime.timedelta(hours=1)
+
+
+async def dispatch_slack_notifications(
+    local_slack_outbox_repo_factory: Callable[
+        [], AsyncContextManager[LocalSlackOutboxRepository]
+    ],
+    slack_repo: RemoteSlackRepository,
+):
+    async with local_slack_outbox_repo_factory() as local_slack_outbox_repo:
+        sent, failed = await usecase_dispatch_notifications.do(
+            local_slack_outbox_repo=local_slack_outbox_repo,
+            slack_repo=slack_repo,
+        )
+    if sent or failed:
+        logger.info(f"Posted {sent} slack notifications, {failed} failed")
+
+
+@inject
+async def schedule_slack_outbox_dispatch(
+    local_slack_outbox_repo_factory: Callable[
+        [], AsyncContextManager[LocalSlackOutboxRepository]
+    ],
+    slack_repo: RemoteSlackRepository,
+    stopping: asyncio.Event,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> asyncio.Task:
+    """
+    :param stopping: once set, the task posts the notifications which
+        are still due, and ends.
+    """
+    outbox_settings = settings.app_settings.slack.outbox
+
+    async def run():
+        purged_at: datetime.datetime | None = None
+        while not stopping.is_set():
+            try:
+                await dispatch_slack_notifications(
+                    local_slack_outbox_repo_factory=local_slack_outbox_repo_factory,
+                    slack_repo=slack_repo,
+                )
+                now = datetime.datetime.now(datetime.timezone.utc)
+                if purged_at is None or now - purged_at > _PURGE_INTERVAL:
+                    async with local_slack_outbox_repo_factory() as repo:
+                        await repo.delete_sent_notifications(
+                            before=now
+                            - datetime.timedelta(days=outbox_settings.retention_days)
+                        )
+                    purged_at = now
+            except Exception:
+                logger.error("Error posting slack notifications", exc_info=True)
+            with suppress(TimeoutError):
+                await asyncio.wait_for(
+                    stopping.wait(), timeout=outbox_settings.interval_seconds
+                )
+        # Post the notifications queued until the shutdown.
+        try:
+            await dispatch_slack_notifications(
+                local_slack_outbox_repo_factory=local_slack_outbox_repo_factory,
+                slack_repo=slack_repo,
+            )
+        except Exception:
+            logger.error("Error posting slack notifications", exc_info=True)
+
+    return asyncio.create_task(run())
@@ -0,0 +1,110 @@
+import asyncio
+import datetime
+import logging
+from typing import AsyncContextManager, Callable
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import Depends
+
+from slackhealthbot.containers import Container
+from slackhealthbot.core.exceptions import UserLoggedOutException
+from slackhealthbot.domain.localrepository.localwithingsrepository import (
+    LocalWithingsRepository,
+    UserIdentity,
+)
+from slackhealthbot.domain.remoterepository.remoteslackrepository import (
+    RemoteSlackRepository,
+)
+from slackhealthbot.domain.remoterepository.remotewithingsrepository import (
+    RemoteWithingsRepository,
+)
+from slackhealthbot.domain.usecases.slack import usecase_post_user_logged_out
+from slackhealthbot.domain.usecases.withings import usecase_poll_new_weight
+from slackhealthbot.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+async def withings_poll(  # noqa: PLR0913
+    local_withings_repo_factory: Callable[
+        [], AsyncContextManager[LocalWithingsRepository]
+    ],
+    remote_withings_repo: RemoteWithingsRepository,
+    slack_repo: RemoteSlackRepository,
+    concurrency: int,
+    cache_fail: dict[str, datetime.date],
+    when: datetime.date,
+):
+    """
+    Poll the new weights of all users, with at most the given number
+    of users being polled at the same time.
+
+    :param cache_fail: the date we last alerted each logged out user.
+    """
+    logger.info("withings poll")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def poll_user(user_identity: UserIdentity):
+        try:
+            # Each user gets their own session: sessions can't be shared
+            # between concurrent tasks.
+            async with local_withings_repo_factory() as local_withings_repo:
+                await usecase_poll_new_weight.do(
+                    local_withings_repo=local_withings_repo,
+                    remote_withings_repo=remote_withings_repo,
+                    withings_userid=user_identity.withings_userid,
+                )
+            cache_fail.pop(user_identity.withings_userid, None)
+        except UserLoggedOutException:
+            last_error_post = cache_fail.get(user_identity.withings_userid)
+            if not last_error_post or last_error_post < when:
+                await usecase_post_user_logged_out.do(
+                    repo=slack_repo,
+                    slack_alias=user_identity.slack_alias,
+                    service="withings",
+                )
+                cache_fail[user_identity.withings_userid] = when
+        except Exception:
+            logger.warning("Error polling withings", exc_info=True)
+        finally:
+            semaphore.release()
+
+    async with local_withings_repo_factory() as local_withings_repo:
+        async with asyncio.TaskGroup() as task_group:
+            # The users are streamed from the database, and only
+            # the users being polled have a task.
+            async for user_identity in local_withings_repo.iter_user_identities():
+                await semaphore.acquire()
+                task_group.create_task(poll_user(user_identity))
+
+
+@inject
+async def schedule_withings_poll(
+    local_withings_repo_factory: Callable[
+        [], AsyncContextManager[LocalWithingsRepository]
+    ],
+    remote_withings_repo: RemoteWithingsRepository,
+    slack_repo: RemoteSlackRepository,
+    initial_delay_s: int,
+    settings: Settings = Depends(Provide[Container.settings]),
+) -> asyncio.Task:
+    poll_settings = settings.app_settings.withings.poll
+    cache_fail: dict[str, datetime.date] = {}
+
+    async def run_with_delay():
+        await asyncio.sleep(initial_delay_s)
+        while True:
+            try:
+                await withings_poll(
+                    local_withings_repo_factory=local_withings_repo_factory,
+                    remote_withings_repo=remote_withings_repo,
+                    slack_repo=slack_repo,
+                    concurrency=poll_settings.concurrency,
+                    cache_fail=cache_fail,
+                    when=datetime.date.today(),
+                )
+            except Exception:
+                logger.error("Error polling withings", exc_info=True)
+            await asyncio.sleep(poll_settings.interval_seconds)
+
+    return asyncio.create_task(run_with_delay())
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from slackhealthbot.core.keyedlocks import KeyedLocks
+
+
+@pytest.mark.asyncio
+async def test_same_key_serialized():
+    """
+    Given two tasks working on the same key
+    When they run concurrently
+    Then the second one waits for the first one to finish
+    And the contention is counted.
+    """
+    locks = KeyedLocks()
+    events: list[str] = []
+
+    async def work(name: str):
+        async with locks.hold("user"):
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+
+    await asyncio.gather(work("a"), work("b"))
+
+    assert events == ["a start", "a end", "b start", "b end"]
+    stats = locks.get_stats()
+    acquisitions = 2
+    assert stats.acquisitions == acquisitions
+    assert stats.contentions == 1
+    assert stats.max_wait_seconds > 0
+    assert stats.active_keys == 0
+
+
+@pytest.mark.asyncio
+async def test_different_keys_concurrent():
+    """
+    Given two tasks working on different keys
+    When they run concurrently
+    Then they don't wait for each other
+    And the locks are forgotten once released.
+    """
+    locks = KeyedLocks()
+    both_started = asyncio.Event()
+    started: set[str] = set()
+
+    async def work(key: str):
+        async with locks.hold(key):
+            started.add(key)
+            if len(started) == len(keys):
+                both_started.set()
+            await asyncio.wait_for(both_started.wait(), timeout=1)
+
+    keys = ["user1", "user2"]
+    await asyncio.gather(*[work(key) for key in keys])
+
+    stats = locks.get_stats()
+    assert stats.contentions == 0
+    assert stats.active_keys == 0
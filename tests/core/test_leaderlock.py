@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from slackhealthbot.core import leaderlock
+
+
+def test_leader_lock(tmp_path: Path):
+    """
+    Given a process which holds the leader lock
+    When another worker tries to take it
+    Then it fails until the lock is released.
+    """
+    path = tmp_path / "leader.lock"
+    leader = leaderlock.try_acquire(path)
+    assert leader is not None
+
+    # Each open file has its own lock, like the files of separate processes.
+    assert leaderlock.try_acquire(path) is None
+
+    leader.close()
+    new_leader = leaderlock.try_acquire(path)
+    assert new_leader is not None
+    new_leader.close()
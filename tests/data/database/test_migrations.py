@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from slackhealthbot.data.database import connection as db_connection
+from slackhealthbot.data.database import migrations
+
+
+def test_upgrade_database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """
+    Given a new database
+    When the app starts for the first time
+    Then all the migrations are applied
+    And they're not applied again on the next starts.
+    """
+    database_path = tmp_path / "new.db"
+    monkeypatch.setattr(
+        db_connection,
+        "get_connection_url",
+        lambda: f"sqlite+aiosqlite:///{database_path}",
+    )
+
+    assert migrations.upgrade_database(database_path)
+    assert migrations.get_database_revisions(database_path) == set(
+        ScriptDirectory.from_config(Config("alembic.ini")).get_heads()
+    )
+    assert not migrations.upgrade_database(database_path)
+
+
+def test_get_head_revisions():
+    assert migrations.get_head_revisions() == set(
+        ScriptDirectory.from_config(Config("alembic.ini")).get_heads()
+    )
+
+
+def test_get_head_revisions_merge(tmp_path: Path):
+    for revision, down_revision in [
+        ("a", None),
+        ("b", "a"),
+        ("c", "a"),
+        ("d", ("b", "c")),
+        ("e", "d"),
+    ]:
+        (tmp_path / f"{revision}.py").write_text(
+            f"revision: str = {revision!r}\ndown_revision = {down_revision!r}\n"
+        )
+
+    assert migrations.get_head_revisions(tmp_path) == {"e"}
+
+
+def test_get_head_revisions_unreadable(tmp_path: Path):
+    (tmp_path / "a.py").write_text("revision = make_revision()\n")
+
+    assert migrations.get_head_revisions(tmp_path) is None
+
+
+def test_get_database_revisions_not_migrated(tmp_path: Path):
+    assert migrations.get_database_revisions(tmp_path / "missing.db") == set()
+    assert not (tmp_path / "missing.db").exists()
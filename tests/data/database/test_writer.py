@@ -0,0 +1,175 @@
+import asyncio
+import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from slackhealthbot.data.database import models
+from slackhealthbot.data.database.writer import (
+    GroupCommitWriter,
+    create_writer_session_maker,
+)
+from slackhealthbot.data.repositories.sqlalchemyfitbitrepository import (
+    SQLAlchemyFitbitRepository,
+)
+from slackhealthbot.data.repositories.sqlalchemywithingsrepository import (
+    SQLAlchemyWithingsRepository,
+)
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.localrepository.localwithingsrepository import (
+    LocalWithingsRepository,
+)
+from slackhealthbot.domain.models.poll import PollState
+from tests.testsupport.factories.factories import (
+    FitbitActivityFactory,
+    FitbitUserFactory,
+    UserFactory,
+    WithingsUserFactory,
+)
+
+
+@pytest_asyncio.fixture
+async def writer(async_connection_url: str) -> GroupCommitWriter:
+    session_maker = create_writer_session_maker(async_connection_url)
+    writer = GroupCommitWriter(session_maker=session_maker, max_batch_size=10)
+    writer.start()
+    yield writer
+    await writer.stop()
+    engine: AsyncEngine = session_maker.kw["bind"]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes(
+    writer: GroupCommitWriter,
+    mocked_async_session: AsyncSession,
+    local_withings_repository: LocalWithingsRepository,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+):
+    """
+    Given users
+    When we update their weights concurrently with the group-commit writer
+    Then all the weights are saved.
+    """
+    user_factory, withings_user_factory = withings_factories
+    withings_users = [
+        withings_user_factory.create(user_id=user_factory.create(withings=None).id)
+        for _ in range(25)
+    ]
+
+    async def update_weight(withings_userid: str, weight: float):
+        repo = SQLAlchemyWithingsRepository(db=mocked_async_session, writer=writer)
+        await repo.update_user_weight(
+            withings_userid=withings_userid, last_weight_kg=weight
+        )
+
+    await asyncio.gather(
+        *(update_weight(x.oauth_userid, 60.0 + i) for i, x in enumerate(withings_users))
+    )
+
+    for i, withings_user in enumerate(withings_users):
+        fitness_data = (
+            await local_withings_repository.get_fitness_data_by_withings_userid(
+                withings_userid=withings_user.oauth_userid,
+            )
+        )
+        assert fitness_data.last_weight_kg == 60.0 + i
+
+
+@pytest.mark.asyncio
+async def test_failed_write_doesnt_affect_batch(
+    writer: GroupCommitWriter,
+    local_withings_repository: LocalWithingsRepository,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+):
+    """
+    Given a batch of writes, one of which fails
+    When the batch is committed
+    Then the failing write raises its error to its caller
+    And the other writes are saved.
+    """
+    user_factory, withings_user_factory = withings_factories
+    withings_user = withings_user_factory.create(
+        user_id=user_factory.create(withings=None).id,
+        last_weight=50.0,
+    )
+
+    async def set_weight(db: AsyncSession, weight: float) -> float:
+        await db.execute(
+            update(models.WithingsUser)
+            .where(models.WithingsUser.oauth_userid == withings_user.oauth_userid)
+            .values(last_weight=weight)
+        )
+        return weight
+
+    async def fail(db: AsyncSession):
+        await set_weight(db, 99.0)
+        raise ValueError("oops")
+
+    results = await asyncio.gather(
+        writer.write(lambda db: set_weight(db, 51.0)),
+        writer.write(fail),
+        writer.write(lambda db: set_weight(db, 52.0)),
+        return_exceptions=True,
+    )
+
+    assert results == [51.0, results[1], 52.0]
+    assert isinstance(results[1], ValueError)
+    fitness_data = await local_withings_repository.get_fitness_data_by_withings_userid(
+        withings_userid=withings_user.oauth_userid,
+    )
+    assert fitness_data.last_weight_kg == results[2]
+
+
+@pytest.mark.asyncio
+async def test_background_writes(
+    writer: GroupCommitWriter,
+    mocked_async_session: AsyncSession,
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+):
+    """
+    Given a fitbit user with old activities
+    When the poll saves its state and the old activities are compacted
+        with the group-commit writer
+    Then the state is saved, and the old activities are deleted.
+    """
+    user_factory, _, fitbit_activity_factory = fitbit_factories
+    now = datetime.datetime.now(datetime.timezone.utc)
+    user: models.User = user_factory.create(
+        fitbit__activity_cursor_start_time=now.replace(tzinfo=None),
+        fitbit__activity_cursor_log_id=1,
+    )
+    old_activity_log_id = fitbit_activity_factory.create(
+        fitbit_user_id=user.fitbit.id,
+        type_id=111,
+        updated_at=(now - datetime.timedelta(days=300)).replace(tzinfo=None),
+    ).log_id
+    fitbit_activity_factory.create(
+        fitbit_user_id=user.fitbit.id,
+        type_id=111,
+        updated_at=now.replace(tzinfo=None),
+    )
+    poll_state = PollState(
+        fitbit_userid=user.fitbit.oauth_userid,
+        last_sleep_success_date=now.date(),
+    )
+    repo = SQLAlchemyFitbitRepository(db=mocked_async_session, writer=writer)
+
+    await repo.upsert_poll_states([poll_state])
+    assert (
+        await repo.compact_activities(
+            before=(now - datetime.timedelta(days=90)).date(),
+        )
+        == 1
+    )
+
+    assert await local_fitbit_repository.get_poll_states() == [poll_state]
+    assert not await local_fitbit_repository.get_activity_by_user_and_log_id(
+        fitbit_userid=user.fitbit.oauth_userid,
+        log_id=old_activity_log_id,
+    )
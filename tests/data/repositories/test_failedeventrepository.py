@@ -0,0 +1,53 @@
+import datetime
+
+import pytest
+
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
+from slackhealthbot.domain.models.failedevent import FailedEventSource
+
+
+@pytest.mark.asyncio
+async def test_claim_failed_event(
+    local_failed_event_repository: LocalFailedEventRepository,
+):
+    """
+    Given a failed event due to be replayed
+    When a replica claims it
+    Then it's no longer due
+    And another replica which read it at the same time can't claim it.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    event_id = await local_failed_event_repository.create_failed_event(
+        source=FailedEventSource.WITHINGS,
+        payload={"withings_userid": "user", "startdate": 1, "enddate": 2},
+        error="httpx.ConnectError: Connection refused",
+        next_attempt_at=now - datetime.timedelta(minutes=1),
+    )
+    await local_failed_event_repository.create_failed_event(
+        source=FailedEventSource.WITHINGS,
+        payload={"withings_userid": "user", "startdate": 3, "enddate": 4},
+        error="httpx.ConnectError: Connection refused",
+        next_attempt_at=now + datetime.timedelta(minutes=1),
+    )
+
+    [due_event] = await local_failed_event_repository.get_due_failed_events(
+        now=now, limit=10
+    )
+    assert due_event.id == event_id
+
+    lease_until = now + datetime.timedelta(minutes=10)
+    assert await local_failed_event_repository.claim_failed_event(
+        id=due_event.id,
+        next_attempt_at=due_event.next_attempt_at,
+        lease_until=lease_until,
+    )
+    assert not await local_failed_event_repository.claim_failed_event(
+        id=due_event.id,
+        next_attempt_at=due_event.next_attempt_at,
+        lease_until=lease_until,
+    )
+    assert not await local_failed_event_repository.get_due_failed_events(
+        now=now, limit=10
+    )
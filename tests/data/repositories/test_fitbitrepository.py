@@ -1,18 +1,24 @@
 import datetime
 
 import pytest
+from sqlalchemy import text
 
+from slackhealthbot.core.models import OAuthFields
 from slackhealthbot.data.database import models
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
+    UserIdentity,
 )
 from slackhealthbot.domain.models.activity import (
+    ActivityData,
+    ActivityRecords,
     ActivityZone,
     ActivityZoneMinutes,
     DailyActivityStats,
     TopActivityStats,
     TopDailyActivityStats,
 )
+from slackhealthbot.domain.models.poll import PollState
 from tests.testsupport.factories.factories import (
     FitbitActivityFactory,
     FitbitUserFactory,
@@ -20,6 +26,109 @@ from tests.testsupport.factories.factories import (
 )
 
 
+@pytest.mark.asyncio
+async def test_user_reads(
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+):
+    user_factory, _, _ = fitbit_factories
+    user: models.User = user_factory.create(
+        fitbit__oauth_expiration_date=datetime.datetime(2024, 1, 2, 3, 4, 5),
+    )
+    other_user: models.User = user_factory.create()
+    expected_identity = UserIdentity(
+        fitbit_userid=user.fitbit.oauth_userid,
+        slack_alias=user.slack_alias,
+    )
+    expected_oauth_data = OAuthFields(
+        oauth_userid=user.fitbit.oauth_userid,
+        oauth_access_token=user.fitbit.oauth_access_token,
+        oauth_refresh_token=user.fitbit.oauth_refresh_token,
+        oauth_expiration_date=datetime.datetime(
+            2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc
+        ),
+    )
+
+    assert (
+        await local_fitbit_repository.get_user_identity_by_fitbit_userid(
+            fitbit_userid=user.fitbit.oauth_userid,
+        )
+        == expected_identity
+    )
+    assert not await local_fitbit_repository.get_user_identity_by_fitbit_userid(
+        fitbit_userid="unknown",
+    )
+    assert (
+        await local_fitbit_repository.get_oauth_data_by_fitbit_userid(
+            fitbit_userid=user.fitbit.oauth_userid,
+        )
+        == expected_oauth_data
+    )
+    repo_user = await local_fitbit_repository.get_user_by_fitbit_userid(
+        fitbit_userid=user.fitbit.oauth_userid,
+    )
+    assert repo_user.identity == expected_identity
+    assert repo_user.oauth_data == expected_oauth_data
+    assert repo_user.activity_cursor is None
+    assert sorted(
+        await local_fitbit_repository.get_all_user_identities(),
+        key=lambda x: x.slack_alias,
+    ) == sorted(
+        [
+            expected_identity,
+            UserIdentity(
+                fitbit_userid=other_user.fitbit.oauth_userid,
+                slack_alias=other_user.slack_alias,
+            ),
+        ],
+        key=lambda x: x.slack_alias,
+    )
+
+
+@pytest.mark.asyncio
+async def test_iter_pages(
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+):
+    """
+    Given more users and daily activities than fit in one page
+    When we iterate over them
+    Then we get each of them exactly once.
+    """
+    user_factory, _, fitbit_activity_factory = fitbit_factories
+    users: list[models.User] = [user_factory.create() for _ in range(5)]
+    for log_id, (user, type_id) in enumerate(
+        (user, type_id) for user in users for type_id in (1234, 5678)
+    ):
+        fitbit_activity_factory.create(
+            log_id=100_000 + log_id,
+            fitbit_user_id=user.fitbit.id,
+            type_id=type_id,
+            updated_at=datetime.datetime(2024, 1, 2, 12, 0, 0),
+        )
+
+    user_identities = [
+        x async for x in local_fitbit_repository.iter_user_identities(page_size=2)
+    ]
+    assert sorted(x.fitbit_userid for x in user_identities) == sorted(
+        x.fitbit.oauth_userid for x in users
+    )
+
+    daily_activities = [
+        x
+        async for x in local_fitbit_repository.iter_daily_activities_by_type(
+            type_ids={1234, 5678},
+            when=datetime.date(2024, 1, 2),
+            page_size=3,
+        )
+    ]
+    assert sorted((x.fitbit_userid, x.type_id) for x in daily_activities) == sorted(
+        (user.fitbit.oauth_userid, type_id)
+        for user in users
+        for type_id in (1234, 5678)
+    )
+
+
 @pytest.mark.asyncio
 async def test_top_activities(
     local_fitbit_repository: LocalFitbitRepository,
@@ -130,12 +239,25 @@ async def test_top_activities(
         updated_at=recent_date,
     )
 
-    all_time_top_activity_stats: TopActivityStats = (
-        await local_fitbit_repository.get_top_activity_stats_by_user_and_activity_type(
-            fitbit_userid=user.fitbit.oauth_userid,
+    # The records are read when saving a new activity.
+    # This one doesn't beat any record.
+    since = (recent_date - datetime.timedelta(days=1)).replace(
+        tzinfo=datetime.timezone.utc
+    )
+    records: ActivityRecords = await local_fitbit_repository.create_activity_for_user(
+        fitbit_userid=user.fitbit.oauth_userid,
+        activity=ActivityData(
+            log_id=100_000,
             type_id=activity_type,
-        )
+            calories=1,
+            distance_km=None,
+            total_minutes=1,
+            zone_minutes=[],
+        ),
+        records_since=since,
     )
+
+    all_time_top_activity_stats: TopActivityStats = records.get_top_stats()
     assert all_time_top_activity_stats == TopActivityStats(
         top_calories=all_time_top_calories_and_distance_activity.calories,
         top_distance_km=all_time_top_calories_and_distance_activity.distance_km,
@@ -156,12 +278,8 @@ async def test_top_activities(
         ],
     )
 
-    recent_top_activity_stats: TopActivityStats = (
-        await local_fitbit_repository.get_top_activity_stats_by_user_and_activity_type(
-            fitbit_userid=user.fitbit.oauth_userid,
-            type_id=activity_type,
-            since=recent_date - datetime.timedelta(days=1),
-        )
+    recent_top_activity_stats: TopActivityStats = records.get_top_stats(
+        since=since,
     )
     assert recent_top_activity_stats == TopActivityStats(
         top_calories=recent_top_calories_and_distance_activity.calories,
@@ -185,39 +303,268 @@ async def test_top_activities(
 
 
 @pytest.mark.asyncio
-async def test_top_activities_no_history(
+async def test_activity_records_updated(
     local_fitbit_repository: LocalFitbitRepository,
     fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
 ):
+    """
+    Given a user's saved records
+    When we save new activities
+    Then the records are updated from the saved records
+    And the recent records only keep the values since the given time.
+    """
     user_factory, _, _ = fitbit_factories
     activity_type = 111
     user: models.User = user_factory.create()
-    recent_date = datetime.datetime(2024, 1, 2, 23, 44, 55)
 
-    all_time_top_activity_stats: TopActivityStats = (
-        await local_fitbit_repository.get_top_activity_stats_by_user_and_activity_type(
-            fitbit_userid=user.fitbit.oauth_userid,
+    # Out of the range of the factory's log ids.
+    records: ActivityRecords = await local_fitbit_repository.create_activity_for_user(
+        fitbit_userid=user.fitbit.oauth_userid,
+        activity=ActivityData(
+            log_id=100_000,
             type_id=activity_type,
+            calories=500,
+            distance_km=2.0,
+            total_minutes=20,
+            zone_minutes=[ActivityZoneMinutes(zone=ActivityZone.CARDIO, minutes=10)],
+        ),
+    )
+    assert records.get_top_stats() == TopActivityStats(
+        top_calories=500,
+        top_distance_km=2.0,
+        top_total_minutes=20,
+        top_zone_minutes=[ActivityZoneMinutes(zone=ActivityZone.CARDIO, minutes=10)],
+    )
+
+    since = datetime.datetime.now(datetime.timezone.utc)
+    records = await local_fitbit_repository.create_activity_for_user(
+        fitbit_userid=user.fitbit.oauth_userid,
+        activity=ActivityData(
+            log_id=100_001,
+            type_id=activity_type,
+            calories=300,
+            distance_km=None,
+            total_minutes=25,
+            zone_minutes=[
+                ActivityZoneMinutes(zone=ActivityZone.PEAK, minutes=5),
+                ActivityZoneMinutes(zone=ActivityZone.CARDIO, minutes=8),
+            ],
+        ),
+        records_since=since,
+    )
+    assert records.get_top_stats() == TopActivityStats(
+        top_calories=500,
+        top_distance_km=2.0,
+        top_total_minutes=25,
+        top_zone_minutes=[
+            ActivityZoneMinutes(zone=ActivityZone.PEAK, minutes=5),
+            ActivityZoneMinutes(zone=ActivityZone.CARDIO, minutes=10),
+        ],
+    )
+    assert records.get_top_stats(since=since) == TopActivityStats(
+        top_calories=300,
+        top_distance_km=None,
+        top_total_minutes=25,
+        top_zone_minutes=[
+            ActivityZoneMinutes(zone=ActivityZone.PEAK, minutes=5),
+            ActivityZoneMinutes(zone=ActivityZone.CARDIO, minutes=8),
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_compact_activities(
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+):
+    """
+    Given activities saved over more than a year
+    When we compact the old activities
+    Then they're deleted
+    And the daily stats and the records are unchanged
+    And the activities of a user without an activity cursor are kept.
+    """
+    user_factory, _, fitbit_activity_factory = fitbit_factories
+    activity_type = 111
+    now = datetime.datetime.now(datetime.timezone.utc)
+    user: models.User = user_factory.create(
+        fitbit__activity_cursor_start_time=now.replace(tzinfo=None),
+        fitbit__activity_cursor_log_id=1,
+    )
+    user_without_cursor: models.User = user_factory.create()
+    old_activity_without_cursor: models.FitbitActivity = fitbit_activity_factory.create(
+        fitbit_user_id=user_without_cursor.fitbit.id,
+        type_id=activity_type,
+        updated_at=(now - datetime.timedelta(days=300)).replace(tzinfo=None),
+    )
+    since = now - datetime.timedelta(days=180)
+    before = (now - datetime.timedelta(days=90)).date()
+
+    # Old activities, on the same day: all-time top records
+    fitbit_activity_factory.create(
+        fitbit_user_id=user.fitbit.id,
+        type_id=activity_type,
+        calories=600,
+        distance_km=3.2,
+        total_minutes=18,
+        fat_burn_minutes=17,
+        cardio_minutes=16,
+        peak_minutes=15,
+        updated_at=(now - datetime.timedelta(days=300)).replace(tzinfo=None),
+    )
+    fitbit_activity_factory.create(
+        fitbit_user_id=user.fitbit.id,
+        type_id=activity_type,
+        calories=333,
+        distance_km=2.5,
+        total_minutes=30,
+        fat_burn_minutes=29,
+        cardio_minutes=28,
+        peak_minutes=27,
+        updated_at=(now - datetime.timedelta(days=300)).replace(tzinfo=None),
+    )
+    # Old activity: recent top records for calories and distance
+    fitbit_activity_factory.create(
+        fitbit_user_id=user.fitbit.id,
+        type_id=activity_type,
+        calories=599,
+        distance_km=3.1,
+        total_minutes=18,
+        fat_burn_minutes=17,
+        cardio_minutes=16,
+        peak_minutes=15,
+        updated_at=(now - datetime.timedelta(days=120)).replace(tzinfo=None),
+    )
+    # Kept activity: recent top records for the different minutes attributes
+    fitbit_activity_factory.create(
+        fitbit_user_id=user.fitbit.id,
+        type_id=activity_type,
+        calories=333,
+        distance_km=2.5,
+        total_minutes=29,
+        fat_burn_minutes=28,
+        cardio_minutes=27,
+        peak_minutes=26,
+        updated_at=(now - datetime.timedelta(days=30)).replace(tzinfo=None),
+    )
+
+    async def get_stats():
+        return [
+            await local_fitbit_repository.get_top_daily_activity_stats_by_user_and_activity_type(
+                fitbit_userid=user.fitbit.oauth_userid,
+                type_id=activity_type,
+            ),
+            await local_fitbit_repository.get_top_daily_activity_stats_by_user_and_activity_type(
+                fitbit_userid=user.fitbit.oauth_userid,
+                type_id=activity_type,
+                since=since,
+            ),
+            await local_fitbit_repository.get_latest_daily_activity_by_user_and_activity_type(
+                fitbit_userid=user.fitbit.oauth_userid,
+                type_id=activity_type,
+                before=before,
+            ),
+        ]
+
+    expected_stats = await get_stats()
+
+    assert (
+        await local_fitbit_repository.compact_activities(
+            before=before,
+            records_since=since,
+        )
+        == 3  # noqa: PLR2004
+    )
+    await local_fitbit_repository.reclaim_space()
+    assert (
+        await local_fitbit_repository.db.scalar(
+            statement=text("PRAGMA freelist_count"),
         )
+        == 0
+    )
+    assert await local_fitbit_repository.get_activity_by_user_and_log_id(
+        fitbit_userid=user_without_cursor.fitbit.oauth_userid,
+        log_id=old_activity_without_cursor.log_id,
+    )
+
+    assert await get_stats() == expected_stats
+    # Save an activity which doesn't beat any record:
+    # the records still include the compacted activities.
+    records = await local_fitbit_repository.create_activity_for_user(
+        fitbit_userid=user.fitbit.oauth_userid,
+        activity=ActivityData(
+            log_id=100_100,
+            type_id=activity_type,
+            calories=1,
+            distance_km=None,
+            total_minutes=1,
+            zone_minutes=[],
+        ),
+        records_since=since,
+    )
+    assert records.get_top_stats() == TopActivityStats(
+        top_calories=600,
+        top_distance_km=3.2,
+        top_total_minutes=30,
+        top_zone_minutes=[
+            ActivityZoneMinutes(zone=ActivityZone.PEAK, minutes=27),
+            ActivityZoneMinutes(zone=ActivityZone.CARDIO, minutes=28),
+            ActivityZoneMinutes(zone=ActivityZone.FAT_BURN, minutes=29),
+        ],
     )
+    assert records.get_top_stats(since=since) == TopActivityStats(
+        top_calories=599,
+        top_distance_km=3.1,
+        top_total_minutes=29,
+        top_zone_minutes=[
+            ActivityZoneMinutes(zone=ActivityZone.PEAK, minutes=26),
+            ActivityZoneMinutes(zone=ActivityZone.CARDIO, minutes=27),
+            ActivityZoneMinutes(zone=ActivityZone.FAT_BURN, minutes=28),
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_top_activities_no_history(
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+):
+    user_factory, _, _ = fitbit_factories
+    activity_type = 111
+    user: models.User = user_factory.create()
+    recent_date = datetime.datetime(
+        2024, 1, 2, 23, 44, 55, tzinfo=datetime.timezone.utc
+    )
+
+    # The first activity of the user has no distance and no zone minutes.
+    records: ActivityRecords = await local_fitbit_repository.create_activity_for_user(
+        fitbit_userid=user.fitbit.oauth_userid,
+        activity=ActivityData(
+            log_id=100_000,
+            type_id=activity_type,
+            calories=100,
+            distance_km=None,
+            total_minutes=10,
+            zone_minutes=[],
+        ),
+        records_since=recent_date - datetime.timedelta(days=1),
+    )
+
+    all_time_top_activity_stats: TopActivityStats = records.get_top_stats()
     assert all_time_top_activity_stats == TopActivityStats(
-        top_calories=None,
+        top_calories=100,
         top_distance_km=None,
-        top_total_minutes=None,
+        top_total_minutes=10,
         top_zone_minutes=[],
     )
 
-    recent_top_activity_stats: TopActivityStats = (
-        await local_fitbit_repository.get_top_activity_stats_by_user_and_activity_type(
-            fitbit_userid=user.fitbit.oauth_userid,
-            type_id=activity_type,
-            since=recent_date - datetime.timedelta(days=1),
-        )
+    recent_top_activity_stats: TopActivityStats = records.get_top_stats(
+        since=recent_date - datetime.timedelta(days=1),
     )
     assert recent_top_activity_stats == TopActivityStats(
-        top_calories=None,
+        top_calories=100,
         top_distance_km=None,
-        top_total_minutes=None,
+        top_total_minutes=10,
         top_zone_minutes=[],
     )
 
@@ -549,3 +896,103 @@ async def test_top_daily_activities(
         actual_top_daily_activities_recent_times
         == expected_top_daily_activities_recent_times
     )
+
+
+@pytest.mark.asyncio
+async def test_upsert_poll_states_keeps_latest(
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+):
+    """
+    Given a poll state saved by a replica
+    When another replica saves an older state of the same user
+    Then the most recent dates are kept
+    And a logged out alert is only forgotten after a later successful poll.
+    """
+    _, fitbit_user_factory, _ = fitbit_factories
+    fitbit_userid = fitbit_user_factory.create().oauth_userid
+    today = datetime.date(2024, 1, 10)
+    now = datetime.datetime(2024, 1, 10, 12, tzinfo=datetime.timezone.utc)
+    latest_state = PollState(
+        fitbit_userid=fitbit_userid,
+        last_sleep_success_date=today,
+        last_fail_alert_date=today,
+        last_new_data_at=now,
+    )
+    await local_fitbit_repository.upsert_poll_states([latest_state])
+
+    await local_fitbit_repository.upsert_poll_states(
+        [
+            PollState(
+                fitbit_userid=fitbit_userid,
+                last_sleep_success_date=today - datetime.timedelta(days=1),
+                last_new_data_at=now - datetime.timedelta(hours=1),
+            )
+        ]
+    )
+    assert await local_fitbit_repository.get_poll_states() == [latest_state]
+
+    await local_fitbit_repository.upsert_poll_states(
+        [
+            PollState(
+                fitbit_userid=fitbit_userid,
+                last_sleep_success_date=today + datetime.timedelta(days=1),
+            )
+        ]
+    )
+    assert await local_fitbit_repository.get_poll_states() == [
+        PollState(
+            fitbit_userid=fitbit_userid,
+            last_sleep_success_date=today + datetime.timedelta(days=1),
+            last_new_data_at=now,
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_compact_activities_keeps_latest(
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+):
+    """
+    Given a user whose activities of a type are all old
+    When we compact the old activities
+    Then the latest one is kept, to compare the next activity with it
+    And the others are deleted.
+    """
+    user_factory, _, fitbit_activity_factory = fitbit_factories
+    activity_type = 111
+    now = datetime.datetime.now(datetime.timezone.utc)
+    user: models.User = user_factory.create(
+        fitbit__activity_cursor_start_time=now.replace(tzinfo=None),
+        fitbit__activity_cursor_log_id=1,
+    )
+    old_activity_log_id = fitbit_activity_factory.create(
+        fitbit_user_id=user.fitbit.id,
+        type_id=activity_type,
+        updated_at=(now - datetime.timedelta(days=300)).replace(tzinfo=None),
+    ).log_id
+    latest_activity_log_id = fitbit_activity_factory.create(
+        fitbit_user_id=user.fitbit.id,
+        type_id=activity_type,
+        updated_at=(now - datetime.timedelta(days=200)).replace(tzinfo=None),
+    ).log_id
+
+    assert (
+        await local_fitbit_repository.compact_activities(
+            before=(now - datetime.timedelta(days=90)).date(),
+        )
+        == 1
+    )
+
+    latest_activity = (
+        await local_fitbit_repository.get_latest_activity_by_user_and_type(
+            fitbit_userid=user.fitbit.oauth_userid,
+            type_id=activity_type,
+        )
+    )
+    assert latest_activity.log_id == latest_activity_log_id
+    assert not await local_fitbit_repository.get_activity_by_user_and_log_id(
+        fitbit_userid=user.fitbit.oauth_userid,
+        log_id=old_activity_log_id,
+    )
@@ -0,0 +1,147 @@
+import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from slackhealthbot.data.repositories.sqlalchemyslackoutboxrepository import (
+    queue_slack_notification,
+)
+from slackhealthbot.domain.localrepository.localslackoutboxrepository import (
+    LocalSlackOutboxRepository,
+)
+from slackhealthbot.domain.models.slacknotification import SlackNotification
+
+
+@pytest.mark.asyncio
+async def test_claim_due_notifications(
+    mocked_async_session: AsyncSession,
+    local_slack_outbox_repository: LocalSlackOutboxRepository,
+):
+    """
+    Given notifications queued twice with the same idempotency key
+    When a replica claims the due notifications
+    Then each notification is claimed once, in the order they were queued
+    And they're no longer due, for the other replicas.
+    """
+    for key in ["first", "second", "first"]:
+        await queue_slack_notification(
+            mocked_async_session,
+            SlackNotification(idempotency_key=key, message=f"message {key}"),
+        )
+    await mocked_async_session.commit()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    notifications = await local_slack_outbox_repository.claim_due_notifications(
+        now=now,
+        lease_until=now + datetime.timedelta(minutes=1),
+        limit=10,
+    )
+    assert [x.idempotency_key for x in notifications] == ["first", "second"]
+    assert [x.message for x in notifications] == ["message first", "message second"]
+    assert not await local_slack_outbox_repository.claim_due_notifications(
+        now=now,
+        lease_until=now + datetime.timedelta(minutes=1),
+        limit=10,
+    )
+
+
+@pytest.mark.asyncio
+async def test_sent_notifications(
+    mocked_async_session: AsyncSession,
+    local_slack_outbox_repository: LocalSlackOutboxRepository,
+):
+    """
+    Given a notification which was sent
+    When the same notification is queued again
+    Then it's not posted again
+    And it's forgotten once it's older than the retention period.
+    """
+    notification = SlackNotification(idempotency_key="key", message="message")
+    await queue_slack_notification(mocked_async_session, notification)
+    await mocked_async_session.commit()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    lease_until = now + datetime.timedelta(minutes=1)
+    [queued_notification] = await local_slack_outbox_repository.claim_due_notifications(
+        now=now,
+        lease_until=lease_until,
+        limit=10,
+    )
+    assert await local_slack_outbox_repository.mark_notification_sent(
+        id=queued_notification.id,
+        claimed_until=lease_until,
+        sent_at=now,
+    )
+
+    await queue_slack_notification(mocked_async_session, notification)
+    await mocked_async_session.commit()
+    later = now + datetime.timedelta(hours=1)
+    assert not await local_slack_outbox_repository.claim_due_notifications(
+        now=later,
+        lease_until=later + datetime.timedelta(minutes=1),
+        limit=10,
+    )
+
+    assert (
+        await local_slack_outbox_repository.delete_sent_notifications(
+            before=now - datetime.timedelta(minutes=1)
+        )
+        == 0
+    )
+    assert (
+        await local_slack_outbox_repository.delete_sent_notifications(before=later) == 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_expired_claim(
+    mocked_async_session: AsyncSession,
+    local_slack_outbox_repository: LocalSlackOutboxRepository,
+):
+    """
+    Given a notification claimed by a replica
+    When its lease expires and another replica claims it
+    Then the first replica can neither renew its claim nor mark it as sent
+    And the other replica can.
+    """
+    await queue_slack_notification(
+        mocked_async_session,
+        SlackNotification(idempotency_key="key", message="message"),
+    )
+    await mocked_async_session.commit()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    lease_until = now + datetime.timedelta(minutes=1)
+    [notification] = await local_slack_outbox_repository.claim_due_notifications(
+        now=now,
+        lease_until=lease_until,
+        limit=10,
+    )
+    renewed_until = now + datetime.timedelta(minutes=2)
+    assert await local_slack_outbox_repository.renew_notification_claim(
+        id=notification.id,
+        claimed_until=lease_until,
+        lease_until=renewed_until,
+    )
+
+    later = renewed_until + datetime.timedelta(seconds=1)
+    other_lease_until = later + datetime.timedelta(minutes=1)
+    assert await local_slack_outbox_repository.claim_due_notifications(
+        now=later,
+        lease_until=other_lease_until,
+        limit=10,
+    ) == [notification]
+
+    assert not await local_slack_outbox_repository.renew_notification_claim(
+        id=notification.id,
+        claimed_until=renewed_until,
+        lease_until=later + datetime.timedelta(minutes=2),
+    )
+    assert not await local_slack_outbox_repository.mark_notification_sent(
+        id=notification.id,
+        claimed_until=renewed_until,
+        sent_at=later,
+    )
+    assert await local_slack_outbox_repository.mark_notification_sent(
+        id=notification.id,
+        claimed_until=other_lease_until,
+        sent_at=later,
+    )
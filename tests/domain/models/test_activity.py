@@ -0,0 +1,64 @@
+import datetime
+
+from slackhealthbot.domain.models.activity import (
+    ActivityData,
+    ActivityRecords,
+    ActivityZone,
+    ActivityZoneMinutes,
+    TopActivityStats,
+)
+
+
+def _activity(calories: int, peak_minutes: int | None = None) -> ActivityData:
+    return ActivityData(
+        log_id=1,
+        type_id=1,
+        total_minutes=10,
+        calories=calories,
+        distance_km=None,
+        zone_minutes=(
+            [ActivityZoneMinutes(zone=ActivityZone.PEAK, minutes=peak_minutes)]
+            if peak_minutes
+            else []
+        ),
+    )
+
+
+def test_activity_records():
+    """
+    Given activities added over time
+    Then the records only keep the values which can still be a recent top value
+    And the top values are correct for each window.
+    """
+    t0 = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    days = [t0 + datetime.timedelta(days=x) for x in range(4)]
+    records = ActivityRecords()
+    records.add(_activity(calories=500, peak_minutes=3), when=days[0])
+    records.add(_activity(calories=300), when=days[1])
+    records.add(_activity(calories=400, peak_minutes=2), when=days[2])
+
+    # 300 can't be a top value anymore: 400 came after it.
+    assert records.recent["calories"] == [(days[0], 500), (days[2], 400)]
+    assert records.get_top_stats() == TopActivityStats(
+        top_calories=500,
+        top_distance_km=None,
+        top_total_minutes=10,
+        top_zone_minutes=[ActivityZoneMinutes(zone=ActivityZone.PEAK, minutes=3)],
+    )
+    assert records.get_top_stats(since=days[1]) == TopActivityStats(
+        top_calories=400,
+        top_distance_km=None,
+        top_total_minutes=10,
+        top_zone_minutes=[ActivityZoneMinutes(zone=ActivityZone.PEAK, minutes=2)],
+    )
+    assert records.get_top_stats(since=days[3]) == TopActivityStats(
+        top_calories=None,
+        top_distance_km=None,
+        top_total_minutes=None,
+        top_zone_minutes=[],
+    )
+
+    # Values older than the window are forgotten.
+    records.add(_activity(calories=100), when=days[3], since=days[1])
+    assert records.recent["calories"] == [(days[2], 400), (days[3], 100)]
+    assert records.all_time == {"calories": 500, "total_minutes": 10, "peak_minutes": 3}
@@ -0,0 +1,61 @@
+import datetime
+
+import pytest
+
+from slackhealthbot.data.database.models import User
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.usecases.fitbit import usecase_compact_activities
+from slackhealthbot.settings import Settings
+from tests.testsupport.factories.factories import (
+    FitbitActivityFactory,
+    FitbitUserFactory,
+    UserFactory,
+)
+
+
+@pytest.mark.asyncio
+async def test_compact_activities(
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    settings: Settings,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Given activities saved 400 days ago and 10 days ago
+    When we compact the activities, with a retention of 365 days
+    Then only the old activity is compacted
+    And it's still counted in the daily activities.
+    """
+    monkeypatch.setattr(
+        settings.app_settings.fitbit.activities.retention, "detail_days", 365
+    )
+    user_factory, _, fitbit_activity_factory = fitbit_factories
+    now = datetime.datetime.now(datetime.timezone.utc)
+    user: User = user_factory.create(
+        fitbit__activity_cursor_start_time=now.replace(tzinfo=None),
+        fitbit__activity_cursor_log_id=1,
+    )
+    old_date = now - datetime.timedelta(days=400)
+    for updated_at in [old_date, now - datetime.timedelta(days=10)]:
+        fitbit_activity_factory.create(
+            fitbit_user_id=user.fitbit.id,
+            type_id=55001,
+            updated_at=updated_at.replace(tzinfo=None),
+        )
+
+    assert (
+        await usecase_compact_activities.do(local_fitbit_repo=local_fitbit_repository)
+        == 1
+    )
+    assert (
+        await usecase_compact_activities.do(local_fitbit_repo=local_fitbit_repository)
+        == 0
+    )
+
+    daily_activities = await local_fitbit_repository.get_daily_activities_by_type(
+        type_ids={55001},
+        when=old_date.date(),
+    )
+    assert [x.count_activities for x in daily_activities] == [1]
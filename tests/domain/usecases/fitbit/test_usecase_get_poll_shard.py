@@ -0,0 +1,95 @@
+import datetime as dt
+
+import pytest
+from pydantic import ValidationError
+
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.models.poll import PollShard
+from slackhealthbot.domain.usecases.fitbit import usecase_get_poll_shard
+from slackhealthbot.settings import Poll, Settings
+
+
+@pytest.mark.asyncio
+async def test_get_poll_shard_from_replicas(
+    local_fitbit_repository: LocalFitbitRepository,
+):
+    """
+    Given other poll replicas, one of which hasn't been seen in a long time
+    When a replica determines its shard
+    Then the shard is derived from the live replicas only
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    await local_fitbit_repository.upsert_poll_replica(replica_id="a", when=now)
+    await local_fitbit_repository.upsert_poll_replica(
+        replica_id="c",
+        when=now - dt.timedelta(days=1),
+    )
+
+    shard: PollShard = await usecase_get_poll_shard.do(
+        local_fitbit_repo=local_fitbit_repository,
+        replica_id="b",
+    )
+    assert shard == PollShard(index=1, count=2)
+
+    # When a replica leaves, the remaining replicas take over its users.
+    await local_fitbit_repository.delete_poll_replica(replica_id="a")
+    shard = await usecase_get_poll_shard.do(
+        local_fitbit_repo=local_fitbit_repository,
+        replica_id="b",
+    )
+    assert shard == PollShard(index=0, count=1)
+
+
+@pytest.mark.asyncio
+async def test_get_static_poll_shard(
+    local_fitbit_repository: LocalFitbitRepository,
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    monkeypatch.setattr(settings.app_settings.fitbit.poll, "shard_index", 2)
+    monkeypatch.setattr(settings.app_settings.fitbit.poll, "shard_count", 3)
+
+    shard: PollShard = await usecase_get_poll_shard.do(
+        local_fitbit_repo=local_fitbit_repository,
+        replica_id="a",
+    )
+
+    assert shard == PollShard(index=2, count=3)
+    assert not await local_fitbit_repository.get_poll_replica_ids(
+        since=dt.datetime(2000, 1, 1),
+    )
+
+
+def test_poll_shards_partition_users():
+    fitbit_userids = [f"user{i}" for i in range(100)]
+    shards = [PollShard(index=i, count=3) for i in range(3)]
+
+    shard_userids = [
+        {x for x in fitbit_userids if shard.contains(x)} for shard in shards
+    ]
+
+    assert sum(len(x) for x in shard_userids) == len(fitbit_userids)
+    assert set().union(*shard_userids) == set(fitbit_userids)
+    assert all(shard_userids)
+
+
+@pytest.mark.parametrize(
+    "shard_index, shard_count",
+    [
+        (0, 0),
+        (-1, 2),
+        (2, 2),
+        (3, 2),
+    ],
+)
+def test_invalid_static_poll_shard(shard_index: int, shard_count: int):
+    with pytest.raises(ValidationError):
+        Poll(shard_index=shard_index, shard_count=shard_count)
+
+
+def test_valid_static_poll_shard():
+    poll = Poll(shard_index=1, shard_count=2)
+
+    assert (poll.shard_index, poll.shard_count) == (1, 2)
@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from httpx import Response
+from respx import MockRouter
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from slackhealthbot.data.database.models import FitbitUser
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.models.activity import ActivityData
+from slackhealthbot.domain.usecases.fitbit import usecase_process_new_activity
+from slackhealthbot.main import app
+from slackhealthbot.remoteservices.repositories.webapifitbitrepository import (
+    WebApiFitbitRepository,
+)
+from slackhealthbot.routers import dependencies
+from slackhealthbot.settings import Settings
+from tests.testsupport.factories.factories import (
+    FitbitActivityFactory,
+    FitbitUserFactory,
+    UserFactory,
+)
+from tests.testsupport.testdata.fitbit_scenarios import activity_scenarios
+
+
+@pytest.mark.asyncio
+async def test_concurrent_new_activity(  # noqa: PLR0913
+    monkeypatch: pytest.MonkeyPatch,
+    async_connection_url: str,
+    local_fitbit_repository: LocalFitbitRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    settings: Settings,
+):
+    """
+    Given a user
+    When a webhook and a poll process the user's new activity at the same time
+    Then the activity is saved once
+    And the message is posted to slack once.
+    """
+    # The webhook and the poll each have their own session.
+    monkeypatch.setattr(
+        dependencies,
+        "create_async_session_maker",
+        lambda: async_sessionmaker(bind=create_async_engine(async_connection_url)),
+    )
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    scenario = activity_scenarios["No previous activity data, new Spinning activity"]
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user_factory.create(fitbit=None).id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+
+    async def slow_activity_response(request: httpx.Request) -> Response:
+        # Let the other task run while this one waits for fitbit.
+        await asyncio.sleep(0.05)
+        return Response(status_code=200, json=scenario.input_mock_fitbit_response)
+
+    respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json",
+    ).mock(side_effect=slow_activity_response)
+    slack_request = respx_mock.post(
+        f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(200))
+
+    async def process() -> ActivityData | None:
+        async with dependencies.fitbit_repository_factory()() as local_fitbit_repo:
+            return await usecase_process_new_activity.do(
+                local_fitbit_repo=local_fitbit_repo,
+                remote_fitbit_repo=WebApiFitbitRepository(),
+                fitbit_userid=fitbit_user.oauth_userid,
+                when=datetime.datetime.now(datetime.timezone.utc),
+            )
+
+    with client:
+        results = await asyncio.gather(process(), process())
+
+    assert sum(x is not None for x in results) == 1
+    assert slack_request.call_count == 1
+    repo_activity: ActivityData = (
+        await local_fitbit_repository.get_latest_activity_by_user_and_type(
+            fitbit_userid=fitbit_user.oauth_userid,
+            type_id=scenario.input_mock_fitbit_response["activities"][0][
+                "activityTypeId"
+            ],
+        )
+    )
+    assert repo_activity.log_id == scenario.expected_new_last_activity_log_id
+    assert app.container.user_locks().get_stats().contentions == 1
@@ -0,0 +1,138 @@
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from httpx import Response
+from respx import MockRouter
+
+from slackhealthbot.data.database.models import User
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.models.activity import ActivityTypeCatalogue
+from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
+    RemoteFitbitRepository,
+)
+from slackhealthbot.domain.usecases.fitbit import usecase_refresh_activity_types
+from slackhealthbot.domain.usecases.fitbit.usecase_process_daily_activity import (
+    get_activity_name,
+)
+from slackhealthbot.main import app
+from slackhealthbot.settings import Settings
+from tests.testsupport.factories.factories import (
+    FitbitActivityFactory,
+    FitbitUserFactory,
+    UserFactory,
+)
+
+ACTIVITY_TYPES_RESPONSE = {
+    "categories": [
+        {
+            "id": 1,
+            "name": "Bicycling",
+            "activities": [
+                {
+                    "id": 90001,
+                    "name": "Bike",
+                    "activityLevels": [
+                        {"id": 1010, "name": "Very Leisurely - Less than 10 mph"},
+                    ],
+                },
+            ],
+            "subCategories": [
+                {
+                    "id": 2,
+                    "name": "Indoor",
+                    "activities": [{"id": 55001, "name": "Spinning"}],
+                },
+            ],
+        },
+    ]
+}
+
+
+@pytest.mark.asyncio
+async def test_refresh_activity_types(  # noqa: PLR0913
+    fitbit_repositories: tuple[LocalFitbitRepository, RemoteFitbitRepository],
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    client: TestClient,
+    settings: Settings,
+):
+    """
+    Given a logged-in user
+    When we refresh the activity types twice
+    Then the activity types are fetched from fitbit only once
+    And they're stored in the database and in memory.
+    """
+    local_fitbit_repository, remote_fitbit_repository = fitbit_repositories
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    activity_types_request = respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1/activities.json",
+    ).mock(Response(status_code=200, json=ACTIVITY_TYPES_RESPONSE))
+
+    with client:
+        for _ in range(2):
+            await usecase_refresh_activity_types.do(
+                local_fitbit_repo=local_fitbit_repository,
+                remote_fitbit_repo=remote_fitbit_repository,
+            )
+
+    assert activity_types_request.call_count == 1
+    expected_names = {
+        90001: "Bike",
+        1010: "Bike (Very Leisurely - Less than 10 mph)",
+        55001: "Spinning",
+    }
+    catalogue: ActivityTypeCatalogue = app.container.activity_type_catalogue()
+    assert catalogue.names == expected_names
+    stored_catalogue = await local_fitbit_repository.get_activity_type_catalogue()
+    assert stored_catalogue.names == expected_names
+    assert not stored_catalogue.is_stale(
+        now=datetime.datetime.now(datetime.timezone.utc),
+        ttl=datetime.timedelta(minutes=1),
+    )
+
+
+@pytest.mark.asyncio
+async def test_refresh_activity_types_from_database(
+    fitbit_repositories: tuple[LocalFitbitRepository, RemoteFitbitRepository],
+):
+    """
+    Given activity types refreshed recently, by another replica
+    When we refresh the activity types
+    Then they're loaded from the database, without calling fitbit.
+    """
+    local_fitbit_repository, remote_fitbit_repository = fitbit_repositories
+    await local_fitbit_repository.upsert_activity_types(
+        names={90001: "Bike"},
+        refreshed_at=datetime.datetime.now(datetime.timezone.utc),
+    )
+
+    await usecase_refresh_activity_types.do(
+        local_fitbit_repo=local_fitbit_repository,
+        remote_fitbit_repo=remote_fitbit_repository,
+    )
+
+    assert app.container.activity_type_catalogue().names == {90001: "Bike"}
+
+
+@pytest.mark.parametrize(
+    argnames=["type_id", "expected_name"],
+    argvalues=[
+        # From the catalogue
+        (90001, "Bike"),
+        # From the config
+        (90019, "Treadmill"),
+        (12345, "Unknown"),
+    ],
+)
+def test_get_activity_name(type_id: int, expected_name: str):
+    app.container.activity_type_catalogue().names = {90001: "Bike"}
+    assert get_activity_name(type_id) == expected_name
@@ -0,0 +1,173 @@
+import datetime
+import json
+
+import pytest
+from httpx import Response
+from respx import MockRouter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from slackhealthbot.data.repositories.sqlalchemyslackoutboxrepository import (
+    queue_slack_notification,
+)
+from slackhealthbot.domain.localrepository.localslackoutboxrepository import (
+    LocalSlackOutboxRepository,
+)
+from slackhealthbot.domain.models.slacknotification import SlackNotification
+from slackhealthbot.domain.usecases.slack import usecase_dispatch_notifications
+from slackhealthbot.remoteservices.repositories.webhookslackrepository import (
+    WebhookSlackRepository,
+)
+from slackhealthbot.settings import Settings
+
+
+async def _queue_notifications(db: AsyncSession, keys: list[str]):
+    for key in keys:
+        await queue_slack_notification(
+            db, SlackNotification(idempotency_key=key, message=f"message {key}")
+        )
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_dispatch_notifications(
+    mocked_async_session: AsyncSession,
+    local_slack_outbox_repository: LocalSlackOutboxRepository,
+    respx_mock: MockRouter,
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    """
+    Given more queued notifications than the batch size
+    When we dispatch the notifications
+    Then they're all posted to slack once, the oldest first.
+    """
+    monkeypatch.setattr(settings.app_settings.slack.outbox, "batch_size", 2)
+    keys = ["a", "b", "c"]
+    await _queue_notifications(mocked_async_session, keys)
+    slack_request = respx_mock.post(
+        f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(200))
+
+    sent, failed = await usecase_dispatch_notifications.do(
+        local_slack_outbox_repo=local_slack_outbox_repository,
+        slack_repo=WebhookSlackRepository(),
+    )
+    assert (sent, failed) == (len(keys), 0)
+    assert [json.loads(x.request.content)["text"] for x in slack_request.calls] == [
+        f"message {key}" for key in keys
+    ]
+
+    sent, failed = await usecase_dispatch_notifications.do(
+        local_slack_outbox_repo=local_slack_outbox_repository,
+        slack_repo=WebhookSlackRepository(),
+    )
+    assert (sent, failed) == (0, 0)
+    assert slack_request.call_count == len(keys)
+
+
+@pytest.mark.asyncio
+async def test_failed_post_backs_off(
+    mocked_async_session: AsyncSession,
+    local_slack_outbox_repository: LocalSlackOutboxRepository,
+    respx_mock: MockRouter,
+    settings: Settings,
+):
+    """
+    Given queued notifications
+    When slack fails to post the first one
+    Then the next posts are postponed, without posting any notification twice
+    And the failed notification is posted again after a delay.
+    """
+    await _queue_notifications(mocked_async_session, ["a", "b"])
+    slack_request = respx_mock.post(
+        f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(side_effect=[Response(500), Response(200), Response(200)])
+
+    sent, failed = await usecase_dispatch_notifications.do(
+        local_slack_outbox_repo=local_slack_outbox_repository,
+        slack_repo=WebhookSlackRepository(),
+    )
+    assert (sent, failed) == (0, 1)
+
+    # The notification which wasn't attempted is posted in the next cycle.
+    sent, failed = await usecase_dispatch_notifications.do(
+        local_slack_outbox_repo=local_slack_outbox_repository,
+        slack_repo=WebhookSlackRepository(),
+    )
+    assert (sent, failed) == (1, 0)
+    assert [json.loads(x.request.content)["text"] for x in slack_request.calls] == [
+        "message a",
+        "message b",
+    ]
+
+    # The failed notification is posted again once its backoff delay is over.
+    now = datetime.datetime.now(datetime.timezone.utc)
+    later = now + datetime.timedelta(
+        seconds=settings.app_settings.slack.outbox.backoff_base_seconds
+    )
+    assert not await local_slack_outbox_repository.claim_due_notifications(
+        now=now, lease_until=now, limit=10
+    )
+    [notification] = await local_slack_outbox_repository.claim_due_notifications(
+        now=later, lease_until=later, limit=10
+    )
+    assert notification.idempotency_key == "a"
+    assert notification.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_claim_expires_mid_dispatch(
+    mocked_async_session: AsyncSession,
+    local_slack_outbox_repository: LocalSlackOutboxRepository,
+    respx_mock: MockRouter,
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    """
+    Given queued notifications
+    When the claim expires while we post the first one
+    And another replica claims the notifications
+    Then we don't mark the first one as sent
+    And we leave the next ones to the other replica.
+    """
+    await _queue_notifications(mocked_async_session, ["a", "b"])
+    slack_request = respx_mock.post(
+        f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(200))
+    slack_repo = WebhookSlackRepository()
+    post_message = slack_repo.post_message
+    other_claims = []
+
+    async def post_message_slowly(message: str):
+        await post_message(message)
+        later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            hours=1
+        )
+        other_claims.extend(
+            await local_slack_outbox_repository.claim_due_notifications(
+                now=later,
+                lease_until=later + datetime.timedelta(minutes=1),
+                limit=10,
+            )
+        )
+
+    monkeypatch.setattr(slack_repo, "post_message", post_message_slowly)
+
+    await usecase_dispatch_notifications.do(
+        local_slack_outbox_repo=local_slack_outbox_repository,
+        slack_repo=slack_repo,
+    )
+    assert [json.loads(x.request.content)["text"] for x in slack_request.calls] == [
+        "message a"
+    ]
+    assert [x.idempotency_key for x in other_claims] == ["a", "b"]
+    # Still claimed by the other replica, and not marked as sent.
+    much_later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        hours=2
+    )
+    assert [
+        x.idempotency_key
+        for x in await local_slack_outbox_repository.claim_due_notifications(
+            now=much_later, lease_until=much_later, limit=10
+        )
+    ] == ["a", "b"]
@@ -0,0 +1,39 @@
+import pytest
+from fastapi import status
+from httpx import Response
+
+from slackhealthbot.oauth import fitbitconfig
+
+
+@pytest.mark.parametrize(
+    "response, expected_is_auth_failure",
+    [
+        (Response(status_code=status.HTTP_401_UNAUTHORIZED), True),
+        (
+            Response(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                json={"errors": [{"errorType": "invalid_grant"}], "success": False},
+            ),
+            True,
+        ),
+        (
+            Response(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                json={"errors": [{"errorType": "validation"}], "success": False},
+            ),
+            False,
+        ),
+        (Response(status_code=status.HTTP_400_BAD_REQUEST, text="oops"), False),
+        (Response(status_code=status.HTTP_201_CREATED), False),
+        (Response(status_code=status.HTTP_429_TOO_MANY_REQUESTS), False),
+        (Response(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR), False),
+        (Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE), False),
+    ],
+)
+def test_is_auth_failure(response: Response, expected_is_auth_failure: bool):
+    """
+    Given a response from fitbit
+    Then only a refused access token or a revoked refresh token
+    mean that the user is logged out.
+    """
+    assert fitbitconfig.is_auth_failure(response) == expected_is_auth_failure
@@ -0,0 +1,69 @@
+import asyncio
+import datetime
+
+import pytest
+
+from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.oauth import fitbitconfig, requests
+from slackhealthbot.settings import Settings
+
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: 2\r\n"
+    b"\r\n"
+    b"{}"
+)
+
+
+@pytest.mark.asyncio
+async def test_connections_are_reused(settings: Settings):
+    """
+    Given a local http server
+    When we send many requests to it
+    Then they all go through the same connection.
+    """
+    connection_count = 0
+
+    async def handle_connection(
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        nonlocal connection_count
+        connection_count += 1
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(RESPONSE)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(handle_connection, "127.0.0.1", 0)
+    _, port = server.sockets[0].getsockname()
+
+    async def update_token(*_args, **_kwargs):
+        pass
+
+    transport = fitbitconfig.configure(update_token)
+    token = OAuthFields(
+        oauth_userid="user",
+        oauth_access_token="access",
+        oauth_refresh_token="refresh",
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    try:
+        for _ in range(1000):
+            response = await requests.get(
+                provider=settings.fitbit_oauth_settings.name,
+                token=token,
+                url=f"http://127.0.0.1:{port}/",
+            )
+            assert response.is_success
+    finally:
+        await transport.close_pool()
+        server.close()
+        await server.wait_closed()
+
+    assert connection_count == 1
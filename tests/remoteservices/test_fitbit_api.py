@@ -0,0 +1,138 @@
+import datetime
+from typing import Awaitable, Callable
+
+import httpx
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from httpx import Response
+from respx import MockRouter
+
+from slackhealthbot.core.exceptions import UserLoggedOutException
+from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.remoteservices.api.fitbit import activityapi, sleepapi
+from slackhealthbot.settings import Settings
+
+INVALID_TOKEN_RESPONSE = Response(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    json={"errors": [{"errorType": "invalid_token"}], "success": False},
+)
+INVALID_GRANT_RESPONSE = Response(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    json={"errors": [{"errorType": "invalid_grant"}], "success": False},
+)
+VALIDATION_ERROR_RESPONSE = Response(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    json={"errors": [{"errorType": "validation"}], "success": False},
+)
+
+
+def _get_token(expiration_date: datetime.datetime) -> OAuthFields:
+    return OAuthFields(
+        oauth_userid="user",
+        oauth_access_token="access",
+        oauth_refresh_token="refresh",
+        oauth_expiration_date=expiration_date,
+    )
+
+
+API_CALLS: dict[str, Callable[[OAuthFields], Awaitable]] = {
+    "get_sleep": lambda token: sleepapi.get_sleep(
+        oauth_token=token, when=datetime.date(2023, 5, 12)
+    ),
+    "get_activity": lambda token: activityapi.get_activity(
+        oauth_token=token, when=datetime.datetime(2023, 5, 12)
+    ),
+    "get_activities_after": lambda token: activityapi.get_activities_after(
+        oauth_token=token, after=datetime.datetime(2023, 5, 12)
+    ),
+}
+
+
+@pytest.mark.parametrize(
+    argnames="api_call",
+    argvalues=API_CALLS.values(),
+    ids=API_CALLS.keys(),
+)
+@pytest.mark.parametrize(
+    argnames="response, expected_exception",
+    argvalues=[
+        (Response(status_code=status.HTTP_401_UNAUTHORIZED), UserLoggedOutException),
+        (INVALID_TOKEN_RESPONSE, UserLoggedOutException),
+        (VALIDATION_ERROR_RESPONSE, httpx.HTTPStatusError),
+    ],
+    ids=["401", "400 invalid token", "400 validation"],
+)
+@pytest.mark.asyncio
+async def test_api_error(  # noqa: PLR0913
+    client: TestClient,
+    respx_mock: MockRouter,
+    settings: Settings,
+    api_call: Callable[[OAuthFields], Awaitable],
+    response: Response,
+    expected_exception: type[Exception],
+):
+    """
+    Given fitbit refuses a read request
+    When we read the user's data
+    Then a refused access token means the user is logged out
+    And the other errors are raised as such.
+    """
+    respx_mock.get(
+        url__startswith=settings.fitbit_oauth_settings.base_url,
+    ).mock(return_value=response)
+    token = _get_token(
+        datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    )
+
+    with client:
+        with pytest.raises(expected_exception):
+            await api_call(token)
+
+
+@pytest.mark.parametrize(
+    argnames="api_call",
+    argvalues=API_CALLS.values(),
+    ids=API_CALLS.keys(),
+)
+@pytest.mark.parametrize(
+    argnames="response, expected_exception",
+    argvalues=[
+        (Response(status_code=status.HTTP_401_UNAUTHORIZED), UserLoggedOutException),
+        (INVALID_GRANT_RESPONSE, UserLoggedOutException),
+        (VALIDATION_ERROR_RESPONSE, httpx.HTTPStatusError),
+    ],
+    ids=["401", "400 invalid grant", "400 validation"],
+)
+@pytest.mark.asyncio
+async def test_token_refresh_error(  # noqa: PLR0913
+    client: TestClient,
+    respx_mock: MockRouter,
+    settings: Settings,
+    api_call: Callable[[OAuthFields], Awaitable],
+    response: Response,
+    expected_exception: type[Exception],
+):
+    """
+    Given a user whose access token expired
+    When fitbit refuses to refresh it
+    Then a revoked refresh token means the user is logged out
+    And the other errors are raised as such
+    And the read request isn't sent.
+    """
+    token_request = respx_mock.post(
+        url=f"{settings.fitbit_oauth_settings.base_url}oauth2/token",
+    ).mock(return_value=response)
+    read_request = respx_mock.get(
+        url__startswith=settings.fitbit_oauth_settings.base_url,
+    ).mock(return_value=Response(status_code=status.HTTP_200_OK, json={}))
+    token = _get_token(
+        datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
+    )
+
+    with client:
+        with pytest.raises(expected_exception):
+            await api_call(token)
+
+    assert token_request.call_count == 1
+    assert not read_request.called
@@ -0,0 +1,167 @@
+import datetime
+
+import httpx
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from httpx import Response
+from respx import MockRouter
+
+from slackhealthbot.core.exceptions import (
+    CircuitOpenException,
+    RetryableRemoteServiceException,
+)
+from slackhealthbot.core.models import OAuthFields
+from slackhealthbot.oauth import requests
+from slackhealthbot.remoteservices.resilience import CircuitState, ResiliencePolicy
+from slackhealthbot.settings import Resilience, Settings
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker(respx_mock: MockRouter):
+    """
+    Given a remote service which is down
+    When we send it more requests than the failure threshold
+    Then the circuit opens, and the next requests fail without being sent
+    And after the reset timeout, a single request is sent
+    And the circuit closes once the service is back.
+    """
+    failure_threshold = 3
+    policy = ResiliencePolicy(
+        name="test",
+        settings=Resilience(
+            max_retries=0,
+            failure_threshold=failure_threshold,
+            reset_timeout_seconds=60,
+        ),
+    )
+    route = respx_mock.get("https://example.com/").mock(
+        return_value=Response(status_code=503)
+    )
+    async with httpx.AsyncClient() as client:
+
+        async def send() -> httpx.Response:
+            return await policy.call(
+                lambda: client.get("https://example.com/"), idempotent=True
+            )
+
+        for _ in range(failure_threshold):
+            with pytest.raises(RetryableRemoteServiceException) as exc_info:
+                await send()
+            assert exc_info.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert policy.stats.state == CircuitState.open
+
+        with pytest.raises(CircuitOpenException):
+            await send()
+        assert route.call_count == failure_threshold
+
+        # The reset timeout passes, and the service is still down.
+        policy.stats.opened_at -= datetime.timedelta(seconds=60)
+        with pytest.raises(RetryableRemoteServiceException):
+            await send()
+        assert route.call_count == failure_threshold + 1
+        assert policy.stats.state == CircuitState.open
+        with pytest.raises(CircuitOpenException):
+            await send()
+
+        # The reset timeout passes, and the service is back.
+        policy.stats.opened_at -= datetime.timedelta(seconds=60)
+        route.mock(return_value=Response(status_code=200))
+        response = await send()
+        assert response.is_success
+        assert policy.stats.state == CircuitState.closed
+        assert policy.stats.consecutive_failures == 0
+        rejected = 2
+        assert policy.stats.rejected == rejected
+
+
+@pytest.mark.asyncio
+async def test_retries_exhausted(respx_mock: MockRouter):
+    """
+    Given a remote service which keeps failing
+    When we send it an idempotent request
+    Then it's retried up to the max retries
+    And the caller gets a retryable error rather than the failed response.
+    """
+    max_retries = 2
+    policy = ResiliencePolicy(
+        name="test",
+        settings=Resilience(max_retries=max_retries, backoff_base_seconds=0),
+    )
+    route = respx_mock.get("https://example.com/").mock(
+        return_value=Response(status_code=429)
+    )
+    async with httpx.AsyncClient() as client:
+        with pytest.raises(RetryableRemoteServiceException) as exc_info:
+            await policy.call(
+                lambda: client.get("https://example.com/"), idempotent=True
+            )
+
+    assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert route.call_count == max_retries + 1
+    assert policy.stats.retries == max_retries
+
+
+@pytest.mark.asyncio
+async def test_exceptions_are_failures():
+    """
+    Given a request which raises an error other than a connection error
+    When we send it through the circuit breaker
+    Then the error is counted as a failure of the service.
+    """
+    policy = ResiliencePolicy(name="test", settings=Resilience(max_retries=0))
+
+    async def request() -> httpx.Response:
+        raise ValueError("Unexpected token response")
+
+    with pytest.raises(ValueError):
+        await policy.call(request, idempotent=True)
+
+    assert policy.stats.failures == 1
+    assert policy.stats.consecutive_failures == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_idempotent_requests(
+    monkeypatch: pytest.MonkeyPatch,
+    client: TestClient,
+    respx_mock: MockRouter,
+    settings: Settings,
+):
+    """
+    Given fitbit fails a request once
+    When we send a read request to fitbit
+    Then it's retried, and the second response is returned
+    And the retry is counted in the exposed counters.
+    """
+    monkeypatch.setattr(
+        settings.app_settings.fitbit.resilience, "backoff_base_seconds", 0
+    )
+    url = f"{settings.fitbit_oauth_settings.base_url}1/user/-/sleep.json"
+    responses = [
+        Response(status_code=500),
+        Response(status_code=200, json={}),
+    ]
+    route = respx_mock.get(url).mock(side_effect=responses)
+    token = OAuthFields(
+        oauth_userid="user",
+        oauth_access_token="access",
+        oauth_refresh_token="refresh",
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+
+    with client:
+        response = await requests.get(
+            provider=settings.fitbit_oauth_settings.name,
+            token=token,
+            url=url,
+        )
+        stats_response = client.get("/v1/remote-services")
+
+    assert response.is_success
+    assert route.call_count == len(responses)
+    stats = stats_response.json()["fitbit"]
+    assert stats["state"] == CircuitState.closed
+    assert stats["retries"] == 1
+    assert stats["failures"] == 1
@@ -1,8 +1,10 @@
+import copy
 import datetime
 import json
 import re
 from operator import attrgetter
 
+import httpx
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
@@ -10,10 +12,16 @@ from httpx import Response
 from respx import MockRouter
 
 from slackhealthbot.data.database.models import FitbitUser, User
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
 )
-from slackhealthbot.domain.models.activity import ActivityData
+from slackhealthbot.domain.models.activity import ActivityCursor, ActivityData
+from slackhealthbot.domain.models.failedevent import FailedEventSource
+from slackhealthbot.domain.models.subscription import CollectionType
+from slackhealthbot.routers import fitbit
 from slackhealthbot.settings import Settings
 from tests.testsupport.factories.factories import (
     FitbitActivityFactory,
@@ -299,6 +307,262 @@ async def test_duplicate_activity_notification(
     assert slack_request.call_count == 1
 
 
+@pytest.mark.asyncio
+async def test_activity_notification_after_cursor(  # noqa: PLR0913
+    local_fitbit_repository: LocalFitbitRepository,
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    settings: Settings,
+):
+    """
+    Given a user for whom we already fetched an activity
+    When we receive the callback from fitbit that a new activity is available
+    Then we only ask fitbit for activities after the one we already fetched
+    And we don't do anything if there are none.
+    """
+
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    scenario: FitbitActivityScenario = activity_scenarios[
+        "No previous activity data, new Spinning activity"
+    ]
+    mock_fitbit_response = copy.deepcopy(scenario.input_mock_fitbit_response)
+    mock_fitbit_response["activities"][0]["startTime"] = "2023-05-12T07:30:00.000+02:00"
+
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+
+    activity_request = respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json",
+    )
+    activity_request.side_effect = [
+        Response(status_code=200, json=mock_fitbit_response),
+        Response(status_code=200, json={"activities": []}),
+    ]
+    slack_request = respx_mock.post(
+        f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(200))
+
+    # Process both notifications, even though they're close together.
+    monkeypatch.setattr(fitbit, "DEBOUNCE_NOTIFICATION_DELAY_S", 0)
+    for _ in range(2):
+        with client:
+            response = client.post(
+                "/fitbit-notification-webhook/",
+                content=json.dumps(
+                    [
+                        {
+                            "ownerId": user.fitbit.oauth_userid,
+                            "date": "2023-05-12",
+                            "collectionType": "activities",
+                        }
+                    ]
+                ),
+            )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    # The first request gets the latest activity
+    first_params = activity_request.calls[0].request.url.params
+    assert "beforeDate" in first_params
+    assert first_params["sort"] == "desc"
+
+    # The second request only asks for activities after the one we got
+    second_params = activity_request.calls[1].request.url.params
+    assert second_params["afterDate"] == "2023-05-12T07:30:00"
+    assert second_params["sort"] == "asc"
+
+    user_model = await local_fitbit_repository.get_user_by_fitbit_userid(
+        fitbit_userid=fitbit_user.oauth_userid,
+    )
+    assert user_model.activity_cursor == ActivityCursor(
+        start_time=datetime.datetime(2023, 5, 12, 7, 30),
+        log_id=scenario.expected_new_last_activity_log_id,
+    )
+    assert slack_request.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_activity_notification_cursor_activity_returned(  # noqa: PLR0913
+    local_fitbit_repository: LocalFitbitRepository,
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    settings: Settings,
+):
+    """
+    Given a user for whom we already fetched an activity
+    When fitbit returns that activity again, followed by a newer one
+    Then the newer activity is posted to slack
+    And the cursor moves to the newer activity.
+    """
+
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    scenario: FitbitActivityScenario = activity_scenarios[
+        "No previous activity data, new Spinning activity"
+    ]
+    cursor_activity = copy.deepcopy(
+        scenario.input_mock_fitbit_response["activities"][0]
+    )
+    cursor_activity["startTime"] = "2023-05-12T07:30:00.000+02:00"
+    new_activity = copy.deepcopy(cursor_activity)
+    new_activity["logId"] = cursor_activity["logId"] + 1
+    new_activity["startTime"] = "2023-05-12T18:00:00.000+02:00"
+
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+
+    activity_request = respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json",
+    )
+    activity_request.side_effect = [
+        Response(status_code=200, json={"activities": [cursor_activity]}),
+        # afterDate includes the activity which starts at that time.
+        Response(status_code=200, json={"activities": [cursor_activity, new_activity]}),
+        Response(status_code=200, json={"activities": [new_activity]}),
+    ]
+    slack_request = respx_mock.post(
+        f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(200))
+
+    monkeypatch.setattr(fitbit, "DEBOUNCE_NOTIFICATION_DELAY_S", 0)
+    for _ in range(3):
+        with client:
+            response = client.post(
+                "/fitbit-notification-webhook/",
+                content=json.dumps(
+                    [
+                        {
+                            "ownerId": user.fitbit.oauth_userid,
+                            "date": "2023-05-12",
+                            "collectionType": "activities",
+                        }
+                    ]
+                ),
+            )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    second_params = activity_request.calls[1].request.url.params
+    assert second_params["afterDate"] == "2023-05-12T07:30:00"
+    assert second_params["sort"] == "asc"
+    third_params = activity_request.calls[2].request.url.params
+    assert third_params["afterDate"] == "2023-05-12T18:00:00"
+
+    user_model = await local_fitbit_repository.get_user_by_fitbit_userid(
+        fitbit_userid=fitbit_user.oauth_userid,
+    )
+    assert user_model.activity_cursor == ActivityCursor(
+        start_time=datetime.datetime(2023, 5, 12, 18, 0),
+        log_id=new_activity["logId"],
+    )
+    # The first and the newer activities, each posted once.
+    assert slack_request.call_count == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_activity_notification_several_new_activities(  # noqa: PLR0913
+    local_fitbit_repository: LocalFitbitRepository,
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    settings: Settings,
+):
+    """
+    Given a user with an activity cursor
+    When fitbit returns several activities after the cursor, over two pages
+    Then each new activity is posted to slack, oldest first
+    And the cursor moves to the latest activity.
+    """
+
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    scenario: FitbitActivityScenario = activity_scenarios[
+        "No previous activity data, new Spinning activity"
+    ]
+    cursor_activity = copy.deepcopy(
+        scenario.input_mock_fitbit_response["activities"][0]
+    )
+    cursor_activity["startTime"] = "2023-05-12T07:30:00.000+02:00"
+    new_activities = []
+    for i, start_time in enumerate(
+        ("2023-05-12T12:00:00.000+02:00", "2023-05-12T18:00:00.000+02:00"), start=1
+    ):
+        new_activity = copy.deepcopy(cursor_activity)
+        new_activity["logId"] = cursor_activity["logId"] + i
+        new_activity["startTime"] = start_time
+        new_activities.append(new_activity)
+
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+        activity_cursor_start_time=datetime.datetime(2023, 5, 12, 7, 30),
+        activity_cursor_log_id=cursor_activity["logId"],
+    )
+
+    url = f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json"
+    next_url = f"{url}?afterDate=2023-05-12T07:30:00&sort=asc&offset=2&limit=2"
+    activity_request = respx_mock.get(url=url)
+    activity_request.side_effect = [
+        Response(
+            status_code=200,
+            json={
+                "activities": [cursor_activity, new_activities[0]],
+                "pagination": {"next": next_url},
+            },
+        ),
+        Response(
+            status_code=200,
+            json={"activities": [new_activities[1]], "pagination": {"next": ""}},
+        ),
+    ]
+    slack_request = respx_mock.post(
+        f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(200))
+
+    monkeypatch.setattr(fitbit, "DEBOUNCE_NOTIFICATION_DELAY_S", 0)
+    with client:
+        response = client.post(
+            "/fitbit-notification-webhook/",
+            content=json.dumps(
+                [
+                    {
+                        "ownerId": user.fitbit.oauth_userid,
+                        "date": "2023-05-12",
+                        "collectionType": "activities",
+                    }
+                ]
+            ),
+        )
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    assert activity_request.call_count == len(new_activities)
+    assert str(activity_request.calls[1].request.url) == next_url
+    for new_activity in new_activities:
+        assert await local_fitbit_repository.get_activity_by_user_and_log_id(
+            fitbit_userid=fitbit_user.oauth_userid,
+            log_id=new_activity["logId"],
+        )
+    user_model = await local_fitbit_repository.get_user_by_fitbit_userid(
+        fitbit_userid=fitbit_user.oauth_userid,
+    )
+    assert user_model.activity_cursor == ActivityCursor(
+        start_time=datetime.datetime(2023, 5, 12, 18, 0),
+        log_id=new_activities[1]["logId"],
+    )
+    assert slack_request.call_count == len(new_activities)
+
+
 @pytest.mark.asyncio
 async def test_duplicate_sleep_notification(
     local_fitbit_repository: LocalFitbitRepository,
@@ -421,3 +685,164 @@ def test_notification_unknown_user(
 
     # Then the webhook returns the expected error.
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_notification_recorded(  # noqa: PLR0913
+    local_fitbit_repository: LocalFitbitRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    """
+    Given a webhook silence threshold for the poll
+    When we receive a fitbit sleep notification
+    Then the notification time is recorded for the poll
+    """
+    monkeypatch.setattr(
+        settings.app_settings.fitbit.poll, "webhook_silence_threshold_seconds", 3600
+    )
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1.2/user/-/sleep/date/2023-05-12.json",
+    ).mock(Response(status_code=200, json={"sleep": []}))
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+
+    with client:
+        response = client.post(
+            "/fitbit-notification-webhook/",
+            content=json.dumps(
+                [
+                    {
+                        "ownerId": fitbit_user.oauth_userid,
+                        "date": "2023-05-12",
+                        "collectionType": "sleep",
+                    }
+                ]
+            ),
+        )
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert await local_fitbit_repository.get_notified_fitbit_userids(
+        collection_type=CollectionType.SLEEP,
+        since=since,
+    ) == {fitbit_user.oauth_userid}
+    assert not await local_fitbit_repository.get_notified_fitbit_userids(
+        collection_type=CollectionType.ACTIVITIES,
+        since=since,
+    )
+
+
+@pytest.mark.asyncio
+async def test_failed_notification_recorded(  # noqa: PLR0913
+    local_failed_event_repository: LocalFailedEventRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    """
+    Given fitbit is unreachable
+    When we receive a fitbit sleep notification
+    Then the webhook succeeds
+    And the notification is recorded as a failed event, to be replayed.
+    """
+    monkeypatch.setattr(settings.app_settings.fitbit.resilience, "max_retries", 0)
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1.2/user/-/sleep/date/2023-05-12.json",
+    ).mock(side_effect=httpx.ConnectError("Connection refused"))
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    until = since + datetime.timedelta(minutes=2)
+    notification = {
+        "ownerId": fitbit_user.oauth_userid,
+        "date": "2023-05-12",
+        "collectionType": "sleep",
+    }
+
+    with client:
+        response = client.post(
+            "/fitbit-notification-webhook/",
+            content=json.dumps([notification]),
+        )
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    failed_events = [
+        x
+        async for x in local_failed_event_repository.iter_failed_events(
+            since=since, until=until
+        )
+    ]
+    assert len(failed_events) == 1
+    assert failed_events[0].source == FailedEventSource.FITBIT
+    assert failed_events[0].payload.items() >= notification.items()
+    assert "ConnectError" in failed_events[0].error
+    assert failed_events[0].attempts == 1
+    assert failed_events[0].next_attempt_at > since
+
+
+@pytest.mark.asyncio
+async def test_notification_record_error(  # noqa: PLR0913
+    local_failed_event_repository: LocalFailedEventRepository,
+    client: TestClient,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    """
+    Given a webhook silence threshold for the poll
+    When we receive a fitbit sleep notification
+    And recording its time fails
+    Then the webhook succeeds
+    And the notification is recorded as a failed event, to be replayed.
+    """
+    monkeypatch.setattr(
+        settings.app_settings.fitbit.poll, "webhook_silence_threshold_seconds", 3600
+    )
+
+    async def record_notification(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(fitbit.usecase_record_notification, "do", record_notification)
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user: FitbitUser = fitbit_user_factory.create(user_id=user.id)
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    until = since + datetime.timedelta(minutes=2)
+    notification = {
+        "ownerId": fitbit_user.oauth_userid,
+        "date": "2023-05-12",
+        "collectionType": "sleep",
+    }
+
+    with client:
+        response = client.post(
+            "/fitbit-notification-webhook/",
+            content=json.dumps([notification]),
+        )
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    failed_events = [
+        x
+        async for x in local_failed_event_repository.iter_failed_events(
+            since=since, until=until
+        )
+    ]
+    assert len(failed_events) == 1
+    assert failed_events[0].payload.items() >= notification.items()
+    assert "database is locked" in failed_events[0].error
@@ -0,0 +1,164 @@
+"""
+Query budgets for the webhooks: these tests fail if a change
+adds SQL statements to a webhook path, for example with an N+1 query.
+"""
+
+import datetime
+import json
+from typing import Callable, ContextManager
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from httpx import Response
+from respx import MockRouter
+
+from slackhealthbot.data.database.connection import QueryCounter
+from slackhealthbot.data.database.models import User
+from slackhealthbot.settings import Settings
+from tests.testsupport.factories.factories import (
+    FitbitActivityFactory,
+    FitbitUserFactory,
+    UserFactory,
+    WithingsUserFactory,
+)
+from tests.testsupport.testdata.fitbit_scenarios import (
+    activity_scenarios,
+    sleep_scenarios,
+)
+
+QueryBudget = Callable[[int], ContextManager[QueryCounter]]
+
+
+def _post_fitbit_notification(
+    client: TestClient,
+    user: User,
+    collection_type: str,
+):
+    response = client.post(
+        "/fitbit-notification-webhook/",
+        content=json.dumps(
+            [
+                {
+                    "ownerId": user.fitbit.oauth_userid,
+                    "date": "2023-05-12",
+                    "collectionType": collection_type,
+                }
+            ]
+        ),
+    )
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+@pytest.mark.parametrize(
+    argnames=["scenario_name", "max_queries"],
+    argvalues=[
+        ("No previous activity data, new Spinning activity", 10),
+        ("New Spinning activity, full zones", 10),
+        ("New unrecognized activity", 2),
+    ],
+)
+def test_fitbit_activity_notification_query_budget(  # noqa: PLR0913
+    client: TestClient,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    query_budget: QueryBudget,
+    settings: Settings,
+    scenario_name: str,
+    max_queries: int,
+):
+    scenario = activity_scenarios[scenario_name]
+    user_factory, fitbit_user_factory, fitbit_activity_factory = fitbit_factories
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user = fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    if scenario.input_initial_activity_data:
+        fitbit_activity_factory.create(
+            fitbit_user_id=fitbit_user.id,
+            type_id=55001,
+            **scenario.input_initial_activity_data,
+        )
+    respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json",
+    ).mock(Response(status_code=200, json=scenario.input_mock_fitbit_response))
+    respx_mock.post(f"{settings.secret_settings.slack_webhook_url}").mock(
+        return_value=Response(200)
+    )
+
+    with client:
+        with query_budget(max_queries):
+            _post_fitbit_notification(client, user, "activities")
+
+
+def test_fitbit_sleep_notification_query_budget(
+    client: TestClient,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    query_budget: QueryBudget,
+    settings: Settings,
+):
+    scenario = sleep_scenarios["New sleep data higher"]
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user_factory.create(
+        user_id=user.id,
+        **scenario.input_initial_sleep_data,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1.2/user/-/sleep/date/2023-05-12.json",
+    ).mock(Response(status_code=200, json=scenario.input_mock_fitbit_response))
+    respx_mock.post(f"{settings.secret_settings.slack_webhook_url}").mock(
+        return_value=Response(200)
+    )
+
+    with client:
+        with query_budget(6):
+            _post_fitbit_notification(client, user, "sleep")
+
+
+def test_withings_notification_query_budget(
+    client: TestClient,
+    respx_mock: MockRouter,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+    query_budget: QueryBudget,
+    settings: Settings,
+):
+    user_factory, withings_user_factory = withings_factories
+    user: User = user_factory.create(withings=None)
+    withings_user_factory.create(
+        user_id=user.id,
+        last_weight=52.1,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    respx_mock.post(
+        url=f"{settings.app_settings.withings.base_url}measure",
+    ).mock(
+        return_value=Response(
+            status_code=200,
+            json={
+                "status": 0,
+                "body": {"measuregrps": [{"measures": [{"value": 52200, "unit": -3}]}]},
+            },
+        )
+    )
+    respx_mock.post(f"{settings.secret_settings.slack_webhook_url}").mock(
+        return_value=Response(200)
+    )
+
+    with client:
+        with query_budget(5):
+            response = client.post(
+                "/withings-notification-webhook/",
+                data={
+                    "userid": user.withings.oauth_userid,
+                    "startdate": 1683894606,
+                    "enddate": 1686570821,
+                },
+            )
+    assert response.status_code == status.HTTP_204_NO_CONTENT
@@ -80,6 +80,7 @@ async def test_refresh_token_ok(
                 "body": {
                     "measuregrps": [
                         {
+                            "date": 1686570000,
                             "measures": [
                                 {
                                     "value": 50050,
@@ -2,12 +2,14 @@ import dataclasses
 import datetime
 import json
 import math
+from urllib.parse import parse_qs
 
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 from httpx import Response
 from respx import MockRouter
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from slackhealthbot.data.database.models import User
 from slackhealthbot.data.database.models import WithingsUser as DbWithingsUser
@@ -15,6 +17,7 @@ from slackhealthbot.domain.localrepository.localwithingsrepository import (
     FitnessData,
     LocalWithingsRepository,
 )
+from slackhealthbot.routers import dependencies
 from slackhealthbot.settings import Settings
 from tests.testsupport.factories.factories import UserFactory, WithingsUserFactory
 
@@ -25,6 +28,7 @@ class WeightNotificationScenario:
     input_new_weight_g: int
     expected_new_latest_weight_kg: float
     expected_icon: str
+    group_commit: bool = False
 
 
 @pytest.mark.parametrize(
@@ -36,6 +40,7 @@ class WeightNotificationScenario:
         (WeightNotificationScenario(53.1, 53000, 53.0, "↘️"),),
         (WeightNotificationScenario(53.0, 51900, 51.9, "⬇️"),),
         (WeightNotificationScenario(52.3, 52300, 52.3, "➡️"),),
+        (WeightNotificationScenario(52.1, 52200, 52.2, "↗️", group_commit=True),),
     ],
 )
 @pytest.mark.asyncio
@@ -46,6 +51,8 @@ async def test_weight_notification(  # noqa: PLR0913
     withings_factories: tuple[UserFactory, WithingsUserFactory],
     scenario: WeightNotificationScenario,
     settings: Settings,
+    monkeypatch: pytest.MonkeyPatch,
+    db_path: str,
 ):
     """
     Given a user with a given previous weight logged
@@ -78,6 +85,7 @@ async def test_weight_notification(  # noqa: PLR0913
                 "body": {
                     "measuregrps": [
                         {
+                            "date": 1686570000,
                             "measures": [
                                 {
                                     "value": scenario.input_new_weight_g,
@@ -96,6 +104,10 @@ async def test_weight_notification(  # noqa: PLR0913
         url=f"{settings.secret_settings.slack_webhook_url}"
     ).mock(return_value=Response(status_code=200))
 
+    if scenario.group_commit:
+        monkeypatch.setattr(settings.app_settings, "database_path", db_path)
+        monkeypatch.setattr(settings.app_settings.database_writer, "group_commit", True)
+
     # When we receive the callback from withings that a new weight is available
     # Use the client as a context manager so the app can have its lfespan events triggered.
     # https://fastapi.tiangolo.com/advanced/testing-events/
@@ -163,6 +175,7 @@ async def test_duplicate_weight_notification(
                 "body": {
                     "measuregrps": [
                         {
+                            "date": 1686570000,
                             "measures": [
                                 {
                                     "value": 50050,
@@ -227,6 +240,94 @@ async def test_duplicate_weight_notification(
     assert slack_request.call_count == 1
 
 
+@pytest.mark.asyncio
+# A window longer than the test is ended early by the shutdown.
+@pytest.mark.parametrize("window_seconds", [0.2, 3600])
+async def test_coalesced_weight_notifications(  # noqa: PLR0913
+    window_seconds: float,
+    local_withings_repository: LocalWithingsRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+    settings: Settings,
+    monkeypatch: pytest.MonkeyPatch,
+    async_connection_url: str,
+):
+    """
+    Given a user with a given previous weight logged
+    When we receive several overlapping notifications from withings within the window
+    Then the weight is requested once, for the range covering all the notifications,
+    And the message is posted to slack only once.
+    """
+    monkeypatch.setattr(
+        settings.app_settings.withings, "notification_window_seconds", window_seconds
+    )
+    # The notifications are processed after their request's session is closed.
+    monkeypatch.setattr(
+        dependencies,
+        "create_async_session_maker",
+        lambda: async_sessionmaker(bind=create_async_engine(async_connection_url)),
+    )
+    user_factory, withings_user_factory = withings_factories
+    user: User = user_factory.create(withings=None)
+    db_withings_user: DbWithingsUser = withings_user_factory.create(
+        user_id=user.id,
+        last_weight=50.2,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    weight_request = respx_mock.post(
+        url=f"{settings.app_settings.withings.base_url}measure",
+    ).mock(
+        return_value=Response(
+            status_code=200,
+            json={
+                "status": 0,
+                "body": {
+                    "measuregrps": [
+                        {
+                            "date": 1686570000,
+                            "measures": [{"value": 50050, "unit": -3}],
+                        }
+                    ]
+                },
+            },
+        )
+    )
+    slack_request = respx_mock.post(
+        url=f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(status_code=200))
+
+    # Exiting the client processes the pending notifications.
+    with client:
+        for startdate, enddate in (
+            (1683894606, 1686570821),
+            (1683894000, 1686570821),
+            (1683894606, 1686571000),
+        ):
+            response = client.post(
+                "/withings-notification-webhook/",
+                data={
+                    "userid": db_withings_user.oauth_userid,
+                    "startdate": startdate,
+                    "enddate": enddate,
+                },
+            )
+            assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    assert weight_request.call_count == 1
+    weight_request_params = parse_qs(weight_request.calls[0].request.content.decode())
+    assert weight_request_params["startdate"] == ["1683894000"]
+    assert weight_request_params["enddate"] == ["1686571000"]
+    fitness_data: FitnessData = (
+        await local_withings_repository.get_fitness_data_by_withings_userid(
+            withings_userid=db_withings_user.oauth_userid,
+        )
+    )
+    assert math.isclose(fitness_data.last_weight_kg, 50.05)
+    assert slack_request.call_count == 1
+
+
 def test_notification_unknown_user(
     client: TestClient,
 ):
@@ -0,0 +1,218 @@
+import datetime
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from httpx import Response
+from respx import MockRouter
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from slackhealthbot.data.database.models import FitbitUser, WithingsUser
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
+from slackhealthbot.domain.localrepository.localwithingsrepository import (
+    LocalWithingsRepository,
+)
+from slackhealthbot.domain.models.failedevent import FailedEvent, FailedEventSource
+from slackhealthbot.remoteservices.repositories.webapifitbitrepository import (
+    WebApiFitbitRepository,
+)
+from slackhealthbot.remoteservices.repositories.webapiwithingsrepository import (
+    WebApiWithingsRepository,
+)
+from slackhealthbot.routers import dependencies
+from slackhealthbot.settings import Settings
+from slackhealthbot.tasks.failedeventsreplay import (
+    ReplayRepositories,
+    replay_failed_events,
+)
+from tests.testsupport.factories.factories import (
+    FitbitActivityFactory,
+    FitbitUserFactory,
+    UserFactory,
+    WithingsUserFactory,
+)
+
+
+@pytest.fixture(autouse=True)
+def session_per_event(monkeypatch: pytest.MonkeyPatch, async_connection_url: str):
+    # The events are replayed concurrently, each with their own session.
+    monkeypatch.setattr(
+        dependencies,
+        "create_async_session_maker",
+        lambda: async_sessionmaker(bind=create_async_engine(async_connection_url)),
+    )
+
+
+def _repos() -> ReplayRepositories:
+    return ReplayRepositories(
+        local_failed_event_repo_factory=dependencies.failed_event_repository_factory(),
+        local_fitbit_repo_factory=dependencies.fitbit_repository_factory(),
+        remote_fitbit_repo=WebApiFitbitRepository(),
+        local_withings_repo_factory=dependencies.withings_repository_factory(),
+        remote_withings_repo=WebApiWithingsRepository(),
+    )
+
+
+async def _get_failed_events(
+    local_failed_event_repository: LocalFailedEventRepository,
+) -> list[FailedEvent]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        x
+        async for x in local_failed_event_repository.iter_failed_events(
+            since=now - datetime.timedelta(hours=1),
+            until=now + datetime.timedelta(hours=1),
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_replay_failed_events(  # noqa: PLR0913
+    local_failed_event_repository: LocalFailedEventRepository,
+    local_withings_repository: LocalWithingsRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+    settings: Settings,
+):
+    """
+    Given withings notifications whose processing failed
+    When we replay them, and withings is back
+    Then the new weights are saved and posted to slack
+    And the failed events are forgotten.
+    """
+    user_factory, withings_user_factory = withings_factories
+    withings_users: list[WithingsUser] = [
+        withings_user_factory.create(
+            user_id=user_factory.create(withings=None).id,
+            last_weight=50.2,
+            oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+            + datetime.timedelta(days=1),
+        )
+        for _ in range(3)
+    ]
+    withings_userids = [x.oauth_userid for x in withings_users]
+    for withings_userid in withings_userids:
+        await local_failed_event_repository.create_failed_event(
+            source=FailedEventSource.WITHINGS,
+            payload={
+                "withings_userid": withings_userid,
+                "startdate": 1700000000,
+                "enddate": 1700000100,
+            },
+            error="httpx.ConnectError: Connection refused",
+            next_attempt_at=datetime.datetime.now(datetime.timezone.utc),
+        )
+
+    new_weight_kg = 50
+    respx_mock.post(
+        url=f"{settings.app_settings.withings.base_url}measure",
+    ).mock(
+        return_value=Response(
+            status_code=200,
+            json={
+                "status": 0,
+                "body": {
+                    "measuregrps": [
+                        {
+                            "date": 1700000050,
+                            "measures": [{"value": new_weight_kg, "unit": 0}],
+                        },
+                    ],
+                },
+            },
+        )
+    )
+    slack_request = respx_mock.post(
+        url=f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(status_code=200))
+
+    with client:
+        replayed, failed = await replay_failed_events(
+            events=local_failed_event_repository.iter_failed_events(
+                since=datetime.datetime.now(datetime.timezone.utc)
+                - datetime.timedelta(hours=1),
+                until=datetime.datetime.now(datetime.timezone.utc)
+                + datetime.timedelta(hours=1),
+            ),
+            repos=_repos(),
+            concurrency=2,
+        )
+
+    assert (replayed, failed) == (len(withings_userids), 0)
+    assert slack_request.call_count == len(withings_userids)
+    for withings_userid in withings_userids:
+        fitness_data = (
+            await local_withings_repository.get_fitness_data_by_withings_userid(
+                withings_userid=withings_userid,
+            )
+        )
+        assert fitness_data.last_weight_kg == new_weight_kg
+    assert not await _get_failed_events(local_failed_event_repository)
+
+
+@pytest.mark.asyncio
+async def test_failed_replay_backs_off(  # noqa: PLR0913
+    local_failed_event_repository: LocalFailedEventRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    """
+    Given a fitbit notification whose processing failed
+    When we replay it, and fitbit is still unreachable
+    Then its next replay is postponed, with a longer delay after each attempt
+    And the background replay gives up after the max number of attempts.
+    """
+    monkeypatch.setattr(settings.app_settings.fitbit.resilience, "max_retries", 0)
+    monkeypatch.setattr(settings.app_settings.failed_events, "max_attempts", 3)
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user_factory.create(fitbit=None).id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    await local_failed_event_repository.create_failed_event(
+        source=FailedEventSource.FITBIT,
+        payload={
+            "collectionType": "sleep",
+            "ownerId": fitbit_user.oauth_userid,
+            "date": "2023-05-12",
+        },
+        error="httpx.ConnectError: Connection refused",
+        next_attempt_at=datetime.datetime.now(datetime.timezone.utc),
+    )
+    sleep_request = respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1.2/user/-/sleep/date/2023-05-12.json",
+    ).mock(side_effect=httpx.ConnectError("Connection refused"))
+
+    replays = 2
+    delays: list[datetime.timedelta] = []
+    with client:
+        for _ in range(replays):
+            replayed_at = datetime.datetime.now(datetime.timezone.utc)
+            replayed, failed = await replay_failed_events(
+                events=local_failed_event_repository.iter_failed_events(
+                    since=replayed_at - datetime.timedelta(hours=1),
+                    until=replayed_at + datetime.timedelta(hours=1),
+                ),
+                repos=_repos(),
+                concurrency=2,
+            )
+            assert (replayed, failed) == (0, 1)
+            [failed_event] = await _get_failed_events(local_failed_event_repository)
+            if failed_event.next_attempt_at:
+                delays.append(failed_event.next_attempt_at - replayed_at)
+
+    assert sleep_request.call_count == replays
+    assert failed_event.attempts == settings.app_settings.failed_events.max_attempts
+    assert failed_event.next_attempt_at is None
+    assert "ConnectError" in failed_event.error
+    assert len(delays) == 1
+    assert delays[0] >= datetime.timedelta(
+        seconds=settings.app_settings.failed_events.backoff_base_seconds * 2
+    )
@@ -134,12 +134,13 @@ async def test_refresh_token_ok(  # noqa: PLR0913
             )
             assert repo_activity.log_id == scenario.expected_new_last_activity_log_id
 
-            # And the message was sent to slack as expected
-            actual_message = json.loads(slack_request.calls[0].request.content)[
-                "text"
-            ].replace("\n", "")
-            assert re.search(scenario.expected_message_pattern, actual_message)
-            assert "None" not in actual_message
+    # And the message was sent to slack as expected,
+    # once the app posted its queued notifications.
+    actual_message = json.loads(slack_request.calls[0].request.content)["text"].replace(
+        "\n", ""
+    )
+    assert re.search(scenario.expected_message_pattern, actual_message)
+    assert "None" not in actual_message
 
 
 @pytest.mark.asyncio
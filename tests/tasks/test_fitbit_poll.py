@@ -14,9 +14,12 @@ from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
 )
 from slackhealthbot.domain.models.activity import ActivityData
+from slackhealthbot.domain.models.poll import ALL_USERS_SHARD, PollShard, PollState
+from slackhealthbot.domain.models.subscription import CollectionType
 from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
     RemoteFitbitRepository,
 )
+from slackhealthbot.domain.usecases.fitbit import usecase_get_poll_skips
 from slackhealthbot.domain.usecases.fitbit.usecase_update_user_oauth import (
     UpdateTokenUseCase,
 )
@@ -27,10 +30,17 @@ from slackhealthbot.remoteservices.repositories.webhookslackrepository import (
 from slackhealthbot.routers.dependencies import (
     fitbit_repository_factory,
     request_context_fitbit_repository,
+    slack_outbox_repository_factory,
 )
 from slackhealthbot.settings import Settings
 from slackhealthbot.tasks import fitbitpoll
-from slackhealthbot.tasks.fitbitpoll import Cache, do_poll
+from slackhealthbot.tasks.fitbitpoll import (
+    Cache,
+    do_poll,
+    load_poll_states,
+    save_poll_states,
+)
+from slackhealthbot.tasks.slackoutbox import dispatch_slack_notifications
 from tests.testsupport.factories.factories import (
     FitbitActivityFactory,
     FitbitUserFactory,
@@ -222,6 +232,261 @@ async def test_fitbit_poll_activity(  # noqa PLR0913
         assert not slack_request.calls
 
 
+@pytest.mark.asyncio
+async def test_fitbit_poll_shard(
+    fitbit_repositories: tuple[LocalFitbitRepository, RemoteFitbitRepository],
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    client: TestClient,
+    settings: Settings,
+):
+    """
+    Given several users
+    When we poll fitbit for one shard
+    Then only the users in that shard are polled
+    """
+    local_fitbit_repository, remote_fitbit_repository = fitbit_repositories
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    shard = PollShard(index=1, count=2)
+
+    fitbit_users: list[FitbitUser] = []
+    for _ in range(10):
+        user: User = user_factory.create(fitbit=None)
+        fitbit_users.append(
+            fitbit_user_factory.create(
+                user_id=user.id,
+                oauth_access_token=f"token-{user.id}",
+                oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+                + datetime.timedelta(days=1),
+            )
+        )
+
+    respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json",
+    ).mock(Response(status_code=200, json={"activities": []}))
+    sleep_request = respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1.2/user/-/sleep/date/2023-01-23.json",
+    ).mock(Response(status_code=200, json={"sleep": []}))
+
+    with client:
+        await do_poll(
+            local_fitbit_repo=local_fitbit_repository,
+            remote_fitbit_repo=remote_fitbit_repository,
+            slack_repo=WebhookSlackRepository(),
+            cache=Cache(),
+            when=datetime.date(2023, 1, 23),
+            shard=shard,
+        )
+
+    polled_tokens = {x.request.headers["Authorization"] for x in sleep_request.calls}
+    expected_tokens = {
+        f"Bearer {x.oauth_access_token}"
+        for x in fitbit_users
+        if shard.contains(x.oauth_userid)
+    }
+    assert expected_tokens
+    assert polled_tokens == expected_tokens
+
+
+@pytest.mark.asyncio
+async def test_fitbit_poll_skips_notified_users(  # noqa: PLR0913
+    fitbit_repositories: tuple[LocalFitbitRepository, RemoteFitbitRepository],
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    """
+    Given users whose webhooks recently notified us, and a silence threshold
+    When we poll fitbit
+    Then we only poll the collection types whose webhooks have been silent
+    """
+    local_fitbit_repository, remote_fitbit_repository = fitbit_repositories
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    monkeypatch.setattr(
+        settings.app_settings.fitbit.poll, "webhook_silence_threshold_seconds", 3600
+    )
+
+    fitbit_users: list[FitbitUser] = []
+    for _ in range(3):
+        user: User = user_factory.create(fitbit=None)
+        fitbit_users.append(
+            fitbit_user_factory.create(
+                user_id=user.id,
+                oauth_access_token=f"token-{user.id}",
+                oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+                + datetime.timedelta(days=1),
+            )
+        )
+    sleep_notified_user, all_notified_user, silent_user = fitbit_users
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for fitbit_user, collection_type, notified_at in [
+        (sleep_notified_user, CollectionType.SLEEP, now),
+        (all_notified_user, CollectionType.SLEEP, now),
+        (all_notified_user, CollectionType.ACTIVITIES, now),
+        (silent_user, CollectionType.SLEEP, now - datetime.timedelta(days=1)),
+    ]:
+        await local_fitbit_repository.record_notification(
+            fitbit_userid=fitbit_user.oauth_userid,
+            collection_type=collection_type,
+            notified_at=notified_at,
+        )
+
+    activity_request = respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json",
+    ).mock(Response(status_code=200, json={"activities": []}))
+    sleep_request = respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1.2/user/-/sleep/date/2023-01-23.json",
+    ).mock(Response(status_code=200, json={"sleep": []}))
+
+    with client:
+        await do_poll(
+            local_fitbit_repo=local_fitbit_repository,
+            remote_fitbit_repo=remote_fitbit_repository,
+            slack_repo=WebhookSlackRepository(),
+            cache=Cache(),
+            when=datetime.date(2023, 1, 23),
+            skip_fitbit_userids=await usecase_get_poll_skips.do(
+                local_fitbit_repo=local_fitbit_repository,
+            ),
+        )
+
+    assert {x.request.headers["Authorization"] for x in sleep_request.calls} == {
+        f"Bearer {silent_user.oauth_access_token}"
+    }
+    assert {x.request.headers["Authorization"] for x in activity_request.calls} == {
+        f"Bearer {sleep_notified_user.oauth_access_token}",
+        f"Bearer {silent_user.oauth_access_token}",
+    }
+
+
+@pytest.mark.asyncio
+async def test_poll_states_survive_restart(  # noqa: PLR0913
+    fitbit_repositories: tuple[LocalFitbitRepository, RemoteFitbitRepository],
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    client: TestClient,
+    settings: Settings,
+):
+    """
+    Given a poll which fetched a user's sleep and activity
+    When the poll state is saved, and restored after a restart
+    Then the next poll doesn't fetch the sleep again,
+    And doesn't post the activity again.
+    """
+    local_fitbit_repository, remote_fitbit_repository = fitbit_repositories
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    sleep_scenario: FitbitSleepScenario = sleep_scenarios["No previous sleep data"]
+    activity_scenario: FitbitActivityScenario = activity_scenarios[
+        "No previous activity data, new Spinning activity"
+    ]
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    sleep_request = respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1.2/user/-/sleep/date/2023-01-23.json",
+    ).mock(Response(status_code=200, json=sleep_scenario.input_mock_fitbit_response))
+    respx_mock.get(
+        url=f"{settings.fitbit_oauth_settings.base_url}1/user/-/activities/list.json",
+    ).mock(Response(status_code=200, json=activity_scenario.input_mock_fitbit_response))
+    slack_request = respx_mock.post(
+        f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(200))
+
+    with client:
+        cache = Cache()
+        await do_poll(
+            local_fitbit_repo=local_fitbit_repository,
+            remote_fitbit_repo=remote_fitbit_repository,
+            slack_repo=WebhookSlackRepository(),
+            cache=cache,
+            when=datetime.date(2023, 1, 23),
+        )
+        await save_poll_states(local_fitbit_repository, cache=cache, schedule=None)
+
+        restored_cache = Cache()
+        await load_poll_states(
+            local_fitbit_repository, cache=restored_cache, schedule=None
+        )
+        await do_poll(
+            local_fitbit_repo=local_fitbit_repository,
+            remote_fitbit_repo=remote_fitbit_repository,
+            slack_repo=WebhookSlackRepository(),
+            cache=restored_cache,
+            when=datetime.date(2023, 1, 23),
+        )
+
+    assert restored_cache.cache_sleep_success == cache.cache_sleep_success
+    assert sleep_request.call_count == 1
+    assert slack_request.call_count == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_poll_states_reloaded_after_rebalance(
+    local_fitbit_repository: LocalFitbitRepository,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+):
+    """
+    Given a replica which polled one shard, and another replica which polled the other one
+    When the replica takes over the users of the other shard
+    Then it loads the poll states which the other replica saved for them
+    And keeps what it knows about its own users.
+    """
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    old_shard = PollShard(index=0, count=2)
+    own_userid = next(f"user{i}" for i in range(100) if old_shard.contains(f"user{i}"))
+    other_userid = next(
+        f"user{i}" for i in range(100) if not old_shard.contains(f"user{i}")
+    )
+    for fitbit_userid in (own_userid, other_userid):
+        fitbit_user_factory.create(
+            user_id=user_factory.create(fitbit=None).id,
+            oauth_userid=fitbit_userid,
+        )
+    today = datetime.date(2024, 1, 10)
+    await local_fitbit_repository.upsert_poll_states(
+        [
+            PollState(
+                fitbit_userid=own_userid,
+                last_fail_alert_date=today - datetime.timedelta(days=3),
+            ),
+            PollState(
+                fitbit_userid=other_userid,
+                last_sleep_success_date=today - datetime.timedelta(days=1),
+                last_fail_alert_date=today,
+            ),
+        ]
+    )
+    cache = Cache(
+        cache_fail={
+            own_userid: today - datetime.timedelta(days=1),
+            # From before the other replica polled this user.
+            other_userid: today - datetime.timedelta(days=5),
+        },
+        shard=old_shard,
+    )
+
+    await load_poll_states(
+        local_fitbit_repository,
+        cache=cache,
+        schedule=None,
+        shard=ALL_USERS_SHARD,
+    )
+
+    assert cache.cache_fail == {
+        own_userid: today - datetime.timedelta(days=1),
+        other_userid: today,
+    }
+    assert cache.cache_sleep_success == {
+        other_userid: today - datetime.timedelta(days=1)
+    }
+    assert cache.shard == ALL_USERS_SHARD
+
+
 @pytest.mark.asyncio
 async def test_schedule_fitbit_poll(  # noqa: PLR0913
     mocked_async_session,
@@ -292,6 +557,10 @@ async def test_schedule_fitbit_poll(  # noqa: PLR0913
     assert repo_activity.log_id == activity_scenario.expected_new_last_activity_log_id
 
     # And the messages were sent to slack as expected
+    await dispatch_slack_notifications(
+        local_slack_outbox_repo_factory=slack_outbox_repository_factory(),
+        slack_repo=WebhookSlackRepository(),
+    )
     assert slack_request.call_count == 2  # noqa: PLR2004
     actual_sleep_message = json.loads(slack_request.calls[0].request.content)[
         "text"
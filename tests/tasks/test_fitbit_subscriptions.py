@@ -0,0 +1,130 @@
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from httpx import Response
+from respx import MockRouter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from slackhealthbot.data.database.models import FitbitUser, User
+from slackhealthbot.domain.localrepository.localfitbitrepository import (
+    LocalFitbitRepository,
+)
+from slackhealthbot.domain.remoterepository.remotefitbitrepository import (
+    RemoteFitbitRepository,
+)
+from slackhealthbot.routers.dependencies import fitbit_repository_factory
+from slackhealthbot.settings import Settings
+from slackhealthbot.tasks.fitbitsubscriptions import reconcile_fitbit_subscriptions
+from tests.testsupport.factories.factories import (
+    FitbitActivityFactory,
+    FitbitUserFactory,
+    UserFactory,
+)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_fitbit_subscriptions(  # noqa: PLR0913
+    mocked_async_session: AsyncSession,
+    fitbit_repositories: tuple[LocalFitbitRepository, RemoteFitbitRepository],
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    settings: Settings,
+    client: TestClient,
+):
+    """
+    Given a user whose activities subscription has disappeared on fitbit
+    When we reconcile the subscriptions
+    Then the activities subscription is recreated
+    And the user is recorded as subscribed to all collection types.
+    """
+    local_fitbit_repository, remote_fitbit_repository = fitbit_repositories
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    base_url = settings.fitbit_oauth_settings.base_url
+    respx_mock.get(f"{base_url}1/user/-/apiSubscriptions.json").mock(
+        return_value=Response(
+            status_code=200,
+            json={
+                "apiSubscriptions": [
+                    {
+                        "collectionType": "sleep",
+                        "ownerId": fitbit_user.oauth_userid,
+                        "ownerType": "user",
+                        "subscriberId": "1",
+                        "subscriptionId": f"{fitbit_user.oauth_userid}-sleep",
+                    }
+                ]
+            },
+        )
+    )
+    subscribe_activities_route = respx_mock.post(
+        f"{base_url}1/user/-/activities/apiSubscriptions/"
+        f"{fitbit_user.oauth_userid}-activities.json"
+    ).mock(return_value=Response(status_code=201, json={}))
+
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    assert not await local_fitbit_repository.get_subscribed_fitbit_userids(since=since)
+
+    with client:
+        await reconcile_fitbit_subscriptions(
+            local_fitbit_repo_factory=fitbit_repository_factory(mocked_async_session),
+            remote_fitbit_repo=remote_fitbit_repository,
+            concurrency=2,
+        )
+
+    assert subscribe_activities_route.call_count == 1
+    assert await local_fitbit_repository.get_subscribed_fitbit_userids(since=since) == {
+        fitbit_user.oauth_userid
+    }
+
+
+@pytest.mark.asyncio
+async def test_reconcile_fitbit_subscriptions_logged_out(  # noqa: PLR0913
+    mocked_async_session: AsyncSession,
+    fitbit_repositories: tuple[LocalFitbitRepository, RemoteFitbitRepository],
+    respx_mock: MockRouter,
+    fitbit_factories: tuple[UserFactory, FitbitUserFactory, FitbitActivityFactory],
+    settings: Settings,
+    client: TestClient,
+):
+    """
+    Given a user who was subscribed to all collection types
+    When we reconcile the subscriptions, and the user's token has been revoked
+    Then the user is no longer recorded as subscribed.
+    """
+    local_fitbit_repository, remote_fitbit_repository = fitbit_repositories
+    user_factory, fitbit_user_factory, _ = fitbit_factories
+    user: User = user_factory.create(fitbit=None)
+    fitbit_user: FitbitUser = fitbit_user_factory.create(
+        user_id=user.id,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        - datetime.timedelta(days=1),
+    )
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    await local_fitbit_repository.update_subscriptions(
+        fitbit_userid=fitbit_user.oauth_userid,
+        collection_types={"sleep", "activities"},
+        verified_at=datetime.datetime.now(datetime.timezone.utc),
+    )
+    assert await local_fitbit_repository.get_subscribed_fitbit_userids(since=since) == {
+        fitbit_user.oauth_userid
+    }
+
+    respx_mock.post(f"{settings.fitbit_oauth_settings.base_url}oauth2/token").mock(
+        return_value=Response(status_code=401)
+    )
+
+    with client:
+        await reconcile_fitbit_subscriptions(
+            local_fitbit_repo_factory=fitbit_repository_factory(mocked_async_session),
+            remote_fitbit_repo=remote_fitbit_repository,
+            concurrency=2,
+        )
+
+    assert not await local_fitbit_repository.get_subscribed_fitbit_userids(since=since)
@@ -0,0 +1,98 @@
+import datetime as dt
+
+import pytest
+from pydantic import ValidationError
+
+from slackhealthbot.settings import AdaptivePoll
+from slackhealthbot.tasks.pollschedule import PollSchedule
+
+MIN_INTERVAL = dt.timedelta(minutes=30)
+MAX_INTERVAL = dt.timedelta(hours=4)
+NOW = dt.datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt.timezone.utc)
+
+
+def test_new_users_are_due_immediately():
+    schedule = PollSchedule(min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL)
+
+    schedule.sync(["a", "b"], now=NOW)
+
+    assert sorted(schedule.pop_due(now=NOW)) == ["a", "b"]
+    assert schedule.pop_due(now=NOW) == []
+
+
+def test_dormant_users_back_off_up_to_max_interval():
+    """
+    Given a user who never has new data
+    When we poll them repeatedly
+    Then the poll interval doubles each time, up to the max interval
+    """
+    schedule = PollSchedule(min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL)
+    schedule.sync(["a"], now=NOW)
+    now = NOW
+    intervals = []
+    for _ in range(5):
+        assert schedule.pop_due(now=now) == ["a"]
+        schedule.record("a", now=now, has_new_data=False)
+        next_poll_at = schedule.next_poll_at()
+        assert schedule.pop_due(now=next_poll_at - dt.timedelta(seconds=1)) == []
+        intervals.append(next_poll_at - now)
+        now = next_poll_at
+
+    assert intervals == [
+        dt.timedelta(hours=1),
+        dt.timedelta(hours=2),
+        dt.timedelta(hours=4),
+        dt.timedelta(hours=4),
+        dt.timedelta(hours=4),
+    ]
+
+
+def test_active_users_reset_to_min_interval():
+    schedule = PollSchedule(min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL)
+    schedule.sync(["a"], now=NOW)
+    schedule.pop_due(now=NOW)
+    schedule.record("a", now=NOW, has_new_data=False)
+    later = NOW + dt.timedelta(hours=1)
+    schedule.pop_due(now=later)
+
+    schedule.record("a", now=later, has_new_data=True)
+
+    assert schedule.next_poll_at() == later + MIN_INTERVAL
+    assert schedule.last_new_data_at == {"a": later}
+
+
+def test_removed_users_are_not_polled():
+    schedule = PollSchedule(min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL)
+    schedule.sync(["a", "b"], now=NOW)
+
+    schedule.sync(["b"], now=NOW)
+
+    assert schedule.pop_due(now=NOW) == ["b"]
+
+
+def test_initial_interval_from_last_new_data():
+    """
+    Given a user whose last new data is 3 hours old
+    When the user is added to the schedule and polled without new data
+    Then the backoff resumes from the interval covering those 3 hours
+    """
+    schedule = PollSchedule(
+        min_interval=MIN_INTERVAL,
+        max_interval=MAX_INTERVAL,
+        last_new_data_at={"a": NOW - dt.timedelta(hours=3)},
+    )
+    schedule.sync(["a"], now=NOW)
+    schedule.pop_due(now=NOW)
+
+    schedule.record("a", now=NOW, has_new_data=False)
+
+    assert schedule.next_poll_at() == NOW + MAX_INTERVAL
+
+
+def test_adaptive_poll_is_disabled_by_default():
+    assert not AdaptivePoll().enabled
+
+
+def test_adaptive_poll_min_interval_above_max_interval():
+    with pytest.raises(ValidationError):
+        AdaptivePoll(min_interval_seconds=7200, max_interval_seconds=3600)
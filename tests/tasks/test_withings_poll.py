@@ -0,0 +1,299 @@
+import datetime
+import json
+from urllib.parse import parse_qs
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from httpx import Response
+from respx import MockRouter
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from slackhealthbot.data.database.models import User
+from slackhealthbot.data.database.models import WithingsUser as DbWithingsUser
+from slackhealthbot.domain.localrepository.localwithingsrepository import (
+    LocalWithingsRepository,
+)
+from slackhealthbot.remoteservices.repositories.webapiwithingsrepository import (
+    WebApiWithingsRepository,
+)
+from slackhealthbot.remoteservices.repositories.webhookslackrepository import (
+    WebhookSlackRepository,
+)
+from slackhealthbot.routers import dependencies
+from slackhealthbot.settings import Settings
+from slackhealthbot.tasks.withingspoll import withings_poll
+from tests.testsupport.factories.factories import UserFactory, WithingsUserFactory
+
+
+@pytest.fixture(autouse=True)
+def session_per_user(monkeypatch: pytest.MonkeyPatch, async_connection_url: str):
+    # The users are polled concurrently, each with their own session.
+    monkeypatch.setattr(
+        dependencies,
+        "create_async_session_maker",
+        lambda: async_sessionmaker(bind=create_async_engine(async_connection_url)),
+    )
+
+
+async def _poll(cache_fail: dict[str, datetime.date] | None = None):
+    await withings_poll(
+        local_withings_repo_factory=dependencies.withings_repository_factory(),
+        remote_withings_repo=WebApiWithingsRepository(),
+        slack_repo=WebhookSlackRepository(),
+        concurrency=2,
+        cache_fail=cache_fail if cache_fail is not None else {},
+        when=datetime.date(2024, 3, 4),
+    )
+
+
+@pytest.mark.asyncio
+async def test_withings_poll(  # noqa: PLR0913
+    local_withings_repository: LocalWithingsRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+    settings: Settings,
+):
+    """
+    Given users who were polled before, and a user who was never polled
+    When we poll withings
+    Then the weights measured since each polled user's cursor are requested,
+    And the new weights are saved and posted to slack,
+    And the user who was never polled only gets a cursor.
+    """
+    user_factory, withings_user_factory = withings_factories
+    polled_users: list[DbWithingsUser] = [
+        withings_user_factory.create(
+            user_id=user_factory.create(withings=None).id,
+            last_weight=50.2,
+            measures_cursor_lastupdate=1700000000 + i,
+            oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+            + datetime.timedelta(days=1),
+        )
+        for i in range(3)
+    ]
+    cursors = [str(x.measures_cursor_lastupdate) for x in polled_users]
+    new_user: DbWithingsUser = withings_user_factory.create(
+        user_id=user_factory.create(withings=None).id,
+        measures_cursor_lastupdate=None,
+    )
+
+    new_weight_kg = 50
+    updatetime = 1700001000
+    weight_request = respx_mock.post(
+        url=f"{settings.app_settings.withings.base_url}measure",
+    ).mock(
+        return_value=Response(
+            status_code=200,
+            json={
+                "status": 0,
+                "body": {
+                    "updatetime": updatetime,
+                    "measuregrps": [
+                        {"date": 1700000500, "measures": [{"value": 49, "unit": 0}]},
+                        {
+                            "date": 1700000900,
+                            "measures": [{"value": new_weight_kg, "unit": 0}],
+                        },
+                    ],
+                },
+            },
+        )
+    )
+    slack_request = respx_mock.post(
+        url=f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(status_code=200))
+
+    with client:
+        await _poll()
+
+    assert weight_request.call_count == len(polled_users)
+    assert (
+        sorted(
+            parse_qs(x.request.content.decode())["lastupdate"][0]
+            for x in weight_request.calls
+        )
+        == cursors
+    )
+    assert slack_request.call_count == len(polled_users)
+    for polled_user in polled_users:
+        repo_user = await local_withings_repository.get_user_by_withings_userid(
+            withings_userid=polled_user.oauth_userid,
+        )
+        assert repo_user.fitness_data.last_weight_kg == new_weight_kg
+        assert repo_user.measures_cursor == updatetime
+    repo_new_user = await local_withings_repository.get_user_by_withings_userid(
+        withings_userid=new_user.oauth_userid,
+    )
+    assert repo_new_user.measures_cursor is not None
+
+
+@pytest.mark.asyncio
+async def test_withings_poll_logged_out(  # noqa: PLR0913
+    client: TestClient,
+    respx_mock: MockRouter,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+    settings: Settings,
+):
+    """
+    Given a user whose token can't be refreshed
+    When we poll withings twice on the same day
+    Then the user is alerted that they're logged out only once.
+    """
+    user_factory, withings_user_factory = withings_factories
+    user: User = user_factory.create(withings=None, slack_alias="jdoe")
+    withings_user_factory.create(
+        user_id=user.id,
+        measures_cursor_lastupdate=1700000000,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        - datetime.timedelta(days=1),
+    )
+    respx_mock.post(
+        url=f"{settings.app_settings.withings.base_url}v2/oauth2",
+    ).mock(Response(status_code=200, json={"status": 401}))
+    slack_request = respx_mock.post(
+        url=f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(status_code=200))
+
+    cache_fail: dict[str, datetime.date] = {}
+    with client:
+        await _poll(cache_fail)
+        await _poll(cache_fail)
+
+    assert slack_request.call_count == 1
+    actual_message = json.loads(slack_request.calls[0].request.content)["text"]
+    assert "jdoe" in actual_message
+    assert "logged out of withings" in actual_message
+
+
+@pytest.mark.parametrize(
+    "measuregrps",
+    [
+        [],
+        # An old measure, edited after the last weight was posted.
+        [{"date": 1690000000, "measures": [{"value": 49, "unit": 0}]}],
+    ],
+)
+@pytest.mark.asyncio
+async def test_withings_poll_no_new_weight(  # noqa: PLR0913
+    local_withings_repository: LocalWithingsRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+    settings: Settings,
+    measuregrps: list[dict],
+):
+    """
+    Given a user who was polled before
+    When we poll withings, and no weight was measured after the user's last one
+    Then nothing is posted to slack,
+    And the user's cursor still moves forward.
+    """
+    user_factory, withings_user_factory = withings_factories
+    withings_user: DbWithingsUser = withings_user_factory.create(
+        user_id=user_factory.create(withings=None).id,
+        last_weight=50.2,
+        last_weight_date=1690000100,
+        measures_cursor_lastupdate=1700000000,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    updatetime = 1700001000
+    respx_mock.post(
+        url=f"{settings.app_settings.withings.base_url}measure",
+    ).mock(
+        return_value=Response(
+            status_code=200,
+            json={
+                "status": 0,
+                "body": {"updatetime": updatetime, "measuregrps": measuregrps},
+            },
+        )
+    )
+    slack_request = respx_mock.post(
+        url=f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(status_code=200))
+
+    with client:
+        await _poll()
+
+    assert slack_request.call_count == 0
+    repo_user = await local_withings_repository.get_user_by_withings_userid(
+        withings_userid=withings_user.oauth_userid,
+    )
+    assert repo_user.fitness_data.last_weight_kg == withings_user.last_weight
+    assert repo_user.measures_cursor == updatetime
+
+
+@pytest.mark.asyncio
+async def test_withings_poll_after_notification(  # noqa: PLR0913
+    local_withings_repository: LocalWithingsRepository,
+    client: TestClient,
+    respx_mock: MockRouter,
+    withings_factories: tuple[UserFactory, WithingsUserFactory],
+    settings: Settings,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Given a weight which was posted from a withings notification
+    When we poll withings, and the poll fetches the same weight
+    Then the weight isn't posted again,
+    And the notification didn't move the user's cursor.
+    """
+    monkeypatch.setattr(
+        settings.app_settings.withings, "notification_window_seconds", 0
+    )
+    user_factory, withings_user_factory = withings_factories
+    withings_user: DbWithingsUser = withings_user_factory.create(
+        user_id=user_factory.create(withings=None).id,
+        last_weight=50.2,
+        measures_cursor_lastupdate=1700000000,
+        oauth_expiration_date=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(days=1),
+    )
+    updatetime = 1700001000
+    measuregrps = [{"date": 1700000500, "measures": [{"value": 50, "unit": 0}]}]
+    respx_mock.post(
+        url=f"{settings.app_settings.withings.base_url}measure",
+    ).mock(
+        side_effect=[
+            Response(
+                status_code=200,
+                json={"status": 0, "body": {"measuregrps": measuregrps}},
+            ),
+            Response(
+                status_code=200,
+                json={
+                    "status": 0,
+                    "body": {"updatetime": updatetime, "measuregrps": measuregrps},
+                },
+            ),
+        ]
+    )
+    slack_request = respx_mock.post(
+        url=f"{settings.secret_settings.slack_webhook_url}"
+    ).mock(return_value=Response(status_code=200))
+
+    with client:
+        response = client.post(
+            "/withings-notification-webhook/",
+            data={
+                "userid": withings_user.oauth_userid,
+                "startdate": 1700000400,
+                "enddate": 1700000600,
+            },
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        repo_user = await local_withings_repository.get_user_by_withings_userid(
+            withings_userid=withings_user.oauth_userid,
+        )
+        assert repo_user.measures_cursor == withings_user.measures_cursor_lastupdate
+        await _poll()
+
+    assert slack_request.call_count == 1
+    repo_user = await local_withings_repository.get_user_by_withings_userid(
+        withings_userid=withings_user.oauth_userid,
+    )
+    assert repo_user.fitness_data.last_weight_date == measuregrps[0]["date"]
+    assert repo_user.measures_cursor == updatetime
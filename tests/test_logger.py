@@ -0,0 +1,60 @@
+import json
+import logging
+
+import pytest
+
+from slackhealthbot import logger
+from slackhealthbot.settings import LogFormat, Logging
+
+
+def _make_record(name: str, level: int, msg: str = "message") -> logging.LogRecord:
+    return logging.LogRecord(
+        name=name,
+        level=level,
+        pathname=__file__,
+        lineno=1,
+        msg=msg,
+        args=(),
+        exc_info=None,
+    )
+
+
+@pytest.mark.parametrize(
+    argnames=["logger_name", "level", "expected_kept"],
+    argvalues=[
+        ("slackhealthbot.routers.fitbit", logging.INFO, False),
+        ("slackhealthbot.routers.fitbit", logging.WARNING, True),
+        ("slackhealthbot.routers.withings", logging.INFO, True),
+        ("slackhealthbot.routers", logging.INFO, True),
+        ("root", logging.INFO, True),
+    ],
+)
+def test_sampling_filter(logger_name: str, level: int, expected_kept: bool):
+    sampling_filter = logger.SamplingFilter(
+        {"slackhealthbot.routers": 1.0, "slackhealthbot.routers.fitbit": 0.0}
+    )
+    assert sampling_filter.filter(_make_record(logger_name, level)) == expected_kept
+
+
+def test_json_formatter():
+    record = _make_record("slackhealthbot.routers.fitbit", logging.INFO, "hello %s")
+    record.args = ("world",)
+    record.correlation_id = "abc"
+
+    entry = json.loads(logger.JsonFormatter().format(record))
+
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "slackhealthbot.routers.fitbit"
+    assert entry["correlation_id"] == "abc"
+    assert entry["message"] == "hello world"
+
+
+@pytest.mark.parametrize(argnames="log_payloads", argvalues=[True, False])
+def test_payload_logging(log_payloads: bool):
+    listener = logger.configure_logging(
+        Logging(format=LogFormat.json, log_payloads=log_payloads)
+    )
+    try:
+        assert logger.payload_logger.isEnabledFor(logging.DEBUG) == log_payloads
+    finally:
+        listener.stop()
@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from slackhealthbot import main
+from slackhealthbot.core import leaderlock
+from slackhealthbot.data.database import migrations
+from slackhealthbot.settings import RuntimeProfile, SecretSettings, Server, Settings
+
+
+@pytest.mark.parametrize(
+    argnames=["profile", "installed", "expected_loop", "expected_http"],
+    argvalues=[
+        (RuntimeProfile.default, True, "asyncio", "h11"),
+        (RuntimeProfile.production, True, "uvloop", "httptools"),
+        (RuntimeProfile.production, False, "asyncio", "h11"),
+    ],
+)
+def test_get_uvicorn_options(
+    monkeypatch: pytest.MonkeyPatch,
+    profile: RuntimeProfile,
+    installed: bool,
+    expected_loop: str,
+    expected_http: str,
+):
+    monkeypatch.setattr(
+        main.importlib.util, "find_spec", lambda name: object() if installed else None
+    )
+    workers = 4
+
+    options = main.get_uvicorn_options(Server(profile=profile, workers=workers))
+
+    assert options["loop"] == expected_loop
+    assert options["http"] == expected_http
+    assert options["workers"] == workers
+
+
+def test_run_several_workers(
+    monkeypatch: pytest.MonkeyPatch,
+    settings: Settings,
+):
+    """
+    Given several workers and no configured session secret key
+    When the app is launched
+    Then the workers import the app themselves
+    And they read the same session secret key.
+    """
+    monkeypatch.setattr(settings.app_settings.server, "workers", 2)
+    monkeypatch.setenv("SESSION_SECRET_KEY", "")
+    monkeypatch.delenv("SESSION_SECRET_KEY")
+    monkeypatch.setattr(migrations, "upgrade_database", lambda database_path: False)
+    uvicorn_calls = []
+    monkeypatch.setattr(
+        main.uvicorn, "run", lambda app, **kwargs: uvicorn_calls.append(app)
+    )
+
+    main.run()
+
+    assert uvicorn_calls == ["slackhealthbot.main:app"]
+    session_secret_key = os.environ["SESSION_SECRET_KEY"]
+    assert session_secret_key
+    assert SecretSettings().session_secret_key == session_secret_key
+
+
+@pytest.mark.parametrize("other_worker_is_leader", [False, True])
+def test_single_worker_tasks(
+    monkeypatch: pytest.MonkeyPatch,
+    client: TestClient,
+    settings: Settings,
+    tmp_path: Path,
+    other_worker_is_leader: bool,
+):
+    """
+    Given several workers
+    When a worker starts
+    Then it runs the single-worker tasks only if no other worker runs them.
+    """
+    database_path = tmp_path / "slackhealthbot.db"
+    monkeypatch.setattr(settings.app_settings.server, "workers", 2)
+    monkeypatch.setattr(settings.app_settings, "database_path", database_path)
+    leader_calls = []
+
+    async def schedule_leader_tasks(settings: Settings) -> list:
+        leader_calls.append(settings)
+        return []
+
+    monkeypatch.setattr(main, "schedule_leader_tasks", schedule_leader_tasks)
+    other_worker_lock = (
+        leaderlock.try_acquire(main.get_leader_lock_path(database_path))
+        if other_worker_is_leader
+        else None
+    )
+
+    with client:
+        pass
+
+    assert len(leader_calls) == (0 if other_worker_is_leader else 1)
+    if other_worker_lock:
+        other_worker_lock.close()
+    # The lock is released on shutdown.
+    lock = leaderlock.try_acquire(main.get_leader_lock_path(database_path))
+    assert lock is not None
+    lock.close()
@@ -1,4 +1,6 @@
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Callable, ContextManager
 
 import pytest
 import pytest_asyncio
@@ -41,6 +43,21 @@ def apply_alembic_migration(
         command.upgrade(alembic_cfg, "head")
 
 
+@pytest.fixture(autouse=True)
+def background_connection_url(
+    async_connection_url: str,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    # The sessions created outside of the requests, for example by the
+    # background tasks, use the test database too.
+    monkeypatch.setattr(
+        db_connection, "get_connection_url", lambda: async_connection_url
+    )
+    db_connection.create_async_session_maker.cache_clear()
+    yield
+    db_connection.create_async_session_maker.cache_clear()
+
+
 @pytest.fixture(autouse=True)
 def setup_db(apply_alembic_migration, connection):
     # This fixture ensures that the alembic migration is applied
@@ -54,3 +71,24 @@ async def mocked_async_session(async_connection_url: str):
     session: AsyncSession = async_sessionmaker(bind=engine)()
     yield session
     await session.close()
+
+
+@pytest.fixture
+def query_budget() -> Callable[[int], ContextManager[db_connection.QueryCounter]]:
+    """
+    Usage:
+        with query_budget(3):
+            ...
+
+    Fails if more than 3 SQL statements are executed within the block.
+    """
+
+    @contextmanager
+    def check_query_budget(max_queries: int):
+        with db_connection.count_queries() as query_counter:
+            yield query_counter
+        assert query_counter.count <= max_queries, "\n\n".join(
+            [f"{query_counter.count} queries:", *query_counter.statements]
+        )
+
+    return check_query_budget
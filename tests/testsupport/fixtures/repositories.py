@@ -1,15 +1,27 @@
 import pytest
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from slackhealthbot.data.repositories.sqlalchemyfailedeventrepository import (
+    SQLAlchemyFailedEventRepository,
+)
 from slackhealthbot.data.repositories.sqlalchemyfitbitrepository import (
     SQLAlchemyFitbitRepository,
 )
+from slackhealthbot.data.repositories.sqlalchemyslackoutboxrepository import (
+    SQLAlchemySlackOutboxRepository,
+)
 from slackhealthbot.data.repositories.sqlalchemywithingsrepository import (
     SQLAlchemyWithingsRepository,
 )
+from slackhealthbot.domain.localrepository.localfailedeventrepository import (
+    LocalFailedEventRepository,
+)
 from slackhealthbot.domain.localrepository.localfitbitrepository import (
     LocalFitbitRepository,
 )
+from slackhealthbot.domain.localrepository.localslackoutboxrepository import (
+    LocalSlackOutboxRepository,
+)
 from slackhealthbot.domain.localrepository.localwithingsrepository import (
     LocalWithingsRepository,
 )
@@ -57,3 +69,17 @@ def fitbit_repositories(
     remote_fitbit_repository: RemoteFitbitRepository,
 ) -> tuple[LocalFitbitRepository, RemoteFitbitRepository]:
     return local_fitbit_repository, remote_fitbit_repository
+
+
+@pytest.fixture
+def local_failed_event_repository(
+    mocked_async_session: AsyncSession,
+) -> LocalFailedEventRepository:
+    return SQLAlchemyFailedEventRepository(db=mocked_async_session)
+
+
+@pytest.fixture
+def local_slack_outbox_repository(
+    mocked_async_session: AsyncSession,
+) -> LocalSlackOutboxRepository:
+    return SQLAlchemySlackOutboxRepository(db=mocked_async_session)